@@ -0,0 +1,80 @@
+import time
+
+from index_partition import IndexPartition
+
+POSTINGS = 100000
+# the linear scan is quadratic, it is measured on fewer postings
+LINEAR_POSTINGS = 10000
+
+
+# adds a posting the way add_token did before the document index,
+# scanning the token's documents for the document id
+def linear_add(token_info, doc_id, lock_no, locations):
+    version_info = {'lockNo': lock_no, 'locations': locations}
+    for info in token_info['documentOccurrences']:
+        if info['documentID'] == doc_id:
+            versions = info['versions']
+            if len(versions) == 2:
+                versions[1] = versions[0]
+                versions[0] = version_info
+            else:
+                versions.insert(0, version_info)
+            return
+    token_info['documentOccurrences'].append({
+        'documentID': doc_id,
+        'versions': [version_info]
+    })
+
+
+def timed(func):
+    start = time.time()
+    func()
+    return time.time() - start
+
+
+def insert_postings(postings):
+    partition = IndexPartition()
+    for i in range(postings):
+        partition.add_token('hot', 'document-{0}'.format(i), 1, 1, [i])
+    # a second version for every document exercises the update path
+    for i in range(postings):
+        partition.add_token('hot', 'document-{0}'.format(i), 2, 1, [i])
+    return partition
+
+
+def insert_postings_batch(postings):
+    partition = IndexPartition()
+    for lock_no in [1, 2]:
+        partition.add_tokens([('hot', 'document-{0}'.format(i), lock_no, 1,
+                               [i]) for i in range(postings)])
+    return partition
+
+
+def insert_postings_linear(postings):
+    token_info = {'ngram_size': 1, 'documentOccurrences': []}
+    for i in range(postings):
+        linear_add(token_info, 'document-{0}'.format(i), 1, [i])
+    for i in range(postings):
+        linear_add(token_info, 'document-{0}'.format(i), 2, [i])
+    return token_info
+
+
+# inserts postings for distinct documents into one token, then a second
+# version of each
+def run():
+    linear = timed(lambda: insert_postings_linear(LINEAR_POSTINGS))
+    indexed_small = timed(lambda: insert_postings(LINEAR_POSTINGS))
+    indexed = timed(lambda: insert_postings(POSTINGS))
+    batched = timed(lambda: insert_postings_batch(POSTINGS))
+    return [
+        ('linear scan: {0} docs x 2 versions'.format(LINEAR_POSTINGS),
+         linear * 1000, 'ms'),
+        ('doc index: {0} docs x 2 versions'.format(LINEAR_POSTINGS),
+         indexed_small * 1000, 'ms'),
+        ('doc index: {0} docs x 2 versions'.format(POSTINGS),
+         indexed * 1000, 'ms'),
+        ('doc index: per posting', indexed * 1e6 / (2 * POSTINGS), 'us'),
+        ('add_tokens: {0} docs x 2 versions'.format(POSTINGS),
+         batched * 1000, 'ms'),
+        ('add_tokens: per posting', batched * 1e6 / (2 * POSTINGS), 'us'),
+    ]
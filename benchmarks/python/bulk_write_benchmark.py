@@ -0,0 +1,153 @@
+import os
+import random
+import string
+import sys
+import time
+
+from document_controller import DocumentController
+from document_model import DocumentModel
+from document_writer import DocumentWriter
+from index_controller import IndexController
+from index_model import IndexModel
+from kinesis import Kinesis
+from local_aws import LocalKinesisClient, LocalTable
+from write_task_model import WriteTaskModel
+
+DOCUMENTS = 400
+TOKENS_PER_DOCUMENT = 40
+VOCABULARY = 5000
+PARTITIONS = 64
+# documents per write master invocation, 1 is the single document handler
+BATCH_SIZES = [1, 25, 100, 400]
+# round trip added to every document, metadata & kinesis call
+LATENCY = 0.005
+SEED = 29
+
+
+def random_token(rand):
+    length = rand.randint(3, 10)
+    return ''.join(rand.choice(string.ascii_lowercase) for _ in range(length))
+
+
+# partitions covering adjacent ranges of the sorted vocabulary
+def build_index(vocabulary):
+    index = IndexController()
+    index._index_table = LocalTable(IndexModel.PKEY, indexes={
+        IndexController.TOKEN_BUCKET_INDEX: (IndexModel.TOKEN_BUCKET,
+                                             IndexModel.START_TOKEN)
+    })
+    size = len(vocabulary) / PARTITIONS
+    for p in range(PARTITIONS):
+        tokens = vocabulary[p * size:(p + 1) * size if p < PARTITIONS - 1
+                            else len(vocabulary)]
+        index.create_new_index(IndexModel().with_pkey('partition-{0:03d}'
+                                                      .format(p))
+                                           .with_storage_key('key-{0}'
+                                                             .format(p))
+                                           .with_start_token(tokens[0])
+                                           .with_end_token(tokens[-1])
+                                           .with_size(len(tokens)))
+    index._index_table.latency = LATENCY
+    index._index_table.reset_stats()
+    return index
+
+
+# write requests of documents drawing their tokens from the vocabulary
+def build_requests(rand, vocabulary):
+    requests = []
+    for i in range(DOCUMENTS):
+        tokens = rand.sample(vocabulary, TOKENS_PER_DOCUMENT)
+        requests.append({
+            'documentID': 'document-{0:05d}'.format(i),
+            'tokenCount': TOKENS_PER_DOCUMENT,
+            'importantTokenRanges': [{
+                'fieldName': 'title',
+                'rangeStart': 0,
+                'rangeEnd': 3
+            }],
+            'tokens': [{
+                'token': token,
+                'ngramSize': 1,
+                'locations': [t]
+            } for (t, token) in enumerate(tokens)]
+        })
+    return requests
+
+
+def new_writer(index):
+    writer = DocumentWriter()
+    writer._documents = DocumentController()
+    writer._documents._document_table = LocalTable(DocumentModel.PKEY,
+                                                   latency=LATENCY)
+    writer._index = index
+    writer._kinesis = Kinesis('stream')
+    writer._kinesis._kinesis = LocalKinesisClient(latency=LATENCY)
+    return writer
+
+
+# writes the requests in invocations of batch_size documents, returns the
+# time, the results & the partition writes the tasks of each invocation
+# take once the worker coalesces them by partition
+def write(writer, requests, batch_size):
+    # the writer logs every document, keep the report readable
+    stdout = sys.stdout
+    sys.stdout = open(os.devnull, 'w')
+    results = []
+    partition_writes = 0
+    stream = writer._kinesis._kinesis
+    try:
+        start = time.time()
+        for first in range(0, len(requests), batch_size):
+            dispatched = len(stream.records)
+            results.extend(writer.write_documents(
+                requests[first:first + batch_size]))
+            tasks = writer._kinesis.parse_tasks_from_records(
+                stream.get_event_records()[dispatched:])
+            partition_writes += len(set(
+                op[WriteTaskModel.PARTITION] for task in tasks
+                for op in task[WriteTaskModel.TOKEN_OPERATIONS]))
+        elapsed = time.time() - start
+    finally:
+        sys.stdout.close()
+        sys.stdout = stdout
+    return (elapsed, results, partition_writes)
+
+
+# indexes the same documents one per invocation & in bulk invocations of
+# growing size with every AWS call taking a round trip, reports documents
+# per second, the calls made per document & the partition writes left
+# once tasks are coalesced by partition
+def run():
+    rand = random.Random(SEED)
+    vocabulary = sorted(set(random_token(rand) for _ in range(VOCABULARY)))
+    requests = build_requests(rand, vocabulary)
+    results = []
+    for batch_size in BATCH_SIZES:
+        index = build_index(vocabulary)
+        writer = new_writer(index)
+        documents = writer._documents._document_table
+        (elapsed, res, partition_writes) = write(writer, requests,
+                                                 batch_size)
+        calls = (sum(documents.calls.values()) +
+                 sum(index._index_table.calls.values()) +
+                 sum(writer._kinesis._kinesis.calls.values()))
+
+        if [r[DocumentWriter.STATUS] for r in res] != \
+                [DocumentWriter.DISPATCHED] * DOCUMENTS:
+            raise Exception('Documents were not dispatched')
+        for request in requests:
+            doc = DocumentModel().set_doc_info(
+                documents.get_item(Key={
+                    DocumentModel.PKEY: request['documentID']})['Item'])
+            if doc.is_updating() or doc.get_lock_no() != 1:
+                raise Exception('Document left locked')
+
+        name = ('single document' if batch_size == 1
+                else '{0} documents per call'.format(batch_size))
+        results.append((name + ': throughput', DOCUMENTS / elapsed,
+                        'docs/s'))
+        results.append((name + ': AWS calls per document',
+                        float(calls) / DOCUMENTS, ''))
+        results.append((name + ': partition writes per document',
+                        float(partition_writes) / DOCUMENTS, ''))
+    return results
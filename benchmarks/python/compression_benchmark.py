@@ -0,0 +1,101 @@
+import random
+import time
+import uuid
+
+import partition_codec
+from legacy_postings import encode_v1_postings
+from partition_codec import PartitionCodec
+
+TOKENS = 1000
+DOCUMENTS = 5000
+POSTINGS = 60000
+DOCUMENT_LENGTH = 3000
+SEED = 13
+LEVELS = [0, 1, 6, 9]
+
+
+# builds token data where document frequency follows a power law,
+# documents have uuid ids, sorted locations and two versions when they
+# were rewritten
+def build_tokens(rand):
+    doc_ids = [str(uuid.UUID(int=rand.getrandbits(128)))
+               for _ in range(DOCUMENTS)]
+    weights = [1.0 / (rank + 1) for rank in range(TOKENS)]
+    total = sum(weights)
+    tokens = {}
+    for i in range(POSTINGS):
+        pick = rand.random() * total
+        idx = 0
+        while pick > weights[idx]:
+            pick -= weights[idx]
+            idx += 1
+        token = 'token{0:04d}'.format(idx)
+        occurrences = tokens.setdefault(token, {
+            'ngram_size': 1, 'documentOccurrences': []
+        })['documentOccurrences']
+        lock_no = rand.randint(1, 50)
+        versions = [{
+            'lockNo': lock_no,
+            'locations': sorted(rand.sample(range(DOCUMENT_LENGTH),
+                                            rand.randint(1, 6)))
+        }]
+        if rand.random() < 0.2:
+            versions.append({
+                'lockNo': lock_no - 1,
+                'locations': sorted(rand.sample(range(DOCUMENT_LENGTH),
+                                                rand.randint(1, 6)))
+            })
+        occurrences.append({'documentID': rand.choice(doc_ids),
+                            'versions': versions})
+    return tokens
+
+
+def count_postings(tokens):
+    return sum(len(doc['versions']) for info in tokens.values()
+               for doc in info['documentOccurrences'])
+
+
+def best_time(func, repeats=3):
+    best = None
+    for i in range(repeats):
+        start = time.time()
+        func()
+        elapsed = time.time() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    return best
+
+
+# reports partition size per posting, encode time and full decode
+# throughput for format version 1 and each compression level
+def run():
+    tokens = build_tokens(random.Random(SEED))
+    postings = count_postings(tokens)
+    occurrences = [info['documentOccurrences'] for info in tokens.values()]
+    results = []
+
+    v1_blocks = [encode_v1_postings(o) for o in occurrences]
+    v1_decode = best_time(lambda: [partition_codec._decode_v1_postings(b)
+                                   for b in v1_blocks])
+    results.append(('v1: bytes per posting',
+                    sum(len(b) for b in v1_blocks) / float(postings),
+                    'B'))
+    results.append(('v1: decode throughput', postings / v1_decode / 1000,
+                    'k postings/s'))
+
+    for level in LEVELS:
+        name = 'v2 level {0}'.format(level)
+        encode = best_time(lambda: PartitionCodec.encode(tokens, None,
+                                                         level))
+        data = PartitionCodec.encode(tokens, None, level)
+        (directory, start) = PartitionCodec.decode_directory(data)
+        blocks_size = len(data) - start
+        decode = best_time(lambda: PartitionCodec.decode(data))
+        results.append((name + ': bytes per posting',
+                        blocks_size / float(postings), 'B'))
+        results.append((name + ': partition size', len(data) / 1024.0,
+                        'KiB'))
+        results.append((name + ': encode', encode * 1000, 'ms'))
+        results.append((name + ': decode throughput',
+                        postings / decode / 1000, 'k postings/s'))
+    return results
@@ -0,0 +1,94 @@
+import threading
+import time
+from datetime import datetime
+
+from document_controller import DocumentController
+from document_model import DocumentModel
+from local_aws import LocalTable
+
+DOCUMENTS = 200
+# round trip added to every document table call
+LATENCY = 0.005
+# seconds a lock is held before another writer may take it over
+EXPIRATION = 60
+# writers racing to lock each document
+WRITERS = 8
+RACED_DOCUMENTS = 20
+
+
+def build_documents():
+    documents = DocumentController()
+    documents._document_table = LocalTable(DocumentModel.PKEY)
+    for i in range(DOCUMENTS):
+        documents.create_new_document(
+            DocumentModel().with_pkey('document-{0:05d}'.format(i))
+                           .with_token_count(100)
+                           .with_word_count(1000)
+                           .with_index_time('2018-01-01 00:00:00.0')
+                           .set_updating(False)
+                           .set_lockno(1)
+                           .set_last_update('2018-01-01 00:00:00.000000'))
+    documents._document_table.latency = LATENCY
+    return documents
+
+
+# the lock as the write master took it: read the document, check the age
+# of its last update, then lock it unconditionally
+def lock_two_trips(documents, doc_id):
+    doc = DocumentModel().set_doc_info(documents.get_document(doc_id))
+    lock_age = (datetime.now() - doc.get_last_update()).seconds
+    if lock_age < EXPIRATION:
+        return False
+    documents.lock_document(doc_id)
+    return True
+
+
+def lock_conditional(documents, doc_id):
+    return documents.acquire_lock(doc_id, EXPIRATION) is not None
+
+
+# writers lock the same document at once, returns how many of them hold
+# the lock
+def race(documents, lock, doc_id):
+    winners = []
+    start = threading.Event()
+
+    def writer():
+        start.wait()
+        if lock(documents, doc_id):
+            winners.append(doc_id)
+    threads = [threading.Thread(target=writer) for _ in range(WRITERS)]
+    for thread in threads:
+        thread.start()
+    start.set()
+    for thread in threads:
+        thread.join()
+    return len(winners)
+
+
+# reports the time & round trips to lock a document by reading it first &
+# by one conditional update, and how many of several racing writers end
+# up holding the lock of one document
+def run():
+    results = []
+    for (name, lock) in [('read then lock', lock_two_trips),
+                         ('conditional update', lock_conditional)]:
+        documents = build_documents()
+        table = documents._document_table
+        table.reset_stats()
+        start = time.time()
+        for i in range(DOCUMENTS):
+            if not lock(documents, 'document-{0:05d}'.format(i)):
+                raise Exception('Failed to lock an unlocked document')
+        elapsed = time.time() - start
+        results.append((name + ': ms per lock', elapsed * 1000 / DOCUMENTS,
+                        'ms'))
+        results.append((name + ': calls per lock',
+                        float(sum(table.calls.values())) / DOCUMENTS, ''))
+
+        documents = build_documents()
+        winners = sum(race(documents, lock, 'document-{0:05d}'.format(i))
+                      for i in range(RACED_DOCUMENTS))
+        results.append((name + ': lock holders per raced document',
+                        float(winners) / RACED_DOCUMENTS, ''))
+    return results
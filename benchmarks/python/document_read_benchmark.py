@@ -0,0 +1,89 @@
+import time
+
+from document_controller import DocumentController
+from document_model import DocumentModel
+from local_aws import LocalTable
+from search_aggregator import SearchAggregator
+
+SIZES = [100, 500, 2000]
+# round trip added to every document table call
+LATENCY = 0.005
+
+
+def new_model(i):
+    return (DocumentModel().with_pkey('document-{0:05d}'.format(i))
+                           .with_token_count(100)
+                           .with_word_count(1000)
+                           .with_index_time('2018-01-01 00:00:00.0')
+                           .with_token_range('title', 0, 5)
+                           .set_updating(False)
+                           .set_lockno(1))
+
+
+def new_controller():
+    documents = DocumentController()
+    documents._document_table = LocalTable(DocumentModel.PKEY,
+                                           latency=LATENCY)
+    return documents
+
+
+# hydration as it was: one query per document
+def get_sequential(documents, doc_ids):
+    models = {}
+    for doc_id in doc_ids:
+        doc_info = documents.get_document(doc_id)
+        if doc_info is not None:
+            models[doc_id] = DocumentModel().set_doc_info(doc_info)
+    return models
+
+
+def timed(func):
+    start = time.time()
+    res = func()
+    return (time.time() - start, res)
+
+
+# reports the time & round trips to write & hydrate result documents one
+# at a time and in batches, as the number of documents grows
+def run():
+    results = []
+    for size in SIZES:
+        models = [new_model(i) for i in range(size)]
+        doc_ids = [model.get_pkey() for model in models]
+        name = '{0} documents'.format(size)
+
+        documents = new_controller()
+        table = documents._document_table
+        (elapsed, res) = timed(lambda: [documents.create_new_document(model)
+                                        for model in models])
+        results.append((name + ', sequential: write time', elapsed * 1000,
+                        'ms'))
+        table.reset_stats()
+        (elapsed, sequential) = timed(lambda: get_sequential(documents,
+                                                             doc_ids))
+        results.append((name + ', sequential: read time', elapsed * 1000,
+                        'ms'))
+        results.append((name + ', sequential: read calls',
+                        sum(table.calls.values()), ''))
+
+        documents = new_controller()
+        table = documents._document_table
+        (elapsed, res) = timed(lambda: documents.create_new_documents(models))
+        results.append((name + ', batched: write time', elapsed * 1000,
+                        'ms'))
+        results.append((name + ', batched: write calls',
+                        sum(table.calls.values()), ''))
+        table.reset_stats()
+        aggregator = SearchAggregator(documents)
+        (elapsed, batched) = timed(lambda: aggregator.get_documents(doc_ids))
+        results.append((name + ', batched: read time', elapsed * 1000, 'ms'))
+        results.append((name + ', batched: read calls',
+                        sum(table.calls.values()), ''))
+
+        for doc_id in doc_ids:
+            if batched[doc_id].get_lock_no() != \
+                    sequential[doc_id].get_lock_no() or \
+                    batched[doc_id].get_token_ranges() != \
+                    sequential[doc_id].get_token_ranges():
+                raise Exception('Batched read differs from sequential read')
+    return results
@@ -0,0 +1,79 @@
+import random
+
+from botocore.exceptions import ClientError
+
+from config import Config
+from kinesis import Kinesis
+from local_aws import LocalKinesisClient
+
+TASKS = 5000
+TOKENS_PER_TASK = 3
+SEED = 17
+
+
+class Task(object):
+
+    def __init__(self, payload):
+        self._payload = payload
+
+    def get_payload(self):
+        return self._payload
+
+
+# small write tasks, like those of a document whose tokens each land in a
+# different partition
+def build_tasks(rand):
+    tasks = []
+    for i in range(TASKS):
+        tasks.append(Task({
+            'writeID': 'write',
+            'documentID': 'document',
+            'lockNoNext': 1,
+            'tokenOperations': [{
+                'token': 'token{0}'.format(rand.randint(0, 100000)),
+                'ngramSize': 1,
+                'locations': [rand.randint(0, 3000)],
+                'partitionID': 'partition-{0}'.format(i)
+            } for t in range(TOKENS_PER_TASK)]
+        }))
+    return tasks
+
+
+def dispatch(tasks, aggregate_bytes):
+    kinesis = Kinesis('stream', aggregate_bytes=aggregate_bytes)
+    client = LocalKinesisClient()
+    kinesis._kinesis = client
+    kinesis.dispatch_tasks(tasks)
+    parsed = kinesis.parse_tasks_from_records(client.get_event_records())
+    if len(parsed) != len(tasks):
+        raise Exception('Tasks lost in dispatch')
+    return kinesis.get_stats()
+
+
+# dispatches one document's tasks to a stand-in stream that throttles
+# records beyond 1MB per request
+def run():
+    tasks = build_tasks(random.Random(SEED))
+
+    # before: every task in a single put_records request
+    accepted = 1
+    client = LocalKinesisClient()
+    try:
+        client.put_records(Records=[{'PartitionKey': 'key',
+                                     'Data': str(t.get_payload())}
+                                    for t in tasks], StreamName='stream')
+    except ClientError:
+        accepted = 0
+
+    results = [('single request: accepted', accepted, 'requests')]
+    for (name, aggregate_bytes) in [('one task per record', 0),
+                                    ('aggregated',
+                                     Config.KINESIS_AGGREGATE_BYTES)]:
+        stats = dispatch(tasks, aggregate_bytes)
+        results.extend([
+            (name + ': records', stats['records'], 'records'),
+            (name + ': requests', stats['requests'], 'requests'),
+            (name + ': records retried', stats['retries'], 'records'),
+            (name + ': throughput', stats['tasksPerSecond'], 'tasks/s'),
+        ])
+    return results
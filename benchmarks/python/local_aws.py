@@ -0,0 +1,585 @@
+import base64
+import copy
+import math
+import re
+import threading
+import time
+import zlib
+from StringIO import StringIO
+
+from boto3.dynamodb.conditions import ConditionBase, AttributeBase
+from boto3.dynamodb.types import TypeDeserializer, TypeSerializer
+from botocore.exceptions import ClientError
+
+
+class LocalTable(object):
+    '''
+    In-memory stand-in for a boto3 DynamoDB Table resource. It supports the
+    subset of the Table API used by the controllers, evaluates boto3
+    condition objects, and counts calls & items read so benchmarks can
+    report round trips and work done alongside wall time. An optional
+    latency in seconds is added to every call to model the round trip.
+    A scan or query reads at most page_size items per call, like the 1 MB
+    limit of a real read, and returns a LastEvaluatedKey when items are
+    left. Scans & queries also count the eventually consistent read units
+    they would consume. Global secondary indexes are given as index name ->
+    (hash key, range key), items missing either key are not indexed.
+    Conditional writes check & apply their condition atomically, like the
+    real table, so they can race from several threads.
+    '''
+
+    def __init__(self, key_name, latency=0, page_size=None, indexes=None):
+        self._key_name = key_name
+        self._items = {}
+        self.indexes = dict(indexes or {})
+        self.calls = {}
+        self.items_read = 0
+        self.read_units = 0.0
+        self.latency = latency
+        self.page_size = page_size
+        self._write_lock = threading.Lock()
+        # table.meta.client, for the client calls made through a table
+        self.meta = LocalTableMeta(LocalTableClient(self))
+
+    def _count(self, op):
+        self.calls[op] = self.calls.get(op, 0) + 1
+        if self.latency:
+            time.sleep(self.latency)
+
+    def reset_stats(self):
+        self.calls = {}
+        self.items_read = 0
+        self.read_units = 0.0
+
+    # a read unit covers 4 KB read with eventual consistency, read units are
+    # rounded up per call
+    def _count_read(self, items):
+        size = 0
+        for item in items:
+            size += sum(len(name) + len(str(value))
+                        for (name, value) in item.items())
+        self.items_read += len(items)
+        self.read_units += math.ceil(size / 4096.0) * 0.5
+
+    def put_item(self, Item, ConditionExpression=None, **kwargs):
+        self._count('put_item')
+        key = Item[self._key_name]
+        with self._write_lock:
+            if ConditionExpression is not None and not evaluate(
+                    ConditionExpression, self._items.get(key) or {}):
+                raise ClientError({'Error': {
+                    'Code': 'ConditionalCheckFailedException',
+                    'Message': 'The conditional request failed'
+                }}, 'PutItem')
+            self._items[key] = copy.deepcopy(Item)
+        return {}
+
+    def get_item(self, Key, **kwargs):
+        self._count('get_item')
+        item = self._items.get(Key[self._key_name])
+        if item is None:
+            return {}
+        self.items_read += 1
+        return {'Item': copy.deepcopy(item)}
+
+    def delete_item(self, Key, ConditionExpression=None, **kwargs):
+        self._count('delete_item')
+        key = Key[self._key_name]
+        with self._write_lock:
+            if ConditionExpression is not None and not evaluate(
+                    ConditionExpression, self._items.get(key) or {}):
+                raise ClientError({'Error': {
+                    'Code': 'ConditionalCheckFailedException',
+                    'Message': 'The conditional request failed'
+                }}, 'DeleteItem')
+            self._items.pop(key, None)
+        return {}
+
+    def scan(self, FilterExpression=None, AttributesToGet=None,
+             ExclusiveStartKey=None, Segment=None, TotalSegments=None,
+             **kwargs):
+        self._count('scan')
+        # keys are read in a stable order, split into segments by hash
+        keys = sorted(key for key in self._items
+                      if TotalSegments is None or
+                      zlib.crc32(str(key)) % TotalSegments == Segment)
+        if ExclusiveStartKey is not None:
+            keys = [key for key in keys
+                    if key > ExclusiveStartKey[self._key_name]]
+        res = {}
+        if self.page_size is not None and len(keys) > self.page_size:
+            keys = keys[:self.page_size]
+            res['LastEvaluatedKey'] = {self._key_name: keys[-1]}
+        items = []
+        self._count_read([self._items[key] for key in keys])
+        for key in keys:
+            item = self._items[key]
+            if FilterExpression is None or evaluate(FilterExpression, item):
+                items.append(_project(item, AttributesToGet))
+        res['Items'] = items
+        res['Count'] = len(items)
+        return res
+
+    def query(self, KeyConditionExpression, IndexName=None,
+              FilterExpression=None, ExclusiveStartKey=None, **kwargs):
+        self._count('query')
+        if IndexName is not None:
+            return self._query_index(IndexName, KeyConditionExpression,
+                                     FilterExpression, ExclusiveStartKey,
+                                     kwargs.get('ScanIndexForward', True),
+                                     kwargs.get('Limit'))
+        items = []
+        # key equality is a direct lookup, like the real table
+        expression = KeyConditionExpression.get_expression()
+        if expression['operator'] == '=' and \
+                getattr(expression['values'][0], 'name', None) == \
+                self._key_name:
+            item = self._items.get(expression['values'][1])
+            if item is not None:
+                self.items_read += 1
+                items.append(copy.deepcopy(item))
+            return {'Items': items, 'Count': len(items)}
+        for item in self._items.values():
+            if evaluate(KeyConditionExpression, item):
+                self.items_read += 1
+                items.append(copy.deepcopy(item))
+        return {'Items': items, 'Count': len(items)}
+
+    # items of the index matching the key condition in range key order, or
+    # in reverse order, up to the limit
+    def _query_index(self, index_name, key_condition, filter_expression,
+                     start_key, forward=True, limit=None):
+        if index_name not in self.indexes:
+            raise ClientError({'Error': {
+                'Code': 'ValidationException',
+                'Message': 'The table does not have the specified index'
+            }}, 'Query')
+        (hash_key, range_key) = self.indexes[index_name]
+        matches = sorted(((item[range_key], item[self._key_name]), item)
+                         for item in self._items.values()
+                         if hash_key in item and range_key in item and
+                         evaluate(key_condition, item))
+        if not forward:
+            matches.reverse()
+        if start_key is not None:
+            position = (start_key[range_key], start_key[self._key_name])
+            matches = [match for match in matches
+                       if (match[0] > position if forward
+                           else match[0] < position)]
+        page_size = self.page_size
+        if limit is not None and (page_size is None or limit < page_size):
+            page_size = limit
+        res = {}
+        if page_size is not None and len(matches) > page_size:
+            matches = matches[:page_size]
+            last = matches[-1][1]
+            res['LastEvaluatedKey'] = dict(
+                (name, last[name])
+                for name in [self._key_name, hash_key, range_key])
+        self._count_read([item for (position, item) in matches])
+        res['Items'] = [copy.deepcopy(item) for (position, item) in matches
+                        if filter_expression is None or
+                        evaluate(filter_expression, item)]
+        res['Count'] = len(res['Items'])
+        return res
+
+    def update_item(self, Key, UpdateExpression, ExpressionAttributeValues,
+                    ConditionExpression=None, ReturnValues=None, **kwargs):
+        self._count('update_item')
+        with self._write_lock:
+            return self._update_item(Key, UpdateExpression,
+                                     ExpressionAttributeValues,
+                                     ConditionExpression, ReturnValues)
+
+    def _update_item(self, Key, UpdateExpression, ExpressionAttributeValues,
+                     ConditionExpression, ReturnValues):
+        key = Key[self._key_name]
+        item = self._items.get(key)
+        if ConditionExpression is not None and \
+                not evaluate(ConditionExpression, item or {}):
+            raise ClientError({'Error': {
+                'Code': 'ConditionalCheckFailedException',
+                'Message': 'The conditional request failed'
+            }}, 'UpdateItem')
+        old_item = copy.deepcopy(item)
+        if item is None:
+            item = {self._key_name: key}
+            self._items[key] = item
+        _apply_update(item, UpdateExpression, ExpressionAttributeValues)
+        # the whole old item is returned for ALL_OLD, the whole new item
+        # for any other ReturnValues
+        if ReturnValues == 'ALL_OLD':
+            return {'Attributes': old_item} if old_item is not None else {}
+        if ReturnValues is not None:
+            return {'Attributes': copy.deepcopy(item)}
+        return {}
+
+
+class LocalTableMeta(object):
+
+    def __init__(self, client):
+        self.client = client
+
+
+class LocalTableClient(object):
+    '''
+    In-memory stand-in for the low-level DynamoDB client of a LocalTable.
+    transact_write_items supports Update & Delete actions on the table with
+    'a = :b' conditions joined by AND, and applies either every action or
+    none of them. batch_get_item returns at most max_batch_items items per
+    call, the rest are returned as UnprocessedKeys like a throttled read,
+    batch_write_item likewise returns the puts past max_batch_items as
+    UnprocessedItems. describe_table & update_table only describe & create
+    the global secondary indexes of a table billed per request.
+    '''
+
+    def __init__(self, table):
+        self._table = table
+        self.max_batch_items = 100
+
+    def describe_table(self, TableName, **kwargs):
+        table = self._table
+        table._count('describe_table')
+        return {'Table': {
+            'TableName': TableName,
+            'BillingModeSummary': {'BillingMode': 'PAY_PER_REQUEST'},
+            'GlobalSecondaryIndexes': [{'IndexName': name, 'KeySchema': [
+                {'AttributeName': hash_key, 'KeyType': 'HASH'},
+                {'AttributeName': range_key, 'KeyType': 'RANGE'}
+            ]} for (name, (hash_key, range_key)) in table.indexes.items()]
+        }}
+
+    def update_table(self, TableName, GlobalSecondaryIndexUpdates=None,
+                     **kwargs):
+        table = self._table
+        table._count('update_table')
+        for update in GlobalSecondaryIndexUpdates or []:
+            index = update['Create']
+            keys = dict((key['KeyType'], key['AttributeName'])
+                        for key in index['KeySchema'])
+            table.indexes[index['IndexName']] = (keys['HASH'], keys['RANGE'])
+        return {}
+
+    def batch_get_item(self, RequestItems, **kwargs):
+        table = self._table
+        table._count('batch_get_item')
+        serializer = TypeSerializer()
+        responses = {}
+        unprocessed = {}
+        for (table_name, request) in RequestItems.items():
+            keys = request['Keys']
+            if len(keys) > 100:
+                raise ClientError({'Error': {
+                    'Code': 'ValidationException',
+                    'Message': 'Too many items requested'
+                }}, 'BatchGetItem')
+            names = request.get('ExpressionAttributeNames', {})
+            attributes = None
+            if 'ProjectionExpression' in request:
+                attributes = [name.strip() for name in _substitute(
+                    request['ProjectionExpression'], names).split(',')]
+            items = []
+            for key in keys[:self.max_batch_items]:
+                item = table._items.get(_deserialize(key)[table._key_name])
+                if item is None:
+                    continue
+                table.items_read += 1
+                items.append(dict((k, serializer.serialize(v)) for (k, v)
+                                  in _project(item, attributes).items()))
+            responses[table_name] = items
+            if len(keys) > self.max_batch_items:
+                unprocessed[table_name] = dict(
+                    request, Keys=keys[self.max_batch_items:])
+        return {'Responses': responses, 'UnprocessedKeys': unprocessed}
+
+    def batch_write_item(self, RequestItems, **kwargs):
+        table = self._table
+        table._count('batch_write_item')
+        unprocessed = {}
+        for (table_name, requests) in RequestItems.items():
+            if len(requests) > 25:
+                raise ClientError({'Error': {
+                    'Code': 'ValidationException',
+                    'Message': 'Too many items requested'
+                }}, 'BatchWriteItem')
+            for request in requests[:self.max_batch_items]:
+                item = _deserialize(request['PutRequest']['Item'])
+                table._items[item[table._key_name]] = item
+            if len(requests) > self.max_batch_items:
+                unprocessed[table_name] = requests[self.max_batch_items:]
+        return {'UnprocessedItems': unprocessed}
+
+    def transact_write_items(self, TransactItems, **kwargs):
+        table = self._table
+        table._count('transact_write_items')
+        actions = []
+        for entry in TransactItems:
+            (action, params) = entry.items()[0]
+            key = _deserialize(params['Key'])[table._key_name]
+            names = params.get('ExpressionAttributeNames', {})
+            values = _deserialize(params.get('ExpressionAttributeValues', {}))
+            condition = params.get('ConditionExpression')
+            if condition is not None and not _evaluate_string(
+                    condition, names, values, table._items.get(key) or {}):
+                raise ClientError({'Error': {
+                    'Code': 'TransactionCanceledException',
+                    'Message': 'Transaction cancelled, a condition failed'
+                }}, 'TransactWriteItems')
+            actions.append((action, key, params, names, values))
+
+        for (action, key, params, names, values) in actions:
+            if action == 'Delete':
+                table._items.pop(key, None)
+                continue
+            item = table._items.setdefault(key, {table._key_name: key})
+            _apply_update(item, _substitute(params['UpdateExpression'],
+                                            names), values)
+        return {}
+
+
+class LocalS3Client(object):
+    '''
+    In-memory stand-in for a boto3 S3 client. Objects are kept as strings
+    per bucket, ranged GETs are supported, and calls & bytes transferred
+    are counted for benchmark reporting. An optional latency in seconds is
+    added to every call to model the round trip.
+    '''
+
+    def __init__(self, latency=0):
+        self._objects = {}
+        self.calls = {}
+        self.bytes_read = 0
+        self.bytes_written = 0
+        self.latency = latency
+
+    def _count(self, op):
+        self.calls[op] = self.calls.get(op, 0) + 1
+        if self.latency:
+            time.sleep(self.latency)
+
+    def reset_stats(self):
+        self.calls = {}
+        self.bytes_read = 0
+        self.bytes_written = 0
+
+    def _get(self, bucket, key):
+        try:
+            return self._objects[(bucket, key)]
+        except KeyError:
+            raise ClientError({'Error': {
+                'Code': 'NoSuchKey',
+                'Message': 'The specified key does not exist.'
+            }}, 'GetObject')
+
+    def put_object(self, Bucket, Key, Body, **kwargs):
+        self._count('put_object')
+        if hasattr(Body, 'read'):
+            Body = Body.read()
+        self._objects[(Bucket, Key)] = Body
+        self.bytes_written += len(Body)
+        return {}
+
+    def get_object(self, Bucket, Key, Range=None, **kwargs):
+        self._count('get_object')
+        data = self._get(Bucket, Key)
+        if Range is not None:
+            (start, end) = Range[len('bytes='):].split('-')
+            data = data[int(start):int(end) + 1]
+        self.bytes_read += len(data)
+        return {'Body': StringIO(data), 'ContentLength': len(data)}
+
+    def download_file(self, Bucket, Key, Filename, **kwargs):
+        self._count('download_file')
+        data = self._get(Bucket, Key)
+        self.bytes_read += len(data)
+        with open(Filename, 'wb') as out_file:
+            out_file.write(data)
+
+    def delete_object(self, Bucket, Key, **kwargs):
+        self._count('delete_object')
+        self._objects.pop((Bucket, Key), None)
+        return {}
+
+    def object_count(self):
+        return len(self._objects)
+
+
+class LocalKinesisClient(object):
+    '''
+    In-memory stand-in for a boto3 Kinesis client. put_records enforces
+    the request limits, and each request only accepts records up to a
+    per-request capacity, the rest fail the way throttled records do.
+    Accepted records are kept for parsing. An optional latency in seconds
+    is added to every call to model the round trip.
+    '''
+
+    MAX_RECORDS = 500
+    MAX_BYTES = 5 * 1024 * 1024
+
+    def __init__(self, capacity_bytes=1024 * 1024, latency=0):
+        self._capacity_bytes = capacity_bytes
+        self.records = []
+        self.calls = {}
+        self.failed_records = 0
+        self.latency = latency
+
+    def _count(self, op):
+        self.calls[op] = self.calls.get(op, 0) + 1
+        if self.latency:
+            time.sleep(self.latency)
+
+    def put_records(self, Records, StreamName, **kwargs):
+        self._count('put_records')
+        size = sum(len(r['Data']) + len(r['PartitionKey']) for r in Records)
+        if len(Records) > self.MAX_RECORDS or size > self.MAX_BYTES:
+            raise ClientError({'Error': {
+                'Code': 'ValidationException',
+                'Message': 'Request exceeds put_records limits'
+            }}, 'PutRecords')
+        entries = []
+        failed = 0
+        accepted_bytes = 0
+        for record in Records:
+            accepted_bytes += len(record['Data'])
+            if accepted_bytes > self._capacity_bytes:
+                failed += 1
+                entries.append({
+                    'ErrorCode': 'ProvisionedThroughputExceededException'
+                })
+            else:
+                self.records.append(record)
+                entries.append({'SequenceNumber': str(len(self.records))})
+        self.failed_records += failed
+        return {'FailedRecordCount': failed, 'Records': entries}
+
+    # accepted records in the format of a lambda kinesis event
+    def get_event_records(self):
+        return [{'kinesis': {'data': base64.b64encode(r['Data'])}}
+                for r in self.records]
+
+
+# copies the attributes of an item, nested attributes given as dotted paths
+def _project(item, attributes):
+    if attributes is None:
+        return copy.deepcopy(item)
+    projected = {}
+    for path in attributes:
+        value = _get_path(item, path)
+        if value is not None:
+            _set_path(projected, path, copy.deepcopy(value))
+    return projected
+
+
+def _get_path(item, path):
+    value = item
+    for part in path.split('.'):
+        if not isinstance(value, dict) or part not in value:
+            return None
+        value = value[part]
+    return value
+
+
+def _set_path(item, path, value):
+    parts = path.split('.')
+    for part in parts[:-1]:
+        item = item.setdefault(part, {})
+    item[parts[-1]] = value
+
+
+# applies an update expression of 'set a = :x, b.c = :y', 'add a :x' and
+# 'remove c, d' clauses
+def _apply_update(item, expression, values):
+    clauses = re.split(r'(?i)(?:^|\s)(set|add|remove)\s', expression.strip())
+    if clauses[0].strip():
+        raise ValueError('Unsupported update expression: ' + expression)
+    for (action, assignments) in zip(clauses[1::2], clauses[2::2]):
+        action = action.lower()
+        for assignment in assignments.split(','):
+            if action == 'remove':
+                _remove_path(item, assignment.strip())
+            elif action == 'add':
+                (path, value) = assignment.split()
+                _set_path(item, path, (_get_path(item, path) or 0) +
+                          values[value])
+            else:
+                (path, value) = assignment.split('=')
+                _set_path(item, path.strip(),
+                          copy.deepcopy(values[value.strip()]))
+
+
+def _remove_path(item, path):
+    parts = path.split('.')
+    parent = _get_path(item, '.'.join(parts[:-1])) if len(parts) > 1 \
+        else item
+    if isinstance(parent, dict):
+        parent.pop(parts[-1], None)
+
+
+def _deserialize(values):
+    deserializer = TypeDeserializer()
+    return dict((k, deserializer.deserialize(v)) for (k, v) in values.items())
+
+
+# replaces #name placeholders with attribute names
+def _substitute(expression, names):
+    # longest first, so #a1 doesn't replace the start of #a10
+    for placeholder in sorted(names, key=len, reverse=True):
+        expression = expression.replace(placeholder, names[placeholder])
+    return expression
+
+
+# evaluates an 'a = :b AND c = :d' condition string against a stored item
+def _evaluate_string(expression, names, values, item):
+    for clause in _substitute(expression, names).split(' AND '):
+        (path, value) = clause.split('=')
+        if _get_path(item, path.strip()) != values[value.strip()]:
+            return False
+    return True
+
+
+# evaluate a boto3 condition object against a stored item
+def evaluate(condition, item):
+    expression = condition.get_expression()
+    operator = expression['operator']
+    values = expression['values']
+    if operator == 'AND':
+        return evaluate(values[0], item) and evaluate(values[1], item)
+    if operator == 'OR':
+        return evaluate(values[0], item) or evaluate(values[1], item)
+    if operator == 'NOT':
+        return not evaluate(values[0], item)
+
+    operands = [_operand(v, item) for v in values]
+    if operator == 'attribute_exists':
+        return operands[0] is not None
+    if operator == 'attribute_not_exists':
+        return operands[0] is None
+    if operands[0] is None:
+        return False
+    if operator == '=':
+        return operands[0] == operands[1]
+    if operator == '<>':
+        return operands[0] != operands[1]
+    if operator == '<':
+        return operands[0] < operands[1]
+    if operator == '<=':
+        return operands[0] <= operands[1]
+    if operator == '>':
+        return operands[0] > operands[1]
+    if operator == '>=':
+        return operands[0] >= operands[1]
+    if operator == 'BETWEEN':
+        return operands[1] <= operands[0] <= operands[2]
+    if operator == 'begins_with':
+        return operands[0].startswith(operands[1])
+    if operator == 'IN':
+        return operands[0] in operands[1]
+    raise ValueError('Unsupported condition operator: ' + operator)
+
+
+def _operand(value, item):
+    if isinstance(value, AttributeBase):
+        return _get_path(item, value.name)
+    if isinstance(value, ConditionBase):
+        return evaluate(value, item)
+    return value
@@ -0,0 +1,118 @@
+import random
+import string
+import time
+
+from config import Config
+from index_controller import IndexController
+from index_model import IndexModel
+from local_aws import LocalTable
+from metadata_migrator import MetadataMigrator
+from partition_router import PartitionRouter
+
+SIZES = [1000, 5000, 20000]
+# items read per scan or query call, about what fits in the 1 MB limit
+PAGE_SIZE = 2500
+# time of a metadata read call
+LATENCY = 0.01
+SEARCHES = 10
+TOKENS_PER_SEARCH = 3
+SEED = 23
+
+
+def random_token(rand):
+    length = rand.randint(2, 10)
+    return ''.join(rand.choice(string.ascii_lowercase) for _ in range(length))
+
+
+def new_table():
+    return LocalTable(IndexModel.PKEY, page_size=PAGE_SIZE, indexes={
+        IndexController.TOKEN_BUCKET_INDEX: (IndexModel.TOKEN_BUCKET,
+                                             IndexModel.START_TOKEN)
+    })
+
+
+# builds a metadata table of mostly adjacent ranges with some overlap,
+# legacy partitions are written without a token bucket
+def build_index(rand, partitions, legacy=False):
+    index = IndexController()
+    index._index_table = new_table()
+    bounds = sorted(random_token(rand) for _ in range(partitions * 2))
+    for i in range(partitions):
+        start = bounds[2 * i]
+        end = bounds[min(2 * i + 2 + rand.randint(0, 2), len(bounds) - 1)]
+        model = (IndexModel().with_pkey('partition-{0:06d}'.format(i))
+                             .with_storage_key('key-{0}'.format(i))
+                             .with_start_token(start)
+                             .with_end_token(end)
+                             .with_size(rand.randint(0, 1200)))
+        if legacy:
+            index._index_table.put_item(Item=model.get_payload())
+        else:
+            index.create_new_index(model)
+    index._index_table.latency = LATENCY
+    return index
+
+
+# routes the tokens of each search with a router loaded by a full scan or
+# only for the tokens, returns the routes, the time & the table stats
+def route_searches(index, searches, by_query):
+    table = index._index_table
+    table.reset_stats()
+    routes = []
+    query_routing = Config.METADATA_QUERY_ROUTING
+    Config.METADATA_QUERY_ROUTING = by_query
+    try:
+        start = time.time()
+        for tokens in searches:
+            router = PartitionRouter(index)
+            router.refresh(tokens if by_query else None)
+            routes.append([sorted(router.get_partitions_for_token(token))
+                           for token in tokens])
+        elapsed = time.time() - start
+    finally:
+        Config.METADATA_QUERY_ROUTING = query_routing
+    return (routes, elapsed, dict(table.calls), table.items_read,
+            table.read_units)
+
+
+# reports the time & read units spent loading the routes of a search from
+# a full scan & from token bucket queries as the table grows, then buckets
+# a table of legacy partitions & checks query routing agrees with the scan
+def run():
+    rand = random.Random(SEED)
+    results = []
+    for size in SIZES:
+        index = build_index(rand, size)
+        searches = [[random_token(rand) for _ in range(TOKENS_PER_SEARCH)]
+                    for _ in range(SEARCHES)]
+        scan = route_searches(index, searches, False)
+        query = route_searches(index, searches, True)
+        if scan[0] != query[0]:
+            raise Exception('Query routing disagrees with scan routing')
+        for (name, (routes, elapsed, calls, items, units)) in [
+                ('scan', scan), ('query', query)]:
+            name = '{0} partitions, {1}'.format(size, name)
+            results.append((name + ': ms per search',
+                            elapsed * 1000 / SEARCHES, 'ms'))
+            results.append((name + ': calls per search',
+                            float(sum(calls.values())) / SEARCHES, ''))
+            results.append((name + ': items read per search',
+                            float(items) / SEARCHES, 'items'))
+            results.append((name + ': read units per search',
+                            units / SEARCHES, 'RCU'))
+
+    index = build_index(rand, SIZES[0], legacy=True)
+    index._index_table.latency = 0
+    index._index_table.indexes = {}
+    migrator = MetadataMigrator()
+    migrator._index = index
+    start = time.time()
+    stats = migrator.migrate_metadata()
+    results.append(('migration: partitions bucketed', stats['migrated'], ''))
+    results.append(('migration: time', (time.time() - start) * 1000, 'ms'))
+    searches = [[random_token(rand) for _ in range(TOKENS_PER_SEARCH)]
+                for _ in range(SEARCHES)]
+    if route_searches(index, searches, False)[0] != \
+            route_searches(index, searches, True)[0]:
+        raise Exception('Query routing disagrees after migration')
+    return results
@@ -0,0 +1,69 @@
+import time
+
+from index_controller import IndexController
+from index_model import IndexModel
+from local_aws import LocalTable
+
+PARTITIONS = 20000
+# items read per scan call, about what fits in the 1 MB scan limit
+PAGE_SIZE = 2500
+# time of a scan call reading a full page
+LATENCY = 0.1
+SEGMENTS = [1, 4, 8]
+
+
+def build_index():
+    index = IndexController()
+    table = LocalTable(IndexModel.PKEY, page_size=PAGE_SIZE)
+    for p in range(PARTITIONS):
+        partition_id = 'partition-{0:06d}'.format(p)
+        table._items[partition_id] = {
+            IndexModel.PKEY: partition_id,
+            IndexModel.STORAGE_KEY: partition_id + '-v1',
+            IndexModel.START_TOKEN: 'token{0:06d}a'.format(p),
+            IndexModel.END_TOKEN: 'token{0:06d}z'.format(p),
+            IndexModel.SIZE: 500,
+            IndexModel.VERSION: 0
+        }
+    table.latency = LATENCY
+    index._index_table = table
+    return index
+
+
+# returns the time to the first item, the total time & the items listed
+def list_partitions(index, segments):
+    start = time.time()
+    first = None
+    count = 0
+    for item in index.scan_partitions([IndexModel.PKEY,
+                                       IndexModel.STORAGE_KEY], None,
+                                      segments):
+        if first is None:
+            first = time.time() - start
+        count += 1
+    return (first, time.time() - start, count)
+
+
+# reports how much of the metadata a single scan call lists, and the time
+# to list every partition with one & several parallel scan segments
+def run():
+    index = build_index()
+    table = index._index_table
+    results = []
+
+    res = table.scan(AttributesToGet=[IndexModel.STORAGE_KEY])
+    results.append(('single scan call: partitions listed',
+                    len(res['Items']) * 100.0 / PARTITIONS, '%'))
+
+    for segments in SEGMENTS:
+        name = '{0} segments'.format(segments)
+        table.reset_stats()
+        (first, elapsed, count) = list_partitions(index, segments)
+        if count != PARTITIONS:
+            raise Exception("Listing missed partitions.")
+        results.append((name + ': time to first partition', first * 1000,
+                        'ms'))
+        results.append((name + ': time', elapsed * 1000, 'ms'))
+        results.append((name + ': scan calls', table.calls.get('scan', 0),
+                        ''))
+    return results
@@ -0,0 +1,64 @@
+import random
+import shutil
+import tempfile
+import time
+
+from config import Config
+from index_storage import IndexStorage
+from local_aws import LocalS3Client
+from partition_cache import PartitionCache
+from partition_format_benchmark import build_partition
+
+SEED = 11
+
+
+def timed(func):
+    start = time.time()
+    func()
+    return time.time() - start
+
+
+# loads the same partition as a cold container, after the in-memory copy
+# was evicted, and as a warm container
+def run():
+    partition = build_partition(random.Random(SEED))
+    cache_directory = tempfile.mkdtemp()
+    # spill every partition so the disk level of the cache is used
+    spill_bytes = Config.PARTITION_SPILL_BYTES
+    Config.PARTITION_SPILL_BYTES = 0
+    try:
+        cache = PartitionCache(cache_directory)
+        storage = IndexStorage(cache)
+        client = LocalS3Client()
+        storage._index_storage = client
+        storage.write_partition('partition', partition)
+        cache.remove('partition')
+
+        client.reset_stats()
+        cold = timed(lambda: storage.load_partition('partition')
+                     .get_token_count('token0000'))
+        cold_bytes = client.bytes_read
+
+        cache._partitions.clear()
+        disk = timed(lambda: storage.load_partition('partition')
+                     .get_token_count('token0000'))
+
+        client.reset_stats()
+        warm = timed(lambda: storage.load_partition('partition')
+                     .get_token_count('token0000'))
+        warm_bytes = client.bytes_read
+        stats = storage.get_cache_stats()
+    finally:
+        Config.PARTITION_SPILL_BYTES = spill_bytes
+        shutil.rmtree(cache_directory)
+
+    return [
+        ('cold: download & load', cold * 1000, 'ms'),
+        ('cold: bytes downloaded', cold_bytes / 1024.0, 'KiB'),
+        ('disk hit: load', disk * 1000, 'ms'),
+        ('memory hit: load', warm * 1000, 'ms'),
+        ('memory hit: bytes downloaded', warm_bytes / 1024.0, 'KiB'),
+        ('cache misses', stats['misses'], 'loads'),
+        ('cache disk hits', stats['diskHits'], 'loads'),
+        ('cache memory hits', stats['memoryHits'], 'loads'),
+    ]
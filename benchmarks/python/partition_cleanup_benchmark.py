@@ -0,0 +1,141 @@
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+from document_controller import DocumentController
+from document_model import DocumentModel
+from index_controller import IndexController
+from index_model import IndexModel
+from index_partition import IndexPartition
+from index_storage import IndexStorage
+from local_aws import LocalS3Client, LocalTable
+from partition_cache import PartitionCache
+from partition_cleaner import PartitionCleaner
+
+PARTITIONS = 20
+TOKENS_PER_PARTITION = 200
+DOCUMENTS = 2000
+DOCUMENTS_PER_TOKEN = 20
+DELETED_FRACTION = 0.2
+# documents rewritten once, their previous version is superseded
+REWRITTEN_FRACTION = 0.3
+UPDATING_FRACTION = 0.05
+SEED = 29
+
+
+def token_name(i):
+    return 'token{0:05d}'.format(i)
+
+
+# documents are deleted, rewritten or being written at random, every
+# posting of a rewritten document keeps its previous version
+def build_index(rand, cache_directory):
+    index = IndexController()
+    index._index_table = LocalTable(IndexModel.PKEY)
+    storage = IndexStorage(PartitionCache(cache_directory))
+    storage._index_storage = LocalS3Client()
+    documents = DocumentController()
+    documents._document_table = LocalTable(DocumentModel.PKEY)
+
+    lock_nos = {}
+    token_counts = {}
+    postings = []
+    for t in range(PARTITIONS * TOKENS_PER_PARTITION):
+        for d in rand.sample(range(DOCUMENTS), DOCUMENTS_PER_TOKEN):
+            postings.append((t, 'document-{0}'.format(d)))
+    for d in range(DOCUMENTS):
+        lock_nos['document-{0}'.format(d)] = (
+            2 if rand.random() < REWRITTEN_FRACTION else 1)
+    for (t, doc_id) in postings:
+        token_counts[doc_id] = token_counts.get(doc_id, 0) + 1
+
+    for (doc_id, lock_no) in lock_nos.iteritems():
+        doc = (DocumentModel().with_pkey(doc_id)
+                              .with_token_count(token_counts.get(doc_id, 0))
+                              .with_word_count(1000)
+                              .with_index_time('2018-01-01 00:00:00.0')
+                              .set_lockno(lock_no)
+                              .set_updating(rand.random() <
+                                            UPDATING_FRACTION)
+                              .set_delete(rand.random() < DELETED_FRACTION))
+        documents.create_new_document(doc)
+
+    for p in range(PARTITIONS):
+        partition = IndexPartition()
+        first = p * TOKENS_PER_PARTITION
+        for (t, doc_id) in postings:
+            if first <= t < first + TOKENS_PER_PARTITION:
+                for lock_no in range(1, lock_nos[doc_id] + 1):
+                    partition.add_token(token_name(t), doc_id, lock_no, 1,
+                                        [t])
+        storage_key = 'partition-{0}-v1'.format(p)
+        storage.write_partition(storage_key, partition)
+        index.update_metadata(IndexModel().with_pkey('partition-{0}'
+                                                     .format(p))
+                                          .with_storage_key(storage_key)
+                                          .with_start_token(
+                                              partition.starting_token())
+                                          .with_end_token(
+                                              partition.ending_token())
+                                          .with_size(partition.size())
+                                          .with_version(0), True)
+    return (index, storage, documents)
+
+
+def storage_size(storage):
+    return sum(len(data) for data in storage._index_storage._objects.values())
+
+
+def run_cleaner(index, storage, documents):
+    cleaner = PartitionCleaner()
+    cleaner._index = index
+    cleaner._storage = storage
+    cleaner._documents = documents
+    # the cleaner logs every partition, keep the report readable
+    stdout = sys.stdout
+    sys.stdout = open(os.devnull, 'w')
+    try:
+        start = time.time()
+        stats = cleaner.clean_partitions()
+        return (time.time() - start, stats)
+    finally:
+        sys.stdout.close()
+        sys.stdout = stdout
+
+
+# cleans an index where a share of the documents were deleted or
+# rewritten, then cleans it again to show unchanged partitions are skipped
+def run():
+    rand = random.Random(SEED)
+    cache_directory = tempfile.mkdtemp()
+    try:
+        (index, storage, documents) = build_index(rand, cache_directory)
+        table = documents._document_table
+        size_before = storage_size(storage)
+        documents_before = len(table._items)
+        table.reset_stats()
+        (elapsed, stats) = run_cleaner(index, storage, documents)
+        reads = table.calls.get('batch_get_item', 0)
+        storage._index_storage.reset_stats()
+        (second, second_stats) = run_cleaner(index, storage, documents)
+        rewrites = storage._index_storage.calls.get('put_object', 0)
+        results = [
+            ('cleanup: time', elapsed * 1000, 'ms'),
+            ('cleanup: partitions rewritten', stats['cleaned'], ''),
+            ('cleanup: deleted document postings', stats['deletedPostings'],
+             ''),
+            ('cleanup: stale versions', stats['staleVersions'], ''),
+            ('cleanup: document batch reads', reads, ''),
+            ('cleanup: documents removed',
+             documents_before - len(table._items), ''),
+            ('storage size: before', size_before / 1024.0, 'KiB'),
+            ('storage size: after', storage_size(storage) / 1024.0, 'KiB'),
+            ('second pass: time', second * 1000, 'ms'),
+            ('second pass: partitions rewritten', rewrites, ''),
+        ]
+    finally:
+        shutil.rmtree(cache_directory)
+    return results
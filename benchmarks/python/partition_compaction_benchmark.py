@@ -0,0 +1,130 @@
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+from index_controller import IndexController
+from index_model import IndexModel
+from index_partition import IndexPartition
+from index_storage import IndexStorage
+from local_aws import LocalS3Client, LocalTable
+from partition_cache import PartitionCache
+from partition_compactor import PartitionCompactor
+
+# partitions laid out in token order, most hold a single token as created
+# for tokens without a partition, some are regular partitions
+PARTITIONS = 600
+REGULAR_FRACTION = 0.05
+REGULAR_TOKENS = 300
+DOCUMENTS_PER_TOKEN = 3
+# the first invocation stops after this many seconds & is resumed
+FIRST_INVOCATION = 0.05
+SEED = 23
+
+
+def token_name(i):
+    return 'token{0:06d}'.format(i)
+
+
+def build_index(rand, cache_directory):
+    index = IndexController()
+    index._index_table = LocalTable(IndexModel.PKEY)
+    storage = IndexStorage(PartitionCache(cache_directory))
+    storage._index_storage = LocalS3Client()
+    next_token = 0
+    for p in range(PARTITIONS):
+        count = REGULAR_TOKENS if rand.random() < REGULAR_FRACTION else 1
+        tokens = range(next_token, next_token + count)
+        next_token += count + rand.randint(0, 10)
+        partition = IndexPartition()
+        partition.add_tokens([(token_name(t), 'document-{0}'.format(
+                                  rand.randint(0, 999)), 1, 1, [t])
+                              for t in tokens
+                              for d in range(DOCUMENTS_PER_TOKEN)])
+        storage_key = 'partition-{0}-v1'.format(p)
+        storage.write_partition(storage_key, partition)
+        index.update_metadata(IndexModel().with_pkey('partition-{0}'
+                                                     .format(p))
+                                          .with_storage_key(storage_key)
+                                          .with_start_token(
+                                              partition.starting_token())
+                                          .with_end_token(
+                                              partition.ending_token())
+                                          .with_size(partition.size())
+                                          .with_version(0), True)
+    return (index, storage)
+
+
+# every (token, document, lockNo) posting in the index
+def get_postings(index, storage):
+    postings = set()
+    for item in index.get_partition_ranges():
+        partition = storage.load_partition(item[IndexModel.STORAGE_KEY])
+        for (token, info) in partition.get_token_infos(
+                partition.get_token_list()).iteritems():
+            for doc in info['documentOccurrences']:
+                for version in doc['versions']:
+                    postings.add((token, doc['documentID'],
+                                  version['lockNo']))
+    return postings
+
+
+def get_metrics(name, index, storage):
+    s3 = storage._index_storage
+    return [
+        (name + ': partitions', len(index.get_partition_ranges()), ''),
+        (name + ': storage objects', s3.object_count(), ''),
+        (name + ': storage size',
+         sum(len(data) for data in s3._objects.values()) / 1024.0, 'KiB'),
+    ]
+
+
+# compacts mostly single token partitions in two invocations, the first
+# stopped by its deadline & the second resumed from its resume token
+def run():
+    rand = random.Random(SEED)
+    cache_directory = tempfile.mkdtemp()
+    try:
+        (index, storage) = build_index(rand, cache_directory)
+        before = get_postings(index, storage)
+        results = get_metrics('before', index, storage)
+
+        # the compactor logs every run, keep the report readable
+        stdout = sys.stdout
+        sys.stdout = open(os.devnull, 'w')
+        try:
+            invocations = []
+            resume_token = None
+            start = time.time()
+            while True:
+                compactor = PartitionCompactor()
+                compactor._index = index
+                compactor._storage = storage
+                deadline = None
+                if len(invocations) == 0:
+                    deadline = time.time() + FIRST_INVOCATION
+                stats = compactor.compact_partitions(resume_token, deadline)
+                invocations.append(stats)
+                resume_token = stats['resumeToken']
+                if resume_token is None:
+                    break
+            elapsed = time.time() - start
+        finally:
+            sys.stdout.close()
+            sys.stdout = stdout
+
+        if get_postings(index, storage) != before:
+            raise Exception('Postings changed during compaction')
+        results.extend(get_metrics('after', index, storage))
+    finally:
+        shutil.rmtree(cache_directory)
+
+    results.append(('compaction: time', elapsed * 1000, 'ms'))
+    results.append(('compaction: invocations', len(invocations), ''))
+    results.append(('compaction: runs compacted',
+                    sum(s['compacted'] for s in invocations), ''))
+    results.append(('compaction: objects eliminated',
+                    sum(s['eliminated'] for s in invocations), ''))
+    return results
@@ -0,0 +1,95 @@
+import cPickle as pickle
+import random
+import time
+
+from index_partition import IndexPartition, _IndexPartition
+from partition_codec import PartitionCodec
+
+TOKENS = 1000
+DOCUMENTS = 2000
+POSTINGS = 50000
+UPDATED_TOKENS = 10
+REPEATS = 5
+SEED = 11
+
+
+# builds a partition where document frequency follows a power law
+def build_partition(rand):
+    partition = IndexPartition()
+    tokens = ['token{0:04d}'.format(i) for i in range(TOKENS)]
+    weights = [1.0 / (rank + 1) for rank in range(TOKENS)]
+    total = sum(weights)
+    for i in range(POSTINGS):
+        pick = rand.random() * total
+        idx = 0
+        while pick > weights[idx]:
+            pick -= weights[idx]
+            idx += 1
+        doc_id = 'document-{0}'.format(rand.randint(0, DOCUMENTS))
+        locations = sorted(rand.sample(range(2000), rand.randint(1, 4)))
+        partition.add_token(tokens[idx], doc_id, rand.randint(1, 3), 1,
+                            locations)
+    return partition
+
+
+def best_time(func):
+    best = None
+    for i in range(REPEATS):
+        start = time.time()
+        func()
+        elapsed = time.time() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    return best
+
+
+# load a partition, add a posting to a few tokens & write it back, the way
+# a write worker applies a small document to an existing partition
+def pickle_write_cycle(pickled):
+    partition = pickle.loads(pickled)
+    for i in range(UPDATED_TOKENS):
+        partition.add_token('token{0:04d}'.format(i), 'new-document', 1, 1,
+                            [0])
+    return pickle.dumps(partition, pickle.HIGHEST_PROTOCOL)
+
+
+def binary_write_cycle(encoded):
+    partition = _IndexPartition()
+    partition.decode(encoded)
+    for i in range(UPDATED_TOKENS):
+        partition.add_token('token{0:04d}'.format(i), 'new-document', 1, 1,
+                            [0])
+    return partition.encode()
+
+
+def run():
+    partition = build_partition(random.Random(SEED))
+    tokens = partition._partition.get_tokens()
+
+    pickled = pickle.dumps(partition._partition, pickle.HIGHEST_PROTOCOL)
+    encoded = PartitionCodec.encode(tokens)
+    if PartitionCodec.decode(encoded) != tokens:
+        raise Exception('Codec failed to round trip partition')
+    if (PartitionCodec.decode(binary_write_cycle(encoded)) !=
+            pickle.loads(pickle_write_cycle(pickled)).get_tokens()):
+        raise Exception('Write cycles produced different partitions')
+
+    return [
+        ('pickle: size', len(pickled) / 1024.0, 'KiB'),
+        ('pickle: serialize', best_time(
+            lambda: pickle.dumps(partition._partition,
+                                 pickle.HIGHEST_PROTOCOL)) * 1000, 'ms'),
+        ('pickle: deserialize', best_time(
+            lambda: pickle.loads(pickled)) * 1000, 'ms'),
+        ('pickle: write cycle', best_time(
+            lambda: pickle_write_cycle(pickled)) * 1000, 'ms'),
+        ('binary: size', len(encoded) / 1024.0, 'KiB'),
+        ('binary: serialize', best_time(
+            lambda: PartitionCodec.encode(tokens)) * 1000, 'ms'),
+        ('binary: deserialize (all postings)', best_time(
+            lambda: PartitionCodec.decode(encoded)) * 1000, 'ms'),
+        ('binary: deserialize (directory only)', best_time(
+            lambda: _IndexPartition().decode(encoded)) * 1000, 'ms'),
+        ('binary: write cycle', best_time(
+            lambda: binary_write_cycle(encoded)) * 1000, 'ms'),
+    ]
@@ -0,0 +1,63 @@
+import os
+import random
+import shutil
+import tempfile
+import time
+
+from index_partition import IndexPartition
+from index_storage import IndexStorage
+from local_aws import LocalS3Client
+from partition_cache import PartitionCache
+from partition_format_benchmark import build_partition, best_time
+
+SEED = 11
+LOOKUP_TOKENS = 1
+
+
+def run():
+    rand = random.Random(SEED)
+    partition = build_partition(rand)
+    tokens = sorted(partition.get_token_list())
+    wanted = rand.sample(tokens, LOOKUP_TOKENS)
+
+    in_file = tempfile.mktemp()
+    cache_directory = tempfile.mkdtemp()
+    partition.serialize(in_file)
+    try:
+        with open(in_file, 'rb') as payload:
+            data = payload.read()
+
+        storage = IndexStorage(PartitionCache(cache_directory))
+        client = LocalS3Client()
+        storage._index_storage = client
+        client.put_object(Bucket=IndexStorage.INDEX_STORAGE,
+                          Key='partition.pkl', Body=data)
+
+        def full_load():
+            loaded = IndexPartition()
+            loaded.deserialize(in_file)
+            loaded._partition.get_tokens()
+
+        full_time = best_time(full_load)
+        mmap_time = best_time(lambda: IndexPartition().lookup(in_file,
+                                                              wanted))
+        client.reset_stats()
+        storage.lookup_tokens('partition', wanted)
+        range_calls = client.calls.get('get_object', 0)
+        range_bytes = client.bytes_read
+        range_time = best_time(lambda: storage.lookup_tokens('partition',
+                                                             wanted))
+    finally:
+        os.remove(in_file)
+        shutil.rmtree(cache_directory)
+
+    return [
+        ('full load: decode every token', full_time * 1000, 'ms'),
+        ('full load: bytes read', len(data) / 1024.0, 'KiB'),
+        ('mmap lookup: decode {0} token(s)'.format(LOOKUP_TOKENS),
+         mmap_time * 1000, 'ms'),
+        ('range lookup: decode {0} token(s)'.format(LOOKUP_TOKENS),
+         range_time * 1000, 'ms'),
+        ('range lookup: ranged GETs', range_calls, 'requests'),
+        ('range lookup: bytes read', range_bytes / 1024.0, 'KiB'),
+    ]
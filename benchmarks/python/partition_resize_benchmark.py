@@ -0,0 +1,147 @@
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+from config import Config
+from index_controller import IndexController
+from index_model import IndexModel
+from index_partition import IndexPartition
+from index_storage import IndexStorage
+from local_aws import LocalS3Client, LocalTable
+from partition_cache import PartitionCache
+from partition_resizer import PartitionResizer
+from partition_router import PartitionRouter
+
+TOKENS = 20000
+# partitions with random, overlapping token ranges
+OVERLAPPING = 12
+OVERLAPPING_TOKENS = 400
+# partitions at the max size with disjoint ranges
+FULL = 3
+# single token partitions, as created when every candidate was full
+FRAGMENTS = 200
+DOCUMENTS_PER_TOKEN = 3
+SEED = 17
+
+
+def token_name(i):
+    return 'token{0:05d}'.format(i)
+
+
+def add_partition(index, storage, rand, tokens):
+    partition = IndexPartition()
+    partition.add_tokens([(token_name(t), 'document-{0}'.format(
+                              rand.randint(0, 999)), 1, 1, [t])
+                          for t in tokens
+                          for d in range(DOCUMENTS_PER_TOKEN)])
+    partition_id = 'partition-{0}'.format(len(index._index_table._items))
+    storage_key = partition_id + '-v1'
+    storage.write_partition(storage_key, partition)
+    index.update_metadata(IndexModel().with_pkey(partition_id)
+                                      .with_storage_key(storage_key)
+                                      .with_start_token(
+                                          partition.starting_token())
+                                      .with_end_token(partition.ending_token())
+                                      .with_size(partition.size())
+                                      .with_version(0), True)
+
+
+# full partitions cover the start of the keyspace, overlapping partitions
+# & fragments the rest
+def build_index(rand, cache_directory):
+    index = IndexController()
+    index._index_table = LocalTable(IndexModel.PKEY)
+    storage = IndexStorage(PartitionCache(cache_directory))
+    storage._index_storage = LocalS3Client()
+    full_end = FULL * Config.INDEX_MAX_SIZE
+    for p in range(FULL):
+        first = p * Config.INDEX_MAX_SIZE
+        add_partition(index, storage, rand,
+                      range(first, first + Config.INDEX_MAX_SIZE))
+    for p in range(OVERLAPPING):
+        first = rand.randint(full_end, TOKENS - OVERLAPPING_TOKENS * 4)
+        add_partition(index, storage, rand,
+                      sorted(rand.sample(range(first, first +
+                                               OVERLAPPING_TOKENS * 4),
+                                         OVERLAPPING_TOKENS)))
+    for p in range(FRAGMENTS):
+        add_partition(index, storage, rand, [rand.randint(full_end,
+                                                          TOKENS - 1)])
+    return (index, storage)
+
+
+# every (token, document, lockNo) posting in the index
+def get_postings(index, storage):
+    postings = set()
+    for item in index.get_partition_ranges():
+        partition = storage.load_partition(item[IndexModel.STORAGE_KEY])
+        for (token, info) in partition.get_token_infos(
+                partition.get_token_list()).iteritems():
+            for doc in info['documentOccurrences']:
+                for version in doc['versions']:
+                    postings.add((token, doc['documentID'],
+                                  version['lockNo']))
+    return postings
+
+
+# mean & max number of partitions a token resolves to
+def get_routing(index, tokens):
+    router = PartitionRouter(index).load()
+    counts = [len(router.get_partitions_for_token(token))
+              for token in tokens]
+    return (sum(counts) / float(len(counts)), max(counts))
+
+
+def get_metrics(name, index, tokens):
+    sizes = [int(item[IndexModel.SIZE])
+             for item in index.get_partition_ranges()]
+    (mean, most) = get_routing(index, tokens)
+    return [
+        (name + ': partitions', len(sizes), ''),
+        (name + ': largest partition', max(sizes), 'tokens'),
+        (name + ': partitions per token', mean, 'mean'),
+        (name + ': partitions per token, max', most, ''),
+    ]
+
+
+# splits full partitions & redistributes overlapping ones, reporting the
+# partitions each token resolves to before & after
+def run():
+    rand = random.Random(SEED)
+    cache_directory = tempfile.mkdtemp()
+    try:
+        (index, storage) = build_index(rand, cache_directory)
+        before = get_postings(index, storage)
+        tokens = sorted(set(posting[0] for posting in before))
+        results = get_metrics('before', index, tokens)
+
+        resizer = PartitionResizer()
+        resizer._index = index
+        resizer._storage = storage
+        # the resizer logs every group, keep the report readable
+        stdout = sys.stdout
+        sys.stdout = open(os.devnull, 'w')
+        try:
+            start = time.time()
+            stats = resizer.resize_partitions()
+            elapsed = time.time() - start
+        finally:
+            sys.stdout.close()
+            sys.stdout = stdout
+
+        if get_postings(index, storage) != before:
+            raise Exception('Postings changed during resize')
+        if storage._index_storage.object_count() != \
+                len(index.get_partition_ranges()):
+            raise Exception('Retired partitions were left in storage')
+        results.extend(get_metrics('after', index, tokens))
+    finally:
+        shutil.rmtree(cache_directory)
+
+    results.append(('resize: time', elapsed * 1000, 'ms'))
+    for stat in ['split', 'redistributed', 'created', 'retired', 'passes']:
+        results.append(('resize: ' + stat, stats[stat], ''))
+    return results
@@ -0,0 +1,61 @@
+import os
+import random
+import shutil
+import tempfile
+import time
+
+from config import Config
+from index_storage import IndexStorage
+from local_aws import LocalS3Client
+from partition_cache import PartitionCache
+from partition_format_benchmark import build_partition
+
+SEED = 11
+REPEATS = 5
+
+
+def directory_bytes(directory):
+    return sum(os.path.getsize(os.path.join(directory, fname))
+               for fname in os.listdir(directory))
+
+
+# writes a partition & loads it back with an empty memory cache, the
+# path a write worker's partition takes through IndexStorage
+def transfer(partition, spill_bytes):
+    cache_directory = tempfile.mkdtemp()
+    saved = Config.PARTITION_SPILL_BYTES
+    Config.PARTITION_SPILL_BYTES = spill_bytes
+    try:
+        best = None
+        for i in range(REPEATS):
+            cache = PartitionCache(cache_directory)
+            storage = IndexStorage(cache)
+            storage._index_storage = LocalS3Client()
+            start = time.time()
+            storage.write_partition('partition', partition)
+            # a different container, nothing cached in memory or on disk
+            cache.remove('partition')
+            storage.load_partition('partition')
+            elapsed = time.time() - start
+            if best is None or elapsed < best:
+                best = elapsed
+        cache.remove('partition')
+        storage.load_partition('partition')
+        file_bytes = directory_bytes(cache_directory)
+    finally:
+        Config.PARTITION_SPILL_BYTES = saved
+        shutil.rmtree(cache_directory)
+    return (best, file_bytes)
+
+
+def run():
+    partition = build_partition(random.Random(SEED))
+    (spilled, spilled_bytes) = transfer(partition, 0)
+    (streamed, streamed_bytes) = transfer(partition,
+                                          Config.PARTITION_SPILL_BYTES)
+    return [
+        ('spilled: write & load', spilled * 1000, 'ms'),
+        ('spilled: bytes on disk', spilled_bytes / 1024.0, 'KiB'),
+        ('in memory: write & load', streamed * 1000, 'ms'),
+        ('in memory: bytes on disk', streamed_bytes / 1024.0, 'KiB'),
+    ]
@@ -0,0 +1,84 @@
+import random
+import string
+import time
+
+from config import Config
+from index_controller import IndexController
+from index_model import IndexModel
+from partition_router import PartitionRouter
+from local_aws import LocalTable
+
+PARTITIONS = 300
+DOCUMENT_TOKENS = 2000
+SEED = 7
+
+
+def random_token(rand):
+    length = rand.randint(2, 10)
+    return ''.join(rand.choice(string.ascii_lowercase) for _ in range(length))
+
+
+# builds a metadata table of mostly adjacent ranges with some overlap
+def build_metadata_table(rand):
+    table = LocalTable(IndexModel.PKEY)
+    bounds = sorted(random_token(rand) for _ in range(PARTITIONS * 2))
+    for i in range(PARTITIONS):
+        start = bounds[2 * i]
+        end = bounds[min(2 * i + 2 + rand.randint(0, 2), len(bounds) - 1)]
+        table.put_item(Item=(IndexModel().with_pkey('partition-{0}'.format(i))
+                                         .with_storage_key('key-{0}'.format(i))
+                                         .with_start_token(start)
+                                         .with_end_token(end)
+                                         .with_size(rand.randint(0, 1200))
+                                         .get_payload()))
+    return table
+
+
+def build_controller(table):
+    controller = IndexController()
+    controller._index_table = table
+    return controller
+
+
+def run():
+    rand = random.Random(SEED)
+    table = build_metadata_table(rand)
+    controller = build_controller(table)
+    tokens = [random_token(rand) for _ in range(DOCUMENT_TOKENS)]
+
+    # before: one filtered scan of the metadata table per token
+    table.reset_stats()
+    query_routing = Config.METADATA_QUERY_ROUTING
+    Config.METADATA_QUERY_ROUTING = False
+    try:
+        start = time.time()
+        scanned = [controller.get_partition_for_token(t) for t in tokens]
+        scan_time = time.time() - start
+    finally:
+        Config.METADATA_QUERY_ROUTING = query_routing
+    scan_calls = table.calls.get('scan', 0)
+    scan_items = table.items_read
+
+    # after: one scan per document, then binary search per token
+    table.reset_stats()
+    start = time.time()
+    router = PartitionRouter(controller).load()
+    routed = [router.get_partition_for_token(t) for t in tokens]
+    router_time = time.time() - start
+    router_calls = table.calls.get('scan', 0)
+    router_items = table.items_read
+
+    # the scan finds no partition for tokens outside every range or only in
+    # full ones, the router sends those to a neighbouring partition instead
+    if [r for (s, r) in zip(scanned, routed) if s != ''] != \
+            [s for s in scanned if s != '']:
+        raise Exception('Router disagrees with per-token scan routing')
+
+    return [
+        ('scan per token: ms per document', scan_time * 1000, 'ms'),
+        ('scan per token: table scans per document', scan_calls, 'scans'),
+        ('scan per token: items read per document', scan_items, 'items'),
+        ('router: ms per document', router_time * 1000, 'ms'),
+        ('router: table scans per document', router_calls, 'scans'),
+        ('router: items read per document', router_items, 'items'),
+    ]
@@ -0,0 +1,136 @@
+import os
+import random
+import shutil
+import sys
+import tempfile
+
+from config import Config
+from document_controller import DocumentController
+from document_model import DocumentModel
+from index_controller import IndexController
+from index_model import IndexModel
+from index_partition import IndexPartition
+from index_storage import IndexStorage
+from local_aws import LocalS3Client, LocalTable
+from partition_cache import PartitionCache
+import search_master_node
+
+PARTITIONS = 40
+TOKENS_PER_PARTITION = 200
+DOCUMENTS = 500
+POSTINGS_PER_TOKEN = 20
+QUERIES = 50
+QUERY_TOKENS = 4
+SEED = 5
+
+
+def token_name(i):
+    return 'token{0:05d}'.format(i)
+
+
+# seeds the metadata table, partition storage & document table through
+# the service controllers, backed by in-memory stand-ins
+def build_index(rand, cache_directory):
+    index = IndexController()
+    index._index_table = LocalTable(IndexModel.PKEY, indexes={
+        IndexController.TOKEN_BUCKET_INDEX: (IndexModel.TOKEN_BUCKET,
+                                             IndexModel.START_TOKEN)
+    })
+    storage = IndexStorage(PartitionCache(cache_directory))
+    storage._index_storage = LocalS3Client()
+    documents = DocumentController()
+    documents._document_table = LocalTable(DocumentModel.PKEY)
+
+    for i in range(DOCUMENTS):
+        doc = (DocumentModel().with_pkey('document-{0}'.format(i))
+                              .with_token_count(POSTINGS_PER_TOKEN)
+                              .with_word_count(1000)
+                              .with_index_time('2018-01-01 00:00:00.0')
+                              .with_token_range('title', 0, 5)
+                              .set_updating(False)
+                              .set_lockno(1))
+        documents.create_new_document(doc)
+
+    for p in range(PARTITIONS):
+        partition = IndexPartition()
+        first = p * TOKENS_PER_PARTITION
+        for t in range(first, first + TOKENS_PER_PARTITION):
+            for d in rand.sample(range(DOCUMENTS), POSTINGS_PER_TOKEN):
+                partition.add_token(token_name(t), 'document-{0}'.format(d),
+                                    1, 1, [rand.randint(0, 999)])
+        storage_key = 'partition-{0}-v1'.format(p)
+        storage.write_partition(storage_key, partition)
+        index.update_metadata(IndexModel().with_pkey('partition-{0}'
+                                                     .format(p))
+                                          .with_storage_key(storage_key)
+                                          .with_start_token(token_name(first))
+                                          .with_end_token(token_name(
+                                              first + TOKENS_PER_PARTITION
+                                              - 1))
+                                          .with_size(TOKENS_PER_PARTITION)
+                                          .with_version(0), True)
+    return (index, storage, documents)
+
+
+def run_queries(rand):
+    timings = {}
+    # the search master logs every query, keep the report readable
+    stdout = sys.stdout
+    sys.stdout = open(os.devnull, 'w')
+    try:
+        for q in range(QUERIES):
+            run_query(rand, timings)
+    finally:
+        sys.stdout.close()
+        sys.stdout = stdout
+    return dict((stage, total / QUERIES)
+                for (stage, total) in timings.iteritems())
+
+
+def run_query(rand, timings):
+    tokens = [token_name(rand.randint(0, PARTITIONS * TOKENS_PER_PARTITION
+                                      - 1))
+              for _ in range(QUERY_TOKENS)]
+    res = search_master_node.search(tokens)
+    if res['returnCode'] != search_master_node.SUCCESS:
+        raise Exception('Search failed: ' + res['error'])
+    if len(res['tokens']) != len(tokens):
+        raise Exception('Search missed tokens')
+    for (stage, elapsed) in res['timings'].iteritems():
+        timings[stage] = timings.get(stage, 0.0) + elapsed
+
+
+# runs searches of a few tokens each through the search master's local
+# thread pool, reporting mean per-stage latency for cold & warm caches
+def run():
+    rand = random.Random(SEED)
+    cache_directory = tempfile.mkdtemp()
+    try:
+        (index, storage, documents) = build_index(rand, cache_directory)
+        search_master_node.INDEX_METADATA = index
+        search_master_node.INDEX_STORAGE = storage
+        search_master_node.DOCUMENTS = documents
+        Config.SEARCH_DISPATCH = 'local'
+
+        # drop the copies cached by the writes so the first pass reads
+        # postings with ranged GETs
+        for p in range(PARTITIONS):
+            storage._cache.remove('partition-{0}-v1'.format(p))
+        cold = run_queries(random.Random(SEED))
+        warm_rand = random.Random(SEED)
+        for p in range(PARTITIONS):
+            storage.load_partition('partition-{0}-v1'.format(p))
+        warm = run_queries(warm_rand)
+    finally:
+        shutil.rmtree(cache_directory)
+
+    results = []
+    for (name, timings) in [('uncached', cold), ('cached', warm)]:
+        for stage in [search_master_node.RESOLVE_STAGE,
+                      search_master_node.SEARCH_STAGE,
+                      search_master_node.AGGREGATE_STAGE,
+                      search_master_node.HYDRATE_STAGE,
+                      search_master_node.TOTAL]:
+            results.append(('{0}: {1}'.format(name, stage), timings[stage],
+                            'ms/query'))
+    return results
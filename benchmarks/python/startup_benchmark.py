@@ -0,0 +1,96 @@
+import json
+import os
+import subprocess
+import sys
+
+# each entry point with the code its lambda runs before the first request
+ENTRY_POINTS = [
+    ('write master', 'import write_master_node'),
+    ('write worker', 'import write_worker_node'),
+    ('search master', 'import search_master_node'),
+    ('search worker', 'import search_worker_node'),
+    ('partition maintenance', 'import partition_maintenance_service\n'
+                              'from partition_resizer import PartitionResizer'
+                              '\nresizer = PartitionResizer()'),
+    ('stopword generation', 'import stopword_generation_service\n'
+                            'from stopword_generator import StopWordGenerator'
+                            '\ngenerator = StopWordGenerator()'),
+]
+# cold starts measured per entry point & mode, the fastest is reported
+REPEATS = 3
+
+# runs in a fresh interpreter like a cold start: times the entry point's
+# import, then the creation of every client the first request uses, and
+# counts the botocore clients created. Eager mode builds a client or
+# resource per controller at construction, as controllers did before the
+# shared registry
+COLD_START = '''
+import gc
+import json
+import time
+import run_benchmarks
+run_benchmarks.setup_path()
+
+import boto3
+import botocore.session
+from aws_clients import AwsClients, LazyReference
+
+created = []
+create_client = botocore.session.Session.create_client
+
+
+def counting_create_client(self, *args, **kwargs):
+    created.append(args[0] if args else kwargs.get('service_name'))
+    return create_client(self, *args, **kwargs)
+botocore.session.Session.create_client = counting_create_client
+
+if {eager}:
+    AwsClients.client = classmethod(lambda cls, service:
+                                    boto3.client(service))
+    AwsClients.table = classmethod(lambda cls, table_name:
+                                   boto3.resource('dynamodb')
+                                   .Table(table_name))
+
+start = time.time()
+{entry}
+imported = time.time() - start
+for reference in [o for o in gc.get_objects()
+                  if isinstance(o, LazyReference)]:
+    reference.get_target()
+ready = time.time() - start
+print json.dumps({{'import': imported, 'ready': ready,
+                  'clients': len(created)}})
+'''
+
+
+def cold_start(entry, eager):
+    env = dict(os.environ)
+    # credentials come from the environment in a lambda, and no instance
+    # metadata is looked up
+    env.update({'AWS_ACCESS_KEY_ID': 'benchmark',
+                'AWS_SECRET_ACCESS_KEY': 'benchmark',
+                'AWS_DEFAULT_REGION': 'us-east-1',
+                'AWS_EC2_METADATA_DISABLED': 'true'})
+    script = COLD_START.format(eager=eager, entry=entry)
+    output = subprocess.check_output([sys.executable, '-c', script],
+                                     env=env)
+    return json.loads(output.strip().splitlines()[-1])
+
+
+# reports the import time, the time until the clients of the first request
+# are ready & the clients created by each entry point with a client per
+# controller & with the shared lazy registry
+def run():
+    results = []
+    for (name, entry) in ENTRY_POINTS:
+        for (mode, eager) in [('client per controller', True),
+                              ('shared registry', False)]:
+            runs = [cold_start(entry, eager) for _ in range(REPEATS)]
+            label = '{0}, {1}'.format(name, mode)
+            results.append((label + ': import',
+                            min(r['import'] for r in runs) * 1000, 'ms'))
+            results.append((label + ': ready for first request',
+                            min(r['ready'] for r in runs) * 1000, 'ms'))
+            results.append((label + ': clients created',
+                            runs[0]['clients'], ''))
+    return results
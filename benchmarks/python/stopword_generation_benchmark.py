@@ -0,0 +1,269 @@
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+from config import Config
+from index_controller import IndexController
+from index_model import IndexModel
+from index_partition import IndexPartition
+from index_storage import IndexStorage
+from local_aws import LocalS3Client, LocalTable
+from partition_cache import PartitionCache
+from stopword_controller import StopWordController
+from stopword_count_storage import StopWordCountStorage
+from stopword_generator import StopWordGenerator
+from stopword_model import StopWordModel
+
+PARTITIONS = 32
+TOKENS_PER_PARTITION = 400
+# every fifth token is a two word ngram, which is not counted
+NGRAM_FRACTION = 0.2
+DOCUMENTS = 5000
+POSTINGS = 120000
+MAX_LOCATIONS = 8
+# round trip added to every storage & metadata call, & to every stop word
+# write
+LATENCY = 0.02
+WRITE_LATENCY = 0.005
+THREADS = [1, 8]
+# partitions rewritten between two runs of the incremental scan
+CHANGED_PARTITIONS = 2
+SEED = 17
+
+
+def token_name(i):
+    return 'token{0:05d}'.format(i)
+
+
+# seeds the metadata table & partition storage, document frequency of the
+# tokens follows a power law
+def build_index(rand):
+    index = IndexController()
+    index._index_table = LocalTable(IndexModel.PKEY)
+    s3 = LocalS3Client()
+    cache_directory = tempfile.mkdtemp()
+    try:
+        storage = IndexStorage(PartitionCache(cache_directory))
+        storage._index_storage = s3
+        count = PARTITIONS * TOKENS_PER_PARTITION
+        weights = [1.0 / (rank + 1) for rank in range(count)]
+        ranks = range(count)
+        rand.shuffle(ranks)
+        picks = _weighted_picks(rand, weights, POSTINGS)
+        tokens = {}
+        for idx in picks:
+            t = ranks[idx]
+            info = tokens.setdefault(t, {
+                'ngram_size': 2 if t % int(1 / NGRAM_FRACTION) == 0 else 1,
+                'documentOccurrences': []
+            })
+            locations = sorted(rand.sample(range(3000),
+                                           rand.randint(1, MAX_LOCATIONS)))
+            info['documentOccurrences'].append({
+                'documentID': 'document-{0}'.format(
+                    rand.randint(0, DOCUMENTS - 1)),
+                'versions': [{'lockNo': 1, 'locations': locations}]
+            })
+
+        for p in range(PARTITIONS):
+            first = p * TOKENS_PER_PARTITION
+            partition = IndexPartition()
+            partition._partition.set_tokens(dict(
+                (token_name(t), tokens[t])
+                for t in range(first, first + TOKENS_PER_PARTITION)
+                if t in tokens))
+            storage_key = 'partition-{0}-v1'.format(p)
+            storage.write_partition(storage_key, partition)
+            index.update_metadata(IndexModel().with_pkey('partition-{0}'
+                                                         .format(p))
+                                              .with_storage_key(storage_key)
+                                              .with_start_token(
+                                                  partition.starting_token())
+                                              .with_end_token(
+                                                  partition.ending_token())
+                                              .with_size(partition.size())
+                                              .with_version(0), True)
+    finally:
+        shutil.rmtree(cache_directory)
+    index._index_table.latency = LATENCY
+    s3.latency = LATENCY
+    return (index, s3)
+
+
+def _weighted_picks(rand, weights, count):
+    cumulative = []
+    total = 0.0
+    for weight in weights:
+        total += weight
+        cumulative.append(total)
+    picks = []
+    for i in range(count):
+        pick = rand.random() * total
+        (low, high) = (0, len(cumulative) - 1)
+        while low < high:
+            mid = (low + high) / 2
+            if cumulative[mid] < pick:
+                low = mid + 1
+            else:
+                high = mid
+        picks.append(low)
+    return picks
+
+
+def new_stopword_controller():
+    controller = StopWordController()
+    controller._stop_word_table = LocalTable(StopWordModel.PKEY,
+                                             latency=WRITE_LATENCY)
+    return controller
+
+
+# the scan as it was: one partition at a time, every token counted with
+# get_token_count & a list membership test
+def scan_sequential(index, storage):
+    tokens = {}
+    for key in index.get_partition_ids():
+        partition = storage.load_partition(key)
+        for token in partition.get_token_list():
+            count = partition.get_token_count(token)
+            if count <= 0:
+                continue
+            if token in tokens.keys():
+                tokens[token] += count
+            else:
+                tokens[token] = count
+    return tokens
+
+
+# one put_item per token counted
+def write_sequential(tokens, controller):
+    for token in tokens.keys():
+        controller.add_word(StopWordModel().set_data(token, tokens[token]))
+
+
+def new_count_storage():
+    counts = StopWordCountStorage()
+    counts._count_storage = LocalS3Client(latency=LATENCY)
+    return counts
+
+
+def run_generator(index, storage, controller, counts, threads):
+    generator = StopWordGenerator()
+    generator._index = index
+    generator._storage = storage
+    generator._stopword = controller
+    generator._counts = counts
+    threads_before = Config.STOPWORD_WORKER_THREADS
+    Config.STOPWORD_WORKER_THREADS = threads
+    try:
+        generator.generate_stopwords()
+        generator.add_stopwords_table()
+    finally:
+        Config.STOPWORD_WORKER_THREADS = threads_before
+    return generator
+
+
+# rewrites partitions under new storage keys, as a write worker would
+def change_partitions(rand, index, storage):
+    items = index._index_table._items
+    for partition_id in rand.sample(sorted(items), CHANGED_PARTITIONS):
+        item = items[partition_id]
+        partition = storage.load_partition(item[IndexModel.STORAGE_KEY],
+                                           for_update=True)
+        for token in rand.sample(partition.get_token_list(), 20):
+            partition.add_token(token, 'new-document', 1, 1, [1, 2, 3])
+        storage_key = item[IndexModel.STORAGE_KEY] + '-changed'
+        storage.write_partition(storage_key, partition)
+        item[IndexModel.STORAGE_KEY] = storage_key
+
+
+def timed(func):
+    # partition stores & loads log, keep the report readable
+    stdout = sys.stdout
+    sys.stdout = open(os.devnull, 'w')
+    try:
+        start = time.time()
+        res = func()
+        return (time.time() - start, res)
+    finally:
+        sys.stdout.close()
+        sys.stdout = stdout
+
+
+# every run reads the partitions from a cold partition cache
+def with_storage(s3, func):
+    cache_directory = tempfile.mkdtemp()
+    try:
+        storage = IndexStorage(PartitionCache(cache_directory))
+        storage._index_storage = s3
+        return func(storage)
+    finally:
+        shutil.rmtree(cache_directory)
+
+
+# reports the scan & write time of the sequential scan & of the thread pool
+# scan, per million token occurrences counted, and the writes made. Then
+# a few partitions are rewritten & the incremental scan is compared with
+# a full scan
+def run():
+    (index, s3) = build_index(random.Random(SEED))
+    results = []
+
+    (elapsed, tokens) = timed(lambda: with_storage(
+        s3, lambda storage: scan_sequential(index, storage)))
+    occurrences = sum(tokens.values()) / 1000000.0
+    controller = new_stopword_controller()
+    (write_elapsed, res) = timed(lambda: write_sequential(tokens,
+                                                           controller))
+    results.append(('sequential: time', (elapsed + write_elapsed) * 1000,
+                    'ms'))
+    results.append(('sequential: scan time per million tokens',
+                    elapsed / occurrences, 's'))
+    results.append(('sequential: stop word writes',
+                    controller._stop_word_table.calls.get('put_item', 0),
+                    ''))
+
+    for threads in THREADS:
+        name = '{0} threads'.format(threads)
+        controller = new_stopword_controller()
+        counts = new_count_storage()
+        (elapsed, generator) = timed(lambda: with_storage(
+            s3, lambda storage: run_generator(index, storage, controller,
+                                              counts, threads)))
+        stats = generator.get_stats()
+        check_stop_words(generator, tokens)
+        results.append((name + ': time', elapsed * 1000, 'ms'))
+        results.append((name + ': scan time per million tokens',
+                        stats['secondsPerMillionTokens'], 's'))
+        results.append((name + ': stop word write requests',
+                        controller._stop_word_table.calls.get(
+                            'batch_write_item', 0), ''))
+
+    # the counts of the last run are kept, only changed partitions are read
+    timed(lambda: with_storage(s3, lambda storage: change_partitions(
+        random.Random(SEED), index, storage)))
+    (elapsed, tokens) = timed(lambda: with_storage(
+        s3, lambda storage: scan_sequential(index, storage)))
+    results.append(('after changes, sequential scan: time', elapsed * 1000, 'ms'))
+    (elapsed, generator) = timed(lambda: with_storage(
+        s3, lambda storage: run_generator(index, storage, controller, counts,
+                                          THREADS[-1])))
+    stats = generator.get_stats()
+    if generator._tokens != tokens:
+        raise Exception("Incremental counts differ from a full scan.")
+    check_stop_words(generator, tokens)
+    results.append(('after changes, incremental: time', elapsed * 1000,
+                    'ms'))
+    results.append(('after changes, incremental: partitions read',
+                    stats['partitions'], ''))
+    results.append(('after changes, incremental: partitions unchanged',
+                    stats['unchanged'], ''))
+    return results
+
+
+def check_stop_words(generator, tokens):
+    expected = sorted(tokens.values(), reverse=True)[:Config.STOPWORD_COUNT]
+    if sorted(generator.get_stop_words().values(), reverse=True) != expected:
+        raise Exception("Stop words differ from the sequential scan.")
@@ -0,0 +1,153 @@
+import os
+import random
+import shutil
+import sys
+import tempfile
+import threading
+import time
+
+from config import Config
+from index_controller import IndexController
+from index_model import IndexModel
+from index_partition import IndexPartition
+from index_storage import IndexStorage
+from local_aws import LocalS3Client, LocalTable
+from partition_cache import PartitionCache
+from write_task_model import WriteTaskModel
+import write_worker_node
+
+PARTITIONS = 16
+TOKENS_PER_PARTITION = 200
+TASKS = 32
+PARTITIONS_PER_TASK = 2
+TOKENS_PER_OPERATION = 5
+# round trip added to every metadata & storage call
+LATENCY = 0.01
+THREADS = [1, 4, 8]
+# concurrent worker invocations writing to a few hot partitions
+WORKERS = 4
+HOT_PARTITIONS = 4
+SEED = 11
+
+
+def token_name(partition, i):
+    return 'p{0:03d}token{1:05d}'.format(partition, i)
+
+
+# seeds the metadata table & partition storage with stand-ins that add a
+# round trip latency to every call
+def build_index(cache_directory):
+    index = IndexController()
+    index._index_table = LocalTable(IndexModel.PKEY)
+    storage = IndexStorage(PartitionCache(cache_directory))
+    storage._index_storage = LocalS3Client()
+    for p in range(PARTITIONS):
+        partition = IndexPartition()
+        for t in range(TOKENS_PER_PARTITION):
+            partition.add_token(token_name(p, t), 'seed-document', 1, 1, [t])
+        storage_key = 'partition-{0}-v1'.format(p)
+        storage.write_partition(storage_key, partition)
+        index.update_metadata(IndexModel().with_pkey('partition-{0}'
+                                                     .format(p))
+                                          .with_storage_key(storage_key)
+                                          .with_start_token(token_name(p, 0))
+                                          .with_end_token(token_name(
+                                              p, TOKENS_PER_PARTITION - 1))
+                                          .with_size(TOKENS_PER_PARTITION)
+                                          .with_version(0), True)
+    index._index_table.latency = LATENCY
+    storage._index_storage.latency = LATENCY
+    return (index, storage)
+
+
+# tasks of one document each, writing to a few random partitions
+def build_tasks(rand, partitions=PARTITIONS, prefix='document'):
+    tasks = []
+    for i in range(TASKS):
+        task = (WriteTaskModel().with_write_id('write-{0}'.format(i))
+                                .with_document_id('{0}-{1}'.format(prefix, i))
+                                .with_lock_no_next(1))
+        for p in rand.sample(range(partitions), PARTITIONS_PER_TASK):
+            for t in rand.sample(range(TOKENS_PER_PARTITION),
+                                 TOKENS_PER_OPERATION):
+                task.with_token_operation(token_name(p, t), 1, [t],
+                                          'partition-{0}'.format(p))
+        tasks.append(task)
+    return tasks
+
+
+def run_tasks(threads, workers=1, partitions=PARTITIONS):
+    cache_directory = tempfile.mkdtemp()
+    # the worker logs every write, keep the report readable
+    stdout = sys.stdout
+    sys.stdout = open(os.devnull, 'w')
+    try:
+        (index, storage) = build_index(cache_directory)
+        write_worker_node.INDEX_METADATA = index
+        write_worker_node.INDEX_STORAGE = storage
+        Config.WRITE_WORKER_THREADS = threads
+        write_worker_node.WORKER_POOL = None
+        batches = [build_tasks(random.Random(SEED + w), partitions,
+                               'worker{0}-document'.format(w))
+                   for w in range(workers)]
+        batch_results = []
+
+        def run_batch(tasks):
+            batch_results.append(write_worker_node.execute_tasks(tasks))
+
+        start = time.time()
+        runners = [threading.Thread(target=run_batch, args=(tasks,))
+                   for tasks in batches]
+        for runner in runners:
+            runner.start()
+        for runner in runners:
+            runner.join()
+        elapsed = time.time() - start
+    finally:
+        sys.stdout.close()
+        sys.stdout = stdout
+        shutil.rmtree(cache_directory)
+
+    # a worker batch writes each of its partitions once, writes still
+    # conflicting after the retries are reported as failed & every other
+    # write creates exactly one partition version
+    results = [r for res in batch_results for r in res]
+    failed = sum(len(set(e['partitionID'] for r in res for e in r['errors']))
+                 for res in batch_results)
+    writes = sum(len(set(op[WriteTaskModel.PARTITION] for task in tasks
+                         for op in task.get_operations()))
+                 for tasks in batches)
+    versions = sum(int(index.get_version_info('partition-{0}'.format(p))[0])
+                   for p in range(PARTITIONS))
+    if versions != writes - failed:
+        raise Exception('Writes were lost: {0} partition versions'
+                        .format(versions))
+    if storage._index_storage.object_count() != PARTITIONS:
+        raise Exception('Orphaned partitions were left in storage')
+    return (elapsed, sum(r['conflicts'] for r in results),
+            sum(r['retries'] for r in results), failed)
+
+
+# runs write tasks spread over a few partitions with every storage &
+# metadata call taking a round trip, one after another & in thread pools,
+# then concurrent workers writing to a few hot partitions
+def run():
+    results = []
+    for threads in THREADS:
+        (elapsed, conflicts, retries, failed) = run_tasks(threads)
+        if failed:
+            raise Exception('{0} writes failed'.format(failed))
+        results.append(('{0} threads: {1} tasks'.format(threads, TASKS),
+                        elapsed * 1000, 'ms'))
+        results.append(('{0} threads: throughput'.format(threads),
+                        TASKS / elapsed, 'tasks/s'))
+
+    (elapsed, conflicts, retries, failed) = run_tasks(max(THREADS), WORKERS,
+                                                      HOT_PARTITIONS)
+    name = '{0} workers, {1} hot partitions'.format(WORKERS, HOT_PARTITIONS)
+    results.append((name + ': throughput', WORKERS * TASKS / elapsed,
+                    'tasks/s'))
+    results.append((name + ': lock conflicts', conflicts, ''))
+    results.append((name + ': retries', retries, ''))
+    results.append((name + ': failed writes', failed, ''))
+    return results
@@ -0,0 +1,83 @@
+import bisect
+import random
+import string
+
+
+class ZipfCorpus(object):
+    '''
+    Generated corpus whose token frequencies follow Zipf's law, the token of
+    rank r is drawn with a probability proportional to 1 / r ** exponent,
+    like the words of natural text. The vocabulary & every draw come from
+    the seed, so a corpus is the same on every run.
+    '''
+
+    def __init__(self, vocabulary_size, exponent=1.0, seed=0):
+        self._rand = random.Random(seed)
+        vocabulary = set()
+        while len(vocabulary) < vocabulary_size:
+            length = self._rand.randint(2, 10)
+            vocabulary.add(''.join(self._rand.choice(string.ascii_lowercase)
+                                   for _ in range(length)))
+        # ranks are assigned in random order so frequent tokens are spread
+        # over the sorted vocabulary & its partitions
+        self._ranked = sorted(vocabulary)
+        self._rand.shuffle(self._ranked)
+        self._cumulative = []
+        total = 0.0
+        for rank in range(vocabulary_size):
+            total += 1.0 / (rank + 1) ** exponent
+            self._cumulative.append(total)
+        self._total = total
+
+    # the vocabulary in token order
+    def vocabulary(self):
+        return sorted(self._ranked)
+
+    def token(self):
+        pick = self._rand.random() * self._total
+        return self._ranked[bisect.bisect_left(self._cumulative, pick)]
+
+    def tokens(self, count):
+        return [self.token() for _ in range(count)]
+
+    # (token, doc_id, lock_no, ngram_size, locations) postings of documents
+    # of length tokens each, with a posting per distinct token of a document
+    def postings(self, documents, length):
+        postings = []
+        for d in range(documents):
+            locations = {}
+            for (location, token) in enumerate(self.tokens(length)):
+                locations.setdefault(token, []).append(location)
+            doc_id = 'document-{0:06d}'.format(d)
+            for (token, token_locations) in sorted(locations.items()):
+                postings.append((token, doc_id, 1, 1, token_locations))
+        return postings
+
+    # write requests in the format of the write master, one per document
+    def write_requests(self, documents, length):
+        requests = []
+        for (doc_id, postings) in self._by_document(
+                self.postings(documents, length)):
+            requests.append({
+                'documentID': doc_id,
+                'tokenCount': length,
+                'importantTokenRanges': [{
+                    'fieldName': 'title',
+                    'rangeStart': 0,
+                    'rangeEnd': 3
+                }],
+                'tokens': [{
+                    'token': token,
+                    'ngramSize': ngram_size,
+                    'locations': locations
+                } for (token, d, l, ngram_size, locations) in postings]
+            })
+        return requests
+
+    def _by_document(self, postings):
+        documents = []
+        for posting in postings:
+            if not documents or documents[-1][0] != posting[1]:
+                documents.append((posting[1], []))
+            documents[-1][1].append(posting)
+        return documents
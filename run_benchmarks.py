@@ -0,0 +1,154 @@
+import argparse
+import imp
+import json
+import os
+import sys
+import warnings
+
+# root directories
+SOURCE_DIR = 'src/'
+BENCHMARK_DIR = 'benchmarks/python/'
+# test helpers shared with benchmarks, e.g. legacy format encoders
+TEST_HELPER_DIR = 'tests/python/utils/'
+
+# service directories that benchmarks import from
+SERVICE_DIRECTORIES = ['python/utils/',
+                       'python/write/',
+                       'python/stopword_generation/',
+                       'python/search/',
+                       'python/partition_maintenance/']
+
+BENCHMARK_SUFFIX = '_benchmark.py'
+
+# recorded results that --check compares against, a metric regresses when
+# it is worse than its baseline by more than the threshold, a fraction of
+# the baseline value
+BASELINE_FILE = 'benchmarks/baseline.json'
+DEFAULT_THRESHOLD = 0.25
+
+
+# makes the service modules & local stand-ins importable
+def setup_path():
+    # boto3 resources need a region even though nothing reaches AWS
+    os.environ.setdefault('AWS_DEFAULT_REGION', 'us-east-1')
+    warnings.filterwarnings('ignore', message='Boto3 will no longer support')
+    sys.path.insert(0, TEST_HELPER_DIR)
+    sys.path.insert(0, BENCHMARK_DIR)
+    for directory in SERVICE_DIRECTORIES:
+        sys.path.insert(0, SOURCE_DIR + directory)
+
+
+# finds benchmark modules, optionally filtered by name
+def get_benchmarks(names):
+    benchmarks = []
+    for fname in sorted(os.listdir(BENCHMARK_DIR)):
+        if not fname.endswith(BENCHMARK_SUFFIX):
+            continue
+        name = fname[:-len(BENCHMARK_SUFFIX)]
+        if names and name not in names:
+            continue
+        benchmarks.append((name, BENCHMARK_DIR + fname))
+    return benchmarks
+
+
+# each benchmark module exposes run(), which returns a list of
+# (metric name, value, unit) tuples
+def run_benchmark(name, path):
+    module = imp.load_source(name + '_benchmark', path)
+    results = module.run()
+    print name
+    for (metric, value, unit) in results:
+        print '  {0:<48} {1:>14.3f} {2}'.format(metric, value, unit)
+    return results
+
+
+# rates are better higher & times lower, other metrics like counts are
+# recorded but not checked
+def better_direction(unit):
+    if unit.endswith('/s'):
+        return 'higher'
+    if unit.split('/')[0] in ['ms', 's']:
+        return 'lower'
+    return None
+
+
+def load_baseline(path):
+    if not os.path.exists(path):
+        return {'threshold': DEFAULT_THRESHOLD, 'benchmarks': {}}
+    with open(path) as baseline_file:
+        return json.load(baseline_file)
+
+
+# replaces the baseline of every benchmark run
+def record_baseline(path, baseline, results):
+    for (name, metrics) in results:
+        baseline['benchmarks'][name] = dict(
+            (metric, {'value': value, 'unit': unit,
+                      'better': better_direction(unit)})
+            for (metric, value, unit) in metrics)
+    with open(path, 'w') as baseline_file:
+        json.dump(baseline, baseline_file, indent=2, sort_keys=True,
+                  separators=(',', ': '))
+        baseline_file.write('\n')
+    print 'recorded baseline of {0} benchmarks in {1}'.format(len(results),
+                                                             path)
+
+
+# compares results with the baseline, returns the regressed metrics
+def check_baseline(baseline, results, threshold):
+    regressions = []
+    for (name, metrics) in results:
+        recorded = baseline['benchmarks'].get(name, {})
+        for (metric, value, unit) in metrics:
+            base = recorded.get(metric)
+            if base is None or base['better'] is None or not base['value']:
+                continue
+            change = (value - base['value']) / float(base['value'])
+            worse = change if base['better'] == 'lower' else -change
+            status = 'REGRESSED' if worse > threshold else 'ok'
+            print '  {0:<9} {1:<48} {2:>+8.1%} vs {3:.3f} {4}'.format(
+                status, name + ': ' + metric, change, base['value'], unit)
+            if worse > threshold:
+                regressions.append((name, metric))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Runs the benchmarks.')
+    parser.add_argument('names', nargs='*',
+                        help='benchmarks to run, all by default or those '
+                             'of the baseline with --check')
+    parser.add_argument('--record', action='store_true',
+                        help='record the results as the baseline')
+    parser.add_argument('--check', action='store_true',
+                        help='fail if a result regressed from the baseline')
+    parser.add_argument('--baseline', default=BASELINE_FILE)
+    parser.add_argument('--threshold', type=float, default=None,
+                        help='regression threshold, a fraction of the '
+                             'baseline value')
+    args = parser.parse_args()
+
+    setup_path()
+    baseline = load_baseline(args.baseline)
+    names = args.names
+    if args.check and not names:
+        names = sorted(baseline['benchmarks'].keys())
+    results = []
+    for (name, path) in get_benchmarks(names):
+        results.append((name, run_benchmark(name, path)))
+
+    if args.record:
+        record_baseline(args.baseline, baseline, results)
+    if args.check:
+        threshold = args.threshold
+        if threshold is None:
+            threshold = baseline.get('threshold', DEFAULT_THRESHOLD)
+        print 'baseline check, threshold {0:.0%}'.format(threshold)
+        regressions = check_baseline(baseline, results, threshold)
+        if regressions:
+            print '{0} metrics regressed'.format(len(regressions))
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
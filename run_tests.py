@@ -11,6 +11,8 @@ TEST_DIR = 'tests/'
 UTILS_DIRECTORY = 'python/utils/'
 WRITE_DIRECTORY = 'python/write/'
 STOPWORD_DIRECTORY = 'python/stopword_generation/'
+SEARCH_DIRECTORY = 'python/search/'
+MAINTENANCE_DIRECTORY = 'python/partition_maintenance/'
 
 # package config directory
 PACKAGE_CONTENTS_DIR = 'deploy/package_contents/'
@@ -18,19 +20,40 @@ PACKAGE_CONTENTS_DIR = 'deploy/package_contents/'
 # names of package_contents files for each service
 WRITE_CONTENTS = ['WriteMasterNode.txt', 'WriteWorkerNode.txt']
 STOPWORD_CONTENTS = ['StopWordGeneration.txt']
+SEARCH_CONTENTS = ['SearchMasterNode.txt', 'SearchWorkerNode.txt']
+MAINTENANCE_CONTENTS = ['PartitionMaintenance.txt']
+
+# package contents copied to the test directory of each service
+SERVICES = [(WRITE_CONTENTS, WRITE_DIRECTORY),
+            (STOPWORD_CONTENTS, STOPWORD_DIRECTORY),
+            (SEARCH_CONTENTS, SEARCH_DIRECTORY),
+            (MAINTENANCE_CONTENTS, MAINTENANCE_DIRECTORY)]
 
 
 # copies dependencies to test directories, executes tests, removes dependencies
 def main():
+    services = get_tested_services()
     copy_utils()
-    copy_service(WRITE_CONTENTS, TEST_DIR + WRITE_DIRECTORY)
-    copy_service(STOPWORD_CONTENTS, TEST_DIR + STOPWORD_DIRECTORY)
+    for (packages, service_path) in services:
+        copy_service(packages, service_path)
     pytest.main()
-    remove_service(WRITE_CONTENTS, TEST_DIR + WRITE_DIRECTORY)
-    remove_service(STOPWORD_CONTENTS, TEST_DIR + STOPWORD_DIRECTORY)
+    for (packages, service_path) in services:
+        remove_service(packages, service_path)
     remove_utils()
 
 
+# the services that have a test directory, services without tests are
+# skipped
+def get_tested_services():
+    services = []
+    for (packages, directory) in SERVICES:
+        if not os.path.isdir(TEST_DIR + directory):
+            print "INFO: no tests for {0}, skipping".format(directory)
+            continue
+        services.append((packages, TEST_DIR + directory))
+    return services
+
+
 # reads the PACKAGE_NAMES file & determines which packages to create
 def get_packages():
     packages = []
@@ -0,0 +1,69 @@
+from index_controller import IndexController
+from index_model import IndexModel
+
+
+class MetadataMigrator:
+    '''
+    This class moves the INDEX_PARTITION_METADATA table to token bucket
+    routing. It creates the token bucket index if the table doesn't have it
+    and sets the token bucket of every partition written before writers
+    maintained it. The bucket is conditionally set on versionNo without
+    bumping it, a partition written to since it was listed already has its
+    bucket set by the writer.
+    '''
+
+    def __init__(self):
+        self._index = IndexController()
+        self._index_created = False
+        self._migrated = 0
+        self._skipped = 0
+        self._conflicts = 0
+
+    '''
+    create the index & bucket every partition listed in the metadata table
+    '''
+    def migrate_metadata(self):
+        self._index_created = self._index.create_bucket_index()
+        for item in self._index.scan_partitions([IndexModel.PKEY,
+                                                 IndexModel.START_TOKEN,
+                                                 IndexModel.END_TOKEN,
+                                                 IndexModel.VERSION,
+                                                 IndexModel.TOKEN_BUCKET]):
+            self.migrate_item(item)
+        return self.get_stats()
+
+    '''
+    set the token bucket of a listed partition if it is missing or no
+    longer matches its range, returns True if it was set
+    '''
+    def migrate_item(self, item):
+        bucket = IndexModel.bucket_for_range(
+            item.get(IndexModel.START_TOKEN), item.get(IndexModel.END_TOKEN))
+        if bucket is None or item.get(IndexModel.TOKEN_BUCKET) == bucket:
+            self._skipped += 1
+            return False
+        partition_id = item[IndexModel.PKEY]
+        try:
+            self._index.set_token_bucket(partition_id,
+                                         item[IndexModel.VERSION], bucket)
+        except Exception as ex:
+            if not IndexController.is_version_conflict(ex):
+                raise ex
+            self._conflicts += 1
+            print ("INFO: partition {0} changed during migration"
+                   .format(partition_id))
+            return False
+        self._migrated += 1
+        return True
+
+    '''
+    return whether the index was created, and counts of bucketed, already
+    bucketed & conflicting partitions
+    '''
+    def get_stats(self):
+        return {
+            'indexCreated': self._index_created,
+            'migrated': self._migrated,
+            'skipped': self._skipped,
+            'conflicts': self._conflicts
+        }
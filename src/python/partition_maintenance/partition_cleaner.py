@@ -0,0 +1,173 @@
+import uuid
+
+from document_controller import DocumentController
+from document_model import DocumentModel
+from index_controller import IndexController
+from index_model import IndexModel
+from index_storage import IndexStorage
+
+
+class PartitionCleaner:
+    '''
+    This class removes dead postings from index partitions: postings of
+    documents marked for deletion, and versions of a document older than
+    its current lockNo once no write of the document is in progress.
+    Document states are read in batches from the DOCUMENTS table. A
+    partition is only rewritten if something was removed, and the metadata
+    is conditionally updated on versionNo the same way a write worker
+    updates a partition. The tokenCount of a deleted document is then
+    decremented by the tokens removed, and the document is removed once it
+    has no tokens left.
+    '''
+
+    def __init__(self):
+        self._storage = IndexStorage()
+        self._index = IndexController()
+        self._documents = DocumentController()
+        # doc id -> DocumentModel of the internal fields, read once per job
+        self._states = {}
+        self._cleaned = 0
+        self._unchanged = 0
+        self._retired = 0
+        self._conflicts = 0
+        self._deleted_postings = 0
+        self._stale_versions = 0
+
+    '''
+    clean every partition listed in the metadata table
+    '''
+    def clean_partitions(self):
+        for item in self._index.get_partition_ranges():
+            self.clean_partition(item[IndexModel.PKEY])
+        return self.get_stats()
+
+    '''
+    clean a single partition, returns True if it was rewritten
+    '''
+    def clean_partition(self, partition_id):
+        (version, storage_key) = self._index.get_version_info(partition_id)
+        if version is None:
+            return False
+        try:
+            partition = self._storage.load_partition(storage_key,
+                                                     for_update=True)
+        except Exception as ex:
+            if not IndexStorage.is_missing_partition(ex):
+                raise ex
+            # replaced by a writer after its version was read
+            self._conflicts += 1
+            print ("INFO: partition {0} changed during cleanup"
+                   .format(partition_id))
+            return False
+        self.load_states(partition.get_document_ids())
+        removed = partition.filter_postings(self.keep_versions)
+        if len(removed) == 0:
+            self._unchanged += 1
+            return False
+
+        if partition.size() == 0:
+            replaced = self.retire_partition(partition_id, version)
+        else:
+            replaced = self.replace_partition(partition_id, version,
+                                              partition)
+        if not replaced:
+            return False
+        self._storage.delete_partition(storage_key)
+
+        # deleted documents lose a token for every occurrence removed
+        removed_tokens = {}
+        for (token, doc_id, versions, document_removed) in removed:
+            if self._states[doc_id].is_deleted():
+                self._deleted_postings += versions
+                if document_removed:
+                    removed_tokens[doc_id] = removed_tokens.get(doc_id, 0) + 1
+            else:
+                self._stale_versions += versions
+        for (doc_id, count) in removed_tokens.iteritems():
+            self._documents.remove_token_occurrences(doc_id, count)
+        self._cleaned += 1
+        print ("INFO: removed {0} postings from partition {1}"
+               .format(len(removed), partition_id))
+        return True
+
+    '''
+    read the internal fields of documents that were not read yet
+    '''
+    def load_states(self, doc_ids):
+        missing = [doc_id for doc_id in doc_ids if doc_id not in self._states]
+        self._states.update(self._documents.get_document_models(
+            missing, DocumentModel.STATE_PATHS))
+
+    '''
+    versions of a document occurrence to keep: none for deleted documents,
+    every version while the document is being written, otherwise the
+    versions at or after its lockNo. The newest version is always kept, the
+    write of the lockNo version may still be queued after the document is
+    unlocked. Unknown documents are kept
+    '''
+    def keep_versions(self, doc_id, versions):
+        state = self._states.get(doc_id)
+        if state is None or state.is_updating():
+            return versions
+        if state.is_deleted():
+            return []
+        lock_no = min(state.get_lock_no(),
+                      max(int(version['lockNo']) for version in versions))
+        return [version for version in versions
+                if int(version['lockNo']) >= lock_no]
+
+    '''
+    write the cleaned partition under a new storage key, returns False if
+    the partition was written to since it was read
+    '''
+    def replace_partition(self, partition_id, version, partition):
+        storage_key = str(uuid.uuid4())
+        self._storage.write_partition(storage_key, partition)
+        index_update = (IndexModel().with_pkey(partition_id)
+                        .with_start_token(partition.starting_token())
+                        .with_storage_key(storage_key)
+                        .with_end_token(partition.ending_token())
+                        .with_size(partition.size())
+                        .with_version(version))
+        try:
+            self._index.update_metadata(index_update, False)
+        except Exception as ex:
+            if not IndexController.is_version_conflict(ex):
+                raise ex
+            self._storage.delete_partition(storage_key)
+            self._conflicts += 1
+            print ("INFO: partition {0} changed during cleanup"
+                   .format(partition_id))
+            return False
+        return True
+
+    '''
+    remove a partition left without postings, returns False if it was
+    written to since it was read
+    '''
+    def retire_partition(self, partition_id, version):
+        try:
+            self._index.delete_metadata(partition_id, version)
+        except Exception as ex:
+            if not IndexController.is_version_conflict(ex):
+                raise ex
+            self._conflicts += 1
+            print ("INFO: partition {0} changed during cleanup"
+                   .format(partition_id))
+            return False
+        self._retired += 1
+        return True
+
+    '''
+    return counts of rewritten, unchanged, removed & conflicting partitions
+    and of the postings of deleted documents & stale versions removed
+    '''
+    def get_stats(self):
+        return {
+            'cleaned': self._cleaned,
+            'unchanged': self._unchanged,
+            'retired': self._retired,
+            'conflicts': self._conflicts,
+            'deletedPostings': self._deleted_postings,
+            'staleVersions': self._stale_versions
+        }
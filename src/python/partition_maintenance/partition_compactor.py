@@ -0,0 +1,168 @@
+import time
+import uuid
+
+from config import Config
+from index_controller import IndexController
+from index_model import IndexModel
+from index_partition import IndexPartition
+from index_storage import IndexStorage
+
+
+class PartitionCompactor:
+    '''
+    This class merges runs of adjacent partitions that are under the target
+    size, such as the single token partitions created for tokens that had
+    no partition, into one partition per run. The first partition of a run
+    is repointed to the merged partition and the others are deleted in one
+    metadata transaction conditioned on every versionNo, then the old
+    storage keys are deleted. Runs are compacted in token order so that a
+    compaction stopped before its deadline can resume from the first token
+    of the next run.
+    '''
+
+    def __init__(self):
+        self._storage = IndexStorage()
+        self._index = IndexController()
+        self._compacted = 0
+        self._eliminated = 0
+        self._conflicts = 0
+
+    '''
+    compact every run of small partitions starting at start_token, stops
+    at the deadline (seconds since the epoch) & returns the stats with the
+    token to resume from, None once every run was compacted
+    '''
+    def compact_partitions(self, start_token=None, deadline=None):
+        resume_token = None
+        retired_keys = []
+        for run in self.find_runs(self._index.get_partition_ranges()):
+            first_token = run[0][IndexModel.START_TOKEN]
+            if start_token is not None and first_token < start_token:
+                continue
+            if deadline is not None and time.time() >= deadline:
+                resume_token = first_token
+                break
+            retired_keys.extend(self.compact_run(run))
+
+        # old storage keys are deleted once the runs are compacted so that
+        # searches that resolved them before can still read them
+        for storage_key in retired_keys:
+            self._storage.delete_partition(storage_key)
+        stats = self.get_stats()
+        stats['resumeToken'] = resume_token
+        return stats
+
+    '''
+    find runs of adjacent partitions that are under
+    Config.PARTITION_TARGET_SIZE tokens & fit in one partition of that size
+    together, partitions overlapping another partition are left to the
+    resize job
+    '''
+    def find_runs(self, items):
+        items = sorted([item for item in items
+                        if item.get(IndexModel.START_TOKEN) is not None],
+                       key=lambda item: (item[IndexModel.START_TOKEN],
+                                         item[IndexModel.END_TOKEN]))
+        runs = []
+        run = []
+        run_size = 0
+        max_end = None
+        for (idx, item) in enumerate(items):
+            size = int(item[IndexModel.SIZE])
+            # ranges are sorted by starting token, so a range overlaps a
+            # later one only if the next range starts within it
+            overlaps = ((max_end is not None and
+                         item[IndexModel.START_TOKEN] <= max_end) or
+                        (idx + 1 < len(items) and
+                         items[idx + 1][IndexModel.START_TOKEN] <=
+                         item[IndexModel.END_TOKEN]))
+            small = size < Config.PARTITION_TARGET_SIZE
+            if overlaps or not small or \
+                    run_size + size > Config.PARTITION_TARGET_SIZE or \
+                    len(run) == Config.PARTITION_COMPACTION_MAX_PARTITIONS:
+                if len(run) > 1:
+                    runs.append(run)
+                run = []
+                run_size = 0
+            if small and not overlaps:
+                run.append(item)
+                run_size += size
+            if max_end is None or item[IndexModel.END_TOKEN] > max_end:
+                max_end = item[IndexModel.END_TOKEN]
+        if len(run) > 1:
+            runs.append(run)
+        return runs
+
+    '''
+    merge a run of partitions into its first partition, returns the storage
+    keys of the replaced partitions, none if a partition changed since the
+    run was found
+    '''
+    def compact_run(self, run):
+        sources = []
+        partition = IndexPartition()
+        for item in run:
+            partition_id = item[IndexModel.PKEY]
+            (version, storage_key) = self._index.get_version_info(
+                partition_id)
+            if version is None:
+                self._conflicts += 1
+                return []
+            try:
+                source = self._storage.load_partition(storage_key,
+                                                      for_update=True)
+            except Exception as ex:
+                if not IndexStorage.is_missing_partition(ex):
+                    raise ex
+                # replaced by a writer after its version was read
+                self._conflicts += 1
+                print ("INFO: partition {0} changed during compaction"
+                       .format(partition_id))
+                return []
+            partition.merge_tokens(source)
+            sources.append((partition_id, version, storage_key))
+        if partition.size() > Config.PARTITION_TARGET_SIZE:
+            # written to since the ranges were read
+            self._conflicts += 1
+            return []
+
+        (partition_id, version, old_storage_key) = sources[0]
+        storage_key = str(uuid.uuid4())
+        self._storage.write_partition(storage_key, partition)
+        index_update = (IndexModel().with_pkey(partition_id)
+                        .with_start_token(partition.starting_token())
+                        .with_storage_key(storage_key)
+                        .with_end_token(partition.ending_token())
+                        .with_size(partition.size())
+                        .with_version(version))
+        try:
+            self._index.replace_partitions(
+                index_update, [(source[0], source[1])
+                               for source in sources[1:]])
+        except Exception as ex:
+            if not IndexController.is_version_conflict(ex):
+                raise ex
+            # a writer updated one of the partitions first, the run is
+            # compacted again on the next run of the job
+            self._storage.delete_partition(storage_key)
+            self._conflicts += 1
+            print ("INFO: partitions starting at {0} changed during "
+                   "compaction".format(partition.starting_token()))
+            return []
+
+        self._compacted += 1
+        self._eliminated += len(sources) - 1
+        print ("INFO: compacted {0} partitions into partition {1}"
+               .format(len(sources), partition_id))
+        return [source[2] for source in sources]
+
+    '''
+    return counts of compacted runs, eliminated partitions (storage objects
+    & metadata items) & runs skipped because of conflicting writes
+    '''
+    def get_stats(self):
+        return {
+            'compacted': self._compacted,
+            'eliminated': self._eliminated,
+            'conflicts': self._conflicts
+        }
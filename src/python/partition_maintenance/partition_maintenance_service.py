@@ -0,0 +1,50 @@
+import os
+import time
+
+from config import Config
+from metadata_migrator import MetadataMigrator
+from partition_cleaner import PartitionCleaner
+from partition_compactor import PartitionCompactor
+from partition_migrator import PartitionMigrator
+from partition_resizer import PartitionResizer
+
+
+def migration_handler(event, context):
+    os.chdir(Config.FILE_DIRECTORY)
+    migrator = PartitionMigrator()
+    return migrator.migrate_partitions()
+
+
+# buckets the metadata of every partition for query routing, run before
+# Config.METADATA_QUERY_ROUTING is turned on
+def metadata_migration_handler(event, context):
+    migrator = MetadataMigrator()
+    return migrator.migrate_metadata()
+
+
+def cleanup_handler(event, context):
+    os.chdir(Config.FILE_DIRECTORY)
+    cleaner = PartitionCleaner()
+    return cleaner.clean_partitions()
+
+
+def resize_handler(event, context):
+    os.chdir(Config.FILE_DIRECTORY)
+    resizer = PartitionResizer()
+    return resizer.resize_partitions()
+
+
+# compacts small partitions until the lambda is about to time out, the
+# returned resumeToken is passed in the next event to continue
+def compaction_handler(event, context):
+    os.chdir(Config.FILE_DIRECTORY)
+    deadline = None
+    if hasattr(context, 'get_remaining_time_in_millis'):
+        deadline = (time.time() +
+                    context.get_remaining_time_in_millis() / 1000.0 -
+                    Config.PARTITION_COMPACTION_TIME_MARGIN)
+    start_token = None
+    if isinstance(event, dict):
+        start_token = event.get('resumeToken')
+    compactor = PartitionCompactor()
+    return compactor.compact_partitions(start_token, deadline)
@@ -0,0 +1,92 @@
+import uuid
+
+from index_controller import IndexController
+from index_model import IndexModel
+from index_storage import IndexStorage
+
+
+class PartitionMigrator:
+    '''
+    This class rewrites partitions that are still stored as pickled objects,
+    or in an older binary format version, in the current partition format.
+    Each partition is written under a new
+    storage key and the metadata is conditionally repointed on versionNo,
+    the same way a write worker updates a partition.
+    '''
+
+    def __init__(self):
+        self._storage = IndexStorage()
+        self._index = IndexController()
+        self._migrated = 0
+        self._skipped = 0
+        self._conflicts = 0
+
+    '''
+    migrate every partition listed in the metadata table
+    '''
+    def migrate_partitions(self):
+        for item in self._index.get_partition_ranges():
+            self.migrate_partition(item[IndexModel.PKEY])
+        return self.get_stats()
+
+    '''
+    migrate a single partition, returns True if it was rewritten
+    '''
+    def migrate_partition(self, partition_id):
+        (version, storage_key) = self._index.get_version_info(partition_id)
+        # retired by the resize job since the partitions were listed
+        if version is None:
+            self._skipped += 1
+            return False
+        try:
+            partition = self._storage.load_partition(storage_key,
+                                                     for_update=True)
+        except Exception as ex:
+            if not IndexStorage.is_missing_partition(ex):
+                raise ex
+            # replaced by a writer after its version was read, the new
+            # storage key is already written in the current format
+            self._conflicts += 1
+            print ("INFO: partition {0} changed during migration"
+                   .format(partition_id))
+            return False
+        if not partition.is_legacy_format():
+            self._skipped += 1
+            return False
+
+        new_storage_key = str(uuid.uuid4())
+        self._storage.write_partition(new_storage_key, partition)
+        index_update = (IndexModel().with_pkey(partition_id)
+                        .with_start_token(partition.starting_token())
+                        .with_storage_key(new_storage_key)
+                        .with_end_token(partition.ending_token())
+                        .with_size(partition.size())
+                        .with_version(version))
+        try:
+            self._index.update_metadata(index_update, False)
+        except Exception as ex:
+            if not IndexController.is_version_conflict(ex):
+                raise ex
+            # a writer replaced the partition first, it is already written
+            # in the current format so the migrated copy can be dropped
+            self._storage.delete_partition(new_storage_key)
+            self._conflicts += 1
+            print ("INFO: partition {0} changed during migration"
+                   .format(partition_id))
+            return False
+
+        self._storage.delete_partition(storage_key)
+        self._migrated += 1
+        print ("INFO: migrated partition {0} to storage key {1}"
+               .format(partition_id, new_storage_key))
+        return True
+
+    '''
+    return counts of migrated, already migrated & conflicting partitions
+    '''
+    def get_stats(self):
+        return {
+            'migrated': self._migrated,
+            'skipped': self._skipped,
+            'conflicts': self._conflicts
+        }
@@ -0,0 +1,182 @@
+import math
+import uuid
+
+from config import Config
+from index_controller import IndexController
+from index_model import IndexModel
+from index_partition import IndexPartition
+from index_storage import IndexStorage
+
+
+class PartitionResizer:
+    '''
+    This class splits partitions that reached the max size and redistributes
+    partitions with overlapping token ranges, so that every token is found
+    in exactly one partition. A group of partitions is rewritten as new
+    partitions with non-overlapping ranges, then the old partitions are
+    retired with a delete conditioned on versionNo. A partition written to
+    while it was being resized is kept and resized again in the next pass.
+    '''
+
+    def __init__(self):
+        self._storage = IndexStorage()
+        self._index = IndexController()
+        self._split = 0
+        self._redistributed = 0
+        self._created = 0
+        self._retired = 0
+        self._conflicts = 0
+        self._passes = 0
+
+    '''
+    resize every partition that is full or overlaps another partition,
+    passes are repeated until no partition needs resizing
+    '''
+    def resize_partitions(self):
+        for i in range(Config.PARTITION_RESIZE_MAX_PASSES):
+            groups = self.find_groups(self._index.get_partition_ranges())
+            if len(groups) == 0:
+                break
+            self._passes += 1
+            retired_keys = []
+            for group in groups:
+                retired_keys.extend(self.resize_group(group))
+            # retired partitions are deleted after the pass so that searches
+            # that resolved them before they were retired can still read them
+            for storage_key in retired_keys:
+                self._storage.delete_partition(storage_key)
+        return self.get_stats()
+
+    '''
+    group partitions with overlapping token ranges, returns the groups of
+    overlapping partitions & the partitions at the max size
+    '''
+    def find_groups(self, items):
+        items = sorted([item for item in items
+                        if item.get(IndexModel.START_TOKEN) is not None],
+                       key=lambda item: (item[IndexModel.START_TOKEN],
+                                         item[IndexModel.END_TOKEN]))
+        groups = []
+        group = []
+        group_end = None
+        for item in items:
+            if group and item[IndexModel.START_TOKEN] <= group_end:
+                group.append(item)
+                group_end = max(group_end, item[IndexModel.END_TOKEN])
+                continue
+            if group:
+                groups.append(group)
+            group = [item]
+            group_end = item[IndexModel.END_TOKEN]
+        if group:
+            groups.append(group)
+        return [group for group in groups
+                if len(group) > 1 or
+                int(group[0][IndexModel.SIZE]) >= Config.INDEX_MAX_SIZE]
+
+    '''
+    rewrite a group of partitions as partitions of at most
+    Config.PARTITION_TARGET_SIZE tokens with non-overlapping ranges, returns
+    the storage keys of the retired partitions, none if a partition was
+    replaced while the group was read
+    '''
+    def resize_group(self, group):
+        sources = []
+        for item in group:
+            partition_id = item[IndexModel.PKEY]
+            (version, storage_key) = self._index.get_version_info(
+                partition_id)
+            if version is None:
+                continue
+            try:
+                partition = self._storage.load_partition(storage_key,
+                                                         for_update=True)
+            except Exception as ex:
+                if not IndexStorage.is_missing_partition(ex):
+                    raise ex
+                # a writer replaced the partition after its version was
+                # read, the group is resized again in the next pass
+                self._conflicts += 1
+                print ("INFO: partition {0} changed during resize"
+                       .format(partition_id))
+                return []
+            sources.append((partition_id, version, storage_key, partition,
+                            set(partition.get_token_list())))
+        tokens = sorted(set().union(*[source[4] for source in sources]))
+        if len(tokens) == 0:
+            return []
+
+        # a full partition is split at its median token
+        count = int(math.ceil(len(tokens) /
+                              float(Config.PARTITION_TARGET_SIZE)))
+        for i in range(count):
+            chunk = tokens[i * len(tokens) / count:
+                           (i + 1) * len(tokens) / count]
+            partition = IndexPartition()
+            for source in sources:
+                partition.merge_tokens(source[3], [token for token in chunk
+                                                   if token in source[4]])
+            self.create_partition(partition)
+
+        retired_keys = []
+        for (partition_id, version, storage_key, partition,
+             source_tokens) in sources:
+            if self.retire_partition(partition_id, version):
+                retired_keys.append(storage_key)
+        if len(group) == 1:
+            self._split += 1
+        else:
+            self._redistributed += 1
+        print ("INFO: resized {0} partitions into {1} partitions"
+               .format(len(sources), count))
+        return retired_keys
+
+    '''
+    write a partition under a new partition id & storage key
+    '''
+    def create_partition(self, partition):
+        partition_id = str(uuid.uuid4())
+        storage_key = str(uuid.uuid4())
+        self._storage.write_partition(storage_key, partition)
+        index_update = (IndexModel().with_pkey(partition_id)
+                        .with_start_token(partition.starting_token())
+                        .with_storage_key(storage_key)
+                        .with_end_token(partition.ending_token())
+                        .with_size(partition.size())
+                        .with_version(0))
+        self._index.update_metadata(index_update, True)
+        self._created += 1
+        return partition_id
+
+    '''
+    delete the metadata of a resized partition, returns False if it was
+    written to since it was read
+    '''
+    def retire_partition(self, partition_id, version):
+        try:
+            self._index.delete_metadata(partition_id, version)
+        except Exception as ex:
+            if not IndexController.is_version_conflict(ex):
+                raise ex
+            # the new partitions hold a copy of the old postings, the
+            # overlap is resolved in the next pass
+            self._conflicts += 1
+            print ("INFO: partition {0} changed during resize"
+                   .format(partition_id))
+            return False
+        self._retired += 1
+        return True
+
+    '''
+    return counts of split, redistributed, created, retired & conflicting
+    partitions & the passes made
+    '''
+    def get_stats(self):
+        return {
+            'split': self._split,
+            'redistributed': self._redistributed,
+            'created': self._created,
+            'retired': self._retired,
+            'conflicts': self._conflicts,
+            'passes': self._passes
+        }
@@ -0,0 +1,75 @@
+from search_task_model import SearchTaskModel
+
+
+class PartitionSearcher:
+    '''
+    This class executes search tasks. It reads only the postings of the
+    searched tokens from each partition and returns them in the search
+    result format, one document occurrence per stored version so that the
+    aggregator can reconcile lock numbers across tokens.
+    '''
+
+    # Result Fields
+    TOKENS = 'tokens'
+    QUERY_ID = 'queryID'
+    TOKEN = 'token'
+    NGRAM_SIZE = 'ngramSize'
+    OCCURRENCES = 'documentOccurrences'
+    DOCUMENT_ID = 'documentID'
+    LOCK_NO = 'lockNo'
+    LOCATIONS = 'locations'
+
+    def __init__(self, index_controller, index_storage):
+        self._index = index_controller
+        self._storage = index_storage
+
+    '''
+    search every partition of the task, returns the result dictionary
+    '''
+    def execute_task(self, task):
+        tokens = task.get_search_tokens()
+        found = {}
+        for partition in task.get_partitions():
+            token_infos = self.search_partition(
+                partition[SearchTaskModel.PARTITION_ID],
+                partition[SearchTaskModel.PARTITION_URI],
+                tokens)
+            for (token, token_info) in token_infos.iteritems():
+                self._add_token_info(found, token, token_info)
+        return {
+            self.TOKENS: found.values(),
+            self.QUERY_ID: task.get_query_id()
+        }
+
+    '''
+    look up tokens in a partition, if the partition was rewritten since
+    it was resolved the current storage key is read instead
+    '''
+    def search_partition(self, partition_id, partition_uri, tokens):
+        try:
+            return self._storage.lookup_tokens(partition_uri, tokens)
+        except Exception as ex:
+            (version, current_uri) = self._index.get_version_info(
+                partition_id)
+            # retired partitions were redistributed to other partitions
+            if current_uri is None or current_uri == partition_uri:
+                raise ex
+            print ("INFO: partition {0} was rewritten during search"
+                   .format(partition_id))
+            return self._storage.lookup_tokens(current_uri, tokens)
+
+    def _add_token_info(self, found, token, token_info):
+        if token not in found:
+            found[token] = {
+                self.TOKEN: token,
+                self.NGRAM_SIZE: token_info['ngram_size'],
+                self.OCCURRENCES: []
+            }
+        occurrences = found[token][self.OCCURRENCES]
+        for doc_info in token_info['documentOccurrences']:
+            for version in doc_info['versions']:
+                occurrences.append({
+                    self.DOCUMENT_ID: doc_info['documentID'],
+                    self.LOCK_NO: int(version['lockNo']),
+                    self.LOCATIONS: version['locations']
+                })
@@ -0,0 +1,124 @@
+from document_model import DocumentModel
+from partition_searcher import PartitionSearcher
+
+
+class SearchAggregator:
+    '''
+    This class combines the results of parallel partition searches. It
+    merges postings per token, hydrates document metadata from the
+    DOCUMENTS table, and reconciles lock numbers so that every token of a
+    document is returned for the same version of that document.
+    '''
+
+    # Response Fields
+    TOKEN = 'token'
+    NGRAM_SIZE = 'ngramSize'
+    OCCURRENCES = 'documentOccurrences'
+    DOCUMENT_ID = 'documentID'
+    LOCATIONS = 'locations'
+    WORD_COUNT = 'wordCount'
+    LAST_INDEXED = 'pageLastIndexed'
+    TOKEN_RANGES = 'importantTokenRanges'
+
+    def __init__(self, document_controller):
+        self._documents = document_controller
+
+    '''
+    merge search results into a token -> {ngramSize, versions} dictionary
+    where versions maps each document id to a lockNo -> locations dictionary
+    '''
+    def merge_results(self, results):
+        merged = {}
+        for result in results:
+            for token_info in result[PartitionSearcher.TOKENS]:
+                token = token_info[PartitionSearcher.TOKEN]
+                if token not in merged:
+                    merged[token] = {
+                        self.NGRAM_SIZE: token_info[PartitionSearcher
+                                                    .NGRAM_SIZE],
+                        'versions': {}
+                    }
+                versions = merged[token]['versions']
+                for occurrence in token_info[PartitionSearcher.OCCURRENCES]:
+                    doc_id = occurrence[PartitionSearcher.DOCUMENT_ID]
+                    lock_no = occurrence[PartitionSearcher.LOCK_NO]
+                    versions.setdefault(doc_id, {})[lock_no] = \
+                        occurrence[PartitionSearcher.LOCATIONS]
+        return merged
+
+    '''
+    return the ids of every document found in the merged results
+    '''
+    def get_document_ids(self, merged):
+        doc_ids = set()
+        for token_info in merged.values():
+            doc_ids.update(token_info['versions'].keys())
+        return doc_ids
+
+    '''
+    retrieve the state & external metadata of the documents with batched
+    reads, returns a doc id -> DocumentModel dictionary of the documents
+    that exist
+    '''
+    def get_documents(self, doc_ids):
+        return self._documents.get_document_models(
+            doc_ids, DocumentModel.STATE_PATHS + [DocumentModel.EXTERNAL])
+
+    '''
+    pick the version of every token that matches the lockNo of each
+    document, so all tokens of a document are returned for its current
+    version. A token without that version may still be on its way to the
+    partition, the write master unlocks documents once the write is
+    dispatched, so the token is reported to be searched again. Once
+    requery is False the version is confirmed stale and the document is
+    dropped from the token. Deleted & unknown documents are discarded.
+    Returns the token results in the order of tokens and the set of tokens
+    to search again.
+    '''
+    def reconcile(self, tokens, merged, documents, requery=True):
+        token_results = []
+        stale_tokens = set()
+        for token in tokens:
+            if token not in merged:
+                continue
+            occurrences = []
+            versions_by_doc = merged[token]['versions']
+            for doc_id in sorted(versions_by_doc.keys()):
+                doc = documents.get(doc_id)
+                if doc is None or doc.is_deleted():
+                    continue
+                versions = versions_by_doc[doc_id]
+                lock_no = doc.get_lock_no()
+                if lock_no not in versions:
+                    if requery:
+                        stale_tokens.add(token)
+                    continue
+                occurrences.append({
+                    self.DOCUMENT_ID: doc_id,
+                    self.LOCATIONS: versions[lock_no]
+                })
+            token_results.append({
+                self.TOKEN: token,
+                self.NGRAM_SIZE: merged[token][self.NGRAM_SIZE],
+                self.OCCURRENCES: occurrences
+            })
+        return (token_results, stale_tokens)
+
+    '''
+    format the metadata of every document referenced by the token results
+    '''
+    def format_documents(self, token_results, documents):
+        doc_ids = set()
+        for token_result in token_results:
+            for occurrence in token_result[self.OCCURRENCES]:
+                doc_ids.add(occurrence[self.DOCUMENT_ID])
+        formatted = []
+        for doc_id in sorted(doc_ids):
+            doc = documents[doc_id]
+            formatted.append({
+                self.DOCUMENT_ID: doc_id,
+                self.WORD_COUNT: doc.get_word_count(),
+                self.LAST_INDEXED: doc.get_last_indexed(),
+                self.TOKEN_RANGES: doc.get_token_ranges()
+            })
+        return formatted
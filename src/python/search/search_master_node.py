@@ -0,0 +1,194 @@
+from collections import OrderedDict
+from multiprocessing.pool import ThreadPool
+import json
+import time
+import uuid
+
+from config import Config
+from document_controller import DocumentController
+from index_controller import IndexController
+from index_storage import IndexStorage
+from input_models import SearchInputModel
+from kinesis import Kinesis
+from partition_router import PartitionRouter
+from partition_searcher import PartitionSearcher
+from result_queue import ResultQueue
+from search_aggregator import SearchAggregator
+from search_task_model import SearchTaskModel
+
+'''
+GLOBALS
+'''
+INDEX_METADATA = IndexController()
+INDEX_STORAGE = IndexStorage()
+DOCUMENTS = DocumentController()
+KINESIS = Kinesis(Config.SEARCH_STREAM)
+RESULTS = ResultQueue(Config.SEARCH_MESSAGES)
+# thread pool for local searches, created on first use & kept for the
+# lifetime of the container
+SEARCH_POOL = None
+
+# search stages, reported in milliseconds with every response
+RESOLVE_STAGE = 'resolvePartitions'
+SEARCH_STAGE = 'searchPartitions'
+AGGREGATE_STAGE = 'aggregateResults'
+HYDRATE_STAGE = 'hydrateDocuments'
+TOTAL = 'total'
+
+# return codes
+SUCCESS = 0
+INTERNAL_FAILURE = 2
+TIMEOUT_FAILURE = 3
+
+
+class SearchTimeoutError(Exception):
+    pass
+
+
+def lambda_handler(event, context):
+    # parse the request to the search input model
+    search_input = SearchInputModel()
+    search_input.parse_from_request(event)
+    if not search_input.verify():
+        print "ERROR: Invalid input."
+        return respond(ValueError("Invalid input."))
+
+    try:
+        return respond(None, search(search_input.get_tokens()))
+    except SearchTimeoutError as ex:
+        return respond(None, failure(TIMEOUT_FAILURE, 'timeout failure'))
+    except Exception as ex:
+        print "ERROR: Search failed: {0}".format(ex)
+        return respond(None, failure(INTERNAL_FAILURE, 'internal failure'))
+
+
+# ParamTypes: Error, Dictionary
+def respond(err, res=None):
+    return {
+        'statusCode': '400' if err else '200',
+        'body': err.message if err else json.dumps(res),
+        'headers': {
+            'Content-Type': 'application/json',
+        },
+    }
+
+
+# search the index for the tokens, returns the documents & token
+# occurrences along with the time spent in each stage of the search
+def search(tokens):
+    timings = OrderedDict([(RESOLVE_STAGE, 0.0), (SEARCH_STAGE, 0.0),
+                           (AGGREGATE_STAGE, 0.0), (HYDRATE_STAGE, 0.0)])
+    search_start = time.time()
+    query_id = str(uuid.uuid4())
+    router = PartitionRouter(INDEX_METADATA)
+    aggregator = SearchAggregator(DOCUMENTS)
+
+    merged = {}
+    search_tokens = tokens
+    for attempt in range(Config.SEARCH_MAX_RETRIES + 1):
+        start = time.time()
+        router.refresh(search_tokens)
+        search_tasks = create_search_tasks(search_tokens, router, query_id)
+        add_timing(timings, RESOLVE_STAGE, start)
+
+        start = time.time()
+        results = run_search_tasks(search_tasks, query_id)
+        add_timing(timings, SEARCH_STAGE, start)
+
+        start = time.time()
+        merged.update(aggregator.merge_results(results))
+        add_timing(timings, AGGREGATE_STAGE, start)
+
+        start = time.time()
+        documents = aggregator.get_documents(
+            aggregator.get_document_ids(merged))
+        add_timing(timings, HYDRATE_STAGE, start)
+
+        start = time.time()
+        (token_results, stale_tokens) = aggregator.reconcile(
+            tokens, merged, documents,
+            attempt < Config.SEARCH_MAX_RETRIES)
+        add_timing(timings, AGGREGATE_STAGE, start)
+
+        if len(stale_tokens) == 0:
+            break
+        print ("INFO: searching {0} tokens again, versions missing for the "
+               "lockNo of their documents".format(len(stale_tokens)))
+        search_tokens = [token for token in tokens if token in stale_tokens]
+
+    start = time.time()
+    formatted_documents = aggregator.format_documents(token_results,
+                                                      documents)
+    add_timing(timings, AGGREGATE_STAGE, start)
+    add_timing(timings, TOTAL, search_start)
+
+    print "INFO: search {0} timings (ms): {1}".format(query_id,
+                                                      json.dumps(timings))
+    return {
+        'returnCode': SUCCESS,
+        'error': '',
+        'documents': formatted_documents,
+        'tokens': token_results,
+        'timings': timings
+    }
+
+
+def failure(return_code, error):
+    return {
+        'returnCode': return_code,
+        'error': error,
+        'documents': [],
+        'tokens': []
+    }
+
+
+def add_timing(timings, stage, start):
+    timings[stage] = timings.get(stage, 0.0) + (time.time() - start) * 1000
+
+
+# creates one search task per partition holding any of the tokens, each
+# task searches every requested token the partition may contain
+def create_search_tasks(tokens, router, query_id):
+    tasks_by_partition = OrderedDict()
+    for token in tokens:
+        for (partition_id, partition_uri) in router.get_partitions_for_token(
+                token):
+            if partition_uri is None:
+                continue
+            if partition_uri not in tasks_by_partition:
+                tasks_by_partition[partition_uri] = (
+                    SearchTaskModel().with_query_id(query_id)
+                                     .with_partition(partition_id,
+                                                     partition_uri))
+            tasks_by_partition[partition_uri].with_search_token(token)
+
+    search_tasks = []
+    for search_task in tasks_by_partition.values():
+        if search_task.verify():
+            search_tasks.append(search_task)
+    return search_tasks
+
+
+# run the search tasks in a local thread pool or on the kinesis workers,
+# returns the list of search results
+def run_search_tasks(search_tasks, query_id):
+    if len(search_tasks) == 0:
+        return []
+
+    if Config.SEARCH_DISPATCH == 'kinesis':
+        KINESIS.dispatch_tasks(search_tasks)
+        print "INFO: sent {0} search tasks to kinesis".format(
+            len(search_tasks))
+        results = RESULTS.receive_results(query_id, len(search_tasks),
+                                          Config.SEARCH_RESULT_TIMEOUT)
+        if len(results) < len(search_tasks):
+            print "ERROR: Received {0} of {1} search results.".format(
+                len(results), len(search_tasks))
+            raise SearchTimeoutError("Search timed out.")
+        return results
+
+    global SEARCH_POOL
+    if SEARCH_POOL is None:
+        SEARCH_POOL = ThreadPool(Config.SEARCH_WORKER_THREADS)
+    searcher = PartitionSearcher(INDEX_METADATA, INDEX_STORAGE)
+    return SEARCH_POOL.map(searcher.execute_task, search_tasks)
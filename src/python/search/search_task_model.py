@@ -0,0 +1,71 @@
+from sets import Set
+
+
+class SearchTaskModel(object):
+    '''
+    This class implements a model for creating search tasks. These
+    tasks are posted to kinesis, or run in a thread pool, and executed
+    by partition searchers.
+    '''
+
+    # Attribute Field Names
+    PARTITIONS = 'partitions'
+    SEARCH_TOKENS = 'searchTokens'
+    QUERY_ID = 'queryID'
+
+    # Valid Fields
+    VALID_FIELDS = [PARTITIONS, SEARCH_TOKENS, QUERY_ID]
+
+    # Partition Attributes
+    PARTITION_ID = 'partitionID'
+    PARTITION_URI = 'partitionURI'
+
+    # Valid Partition Fields
+    VALID_PARTITION_FIELDS = [PARTITION_ID, PARTITION_URI]
+
+    def __init__(self):
+        self._valid_fields = Set(self.VALID_FIELDS)
+        self._valid_partition_fields = Set(self.VALID_PARTITION_FIELDS)
+        self._task_info = {
+            self.PARTITIONS: [],
+            self.SEARCH_TOKENS: []
+        }
+
+    def get_partitions(self):
+        return self._task_info[self.PARTITIONS]
+
+    def get_search_tokens(self):
+        return self._task_info[self.SEARCH_TOKENS]
+
+    def get_query_id(self):
+        return self._task_info[self.QUERY_ID]
+
+    def verify(self):
+        if Set(self._task_info.keys()) == self._valid_fields:
+            for partition in self._task_info[self.PARTITIONS]:
+                if Set(partition.keys()) != self._valid_partition_fields:
+                    return False
+            return True
+        return False
+
+    def load(self, task_info):
+        self._task_info = task_info
+
+    def get_payload(self):
+        return self._task_info
+
+    def with_query_id(self, query_id):
+        self._task_info[self.QUERY_ID] = query_id
+        return self
+
+    def with_partition(self, partition_id, partition_uri):
+        partition = {
+            self.PARTITION_ID: partition_id,
+            self.PARTITION_URI: partition_uri
+        }
+        self._task_info[self.PARTITIONS].append(partition)
+        return self
+
+    def with_search_token(self, token):
+        self._task_info[self.SEARCH_TOKENS].append(token)
+        return self
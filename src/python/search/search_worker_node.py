@@ -0,0 +1,30 @@
+from config import Config
+from index_controller import IndexController
+from index_storage import IndexStorage
+from kinesis import Kinesis
+from partition_searcher import PartitionSearcher
+from result_queue import ResultQueue
+from search_task_model import SearchTaskModel
+
+'''
+GLOBALS
+'''
+INDEX_METADATA = IndexController()
+INDEX_STORAGE = IndexStorage()
+KINESIS = Kinesis(Config.SEARCH_STREAM)
+RESULTS = ResultQueue(Config.SEARCH_MESSAGES)
+SEARCHER = PartitionSearcher(INDEX_METADATA, INDEX_STORAGE)
+
+
+def lambda_handler(event, context):
+    tasks = KINESIS.parse_tasks_from_records(event['Records'])
+    for task in tasks:
+        search_task = SearchTaskModel()
+        search_task.load(task)
+        if not search_task.verify():
+            print "ERROR: Invalid search task."
+            continue
+        result = SEARCHER.execute_task(search_task)
+        RESULTS.send_result(search_task.get_query_id(), result)
+        print "INFO: searched {0} partitions for query {1}".format(
+            len(search_task.get_partitions()), search_task.get_query_id())
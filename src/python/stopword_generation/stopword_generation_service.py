@@ -2,7 +2,13 @@ from stopword_generator import StopWordGenerator
 
 def stopword_handler(event, context):
     sw = StopWordGenerator()
-    sw.generate_stopwords()
+    # every partition is counted again if the event sets full
+    sw.generate_stopwords(bool(event and event.get('full')))
     sw.add_stopwords_table()
+    stats = sw.get_stats()
+    print ("INFO: counted {0} changed partitions ({1} unchanged, {2} removed)"
+           " in {3:.1f}s, {4:.2f}s per million tokens".format(
+               stats['partitions'], stats['unchanged'], stats['removed'],
+               stats['seconds'], stats['secondsPerMillionTokens']))
     tokens = sw.get_stop_words()
     return tokens
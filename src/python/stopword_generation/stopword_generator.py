@@ -1,61 +1,203 @@
+from heapq import nlargest
+from multiprocessing.pool import ThreadPool
+from operator import itemgetter
+import time
+
+from config import Config
 from index_storage import IndexStorage
-from index_partition import IndexPartition
 from index_controller import IndexController
+from index_model import IndexModel
 from stopword_controller import StopWordController
+from stopword_count_storage import StopWordCountStorage
 from stopword_model import StopWordModel
 
-import boto3
+# thread pool counting partitions, created on first use & kept for the
+# lifetime of the container
+COUNT_POOL = None
 
 
 class StopWordGenerator:
+    '''
+    This class counts the occurrences of every single word token in the
+    index & keeps the most frequent ones as stop words. The token counts of
+    each partition are stored under its storage key, and the totals of the
+    last run are stored with the storage key each partition was counted
+    from. A run only downloads the partitions that have a new storage key,
+    in a thread pool, and applies the difference between their old & new
+    counts to the totals. Only the top Config.STOPWORD_COUNT tokens are
+    selected with a heap & written to the STOP_WORD table in batches.
+    '''
 
     def __init__(self):
         self._storage = IndexStorage()
-        self._partition = None
         self._tokens = {}
+        self._stop_words = {}
         self._stopword = StopWordController()
         self._index = IndexController()
+        self._counts = StopWordCountStorage()
+        self._counted = 0
+        self._unchanged = 0
+        self._removed = 0
+        self._skipped = 0
+        self._occurrences = 0
+        self._seconds = 0.0
 
     '''
-    Search a partition and update all_tokens with a given version
+    generate stop words from the partitions changed since the last run, or
+    from every partition if full is set. Changed partitions are counted in
+    up to Config.STOPWORD_WORKER_THREADS threads
     '''
-    def search_partition(self, key):
-        # lookup partition using key
-        payload = self._storage.get_partition(key)
-        # deserialize key
-        self.partition = IndexPartition()
-        self.partition.deserialize(payload)
-        # length of the token
-        partition_token = self.partition.get_token_list()
+    def generate_stopwords(self, full=False):
+        start = time.time()
+        (seen, tokens) = self._counts.get_totals()
+        if full:
+            (partitions, self._tokens) = ({}, {})
+        else:
+            (partitions, self._tokens) = (dict(seen), tokens)
+        current = {}
+        results = self.count_changes(self.list_changes(partitions, current))
 
-        for key in self.partition.get_token_list():
-            addamount = self.partition.get_token_count(key)
-            if addamount <= 0:
+        if any(old_counts is None for (partition_id, old_key, new_key,
+                                       old_counts, new_counts) in results):
+            print ("WARNING: token counts of the last run are missing, "
+                   "counting every partition")
+            return self.generate_stopwords(True)
+
+        self._counted = 0
+        self._removed = 0
+        self._skipped = 0
+        self._occurrences = 0
+        for (partition_id, old_key, new_key, old_counts,
+             new_counts) in results:
+            if new_key is None and partition_id in current:
+                # replaced since the ranges were read, counted next run
+                self._skipped += 1
                 continue
-            if(key in self._tokens.keys()):
-                self._tokens[key] += addamount
+            self.apply_counts(old_counts, new_counts)
+            if new_key is None:
+                partitions.pop(partition_id, None)
+                self._removed += 1
             else:
-                self._tokens[key] = addamount
+                partitions[partition_id] = new_key
+                self._counted += 1
+                self._occurrences += sum(new_counts.itervalues())
+        self._unchanged = len(current) - self._counted - self._skipped
+
+        # counts are only deleted once the totals no longer refer to them
+        self._counts.put_totals(partitions, self._tokens)
+        for key in set(seen.values()) - set(partitions.values()):
+            self._counts.delete_counts(key)
+
+        self._stop_words = dict(nlargest(Config.STOPWORD_COUNT,
+                                         self._tokens.iteritems(),
+                                         key=itemgetter(1)))
+        self._seconds = time.time() - start
 
     '''
-    generate stop words by searching through all partitions
+    yield (partition id, old storage key, new storage key) for every
+    partition that is new, has a new storage key or was removed since the
+    counts were made, while the metadata is still being listed. current is
+    filled with the partition id -> storage key of every partition listed
     '''
-    def generate_stopwords(self):
-        partition_ids = self._index.get_partition_ids()
-        for k in partition_ids:
-            self.search_partition(k)
+    def list_changes(self, partitions, current):
+        for item in self._index.scan_partitions([IndexModel.PKEY,
+                                                 IndexModel.STORAGE_KEY]):
+            partition_id = item[IndexModel.PKEY]
+            key = item[IndexModel.STORAGE_KEY]
+            current[partition_id] = key
+            if partitions.get(partition_id) != key:
+                yield (partition_id, partitions.get(partition_id), key)
+        for (partition_id, key) in partitions.items():
+            if partition_id not in current:
+                yield (partition_id, key, None)
 
     '''
-    iterate through all tokens and add to stopwords table
+    run count_change for every change, in the thread pool if enabled. The
+    pool takes changes as they are listed, so partitions are downloaded
+    before the listing finishes
+    '''
+    def count_changes(self, changes):
+        if Config.STOPWORD_WORKER_THREADS <= 1:
+            return [self.count_change(change) for change in changes]
+        global COUNT_POOL
+        if COUNT_POOL is None:
+            COUNT_POOL = ThreadPool(Config.STOPWORD_WORKER_THREADS)
+        return list(COUNT_POOL.imap_unordered(self.count_change, changes))
+
+    '''
+    read the stored counts of the old storage key of a partition & count
+    the partition under its new storage key, storing its counts. A storage
+    key deleted since the ranges were read is returned as None
+    '''
+    def count_change(self, change):
+        (partition_id, old_key, new_key) = change
+        old_counts = {}
+        if old_key is not None:
+            old_counts = self._counts.get_counts(old_key)
+        new_counts = {}
+        if new_key is not None:
+            try:
+                new_counts = self.count_partition(new_key)
+            except Exception as ex:
+                if not IndexStorage.is_missing_partition(ex):
+                    raise ex
+                return (partition_id, old_key, None, old_counts, {})
+            self._counts.put_counts(new_key, new_counts)
+        return (partition_id, old_key, new_key, old_counts, new_counts)
+
+    '''
+    download a partition & return its token -> occurrence count dictionary
+    '''
+    def count_partition(self, key):
+        counts = self._storage.load_partition(key).get_token_counts()
+        return dict((token, count) for (token, count) in counts.iteritems()
+                    if count > 0)
+
+    '''
+    replace the old counts of a partition with its new counts in the totals
+    '''
+    def apply_counts(self, old_counts, new_counts):
+        for (token, count) in old_counts.iteritems():
+            self._tokens[token] = self._tokens.get(token, 0) - count
+        for (token, count) in new_counts.iteritems():
+            self._tokens[token] = self._tokens.get(token, 0) + count
+        for token in old_counts:
+            if self._tokens[token] <= 0:
+                del self._tokens[token]
+
+    '''
+    add the stop words to the stopwords table
     '''
     def add_stopwords_table(self):
-        for t in self._tokens.keys():
+        words = []
+        for t in self._stop_words.keys():
             sw = StopWordModel()
-            sw.set_data(t, self._tokens[t])
-            self._stopword.add_word(sw)
+            sw.set_data(t, self._stop_words[t])
+            words.append(sw)
+        return self._stopword.add_words(words)
 
     '''
     return all stop words as dictionary
     '''
     def get_stop_words(self):
-        return self._tokens
+        return self._stop_words
+
+    '''
+    return counts of partitions counted, unchanged, removed & skipped, of
+    distinct tokens & of token occurrences counted, and the wall time of
+    the run, also per million token occurrences counted
+    '''
+    def get_stats(self):
+        return {
+            'partitions': self._counted,
+            'unchanged': self._unchanged,
+            'removed': self._removed,
+            'skipped': self._skipped,
+            'tokens': len(self._tokens),
+            'occurrences': self._occurrences,
+            'stopWords': len(self._stop_words),
+            'seconds': self._seconds,
+            'secondsPerMillionTokens': (self._seconds * 1000000 /
+                                        self._occurrences
+                                        if self._occurrences > 0 else 0.0)
+        }
@@ -0,0 +1,109 @@
+import boto3
+import threading
+from botocore.config import Config as BotocoreConfig
+
+from config import Config
+
+
+class AwsClients(object):
+    '''
+    This class is the registry of the AWS clients & resources shared by
+    every controller in a container. A client or table is handed out as a
+    lazy reference that is only created on its first call, so modules that
+    build controllers at import time don't pay for sessions & endpoint
+    resolution they never use. A single session creates every client &
+    resource once per service, with a connection pool sized for the
+    service's thread pools and the retry settings of Config.
+    '''
+
+    _lock = threading.RLock()
+    _session = None
+    _clients = {}
+    _resources = {}
+
+    # returns a lazy reference to the shared client of a service
+    @classmethod
+    def client(cls, service):
+        return LazyReference(lambda: cls.get_client(service))
+
+    # returns a lazy reference to a DynamoDB table of the shared resource
+    @classmethod
+    def table(cls, table_name):
+        return LazyReference(
+            lambda: cls.get_resource('dynamodb').Table(table_name))
+
+    # returns the shared client of a service, creating it on first use
+    @classmethod
+    def get_client(cls, service):
+        client = cls._clients.get(service)
+        if client is None:
+            with cls._lock:
+                client = cls._clients.get(service)
+                if client is None:
+                    client = cls._get_session().client(
+                        service, config=cls.get_config())
+                    cls._clients[service] = client
+        return client
+
+    # returns the shared resource of a service, creating it on first use
+    @classmethod
+    def get_resource(cls, service):
+        resource = cls._resources.get(service)
+        if resource is None:
+            with cls._lock:
+                resource = cls._resources.get(service)
+                if resource is None:
+                    resource = cls._get_session().resource(
+                        service, config=cls.get_config())
+                    cls._resources[service] = resource
+        return resource
+
+    # the botocore config of every client & resource
+    @classmethod
+    def get_config(cls):
+        return BotocoreConfig(
+            max_pool_connections=Config.AWS_MAX_POOL_CONNECTIONS,
+            retries={
+                'mode': Config.AWS_RETRY_MODE,
+                'max_attempts': Config.AWS_MAX_ATTEMPTS
+            })
+
+    # drops every client, resource & the session, they are created again on
+    # their next use
+    @classmethod
+    def reset(cls):
+        with cls._lock:
+            cls._session = None
+            cls._clients = {}
+            cls._resources = {}
+
+    # sessions are not thread safe, only use it with the lock held
+    @classmethod
+    def _get_session(cls):
+        with cls._lock:
+            if cls._session is None:
+                cls._session = boto3.session.Session()
+            return cls._session
+
+
+class LazyReference(object):
+    '''
+    This class stands in for a client or resource until it is first used,
+    every attribute is then read from the object created by the factory.
+    '''
+
+    def __init__(self, factory):
+        self._factory = factory
+        self._target = None
+        self._lock = threading.Lock()
+
+    def __getattr__(self, name):
+        return getattr(self.get_target(), name)
+
+    # returns the referenced object, creating it on first use
+    def get_target(self):
+        if self._target is None:
+            with self._lock:
+                if self._target is None:
+                    self._target = self._factory()
+        return self._target
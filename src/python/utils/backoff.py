@@ -0,0 +1,39 @@
+import random
+import time
+
+
+class Backoff(object):
+    '''
+    This class implements the retries shared by the controllers and nodes
+    that call AWS: full jitter exponential backoff between attempts, and
+    batch_write_item requests whose unprocessed items are written again.
+    '''
+
+    # sleeps a random time of up to base * 2 ** attempt seconds, capped at
+    # maximum seconds
+    @classmethod
+    def sleep(cls, attempt, base, maximum):
+        time.sleep(random.uniform(0, min(maximum, base * 2 ** attempt)))
+
+    # sends a batch_write_item request, items left unprocessed by throttling
+    # are written again with backoff up to max_retries times before failing
+    @classmethod
+    def batch_write(cls, client, request_items, max_retries, base, maximum):
+        tables = ', '.join(request_items.keys())
+        attempt = 0
+        while True:
+            try:
+                res = client.batch_write_item(RequestItems=request_items)
+            except Exception as ex:
+                print "ERROR: Failed to write {0} table: {1}".format(
+                    tables, ex)
+                raise ex
+            request_items = res.get('UnprocessedItems') or {}
+            if not request_items:
+                return
+            if attempt >= max_retries:
+                print ("ERROR: Items left unprocessed in {0} table after {1} "
+                       "retries.".format(tables, attempt))
+                raise Exception("Failed to write {0} table.".format(tables))
+            cls.sleep(attempt, base, maximum)
+            attempt += 1
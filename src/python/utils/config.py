@@ -4,4 +4,100 @@ class Config(object):
     WRITE_MESSAGES = 'writeServiceQueue'
     SEARCH_MESSAGES = 'searchServiceQueue'
     INDEX_MAX_SIZE = 1000
+    # the resize job splits partitions at INDEX_MAX_SIZE tokens and
+    # redistributes overlapping ranges into partitions of this many tokens
+    PARTITION_TARGET_SIZE = INDEX_MAX_SIZE / 2
+    # passes of the resize job, a pass restarts the partitions written to
+    # while they were being resized
+    PARTITION_RESIZE_MAX_PASSES = 3
+    # the compaction job merges up to this many adjacent partitions at a
+    # time, one metadata transaction each, & stops this many seconds before
+    # its lambda times out
+    PARTITION_COMPACTION_MAX_PARTITIONS = 25
+    PARTITION_COMPACTION_TIME_MARGIN = 10
+    # metadata listings are read by a parallel scan of this many segments
+    # when above 1, segments & token bucket queries are read in up to
+    # METADATA_READ_THREADS threads
+    METADATA_SCAN_SEGMENTS = 1
+    METADATA_READ_THREADS = 8
+    # tokens are routed by querying the token bucket index instead of
+    # scanning the metadata table. Only turn this on once
+    # metadata_migration_handler has bucketed every partition & the
+    # TOKEN_BUCKET_INDEX is ACTIVE, until then queries miss partitions
+    METADATA_QUERY_ROUTING = False
+    # a token outside every range is routed to the partition starting
+    # before it, looked up in up to this many earlier token buckets before
+    # every partition is read instead
+    METADATA_PRECEDING_BUCKETS = 8
     FILE_DIRECTORY = '/tmp/'
+    # AWS clients & resources are created once per container & shared by
+    # every controller, with a connection pool per client large enough for
+    # the thread pools above & botocore's standard retry mode
+    AWS_MAX_POOL_CONNECTIONS = 32
+    AWS_RETRY_MODE = 'standard'
+    AWS_MAX_ATTEMPTS = 3
+    # documents read per batch_get_item request & written per
+    # batch_write_item request, the DynamoDB limits. Keys & items left
+    # unprocessed are sent again with full jitter backoff, in seconds
+    DOCUMENT_BATCH_SIZE = 100
+    DOCUMENT_WRITE_BATCH_SIZE = 25
+    DOCUMENT_BATCH_MAX_RETRIES = 5
+    DOCUMENT_BACKOFF_BASE = 0.05
+    DOCUMENT_BACKOFF_MAX = 1.0
+    # stop word generation counts partitions in this many threads, keeps
+    # the STOPWORD_COUNT most frequent tokens & writes them in
+    # batch_write_item requests of up to STOPWORD_BATCH_SIZE items, the
+    # DynamoDB limit. Unprocessed items are written again with full jitter
+    # backoff, in seconds
+    STOPWORD_WORKER_THREADS = 8
+    STOPWORD_COUNT = 100
+    STOPWORD_BATCH_SIZE = 25
+    STOPWORD_BATCH_MAX_RETRIES = 5
+    STOPWORD_BACKOFF_BASE = 0.05
+    STOPWORD_BACKOFF_MAX = 1.0
+    # documents of a bulk write are locked & unlocked in parallel
+    WRITE_MASTER_THREADS = 16
+    # write tasks to different partitions run in parallel in a worker
+    # invocation, 1 runs them one after another
+    WRITE_WORKER_THREADS = 8
+    # partition writes that lose the optimistic lock are rebased onto the
+    # current version & retried with full jitter backoff, in seconds,
+    # capped at WRITE_BACKOFF_MAX
+    WRITE_MAX_RETRIES = 8
+    WRITE_BACKOFF_BASE = 0.05
+    WRITE_BACKOFF_MAX = 1.0
+    # partition writes still failing after being re-queued this many times
+    # are sent to the WRITE_DEAD_LETTERS queue instead of the stream
+    WRITE_MAX_ATTEMPTS = 5
+    WRITE_DEAD_LETTERS = 'writeDeadLetterQueue'
+    # bytes requested by the first ranged read of a partition, enough to
+    # cover the preamble & token directory of a full partition
+    PARTITION_HEADER_READ_SIZE = 65536
+    # postings ranges closer than this are fetched with one ranged read
+    PARTITION_RANGE_GAP = 8192
+    # local partition cache, kept under FILE_DIRECTORY
+    PARTITION_CACHE_DIRECTORY = 'partition_cache/'
+    PARTITION_CACHE_DISK_BYTES = 256 * 1024 * 1024
+    PARTITION_CACHE_MEMORY_PARTITIONS = 16
+    # partitions are transferred in memory, larger ones are spilled to the
+    # partition cache directory instead
+    PARTITION_SPILL_BYTES = 64 * 1024 * 1024
+    PARTITION_STREAM_CHUNK_SIZE = 1024 * 1024
+    # zlib level for partition postings blocks, 0 stores them uncompressed
+    PARTITION_COMPRESSION_LEVEL = 1
+    # search dispatch, 'local' runs partition searches in a thread pool on
+    # the search master, 'kinesis' posts them to search worker nodes
+    SEARCH_DISPATCH = 'local'
+    SEARCH_WORKER_THREADS = 8
+    # seconds the search master waits for kinesis search results
+    SEARCH_RESULT_TIMEOUT = 20
+    # times tokens of documents being written are searched again
+    SEARCH_MAX_RETRIES = 1
+    # kinesis tasks are aggregated into records of up to this many bytes,
+    # one 25KB PUT payload unit
+    KINESIS_AGGREGATE_BYTES = 25 * 1024
+    # failed kinesis records are retried with full jitter backoff, in
+    # seconds, capped at KINESIS_BACKOFF_MAX
+    KINESIS_MAX_RETRIES = 5
+    KINESIS_BACKOFF_BASE = 0.05
+    KINESIS_BACKOFF_MAX = 2.0
@@ -1,6 +1,10 @@
-import boto3
-from datetime import datetime
+from datetime import datetime, timedelta
 from boto3.dynamodb.conditions import Key, Attr
+from boto3.dynamodb.types import TypeDeserializer, TypeSerializer
+
+from aws_clients import AwsClients
+from backoff import Backoff
+from config import Config
 from document_model import DocumentModel
 
 
@@ -14,8 +18,7 @@ class DocumentController(object):
     DOCUMENT_TABLE = 'DOCUMENTS'
 
     def __init__(self):
-        self._document_table = (boto3.resource('dynamodb')
-                                .Table(self.DOCUMENT_TABLE))
+        self._document_table = AwsClients.table(self.DOCUMENT_TABLE)
 
     # retrieves the document if present, None if not present or failure
     def get_document(self, doc_id):
@@ -31,6 +34,136 @@ class DocumentController(object):
             table: {1}".format(self.DOCUMENT_TABLE, ex)
             raise ex
 
+    # retrieves documents with batched reads of Config.DOCUMENT_BATCH_SIZE
+    # keys, only the provided attributes if any, nested attributes as
+    # dotted paths like internal.lockNo. Returns a doc id -> document
+    # dictionary of the documents that exist
+    def get_documents(self, doc_ids, attributes=None):
+        doc_ids = list(set(doc_ids))
+        documents = {}
+        for start in range(0, len(doc_ids), Config.DOCUMENT_BATCH_SIZE):
+            documents.update(self._get_batch(
+                doc_ids[start:start + Config.DOCUMENT_BATCH_SIZE],
+                attributes))
+        return documents
+
+    # reads one batch, keys left unprocessed by throttling are read again
+    def _get_batch(self, doc_ids, attributes):
+        serializer = TypeSerializer()
+        deserializer = TypeDeserializer()
+        request = {
+            'Keys': [{DocumentModel.PKEY: serializer.serialize(doc_id)}
+                     for doc_id in doc_ids]
+        }
+        if attributes is not None:
+            paths = [DocumentModel.PKEY] + list(attributes)
+            placeholders = {}
+            for path in paths:
+                for name in path.split('.'):
+                    placeholders.setdefault(
+                        name, '#a{0}'.format(len(placeholders)))
+            request['ProjectionExpression'] = ', '.join(
+                '.'.join(placeholders[name] for name in path.split('.'))
+                for path in paths)
+            request['ExpressionAttributeNames'] = dict(
+                (placeholder, name)
+                for (name, placeholder) in placeholders.iteritems())
+        request_items = {self.DOCUMENT_TABLE: request}
+
+        documents = {}
+        attempt = 0
+        while request_items:
+            try:
+                res = self._document_table.meta.client.batch_get_item(
+                    RequestItems=request_items)
+            except Exception as ex:
+                print "ERROR: Failed to read {0} table: {1}".format(
+                    self.DOCUMENT_TABLE, ex)
+                raise ex
+            for item in res['Responses'].get(self.DOCUMENT_TABLE, []):
+                document = dict((key, deserializer.deserialize(value))
+                                for (key, value) in item.iteritems())
+                documents[document[DocumentModel.PKEY]] = document
+
+            request_items = res.get('UnprocessedKeys') or {}
+            if not request_items:
+                break
+            if attempt >= Config.DOCUMENT_BATCH_MAX_RETRIES:
+                print "ERROR: Documents left unprocessed after retries."
+                raise Exception("Failed to read documents.")
+            Backoff.sleep(attempt, Config.DOCUMENT_BACKOFF_BASE,
+                          Config.DOCUMENT_BACKOFF_MAX)
+            attempt += 1
+        return documents
+
+    # retrieves documents like get_documents, returns a doc id ->
+    # DocumentModel dictionary of the documents that exist
+    def get_document_models(self, doc_ids, attributes=None):
+        documents = self.get_documents(doc_ids, attributes)
+        return dict((doc_id, DocumentModel().set_doc_info(document))
+                    for (doc_id, document) in documents.iteritems())
+
+    # create the valid documents with batched writes of
+    # Config.DOCUMENT_WRITE_BATCH_SIZE documents, returns the number of
+    # documents written
+    def create_new_documents(self, document_models):
+        serializer = TypeSerializer()
+        requests = [{'PutRequest': {'Item': dict(
+            (key, serializer.serialize(value)) for (key, value)
+            in model.get_payload().iteritems())}}
+            for model in document_models if model.verify()]
+        for start in range(0, len(requests),
+                           Config.DOCUMENT_WRITE_BATCH_SIZE):
+            self._write_batch(
+                requests[start:start + Config.DOCUMENT_WRITE_BATCH_SIZE])
+        return len(requests)
+
+    # writes one batch, items left unprocessed by throttling are written
+    # again
+    def _write_batch(self, requests):
+        Backoff.batch_write(self._document_table.meta.client,
+                            {self.DOCUMENT_TABLE: requests},
+                            Config.DOCUMENT_BATCH_MAX_RETRIES,
+                            Config.DOCUMENT_BACKOFF_BASE,
+                            Config.DOCUMENT_BACKOFF_MAX)
+
+    # decrements the tokenCount of a document by the token occurrences
+    # removed from the index, a deleted document is removed once none of
+    # its tokens are left. Returns the remaining tokenCount, 0 if the
+    # document no longer exists
+    def remove_token_occurrences(self, doc_id, count):
+        update_expression = 'add {0}.{1} :count'.format(
+            DocumentModel.INTERNAL, DocumentModel.TOKEN_COUNT)
+        try:
+            res = self._document_table.update_item(Key={
+                DocumentModel.PKEY: doc_id
+            }, UpdateExpression=update_expression, ExpressionAttributeValues={
+                ':count': -count
+            }, ConditionExpression=Attr(DocumentModel.PKEY).exists(),
+               ReturnValues='UPDATED_NEW')
+            remaining = int(res['Attributes'][DocumentModel.INTERNAL]
+                            [DocumentModel.TOKEN_COUNT])
+            if remaining <= 0:
+                # a document written again since it was deleted is kept
+                self._document_table.delete_item(Key={
+                    DocumentModel.PKEY: doc_id
+                }, ConditionExpression=Attr('{0}.{1}'.format(
+                    DocumentModel.INTERNAL, DocumentModel.DELETE)).eq(True))
+            return remaining
+        except Exception as ex:
+            if self.is_condition_failure(ex):
+                return 0
+            print "ERROR: Failed to update token count of document"
+            raise ex
+
+    # True if the exception is a failed condition on a document update
+    @classmethod
+    def is_condition_failure(cls, ex):
+        if not hasattr(ex, 'response'):
+            return False
+        return (ex.response.get('Error', {}).get('Code') ==
+                'ConditionalCheckFailedException')
+
     # set updating field to true & set lastUpdate timestamp
     def lock_document(self, doc_id):
         now = str(datetime.now())
@@ -51,6 +184,39 @@ class DocumentController(object):
             print "ERROR: Failed to acquire lock on document"
             raise ex
 
+    # locks the document in one conditional update, if it exists & is not
+    # being written or its lock is older than expiration seconds: sets
+    # updating & lastUpdate and increments lockNo to the version about to
+    # be written. Returns the DocumentModel of the document before it was
+    # locked, None if the document is locked or does not exist
+    def acquire_lock(self, doc_id, expiration):
+        now = datetime.now()
+        update_expression = ('set {0}.{1} = :updating, {0}.{2} = :now '
+                             'add {0}.{3} :one').format(
+            DocumentModel.INTERNAL,
+            DocumentModel.UPDATING,
+            DocumentModel.LAST_UPDATE,
+            DocumentModel.LOCK_NO)
+        internal = DocumentModel.INTERNAL + '.'
+        condition = (Attr(DocumentModel.PKEY).exists() &
+                     (Attr(internal + DocumentModel.UPDATING).eq(False) |
+                      Attr(internal + DocumentModel.LAST_UPDATE).lt(
+                          str(now - timedelta(seconds=expiration)))))
+        try:
+            res = self._document_table.update_item(Key={
+                DocumentModel.PKEY: doc_id
+            }, UpdateExpression=update_expression, ExpressionAttributeValues={
+                ':updating': True,
+                ':now': str(now),
+                ':one': 1
+            }, ConditionExpression=condition, ReturnValues='ALL_OLD')
+            return DocumentModel().set_doc_info(res['Attributes'])
+        except Exception as ex:
+            if self.is_condition_failure(ex):
+                return None
+            print "ERROR: Failed to acquire lock on document"
+            raise ex
+
     # set updating field to false for given document
     def unlock_document(self, doc_id):
         now = str(datetime.now())
@@ -68,15 +234,22 @@ class DocumentController(object):
             print "ERROR: Failed to unlock document"
             raise ex
 
-    # create a new index document if the provided model is valid
-    def create_new_document(self, document_model):
+    # create a new index document if the provided model is valid, only if
+    # no document with its pKey exists when if_absent is set
+    def create_new_document(self, document_model, if_absent=False):
         if not document_model.verify():
             return False
+        kwargs = {}
+        if if_absent:
+            kwargs['ConditionExpression'] = \
+                Attr(DocumentModel.PKEY).not_exists()
         try:
             self._document_table.put_item(
-                Item=document_model.get_payload()
+                Item=document_model.get_payload(), **kwargs
             )
             return True
         except Exception as ex:
+            if if_absent and self.is_condition_failure(ex):
+                return False
             print "ERROR: Failed to create new document: {0}".format(ex)
             raise ex
@@ -36,6 +36,11 @@ class DocumentModel(object):
                              LAST_UPDATE,
                              TOKEN_COUNT]
 
+    # Paths of the internal fields a document's state is read from, to read
+    # the state without the rest of the document
+    STATE_PATHS = ['{0}.{1}'.format(INTERNAL, field)
+                   for field in [LOCK_NO, UPDATING, DELETE]]
+
     # External Fields
     WORD_COUNT = 'wordCount'
     LAST_INDEXED = 'lastIndexed'
@@ -89,8 +94,30 @@ class DocumentModel(object):
     def get_pkey(self):
         return self._info[self.PKEY]
 
+    # internal fields default to those of a new document, documents read
+    # with a projection may only have some of them
     def get_lock_no(self):
-        return int(self._info[self.INTERNAL][self.LOCK_NO])
+        return int(self._info.get(self.INTERNAL, {}).get(self.LOCK_NO, 0))
+
+    def get_token_count(self):
+        return int(self._info.get(self.INTERNAL, {})
+                   .get(self.TOKEN_COUNT, 0))
+
+    def is_updating(self):
+        return bool(self._info.get(self.INTERNAL, {})
+                    .get(self.UPDATING, False))
+
+    def is_deleted(self):
+        return bool(self._info.get(self.INTERNAL, {}).get(self.DELETE, False))
+
+    def get_word_count(self):
+        return self._info[self.EXTERNAL].get(self.WORD_COUNT)
+
+    def get_last_indexed(self):
+        return self._info[self.EXTERNAL].get(self.LAST_INDEXED)
+
+    def get_token_ranges(self):
+        return self._info[self.EXTERNAL][self.TOKEN_RANGES]
 
     def get_last_update(self):
         return (datetime.strptime(self._info[self.INTERNAL][self.LAST_UPDATE],
@@ -1,6 +1,9 @@
-import boto3
+import Queue
+import threading
 from boto3.dynamodb.conditions import Key, Attr
+from boto3.dynamodb.types import TypeSerializer
 
+from aws_clients import AwsClients
 from config import Config
 from index_model import IndexModel
 
@@ -10,21 +13,35 @@ class IndexController(object):
     This class is responsible for interactions with the
     INDEX_PARTITION_METADATA table. It creates and updates metadata for
     partitions and also determines which partitions contain specified tokens.
+    Partitions are bucketed by the leading character of their token range,
+    so the partitions of a token are found by querying the token bucket
+    index instead of scanning the table.
     '''
 
     INDEX_METADATA_TABLE = 'INDEX_PARTITION_METADATA'
+    # global secondary index of partitions by token bucket & starting token,
+    # a token is routed by querying its bucket & the spanning bucket
+    TOKEN_BUCKET_INDEX = 'TOKEN_BUCKET_INDEX'
+
+    # error codes returned when a versionNo condition fails, on its own or
+    # as part of a transaction
+    VERSION_CONFLICT = 'ConditionalCheckFailedException'
+    TRANSACTION_CONFLICT = 'TransactionCanceledException'
 
     def __init__(self):
-        self._index_table = (boto3.resource('dynamodb')
-                                  .Table(self.INDEX_METADATA_TABLE))
+        self._index_table = AwsClients.table(self.INDEX_METADATA_TABLE)
 
     # create a new index document if the provided model is valid
     def create_new_index(self, index_model):
         if not index_model.verify():
             return False
+        item = dict(index_model.get_payload())
+        bucket = index_model.get_token_bucket()
+        if bucket is not None:
+            item[IndexModel.TOKEN_BUCKET] = bucket
         try:
             self._index_table.put_item(
-                Item=index_model.get_payload()
+                Item=item
             )
             return True
         except Exception as ex:
@@ -33,31 +50,109 @@ class IndexController(object):
 
     def get_partition_ids(self):
         try:
-            res = self._index_table.scan(
-                TableName="INDEX_PARTITION_METADATA",
-                AttributesToGet=[
-                    's3Key',
-                ]
-            )
-            partition_ids = []
-            for i in res['Items']:
-                partition_ids.append(i['s3Key'])
-            return partition_ids
+            return [item[IndexModel.STORAGE_KEY] for item in
+                    self.scan_partitions([IndexModel.STORAGE_KEY])]
         except Exception as ex:
             print "ERROR: Failed to retrieve partition ids: {0}".format(ex)
             raise ex
 
-    # get pkeys for partitions the provided token might be in
+    # get the token range, size & storage key of every partition for routing
+    def get_partition_ranges(self):
+        try:
+            return list(self.scan_partitions([
+                IndexModel.PKEY,
+                IndexModel.STORAGE_KEY,
+                IndexModel.START_TOKEN,
+                IndexModel.END_TOKEN,
+                IndexModel.SIZE
+            ]))
+        except Exception as ex:
+            print "ERROR: Failed to retrieve partition ranges: {0}".format(ex)
+            raise ex
+
+    # get the token range, size & storage key of the partitions any of the
+    # tokens might be in, the partitions of each token's bucket & the
+    # spanning bucket, and of the partition starting nearest before each
+    # token, so a token outside every range is routed to the same partition
+    # whatever other tokens are loaded with it. Every partition is read if
+    # query routing is off, or if a token has no such partition within
+    # Config.METADATA_PRECEDING_BUCKETS earlier buckets
+    def get_partition_ranges_for_tokens(self, tokens):
+        if not Config.METADATA_QUERY_ROUTING:
+            return self.get_partition_ranges()
+        buckets = set(IndexModel.bucket_for_token(token) for token in tokens)
+        buckets.add(IndexModel.SPANNING_BUCKET)
+        try:
+            items = list(self.query_buckets(sorted(buckets)))
+            preceding = {}
+            for token in sorted(set(tokens)):
+                if not self._find_preceding(token, items, buckets, preceding):
+                    return self.get_partition_ranges()
+            return items + [item for item in preceding.values()
+                            if item is not None]
+        except Exception as ex:
+            print "ERROR: Failed to retrieve partition ranges: {0}".format(ex)
+            raise ex
+
+    # makes sure the partition starting nearest before the token is in the
+    # items. The token's bucket & the spanning bucket are read in full, so
+    # one of theirs is nearest if it shares the token's leading character.
+    # Otherwise earlier buckets that weren't read are queried for their last
+    # partition, nearest first, down to the bucket of the nearest partition
+    # read. Partitions found are kept in preceding by bucket. Returns False
+    # if the nearest partition isn't found within
+    # Config.METADATA_PRECEDING_BUCKETS buckets
+    def _find_preceding(self, token, items, buckets, preceding):
+        starts = [item[IndexModel.START_TOKEN] for item in
+                  items + [i for i in preceding.values() if i is not None]
+                  if item[IndexModel.START_TOKEN] <= token]
+        floor = max(starts) if starts else None
+        if floor is not None and floor[:1] == token[:1]:
+            return True
+        if token == '':
+            return False
+        floor_char = ord(floor[0]) if floor else -1
+        char = ord(token[0]) - 1
+        walked = 0
+        while char >= floor_char:
+            bucket = unichr(char) if isinstance(token, unicode) else chr(char)
+            if bucket not in buckets:
+                if bucket not in preceding:
+                    if walked >= Config.METADATA_PRECEDING_BUCKETS:
+                        return False
+                    preceding[bucket] = self.get_last_partition(bucket)
+                    walked += 1
+                if preceding[bucket] is not None:
+                    return True
+            char -= 1
+        return floor is not None
+
+    # get the index item of the partition with the last starting token in
+    # the bucket, None if the bucket is empty
+    def get_last_partition(self, bucket):
+        res = self._index_table.query(
+            IndexName=self.TOKEN_BUCKET_INDEX,
+            KeyConditionExpression=Key(IndexModel.TOKEN_BUCKET).eq(bucket),
+            ScanIndexForward=False,
+            Limit=1
+        )
+        return res['Items'][0] if res['Items'] else None
+
+    # get pkey of the smallest partition the provided token might be in
     def get_partition_for_token(self, token):
         try:
-            # Yes this is doing a scan, yes I know it's gross
-            res = self._index_table.scan(
-                FilterExpression=Attr(IndexModel.START_TOKEN).lte(token) &
-                Attr(IndexModel.END_TOKEN).gte(token)
-            )
+            if Config.METADATA_QUERY_ROUTING:
+                items = self.query_buckets(
+                    [IndexModel.bucket_for_token(token),
+                     IndexModel.SPANNING_BUCKET], token)
+            else:
+                items = self.scan_partitions(
+                    filter_expression=Attr(IndexModel.START_TOKEN).lte(token) &
+                    Attr(IndexModel.END_TOKEN).gte(token)
+                )
             min_size = Config.INDEX_MAX_SIZE
             key = ''
-            for item in res['Items']:
+            for item in items:
                 if int(item[IndexModel.SIZE]) < min_size:
                     min_size = int(item[IndexModel.SIZE])
                     key = item[IndexModel.PKEY]
@@ -66,6 +161,154 @@ class IndexController(object):
             print "ERROR: Unable to retrieve partition metadata."
             raise ex
 
+    # yields the metadata item of every partition, reading the table page
+    # by page until no LastEvaluatedKey is returned. With more than one
+    # segment the table is read by a parallel scan, one thread per segment
+    # up to Config.METADATA_READ_THREADS, and items are yielded in the order
+    # their pages arrive. Only the given
+    # attributes are read if any are given
+    def scan_partitions(self, attributes=None, filter_expression=None,
+                        segments=None):
+        if segments is None:
+            segments = Config.METADATA_SCAN_SEGMENTS
+        request = {}
+        if attributes is not None:
+            request['AttributesToGet'] = attributes
+        if filter_expression is not None:
+            request['FilterExpression'] = filter_expression
+        if segments <= 1:
+            return self._read_items('scan', [request])
+        return self._read_items('scan', [
+            dict(request, Segment=segment, TotalSegments=segments)
+            for segment in range(segments)])
+
+    # yields the index items of the partitions in the buckets, one query
+    # per bucket on the token bucket index, run in parallel. With a token
+    # only partitions whose range contains it are read
+    def query_buckets(self, buckets, token=None):
+        requests = []
+        for bucket in buckets:
+            condition = Key(IndexModel.TOKEN_BUCKET).eq(bucket)
+            request = {'IndexName': self.TOKEN_BUCKET_INDEX}
+            if token is not None:
+                condition = condition & Key(IndexModel.START_TOKEN).lte(token)
+                request['FilterExpression'] = (
+                    Attr(IndexModel.END_TOKEN).gte(token))
+            request['KeyConditionExpression'] = condition
+            requests.append(request)
+        return self._read_items('query', requests)
+
+    # yields the items of every page of the scan or query requests. A
+    # single request is read in the calling thread, several are read by up
+    # to Config.METADATA_READ_THREADS threads & items are yielded in the
+    # order their pages arrive
+    def _read_items(self, operation, requests):
+        if len(requests) == 1:
+            for page in self._read_pages(operation, requests[0]):
+                for item in page:
+                    yield item
+            return
+
+        pending = Queue.Queue()
+        for request in requests:
+            pending.put(request)
+        pages = Queue.Queue()
+        threads = min(len(requests), Config.METADATA_READ_THREADS)
+        for i in range(threads):
+            thread = threading.Thread(target=self._read_requests, args=(
+                operation, pending, pages))
+            thread.daemon = True
+            thread.start()
+        finished = 0
+        while finished < threads:
+            (page, error) = pages.get()
+            if error is not None:
+                raise error
+            if page is None:
+                finished += 1
+                continue
+            for item in page:
+                yield item
+
+    # yields the items of each page of a scan or query
+    def _read_pages(self, operation, request):
+        while True:
+            try:
+                res = getattr(self._index_table, operation)(**request)
+            except Exception as ex:
+                print "ERROR: Failed to {0} {1}.".format(
+                    operation, self.INDEX_METADATA_TABLE)
+                raise ex
+            yield res['Items']
+            last_key = res.get('LastEvaluatedKey')
+            if last_key is None:
+                return
+            request = dict(request, ExclusiveStartKey=last_key)
+
+    # puts the pages of the pending requests on the queue until none are
+    # left, then None, or the error a request failed with
+    def _read_requests(self, operation, pending, pages):
+        try:
+            while True:
+                try:
+                    request = pending.get_nowait()
+                except Queue.Empty:
+                    break
+                for page in self._read_pages(operation, request):
+                    pages.put((page, None))
+            pages.put((None, None))
+        except Exception as ex:
+            pages.put((None, ex))
+
+    # creates the token bucket index if the table doesn't have it, with the
+    # capacity of the table unless it is billed per request. Returns True
+    # if the index was created, it is backfilled by DynamoDB
+    def create_bucket_index(self):
+        client = self._index_table.meta.client
+        try:
+            table = client.describe_table(
+                TableName=self.INDEX_METADATA_TABLE)['Table']
+            for index in table.get('GlobalSecondaryIndexes', []):
+                if index['IndexName'] == self.TOKEN_BUCKET_INDEX:
+                    return False
+            index = {
+                'IndexName': self.TOKEN_BUCKET_INDEX,
+                'KeySchema': [
+                    {'AttributeName': IndexModel.TOKEN_BUCKET,
+                     'KeyType': 'HASH'},
+                    {'AttributeName': IndexModel.START_TOKEN,
+                     'KeyType': 'RANGE'}
+                ],
+                'Projection': {
+                    'ProjectionType': 'INCLUDE',
+                    'NonKeyAttributes': [IndexModel.STORAGE_KEY,
+                                         IndexModel.END_TOKEN,
+                                         IndexModel.SIZE]
+                }
+            }
+            billing = table.get('BillingModeSummary', {}).get('BillingMode')
+            if billing != 'PAY_PER_REQUEST':
+                throughput = table['ProvisionedThroughput']
+                index['ProvisionedThroughput'] = {
+                    'ReadCapacityUnits': throughput['ReadCapacityUnits'],
+                    'WriteCapacityUnits': throughput['WriteCapacityUnits']
+                }
+            client.update_table(
+                TableName=self.INDEX_METADATA_TABLE,
+                AttributeDefinitions=[
+                    {'AttributeName': IndexModel.TOKEN_BUCKET,
+                     'AttributeType': 'S'},
+                    {'AttributeName': IndexModel.START_TOKEN,
+                     'AttributeType': 'S'}
+                ],
+                GlobalSecondaryIndexUpdates=[{'Create': index}])
+            return True
+        except Exception as ex:
+            print "ERROR: Failed to create the token bucket index."
+            raise ex
+
+    # writes the partition's storage key, token range & version, and the
+    # token bucket derived from its range
     def update_metadata(self, index_model, is_new):
         if not index_model.verify():
             raise Exception("Invalid index model")
@@ -74,41 +317,149 @@ class IndexController(object):
                              ', {4} = :storage').format(
             IndexModel.END_TOKEN, IndexModel.SIZE,
             IndexModel.START_TOKEN, IndexModel.VERSION, IndexModel.STORAGE_KEY)
+        values = {
+            ':endingToken': index_model.get_end_token(),
+            ':size': index_model.get_size(),
+            ':startingToken': index_model.get_start_token(),
+            ':lockNo': index_model.get_version(),
+            ':storage': index_model.get_storage_key()
+        }
+        bucket = index_model.get_token_bucket()
+        if bucket is None:
+            update_expression += ' remove {0}'.format(IndexModel.TOKEN_BUCKET)
+        else:
+            update_expression += ', {0} = :bucket'.format(
+                IndexModel.TOKEN_BUCKET)
+            values[':bucket'] = bucket
         try:
             if is_new:
                 res = self._index_table.update_item(Key={
                     IndexModel.PKEY: index_model.get_id()
                 }, UpdateExpression=update_expression,
-                   ExpressionAttributeValues={
-                    ':endingToken': index_model.get_end_token(),
-                    ':size': index_model.get_size(),
-                    ':startingToken': index_model.get_start_token(),
-                    ':lockNo': index_model.get_version(),
-                    ':storage': index_model.get_storage_key()
-                })
+                   ExpressionAttributeValues=values)
             else:
+                values[':lockNo'] = index_model.get_version() + 1
                 res = self._index_table.update_item(Key={
                     IndexModel.PKEY: index_model.get_id()
                 }, UpdateExpression=update_expression,
-                   ExpressionAttributeValues={
-                    ':endingToken': index_model.get_end_token(),
-                    ':size': index_model.get_size(),
-                    ':startingToken': index_model.get_start_token(),
-                    ':lockNo': index_model.get_version() + 1,
-                    ':storage': index_model.get_storage_key()
-                }, ConditionExpression=(Attr(IndexModel.VERSION)
+                   ExpressionAttributeValues=values,
+                   ConditionExpression=(Attr(IndexModel.VERSION)
                                         .eq(index_model.get_version())))
         except Exception as ex:
             print "ERROR: Failed to update partition metadata."
             raise ex
 
+    # sets the token bucket of a partition written before the bucket was
+    # maintained, if the partition is still at the version it was read at.
+    # The version is not bumped, only the index attribute changes
+    def set_token_bucket(self, partition_id, version, bucket):
+        try:
+            self._index_table.update_item(Key={
+                IndexModel.PKEY: partition_id
+            }, UpdateExpression='set {0} = :bucket'.format(
+                IndexModel.TOKEN_BUCKET),
+               ExpressionAttributeValues={':bucket': bucket},
+               ConditionExpression=Attr(IndexModel.VERSION).eq(version))
+            return True
+        except Exception as ex:
+            print "ERROR: Failed to set partition token bucket."
+            raise ex
+
+    # repoints the partition to the model's storage key & token range and
+    # deletes the metadata of the retired (pkey, version) partitions in one
+    # transaction, every partition must still be at the version it was read
+    def replace_partitions(self, index_model, retired):
+        if not index_model.verify():
+            raise Exception("Invalid index model")
+        serializer = TypeSerializer()
+        bucket = index_model.get_token_bucket()
+        version_condition = {
+            'ConditionExpression': '#version = :version',
+            'ExpressionAttributeNames': {'#version': IndexModel.VERSION}
+        }
+        update = dict(version_condition, **{
+            'TableName': self.INDEX_METADATA_TABLE,
+            'Key': {IndexModel.PKEY: serializer.serialize(
+                index_model.get_id())},
+            'UpdateExpression': ('set #end = :endingToken, #size = :size, '
+                                 '#start = :startingToken, '
+                                 '#version = :lockNo, #storage = :storage'),
+            'ExpressionAttributeNames': {
+                '#end': IndexModel.END_TOKEN,
+                '#size': IndexModel.SIZE,
+                '#start': IndexModel.START_TOKEN,
+                '#version': IndexModel.VERSION,
+                '#storage': IndexModel.STORAGE_KEY
+            },
+            'ExpressionAttributeValues': {
+                ':endingToken': serializer.serialize(
+                    index_model.get_end_token()),
+                ':size': serializer.serialize(index_model.get_size()),
+                ':startingToken': serializer.serialize(
+                    index_model.get_start_token()),
+                ':lockNo': serializer.serialize(
+                    index_model.get_version() + 1),
+                ':storage': serializer.serialize(
+                    index_model.get_storage_key()),
+                ':version': serializer.serialize(index_model.get_version())
+            }
+        })
+        if bucket is None:
+            update['UpdateExpression'] += ' remove #bucket'
+        else:
+            update['UpdateExpression'] += ', #bucket = :bucket'
+            update['ExpressionAttributeValues'][':bucket'] = (
+                serializer.serialize(bucket))
+        update['ExpressionAttributeNames']['#bucket'] = (
+            IndexModel.TOKEN_BUCKET)
+        items = [{'Update': update}]
+        for (partition_id, version) in retired:
+            items.append({'Delete': dict(version_condition, **{
+                'TableName': self.INDEX_METADATA_TABLE,
+                'Key': {IndexModel.PKEY: serializer.serialize(partition_id)},
+                'ExpressionAttributeValues': {
+                    ':version': serializer.serialize(version)
+                }
+            })})
+        try:
+            self._index_table.meta.client.transact_write_items(
+                TransactItems=items)
+            return True
+        except Exception as ex:
+            print "ERROR: Failed to replace partition metadata."
+            raise ex
+
+    # True if the exception is a failed optimistic lock on versionNo
+    @classmethod
+    def is_version_conflict(cls, ex):
+        if not hasattr(ex, 'response'):
+            return False
+        return (ex.response.get('Error', {}).get('Code') in
+                [cls.VERSION_CONFLICT, cls.TRANSACTION_CONFLICT])
+
+    # get the version & storage key of a partition, (None, None) if the
+    # partition no longer exists
     def get_version_info(self, partition_id):
         try:
             res = self._index_table.query(
                 KeyConditionExpression=Key(IndexModel.PKEY).eq(partition_id)
             )
-            data = res['Items'][0]
-            return (data[IndexModel.VERSION], data[IndexModel.STORAGE_KEY])
         except Exception as ex:
             print "ERROR: Failed to get version info for partition."
             raise ex
+        if len(res['Items']) == 0:
+            return (None, None)
+        data = res['Items'][0]
+        return (data[IndexModel.VERSION], data[IndexModel.STORAGE_KEY])
+
+    # delete a partition's metadata if it is still at the provided version,
+    # a failed condition raises the same error as update_metadata
+    def delete_metadata(self, partition_id, version):
+        try:
+            self._index_table.delete_item(Key={
+                IndexModel.PKEY: partition_id
+            }, ConditionExpression=Attr(IndexModel.VERSION).eq(version))
+            return True
+        except Exception as ex:
+            print "ERROR: Failed to delete partition metadata."
+            raise ex
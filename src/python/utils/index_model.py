@@ -16,6 +16,12 @@ class IndexModel(object):
     END_TOKEN = 'endingToken'
     SIZE = 'size'
     VERSION = 'versionNo'
+    # hash key of the token bucket index, derived from the token range so
+    # it is not a field of the model
+    TOKEN_BUCKET = 'tokenBucket'
+
+    # bucket of partitions whose range spans more than one leading character
+    SPANNING_BUCKET = '*'
 
     # Assign Valid Fields
     VALID_FIELDS = [PKEY,
@@ -50,6 +56,10 @@ class IndexModel(object):
     def get_version(self):
         return self._info[self.VERSION]
 
+    def get_token_bucket(self):
+        return self.bucket_for_range(self._info.get(self.START_TOKEN),
+                                     self._info.get(self.END_TOKEN))
+
     def get_payload(self):
         return self._info
 
@@ -79,3 +89,19 @@ class IndexModel(object):
     def with_version(self, version):
         self._info[self.VERSION] = version
         return self
+
+    # the bucket a token is looked up in, the leading character of the token
+    @classmethod
+    def bucket_for_token(cls, token):
+        return token[:1] or cls.SPANNING_BUCKET
+
+    # the bucket of a partition, the leading character its starting & ending
+    # tokens share or the spanning bucket if they don't share one. None for
+    # a partition without a range
+    @classmethod
+    def bucket_for_range(cls, start_token, end_token):
+        if start_token is None or end_token is None:
+            return None
+        if start_token[:1] == '' or start_token[:1] != end_token[:1]:
+            return cls.SPANNING_BUCKET
+        return start_token[:1]
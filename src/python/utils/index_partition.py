@@ -1,16 +1,27 @@
+from collections import OrderedDict
 import cPickle as pickle
+import mmap
 
 from config import Config
+from partition_codec import PartitionCodec
 
 
 class IndexPartition(object):
     '''
     This class wraps the _IndexPartition class to provide serialization.
-    It stores and loads an _IndexPartition object internally.
+    It stores and loads an _IndexPartition object internally. Partitions are
+    written in the binary PartitionCodec format, pickled partitions written
+    before that format existed can still be read.
     '''
 
+    # Outcomes of adding postings to a token
+    TOKEN_ADDED = 'tokenAdded'
+    DOCUMENT_ADDED = 'documentAdded'
+    VERSION_ADDED = 'versionAdded'
+
     def __init__(self):
         self._partition = _IndexPartition()
+        self._legacy_format = False
 
     def size(self):
         return self._partition.size()
@@ -26,32 +37,109 @@ class IndexPartition(object):
                                   locations)
         return True
 
+    # applies (token, doc_id, lock_no, ngram_size, locations) postings in
+    # one pass, returns a token -> outcome dictionary in token order
+    def add_tokens(self, postings):
+        return self._partition.add_tokens(postings)
+
+    # copies tokens of another partition into this one, every token of the
+    # other partition if none are provided. Tokens present in both are
+    # merged per document, keeping the two newest versions
+    def merge_tokens(self, other, tokens=None):
+        if tokens is None:
+            tokens = other.get_token_list()
+        self._partition.merge_tokens(other._partition, tokens)
+        return True
+
+    # returns the ids of every document in the partition
+    def get_document_ids(self):
+        return self._partition.get_document_ids()
+
+    # rewrites the versions of every document occurrence with
+    # keep(doc_id, versions), which returns the versions to keep. Documents
+    # left without versions & tokens left without documents are removed,
+    # returns (token, doc_id, versions removed, document removed) for every
+    # occurrence that changed
+    def filter_postings(self, keep):
+        return self._partition.filter_postings(keep)
+
     def serialize(self, out_file):
         with open(out_file, 'wb') as payload:
-            pickle.dump(self._partition, payload, pickle.HIGHEST_PROTOCOL)
+            payload.write(self.dumps())
             payload.close()
         return True
 
     def deserialize(self, in_file):
         with open(in_file, 'rb') as payload:
-            self._partition = pickle.load(payload)
+            data = payload.read()
             payload.close()
+        return self.loads(data)
+
+    # returns the partition encoded in the PartitionCodec format
+    def dumps(self):
+        return self._partition.encode()
+
+    # loads a partition from encoded or pickled data
+    def loads(self, data):
+        if not PartitionCodec.is_encoded(data):
+            self._legacy_format = True
+            self._partition = pickle.loads(data)
+            return True
+        self._legacy_format = (PartitionCodec.format_version(data) !=
+                               PartitionCodec.FORMAT_VERSION)
+        self._partition = _IndexPartition()
+        self._partition.decode(data)
         return True
 
+    # reads only the postings of the requested tokens from in_file without
+    # loading the partition, returns a token -> token info dictionary
+    def lookup(self, in_file, tokens):
+        with open(in_file, 'rb') as payload:
+            data = mmap.mmap(payload.fileno(), 0, access=mmap.ACCESS_READ)
+            try:
+                if PartitionCodec.is_encoded(data):
+                    return PartitionCodec.lookup(data, tokens)
+            finally:
+                data.close()
+
+        # pickled partitions have to be fully loaded
+        self.deserialize(in_file)
+        return self.get_token_infos(tokens)
+
+    # returns a token -> token info dictionary for the requested tokens
+    # that are present in the partition
+    def get_token_infos(self, tokens):
+        found = {}
+        for token in tokens:
+            token_info = self._partition.get_token_info(token)
+            if token_info is not None:
+                found[token] = token_info
+        return found
+
+    # True if the last deserialized payload was a pickled partition
+    def is_legacy_format(self):
+        return self._legacy_format
+
     def get_token_list(self):
         return self._partition.get_token_list()
 
     def get_token_count(self, key):
-        if key not in self._partition._partition.keys():
+        token_info = self._partition.get_token_info(key)
+        if token_info is None:
             return -1
-        if self._partition._partition[key]['ngram_size'] != 1:
+        if token_info['ngram_size'] != 1:
             return -1
 
         count = 0
-        for doc in self._partition._partition[key]['documentOccurrences']:
+        for doc in token_info['documentOccurrences']:
             count += len(doc['versions'][0]['locations'])
         return count
 
+    # returns a token -> occurrence count dictionary for every single word
+    # token, the same counts as get_token_count
+    def get_token_counts(self):
+        return self._partition.get_token_counts()
+
 
 class _IndexPartition(object):
     '''
@@ -62,10 +150,28 @@ class _IndexPartition(object):
 
     def __init__(self):
         self._partition = {}
+        self._encoded = {}
+        # token -> doc id -> document info, built the first time a token
+        # is updated so that later updates don't scan its documents
+        self._documents = {}
         self._size = 0
         self._starting_token = None
         self._ending_token = None
 
+    # the document index is rebuilt on demand rather than stored
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['_documents'] = {}
+        return state
+
+    # partitions pickled before the binary format have no encoded tokens
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        if '_encoded' not in state:
+            self._encoded = {}
+        if '_documents' not in state:
+            self._documents = {}
+
     ''' GETTERS '''
     def size(self):
         return self._size
@@ -77,42 +183,205 @@ class _IndexPartition(object):
         return self._ending_token
 
     def get_token_list(self):
-        return self._partition.keys()
+        return self._partition.keys() + self._encoded.keys()
+
+    # returns the token info for the token, None if not present
+    def get_token_info(self, token):
+        if token in self._encoded:
+            self._materialize(token)
+        return self._partition.get(token)
+
+    # returns the token -> token info dictionary for every token
+    def get_tokens(self):
+        for token in self._encoded.keys():
+            self._materialize(token)
+        return self._partition
+
+    # replaces the token data & recomputes the partition metadata
+    def set_tokens(self, tokens):
+        self._partition = tokens
+        self._encoded = {}
+        self._documents = {}
+        self._size = len(tokens)
+        self._starting_token = min(tokens) if tokens else None
+        self._ending_token = max(tokens) if tokens else None
+
+    ''' SERIALIZATION '''
+    # loads encoded data, postings stay encoded until a token is accessed
+    def decode(self, data):
+        blocks = PartitionCodec.decode_blocks(data)
+        self._partition = {}
+        self._encoded = {}
+        self._documents = {}
+        for (token, ngram_size, block) in blocks:
+            self._encoded[token] = (ngram_size, block)
+        self._size = len(blocks)
+        self._starting_token = blocks[0][0] if blocks else None
+        self._ending_token = blocks[-1][0] if blocks else None
+
+    # encodes the partition, postings of untouched tokens are copied as is
+    def encode(self):
+        return PartitionCodec.encode(self._partition, self._encoded)
+
+    # decodes the token before removing it from the encoded tokens so that
+    # readers sharing a cached partition always find the token in one of them
+    def _materialize(self, token):
+        entry = self._encoded.get(token)
+        if entry is None:
+            return
+        (ngram_size, block) = entry
+        self._partition[token] = {
+            'ngram_size': ngram_size,
+            'documentOccurrences': PartitionCodec.decode_block(block)
+        }
+        self._encoded.pop(token, None)
 
     ''' INDEX FUNCTIONALITY '''
     # adds token to index if not present, replaces oldest version if present
     def add_token(self, token, doc_id, lock_no, ngram_size, locations):
-        # set metadata appropriately
-        if token < self._starting_token or self._starting_token is None:
-            self._starting_token = token
-        if token > self._ending_token or self._ending_token is None:
-            self._ending_token = token
-        version_info = {'lockNo': lock_no, 'locations': locations}
+        self._update_range(token, token)
+        return self._add_postings(token, ngram_size,
+                                  [(doc_id, lock_no, locations)])
+
+    # adds postings grouped by token, the range metadata is updated once
+    # and each token is looked up once for the whole batch
+    def add_tokens(self, postings):
+        groups = {}
+        for (token, doc_id, lock_no, ngram_size, locations) in postings:
+            if token not in groups:
+                groups[token] = (ngram_size, [])
+            groups[token][1].append((doc_id, lock_no, locations))
+
+        outcomes = OrderedDict()
+        if not groups:
+            return outcomes
+        tokens = sorted(groups.keys())
+        self._update_range(tokens[0], tokens[-1])
+        for token in tokens:
+            (ngram_size, doc_postings) = groups[token]
+            outcomes[token] = self._add_postings(token, ngram_size,
+                                                 doc_postings)
+        return outcomes
+
+    # postings still encoded in the other partition are copied without
+    # decoding them
+    def merge_tokens(self, other, tokens):
+        tokens = sorted(tokens)
+        if not tokens:
+            return
+        self._update_range(tokens[0], tokens[-1])
+        for token in tokens:
+            entry = other._encoded.get(token)
+            if entry is not None and token not in self._partition and \
+                    token not in self._encoded:
+                self._encoded[token] = entry
+                self._size += 1
+                continue
+            token_info = other.get_token_info(token)
+            if token_info is not None:
+                self._merge_occurrences(token, token_info['ngram_size'],
+                                        token_info['documentOccurrences'])
+
+    # ids of encoded tokens are read without decoding their versions
+    def get_document_ids(self):
+        doc_ids = set()
+        for token_info in self._partition.values():
+            for info in token_info['documentOccurrences']:
+                doc_ids.add(info['documentID'])
+        for (ngram_size, block) in self._encoded.values():
+            doc_ids.update(PartitionCodec.decode_document_ids(block))
+        return doc_ids
+
+    # encoded postings are decoded without being kept, so counting leaves a
+    # partition shared through the partition cache as it was
+    def get_token_counts(self):
+        counts = {}
+        for (token, token_info) in self._partition.items():
+            if token_info['ngram_size'] == 1:
+                counts[token] = self._count_locations(
+                    token_info['documentOccurrences'])
+        for (token, (ngram_size, block)) in self._encoded.items():
+            if ngram_size == 1:
+                counts[token] = self._count_locations(
+                    PartitionCodec.decode_block(block))
+        return counts
+
+    # tokens that are unchanged stay encoded
+    def filter_postings(self, keep):
+        removed = []
+        for token in self.get_token_list():
+            entry = self._encoded.get(token)
+            if entry is not None:
+                ngram_size = entry[0]
+                occurrences = PartitionCodec.decode_block(entry[1])
+            else:
+                ngram_size = self._partition[token]['ngram_size']
+                occurrences = self._partition[token]['documentOccurrences']
+
+            kept = []
+            changed = False
+            for info in occurrences:
+                versions = keep(info['documentID'], info['versions'])
+                if len(versions) != len(info['versions']):
+                    changed = True
+                    removed.append((token, info['documentID'],
+                                    len(info['versions']) - len(versions),
+                                    len(versions) == 0))
+                if versions:
+                    kept.append({'documentID': info['documentID'],
+                                 'versions': versions})
+            if not changed:
+                continue
+
+            self._encoded.pop(token, None)
+            self._documents.pop(token, None)
+            if kept:
+                self._partition[token] = {'ngram_size': ngram_size,
+                                          'documentOccurrences': kept}
+            else:
+                self._partition.pop(token, None)
+                self._size -= 1
+
+        if removed:
+            tokens = self.get_token_list()
+            self._starting_token = min(tokens) if tokens else None
+            self._ending_token = max(tokens) if tokens else None
+        return removed
+
+    def _update_range(self, first_token, last_token):
+        if self._starting_token is None or first_token < self._starting_token:
+            self._starting_token = first_token
+        if self._ending_token is None or last_token > self._ending_token:
+            self._ending_token = last_token
+
+    # applies (doc_id, lock_no, locations) postings to a token, returns
+    # whether the token, a document or only versions were added
+    def _add_postings(self, token, ngram_size, postings):
+        if token in self._encoded:
+            self._materialize(token)
 
         # add token data to partition if not present
+        outcome = IndexPartition.VERSION_ADDED
         if token not in self._partition:
-            versions = [version_info]
-            doc_info = {'documentID': doc_id, 'versions': versions}
-            token_info = {'ngram_size': ngram_size,
-                          'documentOccurrences': [doc_info]}
-            self._partition[token] = token_info
+            self._partition[token] = {'ngram_size': ngram_size,
+                                      'documentOccurrences': []}
+            self._documents[token] = {}
             self._size += 1
-        # otherwise update the info for the token
-        else:
-            # find the document info for this token in the index
-            token_info = self._partition[token]
-            occurences = token_info['documentOccurrences']
-            doc_info = None
-            for info in occurences:
-                if info['documentID'] == doc_id:
-                    doc_info = info
-                    break
-
-            # if not present add it
+            outcome = IndexPartition.TOKEN_ADDED
+
+        occurrences = self._partition[token]['documentOccurrences']
+        documents = self._get_documents(token)
+        for (doc_id, lock_no, locations) in postings:
+            version_info = {'lockNo': lock_no, 'locations': locations}
+            doc_info = documents.get(doc_id)
+
+            # if the document is not present add it
             if doc_info is None:
-                versions = [version_info]
-                doc_info = {'documentID': doc_id, 'versions': versions}
-                self._partition[token]['documentOccurrences'].append(doc_info)
+                doc_info = {'documentID': doc_id, 'versions': [version_info]}
+                occurrences.append(doc_info)
+                documents[doc_id] = doc_info
+                if outcome == IndexPartition.VERSION_ADDED:
+                    outcome = IndexPartition.DOCUMENT_ADDED
             # otherwise update version info
             else:
                 versions = doc_info['versions']
@@ -121,3 +390,48 @@ class _IndexPartition(object):
                     versions[0] = version_info
                 else:
                     versions.insert(0, version_info)
+        return outcome
+
+    # merges the document occurrences of a token from another partition,
+    # versions are kept newest first
+    def _merge_occurrences(self, token, ngram_size, other_occurrences):
+        if token in self._encoded:
+            self._materialize(token)
+        if token not in self._partition:
+            self._partition[token] = {'ngram_size': ngram_size,
+                                      'documentOccurrences': []}
+            self._documents[token] = {}
+            self._size += 1
+
+        occurrences = self._partition[token]['documentOccurrences']
+        documents = self._get_documents(token)
+        for info in other_occurrences:
+            doc_info = documents.get(info['documentID'])
+            if doc_info is None:
+                doc_info = {'documentID': info['documentID'],
+                            'versions': list(info['versions'])}
+                occurrences.append(doc_info)
+                documents[info['documentID']] = doc_info
+                continue
+            versions = dict((version['lockNo'], version) for version in
+                            info['versions'] + doc_info['versions'])
+            doc_info['versions'] = sorted(versions.values(),
+                                          key=lambda v: v['lockNo'],
+                                          reverse=True)[:2]
+
+    # counts the locations of the newest version of every document
+    def _count_locations(self, occurrences):
+        count = 0
+        for doc in occurrences:
+            count += len(doc['versions'][0]['locations'])
+        return count
+
+    # returns the doc id -> document info dictionary of the token
+    def _get_documents(self, token):
+        documents = self._documents.get(token)
+        if documents is None:
+            documents = {}
+            for info in self._partition[token]['documentOccurrences']:
+                documents[info['documentID']] = info
+            self._documents[token] = documents
+        return documents
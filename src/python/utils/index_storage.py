@@ -1,47 +1,210 @@
-import boto3
 import json
+import shutil
 
+from aws_clients import AwsClients
+from config import Config
 from index_partition import IndexPartition
+from partition_cache import PartitionCache
+from partition_codec import PartitionCodec
 
 
 class IndexStorage(object):
     '''
     This class is responsible for interacting with the index partition storage
     solution (in this case S3). It retrieves, stores, and creates partitions.
+    Partitions are cached locally by storage key, since a storage key is
+    never rewritten once its partition has been written.
     '''
 
     INDEX_STORAGE = 'lspt-index-partitions'
 
-    def __init__(self):
-        self._index_storage = boto3.client('s3')
+    # error codes returned when a storage key does not exist
+    MISSING_PARTITION = ['NoSuchKey', '404']
 
+    def __init__(self, cache=None):
+        self._index_storage = AwsClients.client('s3')
+        if cache is None:
+            cache = PartitionCache()
+        self._cache = cache
+
+    # downloads the partition if it is not cached, returns the local path
     def get_partition(self, partition_uri):
-        local_path = partition_uri
+        local_path = self._cache.get_file(partition_uri)
+        if local_path is not None:
+            return local_path
+        local_path = self._cache.get_path(partition_uri)
         try:
+            self._cache.record_miss()
             self._index_storage.download_file(self.INDEX_STORAGE,
                                               partition_uri + '.pkl',
                                               local_path)
+            self._cache.add_file(partition_uri)
             return local_path
         except Exception as ex:
             print ("ERROR: Partition {0} not found in storage"
                    .format(partition_uri))
             raise ex
 
+    # returns the deserialized partition, shared with other readers unless
+    # it is loaded for update, in which case the caller owns the object
+    def load_partition(self, partition_uri, for_update=False):
+        partition = self._cache.get_partition(partition_uri, for_update)
+        if partition is not None:
+            return partition
+        partition = self._read_partition(partition_uri)
+        if not for_update:
+            self._cache.add_partition(partition_uri, partition)
+        return partition
+
+    # deserializes the partition straight from the response stream,
+    # partitions over Config.PARTITION_SPILL_BYTES are spilled to the cache
+    # directory and read from there
+    def _read_partition(self, partition_uri):
+        partition = IndexPartition()
+        local_path = self._cache.get_file(partition_uri)
+        if local_path is not None:
+            partition.deserialize(local_path)
+            return partition
+        try:
+            self._cache.record_miss()
+            res = self._index_storage.get_object(
+                Bucket=self.INDEX_STORAGE,
+                Key=partition_uri + '.pkl'
+            )
+            if res['ContentLength'] <= Config.PARTITION_SPILL_BYTES:
+                partition.loads(res['Body'].read())
+                return partition
+
+            local_path = self._cache.get_path(partition_uri)
+            with open(local_path, 'wb') as out_file:
+                shutil.copyfileobj(res['Body'], out_file,
+                                   Config.PARTITION_STREAM_CHUNK_SIZE)
+            self._cache.add_file(partition_uri)
+        except Exception as ex:
+            print ("ERROR: Partition {0} not found in storage"
+                   .format(partition_uri))
+            raise ex
+        partition.deserialize(local_path)
+        return partition
+
+    # caches a partition that was written under partition_uri, it must not
+    # be modified afterwards
+    def cache_partition(self, partition_uri, partition):
+        self._cache.add_partition(partition_uri, partition)
+
+    def get_cache_stats(self):
+        return self._cache.get_stats()
+
+    # reads only the header & the postings of the requested tokens with
+    # ranged GETs, returns a token -> token info dictionary
+    def lookup_tokens(self, partition_uri, tokens):
+        # cached partitions are read locally
+        partition = self._cache.get_partition(partition_uri)
+        if partition is not None:
+            return partition.get_token_infos(tokens)
+        local_path = self._cache.get_file(partition_uri)
+        if local_path is not None:
+            return IndexPartition().lookup(local_path, tokens)
+
+        key = partition_uri + '.pkl'
+        try:
+            data = self._get_range(key, 0, Config.PARTITION_HEADER_READ_SIZE)
+            if not PartitionCodec.is_encoded(data):
+                # pickled partitions have to be fully loaded
+                return self.load_partition(partition_uri).get_token_infos(
+                    tokens)
+
+            header_length = PartitionCodec.header_length(data)
+            if header_length > len(data):
+                data += self._get_range(key, len(data), header_length)
+            (directory, postings_start) = PartitionCodec.decode_directory(data)
+            version = PartitionCodec.format_version(data)
+
+            # fetch postings blocks, merging blocks that are close together
+            wanted = set(tokens)
+            gap = Config.PARTITION_RANGE_GAP
+            ranges = []
+            for (token, ngram_size, offset, length) in directory:
+                if token not in wanted:
+                    continue
+                start = postings_start + offset
+                if ranges and start - ranges[-1][1] <= gap:
+                    ranges[-1][1] = start + length
+                    ranges[-1][2].append((token, ngram_size, start, length))
+                else:
+                    ranges.append([start, start + length,
+                                   [(token, ngram_size, start, length)]])
+
+            found = {}
+            for (start, end, entries) in ranges:
+                # postings already covered by the header read are reused
+                if end <= len(data):
+                    block = data[start:end]
+                else:
+                    block = self._get_range(key, start, end)
+                for (token, ngram_size, offset, length) in entries:
+                    offset -= start
+                    found[token] = {
+                        PartitionCodec.NGRAM_SIZE: ngram_size,
+                        PartitionCodec.OCCURRENCES:
+                            PartitionCodec.decode_block(
+                                block[offset:offset + length], version)
+                    }
+            return found
+        except Exception as ex:
+            print ("ERROR: Failed to look up tokens in partition {0}"
+                   .format(partition_uri))
+            raise ex
+
+    # reads bytes [start, end) of an object, fewer if the object is shorter
+    def _get_range(self, key, start, end):
+        res = self._index_storage.get_object(
+            Bucket=self.INDEX_STORAGE,
+            Key=key,
+            Range='bytes={0}-{1}'.format(start, end - 1)
+        )
+        return res['Body'].read()
+
+    # uploads the encoded partition from memory, partitions over
+    # Config.PARTITION_SPILL_BYTES are spilled to the cache directory and
+    # uploaded from there
     def write_partition(self, partition_uri, partition):
-        partition_uri += '.pkl'
         try:
-            partition.serialize(partition_uri)
-            payload = open(partition_uri, 'rb')
-            res = self._index_storage.put_object(Bucket=self.INDEX_STORAGE,
-                                                 Body=payload)
+            data = partition.dumps()
+            if len(data) <= Config.PARTITION_SPILL_BYTES:
+                self._index_storage.put_object(
+                    Bucket=self.INDEX_STORAGE,
+                    Key=partition_uri + '.pkl',
+                    Body=data)
+                return True
+
+            local_path = self._cache.get_path(partition_uri)
+            with open(local_path, 'wb') as out_file:
+                out_file.write(data)
+            del data
+            with open(local_path, 'rb') as payload:
+                self._index_storage.put_object(
+                    Bucket=self.INDEX_STORAGE,
+                    Key=partition_uri + '.pkl',
+                    Body=payload)
+            self._cache.add_file(partition_uri)
             return True
         except Exception as ex:
             print ("ERROR: Failed to write partition {0} to storage."
                    .format(partition_uri))
             raise ex
 
+    # True if the exception is a read of a storage key that doesn't exist,
+    # e.g. one replaced & deleted by another writer after it was looked up
+    @classmethod
+    def is_missing_partition(cls, ex):
+        if not hasattr(ex, 'response'):
+            return False
+        return (ex.response.get('Error', {}).get('Code') in
+                cls.MISSING_PARTITION)
+
     def delete_partition(self, partition_uri):
-        partition_uri = partition_uri
+        self._cache.remove(partition_uri)
         partition_uri += '.pkl'
         try:
             self._index_storage.delete_object(
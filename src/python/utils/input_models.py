@@ -71,3 +71,41 @@ class WriteInputModel(object):
 
     def parse_from_request(self, req):
         self._info = req
+
+
+class SearchInputModel(object):
+    '''
+    This class implements the data model & functions for parsing an
+    input request into an input object for the search service. This
+    class initializes and retrieves input information from the request.
+    '''
+
+    # Attributes
+    TOKENS = 'tokens'
+
+    # Assign Valid Fields
+    VALID_FIELDS = [TOKENS]
+
+    def __init__(self):
+        self._info = {}
+        self._valid_fields = Set(self.VALID_FIELDS)
+
+    # tokens are matched in lower case, the same way they are written
+    def get_tokens(self):
+        tokens = []
+        for token in self._info[self.TOKENS]:
+            token = token.lower()
+            if token not in tokens:
+                tokens.append(token)
+        return tokens
+
+    def verify(self):
+        if Set(self._info.keys()) != self._valid_fields:
+            return False
+        for token in self._info[self.TOKENS]:
+            if not isinstance(token, basestring):
+                return False
+        return True
+
+    def parse_from_request(self, req):
+        self._info = req
@@ -1,36 +1,75 @@
-import boto3
+from collections import OrderedDict
 import uuid
 import json
 import base64
+import threading
+import time
+
+from aws_clients import AwsClients
+from backoff import Backoff
+from config import Config
 
 
 class Kinesis(object):
     '''
     This class is responsible for dispatching tasks to worker threads. This
     implementation wraps kinesis to post records to the stream provided at
-    initialization. It also parses data from b64 strings back to python
-    dictionaries.
+    initialization. Small tasks are aggregated into a single record, records
+    are sent in requests within the kinesis limits and records that fail are
+    retried with jittered exponential backoff. It also parses data from b64
+    strings back to python dictionaries.
     '''
 
-    def __init__(self, stream_name):
+    # put_records limits
+    MAX_REQUEST_RECORDS = 500
+    MAX_REQUEST_BYTES = 5 * 1024 * 1024
+    MAX_RECORD_BYTES = 1024 * 1024
+
+    def __init__(self, stream_name, aggregate_bytes=None):
         self._stream_name = stream_name
-        self._kinesis = boto3.client('kinesis')
+        self._kinesis = AwsClients.client('kinesis')
+        if aggregate_bytes is None:
+            aggregate_bytes = Config.KINESIS_AGGREGATE_BYTES
+        self._aggregate_bytes = aggregate_bytes
+        self._stats_lock = threading.Lock()
+        self._stats = {
+            'tasks': 0,
+            'records': 0,
+            'requests': 0,
+            'retries': 0,
+            'bytes': 0,
+            'seconds': 0.0
+        }
 
-    # post records to kinesis stream
-    def dispatch_tasks(self, task_list):
-        records = []
-        for task in task_list:
-            records.append({
-                'PartitionKey': str(uuid.uuid4()),
-                'Data': json.dumps(task.get_payload())
-            })
-        try:
-            self._kinesis.put_records(
-                Records=records, StreamName=self._stream_name
-            )
-        except Exception as ex:
-            print "ERROR: Failed to put records to kinesis stream."
-            raise ex
+    # post records to kinesis stream. Tasks are grouped by group_key(task)
+    # if provided, a record only holds tasks of one group and is sent with
+    # the group as its partition key so the group is read by one shard
+    def dispatch_tasks(self, task_list, group_key=None):
+        start = time.time()
+        if group_key is None:
+            records = self._aggregate_records(task_list)
+        else:
+            groups = OrderedDict()
+            for task in task_list:
+                groups.setdefault(group_key(task), []).append(task)
+            records = []
+            for (key, tasks) in groups.items():
+                records.extend(self._aggregate_records(tasks, key))
+        requests = 0
+        retries = 0
+        for batch in self._batch_records(records):
+            (batch_requests, batch_retries) = self._put_records(batch)
+            requests += batch_requests
+            retries += batch_retries
+
+        with self._stats_lock:
+            self._stats['tasks'] += len(task_list)
+            self._stats['records'] += len(records)
+            self._stats['requests'] += requests
+            self._stats['retries'] += retries
+            self._stats['bytes'] += sum(len(r['Data']) for r in records)
+            self._stats['seconds'] += time.time() - start
+        return True
 
     # parse a list of tasks (dictionaries) from kinesis Records
     def parse_tasks_from_records(self, records):
@@ -38,5 +77,101 @@ class Kinesis(object):
         for record in records:
             b64_string = record['kinesis']['data']
             json_payload = base64.b64decode(b64_string)
-            tasks.append(json.loads(json_payload))
+            payload = json.loads(json_payload)
+            # aggregated records hold a list of tasks
+            if isinstance(payload, list):
+                tasks.extend(payload)
+            else:
+                tasks.append(payload)
         return tasks
+
+    # returns dispatch counters, throughput & the records retried
+    def get_stats(self):
+        with self._stats_lock:
+            stats = dict(self._stats)
+        stats['tasksPerSecond'] = (stats['tasks'] / stats['seconds']
+                                   if stats['seconds'] > 0 else 0.0)
+        return stats
+
+    # packs task payloads into records of at most aggregate_bytes, a task
+    # larger than the budget gets a record of its own. Records get a random
+    # partition key unless one is provided
+    def _aggregate_records(self, task_list, partition_key=None):
+        records = []
+        pending = []
+        # an aggregated record is '[' + payloads joined by ',' + ']'
+        pending_bytes = 1
+        for task in task_list:
+            payload = json.dumps(task.get_payload())
+            if len(payload) + 2 > self.MAX_RECORD_BYTES:
+                print "ERROR: Task exceeds the kinesis record size limit."
+                raise Exception("Task too large for a kinesis record.")
+            if pending and (pending_bytes + len(payload) + 1 >
+                            self._aggregate_bytes):
+                records.append(self._new_record(pending, partition_key))
+                pending = []
+                pending_bytes = 1
+            pending.append(payload)
+            pending_bytes += len(payload) + 1
+        if pending:
+            records.append(self._new_record(pending, partition_key))
+        return records
+
+    def _new_record(self, payloads, partition_key=None):
+        if len(payloads) == 1:
+            data = payloads[0]
+        else:
+            data = '[' + ','.join(payloads) + ']'
+        return {
+            'PartitionKey': partition_key or str(uuid.uuid4()),
+            'Data': data
+        }
+
+    # splits records into put_records requests within the request limits
+    def _batch_records(self, records):
+        batches = []
+        batch = []
+        batch_bytes = 0
+        for record in records:
+            size = len(record['Data']) + len(record['PartitionKey'])
+            if batch and (len(batch) == self.MAX_REQUEST_RECORDS or
+                          batch_bytes + size > self.MAX_REQUEST_BYTES):
+                batches.append(batch)
+                batch = []
+                batch_bytes = 0
+            batch.append(record)
+            batch_bytes += size
+        if batch:
+            batches.append(batch)
+        return batches
+
+    # puts a batch of records, retrying only the records that failed,
+    # returns the number of requests made & records retried
+    def _put_records(self, records):
+        requests = 0
+        retries = 0
+        attempt = 0
+        while True:
+            try:
+                res = self._kinesis.put_records(
+                    Records=records, StreamName=self._stream_name
+                )
+            except Exception as ex:
+                print "ERROR: Failed to put records to kinesis stream."
+                raise ex
+            requests += 1
+            if res.get('FailedRecordCount', 0) == 0:
+                return (requests, retries)
+
+            # responses are in request order, failed entries have an
+            # ErrorCode instead of a SequenceNumber
+            records = [record for (record, entry) in
+                       zip(records, res['Records']) if 'ErrorCode' in entry]
+            if attempt >= Config.KINESIS_MAX_RETRIES:
+                print ("ERROR: Failed to put {0} records to kinesis stream."
+                       .format(len(records)))
+                raise Exception("Kinesis records failed after retries.")
+            retries += len(records)
+            Backoff.sleep(attempt, Config.KINESIS_BACKOFF_BASE,
+                          Config.KINESIS_BACKOFF_MAX)
+            attempt += 1
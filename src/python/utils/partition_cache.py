@@ -0,0 +1,132 @@
+import os
+import threading
+from collections import OrderedDict
+
+from config import Config
+
+
+class PartitionCache(object):
+    '''
+    This class caches partitions by storage key, both as files on local
+    disk and as deserialized IndexPartition objects in memory. Writers never
+    rewrite a storage key in place, so the bytes behind a key never change
+    and cached copies never need to be invalidated, only evicted. Both
+    levels evict the least recently used partitions, the disk level once
+    its total size exceeds the disk budget and the memory level once it
+    holds more partitions than the memory budget.
+    '''
+
+    def __init__(self, directory=None, max_disk_bytes=None,
+                 max_memory_partitions=None):
+        if directory is None:
+            directory = os.path.join(Config.FILE_DIRECTORY,
+                                     Config.PARTITION_CACHE_DIRECTORY)
+        if max_disk_bytes is None:
+            max_disk_bytes = Config.PARTITION_CACHE_DISK_BYTES
+        if max_memory_partitions is None:
+            max_memory_partitions = Config.PARTITION_CACHE_MEMORY_PARTITIONS
+        self._directory = directory
+        self._max_disk_bytes = max_disk_bytes
+        self._max_memory_partitions = max_memory_partitions
+        self._files = OrderedDict()
+        self._disk_bytes = 0
+        self._partitions = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {
+            'memoryHits': 0,
+            'diskHits': 0,
+            'misses': 0,
+            'evictions': 0
+        }
+        self._load_directory()
+
+    # files left by an earlier invocation in the same container are reused
+    def _load_directory(self):
+        if not os.path.isdir(self._directory):
+            os.makedirs(self._directory)
+            return
+        paths = []
+        for fname in os.listdir(self._directory):
+            path = os.path.join(self._directory, fname)
+            paths.append((os.path.getmtime(path), fname, path))
+        for (mtime, fname, path) in sorted(paths):
+            size = os.path.getsize(path)
+            self._files[fname] = size
+            self._disk_bytes += size
+        self._evict_files()
+
+    # returns the local path a partition is (or will be) cached at
+    def get_path(self, storage_key):
+        return os.path.join(self._directory, storage_key)
+
+    # returns the cached file path for the key, None if not cached
+    def get_file(self, storage_key):
+        with self._lock:
+            if storage_key not in self._files:
+                return None
+            self._files[storage_key] = self._files.pop(storage_key)
+            self._stats['diskHits'] += 1
+            return self.get_path(storage_key)
+
+    # registers a file written to get_path(storage_key)
+    def add_file(self, storage_key):
+        size = os.path.getsize(self.get_path(storage_key))
+        with self._lock:
+            if storage_key in self._files:
+                self._disk_bytes -= self._files.pop(storage_key)
+            self._files[storage_key] = size
+            self._disk_bytes += size
+            self._evict_files()
+
+    # returns the cached partition for the key, None if not cached,
+    # the partition is removed from the cache if it is taken for update
+    def get_partition(self, storage_key, for_update=False):
+        with self._lock:
+            if storage_key not in self._partitions:
+                return None
+            partition = self._partitions.pop(storage_key)
+            if not for_update:
+                self._partitions[storage_key] = partition
+            self._stats['memoryHits'] += 1
+            return partition
+
+    def add_partition(self, storage_key, partition):
+        with self._lock:
+            self._partitions.pop(storage_key, None)
+            self._partitions[storage_key] = partition
+            while len(self._partitions) > self._max_memory_partitions:
+                self._partitions.popitem(last=False)
+                self._stats['evictions'] += 1
+
+    def record_miss(self):
+        with self._lock:
+            self._stats['misses'] += 1
+
+    # drops the key from both levels & removes the cached file
+    def remove(self, storage_key):
+        with self._lock:
+            self._partitions.pop(storage_key, None)
+            if storage_key in self._files:
+                self._disk_bytes -= self._files.pop(storage_key)
+                self._remove_file(storage_key)
+
+    def get_stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats['diskBytes'] = self._disk_bytes
+            stats['diskPartitions'] = len(self._files)
+            stats['memoryPartitions'] = len(self._partitions)
+            return stats
+
+    def _evict_files(self):
+        while self._disk_bytes > self._max_disk_bytes and self._files:
+            (storage_key, size) = self._files.popitem(last=False)
+            self._disk_bytes -= size
+            self._remove_file(storage_key)
+            self._stats['evictions'] += 1
+
+    def _remove_file(self, storage_key):
+        try:
+            os.remove(self.get_path(storage_key))
+        except OSError:
+            pass
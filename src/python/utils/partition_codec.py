@@ -0,0 +1,384 @@
+import struct
+import zlib
+
+from config import Config
+
+
+class PartitionCodec(object):
+    '''
+    This class encodes index partition token data to, and decodes it from,
+    the compact binary partition format. A partition is stored as a fixed
+    preamble, a token directory sorted by token, and a postings section with
+    one contiguous block per token. Each postings block starts with its
+    block codec, followed by the document ids and variable-byte integer
+    arrays for version counts, lock numbers, location counts and locations.
+    Lock numbers & locations are delta encoded, and blocks can be zlib
+    compressed.
+    '''
+
+    MAGIC = 'SIXP'
+    FORMAT_VERSION = 2
+
+    # magic, format version, flags, directory length, token count
+    PREAMBLE = struct.Struct('<4sHHII')
+
+    # token length is followed by the token, then ngram size, postings
+    # offset & postings length
+    TOKEN_LENGTH = struct.Struct('<H')
+    TOKEN_ENTRY = struct.Struct('<HII')
+
+    # format version 1 postings blocks start with their document count
+    DOC_COUNT = struct.Struct('<I')
+
+    # postings block codecs, stored in the first byte of every block so
+    # that blocks can be copied between partitions as is
+    RAW_BLOCK = '\x00'
+    ZLIB_BLOCK = '\x01'
+
+    # token info fields, these match the in-memory partition layout
+    NGRAM_SIZE = 'ngram_size'
+    OCCURRENCES = 'documentOccurrences'
+    DOCUMENT_ID = 'documentID'
+    VERSIONS = 'versions'
+    LOCK_NO = 'lockNo'
+    LOCATIONS = 'locations'
+
+    # returns True if the data is in the binary partition format
+    @classmethod
+    def is_encoded(cls, data):
+        return data[:len(cls.MAGIC)] == cls.MAGIC
+
+    # returns the format version of encoded data, data only needs to hold
+    # the preamble
+    @classmethod
+    def format_version(cls, data):
+        (magic, version, flags, directory_length,
+         token_count) = cls.PREAMBLE.unpack_from(data, 0)
+        return version
+
+    # encodes a token -> token info dictionary, tokens that are still
+    # encoded can be passed as a token -> (ngram size, postings block)
+    # dictionary and their postings are copied without being decoded.
+    # Blocks are compressed at compression_level, 0 disables compression
+    # and None uses Config.PARTITION_COMPRESSION_LEVEL
+    @classmethod
+    def encode(cls, tokens, encoded_tokens=None, compression_level=None):
+        entries = []
+        for (token, token_info) in tokens.iteritems():
+            block = cls.encode_postings(token_info[cls.OCCURRENCES],
+                                        compression_level)
+            entries.append((_to_bytes(token), token_info[cls.NGRAM_SIZE],
+                            block))
+        if encoded_tokens is not None:
+            for (token, (ngram_size, block)) in encoded_tokens.iteritems():
+                entries.append((_to_bytes(token), ngram_size, block))
+        entries.sort()
+
+        directory = []
+        offset = 0
+        for (token, ngram_size, block) in entries:
+            directory.append(cls.TOKEN_LENGTH.pack(len(token)))
+            directory.append(token)
+            directory.append(cls.TOKEN_ENTRY.pack(ngram_size, offset,
+                                                  len(block)))
+            offset += len(block)
+
+        directory = ''.join(directory)
+        preamble = cls.PREAMBLE.pack(cls.MAGIC, cls.FORMAT_VERSION, 0,
+                                     len(directory), len(entries))
+        return ''.join([preamble, directory] +
+                       [entry[2] for entry in entries])
+
+    # decodes data into a token -> token info dictionary
+    @classmethod
+    def decode(cls, data):
+        tokens = {}
+        for (token, ngram_size, block) in cls.decode_blocks(data):
+            tokens[token] = {
+                cls.NGRAM_SIZE: ngram_size,
+                cls.OCCURRENCES: cls.decode_block(block)
+            }
+        return tokens
+
+    # splits data into a sorted list of (token, ngram size, postings block)
+    # without decoding any postings, blocks of older format versions are
+    # converted to the current format
+    @classmethod
+    def decode_blocks(cls, data):
+        (directory, postings_start) = cls.decode_directory(data)
+        version = cls.format_version(data)
+        blocks = []
+        for (token, ngram_size, offset, length) in directory:
+            start = postings_start + offset
+            block = data[start:start + length]
+            if version != cls.FORMAT_VERSION:
+                block = cls.encode_postings(cls.decode_block(block, version))
+            blocks.append((token, ngram_size, block))
+        return blocks
+
+    # decodes only the postings of the requested tokens, returns a
+    # token -> token info dictionary for the tokens present in the partition
+    @classmethod
+    def lookup(cls, data, tokens):
+        (directory, postings_start) = cls.decode_directory(data)
+        version = cls.format_version(data)
+        entries = {}
+        for (token, ngram_size, offset, length) in directory:
+            entries[token] = (ngram_size, offset, length)
+
+        found = {}
+        for token in tokens:
+            if token not in entries:
+                continue
+            (ngram_size, offset, length) = entries[token]
+            start = postings_start + offset
+            found[token] = {
+                cls.NGRAM_SIZE: ngram_size,
+                cls.OCCURRENCES: cls.decode_block(data[start:start + length],
+                                                  version)
+            }
+        return found
+
+    # returns the size of the preamble & token directory, data only needs
+    # to hold the preamble
+    @classmethod
+    def header_length(cls, data):
+        (magic, version, flags, directory_length,
+         token_count) = cls.PREAMBLE.unpack_from(data, 0)
+        return cls.PREAMBLE.size + directory_length
+
+    # decodes the token directory, returns the list of
+    # (token, ngram size, offset, length) entries and where postings start,
+    # data only needs to hold the preamble & the directory
+    @classmethod
+    def decode_directory(cls, data):
+        (magic, version, flags, directory_length,
+         token_count) = cls.PREAMBLE.unpack_from(data, 0)
+        if magic != cls.MAGIC:
+            raise Exception("Data is not an encoded partition")
+        if version < 1 or version > cls.FORMAT_VERSION:
+            raise Exception("Unsupported partition format version: {0}"
+                            .format(version))
+
+        directory = []
+        pos = cls.PREAMBLE.size
+        for i in xrange(token_count):
+            (length,) = cls.TOKEN_LENGTH.unpack_from(data, pos)
+            pos += cls.TOKEN_LENGTH.size
+            token = data[pos:pos + length].decode('utf-8')
+            pos += length
+            (ngram_size, offset,
+             block_length) = cls.TOKEN_ENTRY.unpack_from(data, pos)
+            pos += cls.TOKEN_ENTRY.size
+            directory.append((token, ngram_size, offset, block_length))
+        return (directory, cls.PREAMBLE.size + directory_length)
+
+    # encodes the document occurrences of a single token, the block is
+    # compressed if that makes it smaller
+    @classmethod
+    def encode_postings(cls, occurrences, compression_level=None):
+        doc_ids = []
+        version_counts = []
+        lock_nos = []
+        location_counts = []
+        locations = []
+        for doc_info in occurrences:
+            doc_ids.append(_to_bytes(doc_info[cls.DOCUMENT_ID]))
+            versions = doc_info[cls.VERSIONS]
+            version_counts.append(len(versions))
+            for version in versions:
+                lock_nos.append(version[cls.LOCK_NO])
+                version_locations = version[cls.LOCATIONS]
+                location_counts.append(len(version_locations))
+                # locations are delta encoded within each version
+                previous = 0
+                for location in version_locations:
+                    locations.append(_zigzag(location - previous))
+                    previous = location
+
+        # lock numbers are delta encoded across the block
+        lock_deltas = []
+        previous = 0
+        for lock_no in lock_nos:
+            lock_deltas.append(_zigzag(lock_no - previous))
+            previous = lock_no
+
+        header = bytearray()
+        _write_varints(header, [len(doc_ids)])
+        _write_varints(header, [len(d) for d in doc_ids])
+        counts = bytearray()
+        _write_varints(counts, version_counts)
+        _write_varints(counts, lock_deltas)
+        _write_varints(counts, location_counts)
+        _write_varints(counts, locations)
+        payload = ''.join([str(header), ''.join(doc_ids), str(counts)])
+
+        if compression_level is None:
+            compression_level = Config.PARTITION_COMPRESSION_LEVEL
+        if compression_level > 0:
+            compressed = zlib.compress(payload, compression_level)
+            if len(compressed) < len(payload):
+                return cls.ZLIB_BLOCK + compressed
+        return cls.RAW_BLOCK + payload
+
+    # decodes a postings block of the given format version into document
+    # occurrences
+    @classmethod
+    def decode_block(cls, block, version=None):
+        if version is not None and version != cls.FORMAT_VERSION:
+            return _decode_v1_postings(block)
+        data = cls._block_payload(block)
+        (doc_ids, pos) = _read_doc_ids(data)
+        doc_count = len(doc_ids)
+        # the rest of the block is version counts, lock numbers, location
+        # counts & locations
+        values = _read_varints(data, pos, None)[0]
+        version_counts = values[:doc_count]
+        total_versions = sum(version_counts)
+        lock_deltas = values[doc_count:doc_count + total_versions]
+        location_counts = values[doc_count + total_versions:
+                                 doc_count + 2 * total_versions]
+        location_idx = doc_count + 2 * total_versions
+
+        occurrences = []
+        version_idx = 0
+        lock_no = 0
+        for (doc_id, version_count) in zip(doc_ids, version_counts):
+            versions = []
+            for i in xrange(version_count):
+                delta = lock_deltas[version_idx]
+                lock_no += (delta >> 1) ^ -(delta & 1)
+                locations = []
+                location = 0
+                location_end = location_idx + location_counts[version_idx]
+                for delta in values[location_idx:location_end]:
+                    location += (delta >> 1) ^ -(delta & 1)
+                    locations.append(location)
+                versions.append({
+                    cls.LOCK_NO: lock_no,
+                    cls.LOCATIONS: locations
+                })
+                location_idx = location_end
+                version_idx += 1
+            occurrences.append({cls.DOCUMENT_ID: doc_id,
+                                cls.VERSIONS: versions})
+        return occurrences
+
+    # decodes only the document ids of a postings block, which are stored
+    # ahead of the versions
+    @classmethod
+    def decode_document_ids(cls, block, version=None):
+        if version is not None and version != cls.FORMAT_VERSION:
+            return [doc_info[cls.DOCUMENT_ID]
+                    for doc_info in _decode_v1_postings(block)]
+        return _read_doc_ids(cls._block_payload(block))[0]
+
+    @classmethod
+    def _block_payload(cls, block):
+        codec = block[:1]
+        if codec == cls.ZLIB_BLOCK:
+            return bytearray(zlib.decompress(block[1:]))
+        elif codec == cls.RAW_BLOCK:
+            return bytearray(block[1:])
+        raise Exception("Unknown postings block codec")
+
+
+# reads the document ids at the start of a block payload, returns the ids
+# & the position after them
+def _read_doc_ids(data):
+    ((doc_count,), pos) = _read_varints(data, 0, 1)
+    (id_lengths, pos) = _read_varints(data, pos, doc_count)
+    doc_ids = []
+    for length in id_lengths:
+        doc_ids.append(str(data[pos:pos + length]).decode('utf-8'))
+        pos += length
+    return (doc_ids, pos)
+
+
+def _to_bytes(value):
+    if isinstance(value, unicode):
+        return value.encode('utf-8')
+    return str(value)
+
+
+def _zigzag(value):
+    if value >= 0:
+        return value << 1
+    return ((-value) << 1) - 1
+
+
+def _write_varints(out, values):
+    for value in values:
+        while value > 0x7f:
+            out.append((value & 0x7f) | 0x80)
+            value >>= 7
+        out.append(value)
+
+
+# reads count varints, or every varint up to the end of data if count is
+# None, returns the values & the position after them
+def _read_varints(data, pos, count):
+    values = []
+    append = values.append
+    if count is None:
+        count = len(data)
+    end = len(data)
+    for i in xrange(count):
+        if pos >= end:
+            break
+        byte = data[pos]
+        pos += 1
+        if byte < 0x80:
+            append(byte)
+            continue
+        value = byte & 0x7f
+        shift = 7
+        while True:
+            byte = data[pos]
+            pos += 1
+            value |= (byte & 0x7f) << shift
+            if byte < 0x80:
+                break
+            shift += 7
+        append(value)
+    return (values, pos)
+
+
+# format version 1 postings blocks hold the document ids followed by
+# fixed width integer arrays
+def _decode_v1_postings(data):
+    (doc_count,) = PartitionCodec.DOC_COUNT.unpack_from(data, 0)
+    pos = PartitionCodec.DOC_COUNT.size
+    (id_lengths, pos) = _unpack('H', doc_count, data, pos)
+    doc_ids = []
+    for length in id_lengths:
+        doc_ids.append(data[pos:pos + length].decode('utf-8'))
+        pos += length
+    (version_counts, pos) = _unpack('B', doc_count, data, pos)
+    total_versions = sum(version_counts)
+    (lock_nos, pos) = _unpack('I', total_versions, data, pos)
+    (location_counts, pos) = _unpack('I', total_versions, data, pos)
+    (locations, pos) = _unpack('I', sum(location_counts), data, pos)
+
+    occurrences = []
+    version_idx = 0
+    location_idx = 0
+    for (doc_id, version_count) in zip(doc_ids, version_counts):
+        versions = []
+        for i in xrange(version_count):
+            location_end = location_idx + location_counts[version_idx]
+            versions.append({
+                PartitionCodec.LOCK_NO: lock_nos[version_idx],
+                PartitionCodec.LOCATIONS: list(locations[location_idx:
+                                                         location_end])
+            })
+            location_idx = location_end
+            version_idx += 1
+        occurrences.append({PartitionCodec.DOCUMENT_ID: doc_id,
+                            PartitionCodec.VERSIONS: versions})
+    return occurrences
+
+
+def _unpack(type_code, count, data, pos):
+    fmt = struct.Struct('<{0}{1}'.format(count, type_code))
+    return (fmt.unpack_from(data, pos), pos + fmt.size)
@@ -0,0 +1,124 @@
+import bisect
+
+from config import Config
+from index_model import IndexModel
+
+
+class PartitionRouter(object):
+    '''
+    This class resolves tokens to index partitions using an in-memory
+    snapshot of the INDEX_PARTITION_METADATA table. The snapshot is loaded
+    with a single scan, or only for the token buckets of the tokens about
+    to be routed, and kept as a list of token ranges sorted by starting
+    token, so each lookup is a binary search instead of a table scan.
+    '''
+
+    def __init__(self, index_controller):
+        self._index_controller = index_controller
+        self._ranges = []
+        self._starts = []
+        self._max_ends = []
+        self._loaded = False
+
+    # load the partition ranges, only reads the metadata table once
+    def load(self, tokens=None):
+        if not self._loaded:
+            self.refresh(tokens)
+        return self
+
+    # rebuild the range snapshot from the metadata table, only from the
+    # partitions the tokens might be in if any are given. Only those tokens
+    # can then be routed
+    def refresh(self, tokens=None):
+        if tokens is None:
+            items = self._index_controller.get_partition_ranges()
+        else:
+            items = self._index_controller.get_partition_ranges_for_tokens(
+                tokens)
+        ranges = []
+        for item in items:
+            ranges.append((item[IndexModel.START_TOKEN],
+                           item[IndexModel.END_TOKEN],
+                           int(item[IndexModel.SIZE]),
+                           item[IndexModel.PKEY],
+                           item.get(IndexModel.STORAGE_KEY)))
+        ranges.sort()
+
+        # running maximum of ending tokens lets lookups stop walking left
+        # as soon as no earlier range can still contain the token
+        max_ends = []
+        max_end = None
+        for (start, end, size, pkey, storage_key) in ranges:
+            if max_end is None or end > max_end:
+                max_end = end
+            max_ends.append(max_end)
+
+        self._ranges = ranges
+        self._starts = [r[0] for r in ranges]
+        self._max_ends = max_ends
+        self._loaded = True
+        return self
+
+    def partition_count(self):
+        return len(self._ranges)
+
+    # get the pkey of the one partition a token is written to: the smallest
+    # partition containing the token, preferring partitions under the max
+    # size. Tokens outside every range go to the partition before them
+    # (or the first partition), extending its range. '' if there are no
+    # partitions. Full partitions are split by the resize job
+    def get_partition_for_token(self, token):
+        candidates = self._candidates(token)
+        if not candidates:
+            return self._neighbour(token)
+
+        best = None
+        for candidate in candidates:
+            (start, end, size, pkey, storage_key) = candidate
+            if best is None:
+                best = candidate
+                continue
+            best_full = best[2] >= Config.INDEX_MAX_SIZE
+            full = size >= Config.INDEX_MAX_SIZE
+            # ties go to the smallest pkey, so every router snapshot picks
+            # the same partition whatever order the table was read in
+            if (best_full and not full) or \
+                    (best_full == full and (size, pkey) <
+                     (best[2], best[3])):
+                best = candidate
+        return best[3]
+
+    # get (pkey, storage key) pairs for every partition the token falls in
+    def get_partitions_for_token(self, token):
+        partitions = []
+        for (start, end, size, pkey, storage_key) in self._candidates(token):
+            partitions.append((pkey, storage_key))
+        partitions.reverse()
+        return partitions
+
+    # ranges containing the token, in descending starting token order
+    def _candidates(self, token):
+        self.load()
+        candidates = []
+        idx = bisect.bisect_right(self._starts, token) - 1
+        while idx >= 0 and self._max_ends[idx] >= token:
+            if self._ranges[idx][1] >= token:
+                candidates.append(self._ranges[idx])
+            idx -= 1
+        return candidates
+
+    # the partition ending before the token, or the first partition
+    def _neighbour(self, token):
+        self.load()
+        if not self._ranges:
+            return ''
+        idx = bisect.bisect_right(self._starts, token) - 1
+        return self._ranges[max(idx, 0)][3]
+
+    # route every token in the list, returns a token -> pkey dictionary
+    def route_tokens(self, tokens):
+        routes = {}
+        for token in tokens:
+            if token not in routes:
+                routes[token] = self.get_partition_for_token(token)
+        return routes
@@ -0,0 +1,75 @@
+import json
+import time
+import uuid
+
+from aws_clients import AwsClients
+
+
+class ResultQueue(object):
+    '''
+    This class is responsible for passing results from worker nodes back to
+    the node that dispatched their tasks. This implementation wraps an SQS
+    FIFO queue, results are sent with the request id (e.g. queryID or
+    writeID) as the message group id and received by that id.
+    '''
+
+    def __init__(self, queue_name):
+        self._queue_name = queue_name
+        self._sqs = AwsClients.client('sqs')
+        self._queue_url = None
+
+    def _get_queue_url(self):
+        if self._queue_url is None:
+            res = self._sqs.get_queue_url(QueueName=self._queue_name)
+            self._queue_url = res['QueueUrl']
+        return self._queue_url
+
+    # post a result dictionary for the given request id
+    def send_result(self, group_id, result):
+        try:
+            self._sqs.send_message(
+                QueueUrl=self._get_queue_url(),
+                MessageBody=json.dumps(result),
+                MessageGroupId=group_id,
+                MessageDeduplicationId=str(uuid.uuid4())
+            )
+            return True
+        except Exception as ex:
+            print "ERROR: Failed to send result to {0}: {1}".format(
+                self._queue_name, ex)
+            raise ex
+
+    # receive up to expected results for the request id, waiting at most
+    # timeout seconds. Messages of other requests are made visible again
+    # right away so they don't block their message group until the
+    # visibility timeout expires
+    def receive_results(self, group_id, expected, timeout):
+        results = []
+        deadline = time.time() + timeout
+        try:
+            while len(results) < expected and time.time() < deadline:
+                res = self._sqs.receive_message(
+                    QueueUrl=self._get_queue_url(),
+                    MaxNumberOfMessages=10,
+                    WaitTimeSeconds=1,
+                    AttributeNames=['MessageGroupId']
+                )
+                for message in res.get('Messages', []):
+                    attributes = message.get('Attributes', {})
+                    if attributes.get('MessageGroupId') != group_id:
+                        self._sqs.change_message_visibility(
+                            QueueUrl=self._get_queue_url(),
+                            ReceiptHandle=message['ReceiptHandle'],
+                            VisibilityTimeout=0
+                        )
+                        continue
+                    results.append(json.loads(message['Body']))
+                    self._sqs.delete_message(
+                        QueueUrl=self._get_queue_url(),
+                        ReceiptHandle=message['ReceiptHandle']
+                    )
+            return results
+        except Exception as ex:
+            print "ERROR: Failed to receive results from {0}: {1}".format(
+                self._queue_name, ex)
+            raise ex
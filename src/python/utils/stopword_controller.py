@@ -1,6 +1,10 @@
-import boto3
 from datetime import datetime
 from boto3.dynamodb.conditions import Key, Attr
+from boto3.dynamodb.types import TypeSerializer
+
+from aws_clients import AwsClients
+from backoff import Backoff
+from config import Config
 from stopword_model import StopWordModel
 
 
@@ -9,9 +13,7 @@ class StopWordController(object):
     STOP_WORD_TABLE = 'STOP_WORD'
 
     def __init__(self):
-        self._dynamodb = boto3.client('dynamodb')
-        self._stop_word_table = (boto3.resource('dynamodb')
-                                .Table(self.STOP_WORD_TABLE))
+        self._stop_word_table = AwsClients.table(self.STOP_WORD_TABLE)
 
     # retrieves the stop
     def get_word(self, word):
@@ -44,3 +46,27 @@ class StopWordController(object):
         except Exception as ex:
             print "ERROR: Failed to insert into STOP_WORD: {0}".format(ex)
             return False
+
+    # writes the valid & verified models in batch_write_item requests of
+    # Config.STOPWORD_BATCH_SIZE items, items left unprocessed by throttling
+    # are written again. Returns the number of words written
+    def add_words(self, stop_word_models):
+        serializer = TypeSerializer()
+        requests = []
+        for stop_word_model in stop_word_models:
+            if not stop_word_model.verify():
+                continue
+            requests.append({'PutRequest': {'Item': dict(
+                (key, serializer.serialize(value)) for (key, value)
+                in stop_word_model.get_payload().iteritems())}})
+        for start in range(0, len(requests), Config.STOPWORD_BATCH_SIZE):
+            self._write_batch(
+                requests[start:start + Config.STOPWORD_BATCH_SIZE])
+        return len(requests)
+
+    def _write_batch(self, requests):
+        Backoff.batch_write(self._stop_word_table.meta.client,
+                            {self.STOP_WORD_TABLE: requests},
+                            Config.STOPWORD_BATCH_MAX_RETRIES,
+                            Config.STOPWORD_BACKOFF_BASE,
+                            Config.STOPWORD_BACKOFF_MAX)
@@ -0,0 +1,83 @@
+import json
+import zlib
+
+from aws_clients import AwsClients
+from index_storage import IndexStorage
+
+
+class StopWordCountStorage(object):
+    '''
+    This class stores the token counts used to generate stop words next to
+    the index partitions. The token counts of a partition are stored under
+    its storage key, which is never rewritten, so a partition is only
+    counted again once it has a new storage key. The totals hold the count
+    of every token in the index & the partition id -> storage key of the
+    partitions they were counted from.
+    '''
+
+    COUNT_STORAGE = IndexStorage.INDEX_STORAGE
+    COUNT_PREFIX = 'stopword_counts/'
+    TOTALS_KEY = 'totals'
+
+    # Fields of the totals
+    PARTITIONS = 'partitions'
+    TOKENS = 'tokens'
+
+    def __init__(self):
+        self._count_storage = AwsClients.client('s3')
+
+    # returns the token -> count dictionary of a partition, None if the
+    # counts of the storage key were never stored
+    def get_counts(self, storage_key):
+        return self._get(storage_key)
+
+    def put_counts(self, storage_key, counts):
+        return self._put(storage_key, counts)
+
+    def delete_counts(self, storage_key):
+        try:
+            self._count_storage.delete_object(
+                Bucket=self.COUNT_STORAGE,
+                Key=self.COUNT_PREFIX + storage_key)
+            return True
+        except Exception as ex:
+            print ("ERROR: Failed to delete token counts {0}"
+                   .format(storage_key))
+            raise ex
+
+    # returns the partition id -> storage key & token -> count dictionaries
+    # of the last run, both empty if there was none
+    def get_totals(self):
+        totals = self._get(self.TOTALS_KEY)
+        if totals is None:
+            return ({}, {})
+        return (totals[self.PARTITIONS], totals[self.TOKENS])
+
+    def put_totals(self, partitions, tokens):
+        return self._put(self.TOTALS_KEY, {
+            self.PARTITIONS: partitions,
+            self.TOKENS: tokens
+        })
+
+    def _get(self, key):
+        try:
+            res = self._count_storage.get_object(
+                Bucket=self.COUNT_STORAGE,
+                Key=self.COUNT_PREFIX + key)
+            return json.loads(zlib.decompress(res['Body'].read()))
+        except Exception as ex:
+            if IndexStorage.is_missing_partition(ex):
+                return None
+            print "ERROR: Failed to read token counts {0}".format(key)
+            raise ex
+
+    def _put(self, key, value):
+        try:
+            self._count_storage.put_object(
+                Bucket=self.COUNT_STORAGE,
+                Key=self.COUNT_PREFIX + key,
+                Body=zlib.compress(json.dumps(value)))
+            return True
+        except Exception as ex:
+            print "ERROR: Failed to write token counts {0}".format(key)
+            raise ex
@@ -0,0 +1,175 @@
+from collections import OrderedDict
+from multiprocessing.pool import ThreadPool
+import uuid
+
+from config import Config
+from document_controller import DocumentController
+from document_model import DocumentModel
+from index_controller import IndexController
+from input_models import WriteInputModel
+from kinesis import Kinesis
+from partition_router import PartitionRouter
+from write_task_model import WriteTaskModel
+
+# thread pool for document locks, created on first use & kept for the
+# lifetime of the container
+LOCK_POOL = None
+
+
+class DocumentWriter(object):
+    '''
+    This class indexes documents for the write master. A batch of write
+    requests is locked in parallel, the tokens of every locked document are
+    routed with a single PartitionRouter snapshot and the write tasks are
+    dispatched grouped by target partition, so the tasks of all documents
+    writing to one partition reach the same worker batch and are written to
+    the partition together. A result is returned for every document.
+    '''
+
+    # Result Field Names
+    DOCUMENT_ID = 'documentID'
+    STATUS = 'status'
+    LOCK_NO = 'lockNo'
+    TASKS = 'tasks'
+
+    # Document Statuses
+    DISPATCHED = 'dispatched'
+    LOCKED = 'locked'
+    INVALID = 'invalid'
+
+    def __init__(self, expiration=0):
+        self._documents = DocumentController()
+        self._index = IndexController()
+        self._kinesis = Kinesis(Config.WRITE_STREAM)
+        # lock expiration threshold in seconds
+        self._expiration = expiration
+
+    # indexes the documents of the write requests, returns a result per
+    # request in request order with its status, the lockNo written & the
+    # number of write tasks dispatched
+    def write_documents(self, requests):
+        results = []
+        write_inputs = []
+        for request in requests:
+            if not isinstance(request, dict):
+                request = {}
+            write_input = WriteInputModel()
+            write_input.parse_from_request(request)
+            valid = write_input.verify()
+            results.append({
+                self.DOCUMENT_ID: request.get(WriteInputModel.DOCUMENT_ID),
+                self.STATUS: self.LOCKED if valid else self.INVALID,
+                self.LOCK_NO: None,
+                self.TASKS: 0
+            })
+            write_inputs.append(write_input if valid else None)
+
+        valid = [idx for (idx, write_input) in enumerate(write_inputs)
+                 if write_input is not None]
+        lock_nos = self._map(self.lock_document,
+                             [write_inputs[idx] for idx in valid])
+        locked = [(idx, lock_no) for (idx, lock_no) in zip(valid, lock_nos)
+                  if lock_no is not None]
+        for (idx, lock_no) in locked:
+            results[idx][self.LOCK_NO] = lock_no
+        if not locked:
+            return results
+
+        # snapshot the partition ranges of every token in the batch once,
+        # then route every token from memory
+        router = PartitionRouter(self._index).load(
+            [tok_info[WriteInputModel.TOKEN].lower()
+             for (idx, lock_no) in locked
+             for tok_info in write_inputs[idx].get_token_info()])
+        write_tasks = []
+        for (idx, lock_no) in locked:
+            tasks = self.create_write_tasks(write_inputs[idx], lock_no,
+                                            router)
+            results[idx][self.TASKS] = len(tasks)
+            write_tasks.extend(tasks)
+        self._kinesis.dispatch_tasks(write_tasks, self.task_partition)
+        print "INFO: sent {0} write tasks to kinesis".format(len(write_tasks))
+
+        doc_ids = [write_inputs[idx].get_id() for (idx, lock_no) in locked]
+        self._map(self._documents.unlock_document, doc_ids)
+        for (idx, lock_no) in locked:
+            results[idx][self.STATUS] = self.DISPATCHED
+        print "INFO: unlocked {0} documents".format(len(doc_ids))
+        return results
+
+    # locks the document in one round trip, its lockNo is incremented to the
+    # version written, otherwise creates it locked. Returns the lockNo being
+    # written, None if another writer holds the lock
+    def lock_document(self, write_input):
+        doc = self._documents.acquire_lock(write_input.get_id(),
+                                           self._expiration)
+        if doc is not None:
+            print "INFO: locked document with id {0}".format(doc.get_pkey())
+            return doc.get_lock_no() + 1
+
+        doc = DocumentModel()
+        doc.load_from_write_input(write_input)
+        lock_next = doc.get_lock_no() + 1
+        doc.set_lockno(lock_next)
+        if not self._documents.create_new_document(doc, True):
+            print ("ERROR: Document {0} already locked."
+                   .format(write_input.get_id()))
+            return None
+        print "INFO: created new doc with id: {0}".format(doc.get_pkey())
+        return lock_next
+
+    # creates one write task per target partition so that each partition is
+    # only read, modified and written once for the document
+    def create_write_tasks(self, write_input, lock_next, router):
+        write_id = str(uuid.uuid4())
+        tasks_by_partition = OrderedDict()
+        new_partition_tasks = []
+        tokens = write_input.get_token_info()
+        for tok_info in tokens:
+            token = tok_info[WriteInputModel.TOKEN].lower()
+            locations = tok_info[WriteInputModel.LOCATIONS]
+            ngram_size = tok_info[WriteInputModel.NGRAM_SIZE]
+            partition = router.get_partition_for_token(token)
+
+            # tokens without a partition are grouped into new partitions
+            if partition == '':
+                if (len(new_partition_tasks) == 0 or
+                        len(new_partition_tasks[-1].get_operations()) >=
+                        Config.INDEX_MAX_SIZE):
+                    new_partition_tasks.append(
+                        self.new_write_task(write_input, lock_next,
+                                            write_id))
+                write_task = new_partition_tasks[-1]
+            else:
+                if partition not in tasks_by_partition:
+                    tasks_by_partition[partition] = self.new_write_task(
+                        write_input, lock_next, write_id)
+                write_task = tasks_by_partition[partition]
+            write_task.with_token_operation(token, ngram_size, locations,
+                                            partition)
+
+        write_tasks = []
+        for write_task in tasks_by_partition.values() + new_partition_tasks:
+            if write_task.verify():
+                write_tasks.append(write_task)
+        return write_tasks
+
+    def new_write_task(self, write_input, lock_next, write_id):
+        return (WriteTaskModel().with_write_id(write_id)
+                                .with_document_id(write_input.get_id())
+                                .with_lock_no_next(lock_next))
+
+    # the partition a task writes to, '' for a new partition
+    @classmethod
+    def task_partition(cls, task):
+        return task.get_operations()[0][WriteTaskModel.PARTITION]
+
+    # maps func over the items, in parallel in up to
+    # Config.WRITE_MASTER_THREADS threads
+    def _map(self, func, items):
+        if Config.WRITE_MASTER_THREADS <= 1 or len(items) <= 1:
+            return [func(item) for item in items]
+        global LOCK_POOL
+        if LOCK_POOL is None:
+            LOCK_POOL = ThreadPool(Config.WRITE_MASTER_THREADS)
+        return LOCK_POOL.map(func, items)
@@ -1,4 +1,5 @@
 from sets import Set
+from collections import OrderedDict
 
 
 class WriteTaskModel(object):
@@ -12,9 +13,12 @@ class WriteTaskModel(object):
     LOCK_NO_NEXT = 'lockNoNext'
     DOCUMENT_ID = 'documentID'
     WRITE_ID = 'writeID'
+    ATTEMPT = 'attempt'
 
     # Valid Fields
     VALID_FIELDS = [TOKEN_OPERATIONS, LOCK_NO_NEXT, DOCUMENT_ID, WRITE_ID]
+    # only set on tasks re-queued by a worker
+    OPTIONAL_FIELDS = [ATTEMPT]
 
     # Token Operation Attributes
     TOKEN = 'token'
@@ -27,6 +31,7 @@ class WriteTaskModel(object):
 
     def __init__(self):
         self._valid_fields = Set(self.VALID_FIELDS)
+        self._optional_fields = Set(self.OPTIONAL_FIELDS)
         self._valid_token_op_fields = Set(self.VALID_TOKEN_OPERATION_FIELDS)
         self._task_info = {
             self.TOKEN_OPERATIONS: []
@@ -35,6 +40,14 @@ class WriteTaskModel(object):
     def get_operations(self):
         return self._task_info[self.TOKEN_OPERATIONS]
 
+    # groups token operations by partition, new partitions ('') are kept as
+    # a single group so their tokens are written to one new partition
+    def get_operations_by_partition(self):
+        groups = OrderedDict()
+        for op in self._task_info[self.TOKEN_OPERATIONS]:
+            groups.setdefault(op[self.PARTITION], []).append(op)
+        return groups.items()
+
     def get_doc_id(self):
         return self._task_info[self.DOCUMENT_ID]
 
@@ -44,8 +57,14 @@ class WriteTaskModel(object):
     def get_lock_no_next(self):
         return self._task_info[self.LOCK_NO_NEXT]
 
+    # times the task was re-queued after a failed write, 0 for tasks from
+    # the master node
+    def get_attempt(self):
+        return self._task_info.get(self.ATTEMPT, 0)
+
     def verify(self):
-        if Set(self._task_info.keys()) == self._valid_fields:
+        if (Set(self._task_info.keys()) - self._optional_fields ==
+                self._valid_fields):
             for op in self._task_info[self.TOKEN_OPERATIONS]:
                 if Set(op.keys()) != self._valid_token_op_fields:
                     return False
@@ -70,6 +89,10 @@ class WriteTaskModel(object):
         self._task_info[self.WRITE_ID] = write_id
         return self
 
+    def with_attempt(self, attempt):
+        self._task_info[self.ATTEMPT] = attempt
+        return self
+
     def with_token_operation(self, token, ngram_size, locations, partition):
         token_op = {
             self.TOKEN: token,
@@ -1,12 +1,17 @@
-import uuid
+from collections import OrderedDict
+from multiprocessing.pool import ThreadPool
 import os
+import threading
+import uuid
 
+from backoff import Backoff
 from config import Config
 from index_controller import IndexController
 from index_model import IndexModel
 from index_partition import IndexPartition
 from index_storage import IndexStorage
 from kinesis import Kinesis
+from result_queue import ResultQueue
 from write_task_model import WriteTaskModel
 
 
@@ -14,85 +19,250 @@ KINESIS_STREAM = 'writeMastertoWorker'
 KINESIS = Kinesis(KINESIS_STREAM)
 INDEX_METADATA = IndexController()
 INDEX_STORAGE = IndexStorage()
+DEAD_LETTERS = ResultQueue(Config.WRITE_DEAD_LETTERS)
+# thread pool for write tasks, created on first use & kept for the
+# lifetime of the container
+WORKER_POOL = None
+# guards the counters of task results shared by pool threads
+RESULTS_LOCK = threading.Lock()
 
 
 def lambda_handler(event, context):
     os.chdir(Config.FILE_DIRECTORY)
-    # tasks = KINESIS.parse_tasks_from_records(event['Records'])
-    tasks = [{'writeID': '5005dbda-7889-49a7-bdb2-2a44609f0ef7',
-              'tokenOperations': [{'token': 'here',
-                                   'locations': [0],
-                                   'partitionID':
-                                   '',
-                                   'ngramSize': 1}],
-              'lockNoNext': 1,
-              'documentID': 'testID2'}]
+    tasks = KINESIS.parse_tasks_from_records(event['Records'])
+    write_tasks = []
     for task in tasks:
         write_task = WriteTaskModel()
         write_task.load(task)
-        execute_task(write_task)
+        write_tasks.append(write_task)
+    results = execute_tasks(write_tasks)
+    print ("INFO: wrote {0} tasks, {1} lock conflicts, {2} retries"
+           .format(len(results), sum(r['conflicts'] for r in results),
+                   sum(r['retries'] for r in results)))
+
+    # failed partition writes are sent to the stream again rather than
+    # acknowledged with the batch, when that fails too the invocation fails
+    # & kinesis retries the batch. Writes that failed every attempt are
+    # set aside in the dead letter queue so they can't cycle forever
+    retry_tasks = []
+    for task in failed_tasks(write_tasks, results):
+        if task.get_attempt() <= Config.WRITE_MAX_ATTEMPTS:
+            retry_tasks.append(task)
+            continue
+        print ("ERROR: write {0} of document {1} to partition {2} failed {3} "
+               "times, sending it to {4}: {5}"
+               .format(task.get_write_id(), task.get_doc_id(),
+                       task.get_operations()[0][WriteTaskModel.PARTITION],
+                       task.get_attempt(), Config.WRITE_DEAD_LETTERS,
+                       task.get_payload()))
+        DEAD_LETTERS.send_result(task.get_write_id(), task.get_payload())
+    if retry_tasks:
+        print ("ERROR: {0} partition writes failed, re-queueing them"
+               .format(len(retry_tasks)))
+        KINESIS.dispatch_tasks(retry_tasks, lambda task:
+                               task.get_operations()[0]
+                               [WriteTaskModel.PARTITION])
+
+    # write results back to master node
+    # TODO
+    return results
 
 
 def execute_task(task):
-    # task info
-    doc_id = task.get_doc_id()
-    write_id = task.get_write_id()
-    doc_lock = task.get_lock_no_next()
-
-    # execute all the token operations
-    for token_op in task.get_operations():
-        # token op info
-        token = token_op[WriteTaskModel.TOKEN]
-        ngram_size = token_op[WriteTaskModel.NGRAM_SIZE]
-        partition_id = token_op[WriteTaskModel.PARTITION]
-        locations = token_op[WriteTaskModel.LOCATIONS]
-
-        # always write with a new storage key for optimistic locking
-        storage_key = str(uuid.uuid4())
-
-        # create partition object, load from storage if id provided
-        partition = IndexPartition()
-        new_partition = False
-        lock_no = 0
-        old_storage_key = None
-        if partition_id == '':
+    return execute_tasks([task])[0]
+
+
+# runs the partition writes of every task, the token operations of all tasks
+# writing to one partition are applied in a single partition write. Writes
+# to different partitions run in parallel in up to
+# Config.WRITE_WORKER_THREADS threads. Returns one result per task with the
+# outcome of each token operation & the lock conflicts & retries of its
+# partition writes
+def execute_tasks(tasks):
+    results = []
+    jobs = OrderedDict()
+    for task in tasks:
+        result = {
+            'writeID': task.get_write_id(),
+            'documentID': task.get_doc_id(),
+            'tokens': {},
+            'errors': [],
+            'conflicts': 0,
+            'retries': 0
+        }
+        results.append(result)
+        for (partition_id, token_ops) in task.get_operations_by_partition():
+            # every write to a new partition creates its own partition
+            key = partition_id if partition_id != '' else len(jobs)
+            jobs.setdefault(key, []).append((task, partition_id, token_ops,
+                                             result))
+
+    if Config.WRITE_WORKER_THREADS <= 1 or len(jobs) <= 1:
+        for job in jobs.values():
+            run_partition_writes(job)
+    else:
+        global WORKER_POOL
+        if WORKER_POOL is None:
+            WORKER_POOL = ThreadPool(Config.WRITE_WORKER_THREADS)
+        WORKER_POOL.map(run_partition_writes, jobs.values())
+    return results
+
+
+# writes the token operations of every task of a job to its partition at
+# once, each posting with its own task's document & lockNo. A failed write
+# is recorded in the result of every task of the job and doesn't stop the
+# writes to other partitions. Its lock conflicts & retries are counted once,
+# in the result of the job's first task
+def run_partition_writes(job):
+    partition_id = job[0][1]
+    postings = []
+    for (task, _, token_ops, result) in job:
+        postings.extend(task_postings(task, token_ops))
+    stats = {'conflicts': 0, 'retries': 0}
+    try:
+        outcomes = write_partition(partition_id, postings, stats)
+        for (task, _, token_ops, result) in job:
+            result['tokens'].update(
+                (op[WriteTaskModel.TOKEN], outcomes[op[WriteTaskModel.TOKEN]])
+                for op in token_ops)
+    except Exception as ex:
+        print ("ERROR: Failed to write partition {0}: {1}"
+               .format(partition_id, ex))
+        for (task, _, token_ops, result) in job:
+            result['errors'].append({
+                'partitionID': partition_id,
+                'tokens': [op[WriteTaskModel.TOKEN] for op in token_ops],
+                'error': str(ex)
+            })
+    with RESULTS_LOCK:
+        job[0][3]['conflicts'] += stats['conflicts']
+        job[0][3]['retries'] += stats['retries']
+
+
+# a new task per failed partition write of a task, with the token
+# operations of that partition only, so postings already written aren't
+# applied twice, & the attempt count of the task incremented
+def failed_tasks(tasks, results):
+    retry_tasks = []
+    for (task, result) in zip(tasks, results):
+        failed = set(error['partitionID'] for error in result['errors'])
+        for (partition_id, token_ops) in task.get_operations_by_partition():
+            if partition_id not in failed:
+                continue
+            retry_task = (WriteTaskModel().with_write_id(task.get_write_id())
+                          .with_document_id(task.get_doc_id())
+                          .with_lock_no_next(task.get_lock_no_next())
+                          .with_attempt(task.get_attempt() + 1))
+            for op in token_ops:
+                retry_task.with_token_operation(op[WriteTaskModel.TOKEN],
+                                                op[WriteTaskModel.NGRAM_SIZE],
+                                                op[WriteTaskModel.LOCATIONS],
+                                                partition_id)
+            retry_tasks.append(retry_task)
+    return retry_tasks
+
+
+# (token, doc_id, lock_no, ngram_size, locations) postings of a task's
+# token operations
+def task_postings(task, token_ops):
+    return [(token_op[WriteTaskModel.TOKEN], task.get_doc_id(),
+             task.get_lock_no_next(), token_op[WriteTaskModel.NGRAM_SIZE],
+             token_op[WriteTaskModel.LOCATIONS]) for token_op in token_ops]
+
+
+# writes the postings to the partition, when another writer replaces the
+# partition first the postings are applied again to the current version,
+# up to Config.WRITE_MAX_RETRIES times. Lock conflicts & retries are
+# counted in stats
+def write_partition(partition_id, postings, stats=None):
+    if stats is None:
+        stats = {'conflicts': 0, 'retries': 0}
+    new_partition = partition_id == ''
+    if new_partition:
+        partition_id = str(uuid.uuid4())
+        print ("INFO: Creating new partition with id: {0}"
+               .format(partition_id))
+
+    attempt = 0
+    while True:
+        try:
+            return write_partition_version(partition_id, postings,
+                                           new_partition)
+        except Exception as ex:
+            # a storage key that is gone was replaced after it was read
+            if not (IndexController.is_version_conflict(ex) or
+                    IndexStorage.is_missing_partition(ex)):
+                raise ex
+            stats['conflicts'] += 1
+            if attempt >= Config.WRITE_MAX_RETRIES:
+                print ("ERROR: Partition {0} still conflicting after {1} "
+                       "retries.".format(partition_id, attempt))
+                raise ex
+            print ("INFO: partition {0} changed during write, retrying"
+                   .format(partition_id))
+            Backoff.sleep(attempt, Config.WRITE_BACKOFF_BASE,
+                          Config.WRITE_BACKOFF_MAX)
+            stats['retries'] += 1
+            attempt += 1
+
+
+# applies the postings to the current version of the partition & replaces
+# it, the uploaded copy is deleted when the metadata update loses the lock
+# so conflicting writes leave no orphaned objects behind
+def write_partition_version(partition_id, postings, new_partition):
+    # always write with a new storage key for optimistic locking
+    storage_key = str(uuid.uuid4())
+
+    # create partition object, load from storage if it exists
+    partition = IndexPartition()
+    lock_no = 0
+    old_storage_key = None
+    if not new_partition:
+        # read-before-write, get the current lockno & storage key
+        (lock_no, old_storage_key) = (INDEX_METADATA
+                                      .get_version_info(partition_id))
+        if lock_no is None:
+            # the resize job retired the partition after the task was
+            # routed, the tokens go to a new partition the next resize merges
             partition_id = str(uuid.uuid4())
             new_partition = True
-            print ("INFO: Creating new partition with id: {0}"
-                   .format(partition_id))
+            lock_no = 0
+            print ("INFO: Partition was resized, creating new partition "
+                   "with id: {0}".format(partition_id))
         else:
-            # read-before-write, get the current lockno & storage key
-            (lock_no, old_storage_key) = (INDEX_METADATA
-                                          .get_version_info(partition_id))
-            # retrieve & load existing partition
-            payload = INDEX_STORAGE.get_partition(old_storage_key)
-            partition.deserialize(payload)
-
-        # update the partition
-        partition.add_token(token, doc_id, doc_lock, ngram_size, locations)
-
-        # save the partition
-        INDEX_STORAGE.write_partition(storage_key, partition)
-        print ("INFO: Wrote partition with pkey {0} and storage key {1}"
-               .format(partition_id, storage_key))
-
-        # update index metadata
-        index_update = (IndexModel().with_pkey(partition_id)
-                        .with_start_token(partition.starting_token())
-                        .with_storage_key(storage_key)
-                        .with_end_token(partition.ending_token())
-                        .with_size(partition.size())
-                        .with_version(lock_no))
+            # retrieve & load existing partition, warm containers reuse
+            # the cached copy since a storage key's contents never change
+            partition = INDEX_STORAGE.load_partition(old_storage_key,
+                                                     for_update=True)
 
-        INDEX_METADATA.update_metadata(index_update, new_partition)
-        print ("INFO: updated metadata for partition: {0}"
-               .format(partition_id))
-        if not new_partition:
-            INDEX_STORAGE.delete_partition(old_storage_key)
-            print "INFO: removed partition: {0}".format(old_storage_key)
+    # apply every token operation for this partition in one batch
+    outcomes = partition.add_tokens(postings)
 
-        # write result back to master node
-        # TODO
+    # save the partition
+    INDEX_STORAGE.write_partition(storage_key, partition)
+    print ("INFO: Wrote {0} token operations to partition with pkey {1} and "
+           "storage key {2}".format(len(postings), partition_id, storage_key))
 
+    # update index metadata
+    index_update = (IndexModel().with_pkey(partition_id)
+                    .with_start_token(partition.starting_token())
+                    .with_storage_key(storage_key)
+                    .with_end_token(partition.ending_token())
+                    .with_size(partition.size())
+                    .with_version(lock_no))
 
-lambda_handler(0, 0)
+    try:
+        INDEX_METADATA.update_metadata(index_update, new_partition)
+    except Exception as ex:
+        # only a failed condition is known not to have been applied
+        if IndexController.is_version_conflict(ex):
+            INDEX_STORAGE.delete_partition(storage_key)
+            print "INFO: removed orphaned partition: {0}".format(storage_key)
+        raise ex
+    INDEX_STORAGE.cache_partition(storage_key, partition)
+    print ("INFO: updated metadata for partition: {0}"
+           .format(partition_id))
+    if not new_partition:
+        INDEX_STORAGE.delete_partition(old_storage_key)
+        print "INFO: removed partition: {0}".format(old_storage_key)
+    return outcomes
@@ -0,0 +1,165 @@
+import unittest
+import mock
+from botocore.exceptions import ClientError
+
+from metadata_migrator import MetadataMigrator
+
+
+class MetadataMigratorTest(unittest.TestCase):
+
+    # mock the metadata table of the migrator's IndexController, scans
+    # return PAGE_SIZE items per page & update_item sets the bucket of the
+    # stored item
+    PAGE_SIZE = 2
+
+    def setUp(self):
+        patcher = mock.patch('index_controller.Config')
+        patcher.start().METADATA_SCAN_SEGMENTS = 1
+        self.addCleanup(patcher.stop)
+        self.mock_table = mock.Mock()
+        self.mock_table.scan.side_effect = self.scan
+        self.mock_table.update_item.side_effect = self.update_item
+        self.mock_table.meta.client.describe_table.return_value = {
+            'Table': {'GlobalSecondaryIndexes': [
+                {'IndexName': 'TOKEN_BUCKET_INDEX'}]}}
+        self.items = []
+        # pkeys written to since they were listed
+        self.written = set()
+        # pkey whose update fails with an error other than a conflict
+        self.failing = None
+        self.migrator = self.new_migrator()
+
+    # a migrator of a new invocation
+    def new_migrator(self):
+        with mock.patch('index_controller.AwsClients') as mock_aws:
+            mock_aws.table.return_value = self.mock_table
+            return MetadataMigrator()
+
+    def item(self, pkey, start, end, bucket=None):
+        item = {'pKey': pkey, 'startingToken': start, 'endingToken': end,
+                'versionNo': 1}
+        if bucket is not None:
+            item['tokenBucket'] = bucket
+        return item
+
+    def scan(self, **request):
+        start = 0
+        if 'ExclusiveStartKey' in request:
+            start = [item['pKey'] for item in self.items].index(
+                request['ExclusiveStartKey']['pKey']) + 1
+        page = [dict(item) for item in
+                self.items[start:start + self.PAGE_SIZE]]
+        res = {'Items': page}
+        if start + self.PAGE_SIZE < len(self.items):
+            res['LastEvaluatedKey'] = {'pKey': page[-1]['pKey']}
+        return res
+
+    def update_item(self, Key, UpdateExpression, ExpressionAttributeValues,
+                    ConditionExpression):
+        if Key['pKey'] == self.failing:
+            raise Exception("ERROR")
+        if Key['pKey'] in self.written:
+            raise ClientError({'Error': {
+                'Code': 'ConditionalCheckFailedException',
+                'Message': 'conflict'}}, 'UpdateItem')
+        for item in self.items:
+            if item['pKey'] == Key['pKey']:
+                item['tokenBucket'] = ExpressionAttributeValues[':bucket']
+
+    def buckets(self):
+        return dict((item['pKey'], item.get('tokenBucket'))
+                    for item in self.items)
+
+    def updated(self):
+        return [c[1]['Key']['pKey'] for c in
+                self.mock_table.update_item.call_args_list]
+
+    def test_migrate_metadata(self):
+        self.items = [self.item('p1', 'apple', 'avocado'),
+                      self.item('p2', 'banana', 'cherry'),
+                      self.item('p3', 'kiwi', 'kiwi')]
+
+        stats = self.migrator.migrate_metadata()
+
+        self.assertEqual(self.buckets(), {'p1': 'a', 'p2': '*', 'p3': 'k'})
+        self.assertEqual(stats, {'indexCreated': False, 'migrated': 3,
+                                 'skipped': 0, 'conflicts': 0})
+        self.assertEqual(self.mock_table.update_item.call_args[1]
+                         ['ExpressionAttributeValues'], {':bucket': 'k'})
+
+    def test_migrate_metadata_pages(self):
+        self.items = [self.item('p{0}'.format(n), 't{0}'.format(n),
+                                't{0}'.format(n)) for n in range(5)]
+
+        stats = self.migrator.migrate_metadata()
+
+        self.assertEqual(self.mock_table.scan.call_count, 3)
+        self.assertEqual(self.updated(), ['p0', 'p1', 'p2', 'p3', 'p4'],
+                         "Failed to migrate the partitions of every page")
+        self.assertEqual(stats['migrated'], 5)
+
+    def test_skips_migrated_items(self):
+        self.items = [self.item('p1', 'apple', 'avocado', 'a'),
+                      self.item('p2', 'banana', 'cherry', 'b'),
+                      self.item('p3', 'kiwi', 'kiwi')]
+
+        stats = self.migrator.migrate_metadata()
+
+        self.assertEqual(self.updated(), ['p2', 'p3'],
+                         "Rewrote a partition already in its bucket")
+        self.assertEqual(self.buckets()['p2'], '*',
+                         "Failed to rebucket a partition whose range grew")
+        self.assertEqual((stats['migrated'], stats['skipped']), (2, 1))
+
+    def test_skips_items_without_range(self):
+        self.items = [{'pKey': 'p1', 'versionNo': 1}]
+
+        stats = self.migrator.migrate_metadata()
+
+        self.assertFalse(self.mock_table.update_item.called)
+        self.assertEqual(stats['skipped'], 1)
+
+    def test_resumes_after_failure(self):
+        self.items = [self.item('p{0}'.format(n), 't{0}'.format(n),
+                                't{0}'.format(n)) for n in range(5)]
+        self.failing = 'p3'
+        with self.assertRaises(Exception):
+            self.migrator.migrate_metadata()
+        self.failing = None
+        self.mock_table.update_item.reset_mock()
+
+        stats = self.new_migrator().migrate_metadata()
+
+        self.assertEqual(self.updated(), ['p3', 'p4'],
+                         "Failed to resume from the unmigrated partitions")
+        self.assertEqual((stats['migrated'], stats['skipped']), (2, 3))
+        self.assertEqual(set(self.buckets().values()), set(['t']))
+
+    def test_version_conflict(self):
+        self.items = [self.item('p1', 'apple', 'apple'),
+                      self.item('p2', 'kiwi', 'kiwi')]
+        self.written.add('p1')
+
+        stats = self.migrator.migrate_metadata()
+
+        self.assertEqual(self.buckets(), {'p1': None, 'p2': 'k'})
+        self.assertEqual((stats['migrated'], stats['conflicts']), (1, 1))
+
+    def test_other_error(self):
+        self.items = [self.item('p1', 'apple', 'apple')]
+        self.failing = 'p1'
+
+        with self.assertRaises(Exception) as context:
+            self.migrator.migrate_metadata()
+
+        self.assertTrue('ERROR' in context.exception)
+
+    def test_creates_bucket_index(self):
+        self.mock_table.meta.client.describe_table.return_value = {
+            'Table': {'BillingModeSummary': {
+                'BillingMode': 'PAY_PER_REQUEST'}}}
+
+        stats = self.migrator.migrate_metadata()
+
+        self.assertTrue(stats['indexCreated'])
+        self.assertTrue(self.mock_table.meta.client.update_table.called)
@@ -0,0 +1,169 @@
+import unittest
+import mock
+from botocore.exceptions import ClientError
+
+from document_model import DocumentModel
+from index_partition import IndexPartition
+from partition_cleaner import PartitionCleaner
+
+
+class PartitionCleanerTest(unittest.TestCase):
+
+    # mock dependencies of PartitionCleaner & save references to class
+    @mock.patch('partition_cleaner.DocumentController')
+    @mock.patch('partition_cleaner.IndexController')
+    @mock.patch('partition_cleaner.IndexStorage')
+    def setUp(self, mock_storage_class, mock_index_class,
+              mock_documents_class):
+        self.mock_storage = mock_storage_class.return_value
+        self.mock_index = mock_index_class.return_value
+        self.mock_documents = mock_documents_class.return_value
+        self.cleaner = PartitionCleaner()
+
+    def state(self, lock_no, updating=False, delete=False):
+        return DocumentModel().set_doc_info({'internal': {
+            'lockNo': lock_no, 'updating': updating, 'delete': delete}})
+
+    def versions(self, *lock_nos):
+        return [{'lockNo': lock_no, 'locations': [0]}
+                for lock_no in lock_nos]
+
+    def keep(self, state, versions):
+        self.cleaner._states = {'doc1': state}
+        return [int(version['lockNo']) for version in
+                self.cleaner.keep_versions('doc1', versions)]
+
+    def test_keep_unknown_document(self):
+        self.assertEqual(self.cleaner.keep_versions(
+            'doc1', self.versions(2, 1)), self.versions(2, 1))
+
+    def test_keep_updating_document(self):
+        self.assertEqual(self.keep(self.state(5, updating=True),
+                                   self.versions(2, 1)), [2, 1])
+
+    def test_keep_deleted_document(self):
+        self.assertEqual(self.keep(self.state(2, delete=True),
+                                   self.versions(2, 1)), [])
+
+    def test_keep_current_versions(self):
+        self.assertEqual(self.keep(self.state(2), self.versions(3, 2)),
+                         [3, 2])
+        self.assertEqual(self.keep(self.state(2), self.versions(2, 1)), [2],
+                         "Failed to drop a stale version")
+
+    def test_keep_newest_below_lock_no(self):
+        self.assertEqual(self.keep(self.state(3), self.versions(2, 1)), [2],
+                         "Dropped the only live posting of a document")
+
+    # a partition holding a posting of each (token, doc id, lockNo)
+    def partition(self, postings):
+        partition = IndexPartition()
+        partition.add_tokens([(token, doc_id, lock_no, 1, [0])
+                              for (token, doc_id, lock_no) in postings])
+        return partition
+
+    def load(self, partition, states):
+        self.mock_index.get_version_info.return_value = (4, 'old')
+        self.mock_storage.load_partition.return_value = partition
+        self.mock_documents.get_document_models.side_effect = \
+            lambda doc_ids, attributes: dict(
+                (doc_id, states[doc_id]) for doc_id in doc_ids)
+
+    def test_clean_partition(self):
+        partition = self.partition([('apple', 'doc1', 1),
+                                    ('apple', 'doc1', 2),
+                                    ('apple', 'doc2', 1),
+                                    ('kiwi', 'doc2', 1)])
+        self.load(partition, {'doc1': self.state(2),
+                              'doc2': self.state(1, delete=True)})
+
+        res = self.cleaner.clean_partition('p1')
+
+        self.assertTrue(res, "Failed to rewrite the partition")
+        self.assertEqual(partition.get_token_list(), ['apple'])
+        (index_model, is_new) = self.mock_index.update_metadata.call_args[0]
+        self.assertEqual(index_model.get_payload()['versionNo'], 4)
+        self.assertFalse(is_new)
+        self.mock_storage.delete_partition.assert_called_once_with('old')
+        self.mock_documents.remove_token_occurrences.assert_called_once_with(
+            'doc2', 2)
+        stats = self.cleaner.get_stats()
+        self.assertEqual((stats['deletedPostings'], stats['staleVersions']),
+                         (2, 1))
+
+    def test_clean_partition_unchanged(self):
+        self.load(self.partition([('apple', 'doc1', 2)]),
+                  {'doc1': self.state(2)})
+
+        res = self.cleaner.clean_partition('p1')
+
+        self.assertFalse(res)
+        self.assertFalse(self.mock_storage.write_partition.called)
+        self.assertEqual(self.cleaner.get_stats()['unchanged'], 1)
+
+    def test_clean_partition_retired(self):
+        self.load(self.partition([('apple', 'doc1', 1)]),
+                  {'doc1': self.state(1, delete=True)})
+
+        res = self.cleaner.clean_partition('p1')
+
+        self.assertTrue(res)
+        self.mock_index.delete_metadata.assert_called_once_with('p1', 4)
+        self.assertFalse(self.mock_storage.write_partition.called)
+        self.assertEqual(self.cleaner.get_stats()['retired'], 1)
+
+    def test_clean_partition_version_conflict(self):
+        self.load(self.partition([('apple', 'doc1', 1),
+                                  ('kiwi', 'doc2', 1)]),
+                  {'doc1': self.state(1, delete=True),
+                   'doc2': self.state(1)})
+        self.mock_index.update_metadata.side_effect = ClientError(
+            {'Error': {'Code': 'ConditionalCheckFailedException',
+                       'Message': 'conflict'}}, 'UpdateItem')
+
+        res = self.cleaner.clean_partition('p1')
+
+        self.assertFalse(res, "Cleaned a partition written to")
+        uploaded = self.mock_storage.write_partition.call_args[0][0]
+        self.mock_storage.delete_partition.assert_called_once_with(uploaded)
+        self.assertFalse(self.mock_documents.remove_token_occurrences.called,
+                         "Removed token counts of postings kept")
+        self.assertEqual(self.cleaner.get_stats()['conflicts'], 1)
+
+    def test_clean_partition_missing(self):
+        self.mock_index.get_version_info.return_value = (None, None)
+
+        self.assertFalse(self.cleaner.clean_partition('p1'))
+        self.assertFalse(self.mock_storage.load_partition.called)
+
+    def test_clean_partition_replaced(self):
+        self.mock_index.get_version_info.return_value = (4, 'old')
+        self.mock_storage.load_partition.side_effect = ClientError(
+            {'Error': {'Code': 'NoSuchKey', 'Message': 'missing'}},
+            'GetObject')
+
+        res = self.cleaner.clean_partition('p1')
+
+        self.assertFalse(res, "Cleaned a partition replaced mid-read")
+        self.assertFalse(self.mock_storage.write_partition.called)
+        self.assertEqual(self.cleaner.get_stats()['conflicts'], 1)
+
+    def test_clean_partition_load_error(self):
+        self.mock_index.get_version_info.return_value = (4, 'old')
+        self.mock_storage.load_partition.side_effect = Exception("ERROR")
+
+        with self.assertRaises(Exception) as context:
+            self.cleaner.clean_partition('p1')
+
+        self.assertTrue('ERROR' in context.exception)
+
+    def test_states_read_once(self):
+        self.load(self.partition([('apple', 'doc1', 2)]),
+                  {'doc1': self.state(2)})
+
+        self.cleaner.clean_partition('p1')
+        self.cleaner.clean_partition('p1')
+
+        self.assertEqual([c[0][0] for c in self.mock_documents
+                          .get_document_models.call_args_list],
+                         [['doc1'], []], "Read a document state twice")
@@ -0,0 +1,213 @@
+import unittest
+import mock
+from botocore.exceptions import ClientError
+
+from index_partition import IndexPartition
+from partition_compactor import PartitionCompactor
+
+
+class PartitionCompactorTest(unittest.TestCase):
+
+    # mock dependencies of PartitionCompactor & save references to class
+    @mock.patch('partition_compactor.IndexController')
+    @mock.patch('partition_compactor.IndexStorage')
+    def setUp(self, mock_storage_class, mock_index_class):
+        self.mock_storage = mock_storage_class.return_value
+        self.mock_index = mock_index_class.return_value
+        self.compactor = PartitionCompactor()
+        patcher = mock.patch('partition_compactor.Config')
+        self.mock_config = patcher.start()
+        self.addCleanup(patcher.stop)
+        self.mock_config.PARTITION_TARGET_SIZE = 10
+        self.mock_config.PARTITION_COMPACTION_MAX_PARTITIONS = 3
+
+    def item(self, pkey, start, end, size):
+        return {'pKey': pkey, 'startingToken': start, 'endingToken': end,
+                'size': size}
+
+    def partition(self, tokens):
+        partition = IndexPartition()
+        partition.add_tokens([(token, 'doc1', 1, 1, [0])
+                              for token in tokens])
+        return partition
+
+    def runs(self, items):
+        return [[item['pKey'] for item in run]
+                for run in self.compactor.find_runs(items)]
+
+    # answers version info & loads for partitions keyed by pKey
+    def load(self, partitions, versions=None):
+        versions = versions or {}
+        self.mock_index.get_version_info.side_effect = \
+            lambda pkey: (versions.get(pkey, 1), pkey + '-key')
+        self.mock_storage.load_partition.side_effect = \
+            lambda key, for_update: partitions[key[:-len('-key')]]
+
+    def test_find_runs(self):
+        res = self.runs([
+            self.item('p1', 'a', 'b', 2),
+            self.item('p2', 'c', 'd', 3),
+            self.item('p3', 'e', 'f', 10),
+            self.item('p4', 'g', 'g', 1),
+            self.item('p5', 'h', 'h', 1),
+            self.item('p6', 'i', 'i', 1)
+        ])
+
+        self.assertEqual(res, [['p1', 'p2'], ['p4', 'p5', 'p6']],
+                         "Failed to find runs of small partitions")
+
+    def test_find_runs_target_size(self):
+        res = self.runs([
+            self.item('p1', 'a', 'a', 6),
+            self.item('p2', 'b', 'b', 4),
+            self.item('p3', 'c', 'c', 1),
+            self.item('p4', 'd', 'd', 1)
+        ])
+
+        self.assertEqual(res, [['p1', 'p2'], ['p3', 'p4']],
+                         "Run exceeds the target size")
+
+    def test_find_runs_max_partitions(self):
+        res = self.runs([self.item('p{0}'.format(i), chr(97 + i),
+                                   chr(97 + i), 1) for i in range(5)])
+
+        self.assertEqual(res, [['p0', 'p1', 'p2'], ['p3', 'p4']])
+
+    def test_find_runs_skips_overlaps(self):
+        res = self.runs([
+            self.item('p1', 'a', 'a', 1),
+            self.item('p2', 'b', 'e', 1),
+            self.item('p3', 'c', 'c', 1),
+            self.item('p4', 'f', 'f', 1),
+            self.item('p5', 'g', 'g', 1)
+        ])
+
+        self.assertEqual(res, [['p4', 'p5']],
+                         "Compacted a partition the resize job owns")
+
+    def test_compact_run(self):
+        self.load({'p1': self.partition(['a']),
+                   'p2': self.partition(['b', 'c'])}, {'p1': 2, 'p2': 5})
+
+        res = self.compactor.compact_run([self.item('p1', 'a', 'a', 1),
+                                          self.item('p2', 'b', 'c', 2)])
+
+        self.assertEqual(res, ['p1-key', 'p2-key'])
+        (index_model, retired) = \
+            self.mock_index.replace_partitions.call_args[0]
+        payload = index_model.get_payload()
+        self.assertEqual((payload['pKey'], payload['versionNo'],
+                          payload['startingToken'], payload['endingToken'],
+                          payload['size']), ('p1', 2, 'a', 'c', 3))
+        self.assertEqual(retired, [('p2', 5)])
+        self.assertEqual(self.compactor.get_stats(),
+                         {'compacted': 1, 'eliminated': 1, 'conflicts': 0})
+
+    def test_compact_run_version_conflict(self):
+        self.load({'p1': self.partition(['a']),
+                   'p2': self.partition(['b'])})
+        self.mock_index.replace_partitions.side_effect = ClientError(
+            {'Error': {'Code': 'TransactionCanceledException',
+                       'Message': 'conflict'}}, 'TransactWriteItems')
+
+        res = self.compactor.compact_run([self.item('p1', 'a', 'a', 1),
+                                          self.item('p2', 'b', 'b', 1)])
+
+        self.assertEqual(res, [], "Retired partitions after a conflict")
+        uploaded = self.mock_storage.write_partition.call_args[0][0]
+        self.mock_storage.delete_partition.assert_called_once_with(uploaded)
+        self.assertEqual(self.compactor.get_stats()['conflicts'], 1)
+
+    def test_compact_run_retired_partition(self):
+        self.mock_index.get_version_info.side_effect = [(1, 'k1'),
+                                                        (None, None)]
+        self.mock_storage.load_partition.return_value = self.partition(['a'])
+
+        res = self.compactor.compact_run([self.item('p1', 'a', 'a', 1),
+                                          self.item('p2', 'b', 'b', 1)])
+
+        self.assertEqual(res, [])
+        self.assertFalse(self.mock_storage.write_partition.called)
+        self.assertEqual(self.compactor.get_stats()['conflicts'], 1)
+
+    def test_compact_run_missing_partition(self):
+        self.mock_index.get_version_info.side_effect = [(1, 'k1'),
+                                                        (1, 'k2')]
+        self.mock_storage.load_partition.side_effect = [
+            self.partition(['a']),
+            ClientError({'Error': {'Code': 'NoSuchKey',
+                                   'Message': 'missing'}}, 'GetObject')]
+
+        res = self.compactor.compact_run([self.item('p1', 'a', 'a', 1),
+                                          self.item('p2', 'b', 'b', 1)])
+
+        self.assertEqual(res, [])
+        self.assertFalse(self.mock_storage.write_partition.called)
+        self.assertEqual(self.compactor.get_stats()['conflicts'], 1)
+
+    def test_compact_partitions_missing_partition(self):
+        self.mock_index.get_partition_ranges.return_value = [
+            self.item('p1', 'a', 'a', 1), self.item('p2', 'b', 'b', 1),
+            self.item('p3', 'c', 'c', 10),
+            self.item('p4', 'd', 'd', 1), self.item('p5', 'e', 'e', 1)]
+        partitions = dict((pkey, self.partition([pkey]))
+                          for pkey in ['p2', 'p4', 'p5'])
+
+        def load(key, for_update):
+            if key == 'p1-key':
+                raise ClientError({'Error': {'Code': 'NoSuchKey',
+                                             'Message': 'missing'}},
+                                  'GetObject')
+            return partitions[key[:-len('-key')]]
+        self.mock_index.get_version_info.side_effect = \
+            lambda pkey: (1, pkey + '-key')
+        self.mock_storage.load_partition.side_effect = load
+
+        stats = self.compactor.compact_partitions()
+
+        self.assertEqual((stats['compacted'], stats['conflicts'],
+                          stats['resumeToken']), (1, 1, None),
+                         "Failed to continue past a replaced partition")
+
+    def test_compact_run_grown(self):
+        self.load({'p1': self.partition(['a', 'b', 'c', 'd', 'e', 'f']),
+                   'p2': self.partition(['g', 'h', 'i', 'j', 'k'])})
+
+        res = self.compactor.compact_run([self.item('p1', 'a', 'f', 1),
+                                          self.item('p2', 'g', 'k', 1)])
+
+        self.assertEqual(res, [], "Compacted partitions that grew")
+        self.assertFalse(self.mock_storage.write_partition.called)
+
+    def test_compact_partitions(self):
+        self.mock_index.get_partition_ranges.return_value = [
+            self.item('p1', 'a', 'a', 1), self.item('p2', 'b', 'b', 1)]
+        self.load({'p1': self.partition(['a']),
+                   'p2': self.partition(['b'])})
+
+        stats = self.compactor.compact_partitions()
+
+        self.assertEqual(stats['resumeToken'], None)
+        self.assertEqual([c[0][0] for c in
+                          self.mock_storage.delete_partition.call_args_list],
+                         ['p1-key', 'p2-key'])
+
+    @mock.patch('partition_compactor.time')
+    def test_compact_partitions_resume_token(self, mock_time):
+        mock_time.time.side_effect = [0, 100]
+        self.mock_index.get_partition_ranges.return_value = [
+            self.item('p1', 'a', 'a', 1), self.item('p2', 'b', 'b', 1),
+            self.item('p3', 'c', 'c', 10),
+            self.item('p4', 'd', 'd', 1), self.item('p5', 'e', 'e', 1),
+            self.item('p6', 'f', 'f', 10),
+            self.item('p7', 'g', 'g', 1), self.item('p8', 'h', 'h', 1)]
+        self.load(dict((pkey, self.partition([pkey]))
+                       for pkey in ['p1', 'p2', 'p4', 'p5', 'p7', 'p8']))
+
+        stats = self.compactor.compact_partitions('b', deadline=50)
+
+        self.assertEqual(stats['resumeToken'], 'g',
+                         "Failed to resume from the next run")
+        self.assertEqual(stats['compacted'], 1)
+        self.assertEqual(self.mock_index.replace_partitions.call_args[0][1],
+                         [('p5', 1)], "Failed to start at the start token")
@@ -0,0 +1,128 @@
+import pickle
+import unittest
+import mock
+from botocore.exceptions import ClientError
+
+from index_partition import IndexPartition
+from partition_codec import PartitionCodec
+from partition_migrator import PartitionMigrator
+
+
+class PartitionMigratorTest(unittest.TestCase):
+
+    # mock dependencies of PartitionMigrator & save references to class
+    @mock.patch('partition_migrator.IndexController')
+    @mock.patch('partition_migrator.IndexStorage')
+    def setUp(self, mock_storage_class, mock_index_class):
+        self.mock_storage = mock_storage_class.return_value
+        self.mock_index = mock_index_class.return_value
+        self.migrator = PartitionMigrator()
+
+    def client_error(self, code):
+        return ClientError({'Error': {'Code': code, 'Message': code}},
+                           'Operation')
+
+    # a partition read from a pickled storage object
+    def legacy_partition(self):
+        partition = IndexPartition()
+        partition.add_tokens([('apple', 'doc1', 1, 1, [0]),
+                              ('kiwi', 'doc2', 1, 1, [1, 2])])
+        legacy = IndexPartition()
+        legacy.loads(pickle.dumps(partition._partition,
+                                  pickle.HIGHEST_PROTOCOL))
+        return legacy
+
+    def load(self, partition):
+        self.mock_index.get_version_info.return_value = (4, 'old')
+        self.mock_storage.load_partition.return_value = partition
+
+    def test_migrate_partition(self):
+        self.load(self.legacy_partition())
+
+        res = self.migrator.migrate_partition('p1')
+
+        self.assertTrue(res, "Failed to migrate a legacy partition")
+        (new_key, written) = self.mock_storage.write_partition.call_args[0]
+        data = written.dumps()
+        self.assertEqual(PartitionCodec.format_version(data),
+                         PartitionCodec.FORMAT_VERSION)
+        migrated = IndexPartition()
+        migrated.loads(data)
+        self.assertFalse(migrated.is_legacy_format())
+        self.assertEqual((sorted(migrated.get_token_list()),
+                          migrated.get_token_count('kiwi')),
+                         (['apple', 'kiwi'], 2))
+        (index_model, is_new) = self.mock_index.update_metadata.call_args[0]
+        payload = index_model.get_payload()
+        self.assertEqual((payload['pKey'], payload['s3Key'],
+                          payload['versionNo']), ('p1', new_key, 4))
+        self.assertFalse(is_new)
+        self.mock_storage.delete_partition.assert_called_once_with('old')
+        self.assertEqual(self.migrator.get_stats()['migrated'], 1)
+
+    def test_migrate_partition_current_format(self):
+        partition = IndexPartition()
+        partition.add_tokens([('apple', 'doc1', 1, 1, [0])])
+        current = IndexPartition()
+        current.loads(partition.dumps())
+        self.load(current)
+
+        res = self.migrator.migrate_partition('p1')
+
+        self.assertFalse(res, "Rewrote an already migrated partition")
+        self.assertFalse(self.mock_storage.write_partition.called)
+        self.assertFalse(self.mock_index.update_metadata.called)
+        self.assertEqual(self.migrator.get_stats()['skipped'], 1)
+
+    def test_migrate_partition_retired(self):
+        self.mock_index.get_version_info.return_value = (None, None)
+
+        self.assertFalse(self.migrator.migrate_partition('p1'))
+        self.assertFalse(self.mock_storage.load_partition.called)
+        self.assertEqual(self.migrator.get_stats()['skipped'], 1)
+
+    def test_migrate_partition_version_conflict(self):
+        self.load(self.legacy_partition())
+        self.mock_index.update_metadata.side_effect = self.client_error(
+            'ConditionalCheckFailedException')
+
+        res = self.migrator.migrate_partition('p1')
+
+        self.assertFalse(res, "Migrated a partition written to")
+        uploaded = self.mock_storage.write_partition.call_args[0][0]
+        self.mock_storage.delete_partition.assert_called_once_with(uploaded)
+        self.assertEqual(self.migrator.get_stats()['conflicts'], 1)
+
+    def test_migrate_partition_replaced(self):
+        self.mock_index.get_version_info.return_value = (4, 'old')
+        self.mock_storage.load_partition.side_effect = \
+            self.client_error('NoSuchKey')
+
+        res = self.migrator.migrate_partition('p1')
+
+        self.assertFalse(res, "Migrated a partition replaced mid-read")
+        self.assertFalse(self.mock_storage.write_partition.called)
+        self.assertEqual(self.migrator.get_stats()['conflicts'], 1)
+
+    def test_migrate_partition_other_error(self):
+        self.load(self.legacy_partition())
+        self.mock_index.update_metadata.side_effect = Exception("ERROR")
+
+        with self.assertRaises(Exception) as context:
+            self.migrator.migrate_partition('p1')
+
+        self.assertTrue('ERROR' in context.exception)
+        self.assertFalse(self.mock_storage.delete_partition.called)
+
+    def test_migrate_partitions(self):
+        self.mock_index.get_partition_ranges.return_value = [
+            {'pKey': 'p1'}, {'pKey': 'p2'}]
+        self.mock_index.get_version_info.side_effect = [(1, 'k1'),
+                                                        (None, None)]
+        self.mock_storage.load_partition.return_value = \
+            self.legacy_partition()
+
+        stats = self.migrator.migrate_partitions()
+
+        self.assertEqual(stats, {'migrated': 1, 'skipped': 1,
+                                 'conflicts': 0})
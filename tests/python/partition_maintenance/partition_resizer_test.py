@@ -0,0 +1,167 @@
+import unittest
+import mock
+from botocore.exceptions import ClientError
+
+from index_partition import IndexPartition
+from partition_resizer import PartitionResizer
+
+
+class PartitionResizerTest(unittest.TestCase):
+
+    # mock dependencies of PartitionResizer & save references to class
+    @mock.patch('partition_resizer.IndexController')
+    @mock.patch('partition_resizer.IndexStorage')
+    def setUp(self, mock_storage_class, mock_index_class):
+        self.mock_storage = mock_storage_class.return_value
+        self.mock_index = mock_index_class.return_value
+        self.resizer = PartitionResizer()
+
+    def item(self, pkey, start, end, size):
+        return {'pKey': pkey, 'startingToken': start, 'endingToken': end,
+                'size': size}
+
+    def partition(self, tokens):
+        partition = IndexPartition()
+        partition.add_tokens([(token, 'doc1', 1, 1, [0])
+                              for token in tokens])
+        return partition
+
+    def conflict(self):
+        return ClientError({'Error': {
+            'Code': 'ConditionalCheckFailedException',
+            'Message': 'conflict'}}, 'DeleteItem')
+
+    # the partitions the resizer created, by the tokens they hold
+    def created(self):
+        return [sorted(c[0][1].get_token_list()) for c in
+                self.mock_storage.write_partition.call_args_list]
+
+    @mock.patch('partition_resizer.Config')
+    def test_find_groups(self, mock_config):
+        mock_config.INDEX_MAX_SIZE = 10
+        res = self.resizer.find_groups([
+            self.item('p1', 'a', 'f', 2),
+            self.item('p2', 'd', 'k', 2),
+            self.item('p3', 'g', 'h', 2),
+            self.item('p4', 'm', 'n', 2),
+            self.item('p5', 'p', 'q', 10),
+            {'pKey': 'p6', 'size': 0}
+        ])
+
+        self.assertEqual([[item['pKey'] for item in group]
+                          for group in res], [['p1', 'p2', 'p3'], ['p5']],
+                         "Failed to group overlapping & full partitions")
+
+    @mock.patch('partition_resizer.Config')
+    def test_find_groups_chained_overlap(self, mock_config):
+        mock_config.INDEX_MAX_SIZE = 10
+        res = self.resizer.find_groups([
+            self.item('p3', 'e', 'g', 2),
+            self.item('p1', 'a', 'c', 2),
+            self.item('p2', 'c', 'e', 2),
+            self.item('p4', 'h', 'i', 2)
+        ])
+
+        self.assertEqual([[item['pKey'] for item in group]
+                          for group in res], [['p1', 'p2', 'p3']])
+
+    @mock.patch('partition_resizer.Config')
+    def test_resize_group(self, mock_config):
+        mock_config.PARTITION_TARGET_SIZE = 2
+        sources = {'k1': self.partition(['a', 'c', 'e']),
+                   'k2': self.partition(['b', 'd'])}
+        self.mock_index.get_version_info.side_effect = [(1, 'k1'),
+                                                        (4, 'k2')]
+        self.mock_storage.load_partition.side_effect = \
+            lambda key, for_update: sources[key]
+
+        res = self.resizer.resize_group([self.item('p1', 'a', 'e', 3),
+                                         self.item('p2', 'b', 'd', 2)])
+
+        self.assertEqual(res, ['k1', 'k2'])
+        self.assertEqual(self.created(), [['a'], ['b', 'c'], ['d', 'e']],
+                         "Failed to redistribute the tokens")
+        self.assertEqual([c[0] for c in
+                          self.mock_index.delete_metadata.call_args_list],
+                         [('p1', 1), ('p2', 4)])
+        stats = self.resizer.get_stats()
+        self.assertEqual((stats['created'], stats['retired'],
+                          stats['redistributed']), (3, 2, 1))
+
+    @mock.patch('partition_resizer.Config')
+    def test_resize_group_skips_retired(self, mock_config):
+        mock_config.PARTITION_TARGET_SIZE = 2
+        self.mock_index.get_version_info.side_effect = [(None, None),
+                                                        (2, 'k2')]
+        self.mock_storage.load_partition.return_value = \
+            self.partition(['x', 'y', 'z'])
+
+        res = self.resizer.resize_group([self.item('p1', 'a', 'e', 3),
+                                         self.item('p2', 'x', 'z', 3)])
+
+        self.assertEqual(res, ['k2'])
+        self.mock_index.delete_metadata.assert_called_once_with('p2', 2)
+
+    @mock.patch('partition_resizer.Config')
+    def test_resize_group_version_conflict(self, mock_config):
+        mock_config.PARTITION_TARGET_SIZE = 2
+        self.mock_index.get_version_info.return_value = (1, 'k1')
+        self.mock_storage.load_partition.return_value = \
+            self.partition(['a', 'b', 'c'])
+        self.mock_index.delete_metadata.side_effect = self.conflict()
+
+        res = self.resizer.resize_group([self.item('p1', 'a', 'c', 3)])
+
+        self.assertEqual(res, [], "Retired a partition written to")
+        self.assertEqual(self.created(), [['a'], ['b', 'c']])
+        stats = self.resizer.get_stats()
+        self.assertEqual((stats['conflicts'], stats['retired'],
+                          stats['split']), (1, 0, 1))
+
+    def test_resize_group_missing_partition(self):
+        self.mock_index.get_version_info.side_effect = [(1, 'k1'),
+                                                        (2, 'k2')]
+        self.mock_storage.load_partition.side_effect = [
+            self.partition(['a']),
+            ClientError({'Error': {'Code': 'NoSuchKey',
+                                   'Message': 'missing'}}, 'GetObject')]
+
+        res = self.resizer.resize_group([self.item('p1', 'a', 'c', 1),
+                                         self.item('p2', 'b', 'd', 1)])
+
+        self.assertEqual(res, [], "Resized a group that was rewritten")
+        self.assertFalse(self.mock_storage.write_partition.called)
+        self.assertFalse(self.mock_index.delete_metadata.called)
+        self.assertEqual(self.resizer.get_stats()['conflicts'], 1)
+
+    def test_resize_group_error(self):
+        self.mock_index.get_version_info.return_value = (1, 'k1')
+        self.mock_storage.load_partition.return_value = \
+            self.partition(['a'])
+        self.mock_index.delete_metadata.side_effect = Exception("ERROR")
+
+        with self.assertRaises(Exception) as context:
+            self.resizer.resize_group([self.item('p1', 'a', 'a', 1)])
+
+        self.assertTrue('ERROR' in context.exception)
+
+    @mock.patch('partition_resizer.Config')
+    def test_resize_partitions(self, mock_config):
+        mock_config.INDEX_MAX_SIZE = 10
+        mock_config.PARTITION_TARGET_SIZE = 5
+        mock_config.PARTITION_RESIZE_MAX_PASSES = 3
+        self.mock_index.get_partition_ranges.side_effect = [
+            [self.item('p1', 'a', 'f', 2), self.item('p2', 'd', 'k', 2)],
+            [self.item('p3', 'a', 'k', 4)]
+        ]
+        self.mock_index.get_version_info.side_effect = [(1, 'k1'),
+                                                        (1, 'k2')]
+        self.mock_storage.load_partition.side_effect = [
+            self.partition(['a', 'f']), self.partition(['d', 'k'])]
+
+        stats = self.resizer.resize_partitions()
+
+        self.assertEqual(stats['passes'], 1)
+        self.assertEqual([c[0][0] for c in
+                          self.mock_storage.delete_partition.call_args_list],
+                         ['k1', 'k2'], "Failed to delete retired partitions")
@@ -0,0 +1,82 @@
+import unittest
+import mock
+
+from partition_searcher import PartitionSearcher
+from search_task_model import SearchTaskModel
+
+
+class PartitionSearcherTest(unittest.TestCase):
+
+    # mock dependencies of PartitionSearcher & save references to class
+    def setUp(self):
+        self.mock_index = mock.Mock()
+        self.mock_storage = mock.Mock()
+        self.searcher = PartitionSearcher(self.mock_index, self.mock_storage)
+
+    def token_info(self, doc_id, *lock_nos):
+        return {'ngram_size': 1, 'documentOccurrences': [{
+            'documentID': doc_id,
+            'versions': [{'lockNo': lock_no, 'locations': [lock_no]}
+                         for lock_no in lock_nos]
+        }]}
+
+    def task(self, tokens, *partitions):
+        task = SearchTaskModel().with_query_id('query')
+        for (partition_id, partition_uri) in partitions:
+            task.with_partition(partition_id, partition_uri)
+        for token in tokens:
+            task.with_search_token(token)
+        return task
+
+    def test_execute_task(self):
+        infos = {
+            'k1': {'apple': self.token_info('doc1', 2, 1)},
+            'k2': {'apple': self.token_info('doc2', 1),
+                   'kiwi': self.token_info('doc2', 1)}
+        }
+        self.mock_storage.lookup_tokens.side_effect = \
+            lambda uri, tokens: infos[uri]
+
+        res = self.searcher.execute_task(self.task(
+            ['apple', 'kiwi'], ('p1', 'k1'), ('p2', 'k2')))
+
+        self.assertEqual(res['queryID'], 'query')
+        found = dict((t['token'], t) for t in res['tokens'])
+        self.assertEqual(found['apple']['documentOccurrences'], [
+            {'documentID': 'doc1', 'lockNo': 2, 'locations': [2]},
+            {'documentID': 'doc1', 'lockNo': 1, 'locations': [1]},
+            {'documentID': 'doc2', 'lockNo': 1, 'locations': [1]}
+        ], "Failed to return every version of each partition")
+        self.assertEqual(len(found['kiwi']['documentOccurrences']), 1)
+        self.mock_storage.lookup_tokens.assert_any_call('k1',
+                                                        ['apple', 'kiwi'])
+
+    def test_search_rewritten_partition(self):
+        self.mock_storage.lookup_tokens.side_effect = [
+            Exception("NoSuchKey"), {'apple': self.token_info('doc1', 1)}]
+        self.mock_index.get_version_info.return_value = (2, 'k2')
+
+        res = self.searcher.search_partition('p1', 'k1', ['apple'])
+
+        self.assertEqual(res, {'apple': self.token_info('doc1', 1)})
+        self.assertEqual([c[0][0] for c in
+                          self.mock_storage.lookup_tokens.call_args_list],
+                         ['k1', 'k2'], "Failed to read the current key")
+
+    def test_search_retired_partition(self):
+        self.mock_storage.lookup_tokens.side_effect = Exception("ERROR")
+        self.mock_index.get_version_info.return_value = (None, None)
+
+        with self.assertRaises(Exception) as context:
+            self.searcher.search_partition('p1', 'k1', ['apple'])
+
+        self.assertTrue('ERROR' in context.exception)
+
+    def test_search_error_same_key(self):
+        self.mock_storage.lookup_tokens.side_effect = Exception("ERROR")
+        self.mock_index.get_version_info.return_value = (1, 'k1')
+
+        with self.assertRaises(Exception):
+            self.searcher.search_partition('p1', 'k1', ['apple'])
+
+        self.assertEqual(self.mock_storage.lookup_tokens.call_count, 1)
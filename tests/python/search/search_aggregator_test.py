@@ -0,0 +1,126 @@
+import unittest
+import mock
+
+from document_model import DocumentModel
+from search_aggregator import SearchAggregator
+
+
+class SearchAggregatorTest(unittest.TestCase):
+
+    # mock dependencies of SearchAggregator & save references to class
+    def setUp(self):
+        self.mock_documents = mock.Mock()
+        self.aggregator = SearchAggregator(self.mock_documents)
+
+    def result(self, token, occurrences):
+        return {'tokens': [{
+            'token': token,
+            'ngramSize': 1,
+            'documentOccurrences': [{'documentID': doc_id, 'lockNo': lock_no,
+                                     'locations': locations}
+                                    for (doc_id, lock_no, locations)
+                                    in occurrences]
+        }], 'queryID': 'query'}
+
+    def document(self, lock_no, delete=False):
+        return DocumentModel().set_doc_info({'internal': {
+            'lockNo': lock_no, 'updating': False, 'delete': delete}})
+
+    def occurrences(self, token_results):
+        return dict((r['token'], [(o['documentID'], o['locations'])
+                                  for o in r['documentOccurrences']])
+                    for r in token_results)
+
+    def test_merge_results(self):
+        res = self.aggregator.merge_results([
+            self.result('apple', [('doc1', 2, [0])]),
+            self.result('apple', [('doc1', 1, [3]), ('doc2', 1, [4])]),
+            self.result('kiwi', [('doc1', 2, [1])])
+        ])
+
+        self.assertEqual(res['apple']['versions'],
+                         {'doc1': {2: [0], 1: [3]}, 'doc2': {1: [4]}},
+                         "Failed to merge versions of partitions")
+        self.assertEqual(self.aggregator.get_document_ids(res),
+                         set(['doc1', 'doc2']))
+
+    def test_get_documents(self):
+        self.aggregator.get_documents(set(['doc1']))
+
+        (doc_ids, attributes) = \
+            self.mock_documents.get_document_models.call_args[0]
+        self.assertEqual(doc_ids, set(['doc1']))
+        self.assertTrue('internal.lockNo' in attributes,
+                        "Failed to read the lockNo of documents")
+
+    def test_reconcile_document_lock_no(self):
+        merged = self.aggregator.merge_results([
+            self.result('apple', [('doc1', 2, [0]), ('doc1', 1, [5])])])
+
+        (res, stale) = self.aggregator.reconcile(
+            ['apple'], merged, {'doc1': self.document(2)})
+
+        self.assertEqual(self.occurrences(res), {'apple': [('doc1', [0])]})
+        self.assertEqual(stale, set())
+
+    def test_reconcile_single_token_stale(self):
+        merged = self.aggregator.merge_results([
+            self.result('apple', [('doc1', 1, [0])])])
+
+        (res, stale) = self.aggregator.reconcile(
+            ['apple'], merged, {'doc1': self.document(2)})
+
+        self.assertEqual(self.occurrences(res), {'apple': []},
+                         "Returned a version older than the lockNo")
+        self.assertEqual(stale, set(['apple']),
+                         "Failed to search a missing version again")
+
+    def test_reconcile_version_in_flight(self):
+        merged = self.aggregator.merge_results([
+            self.result('apple', [('doc1', 2, [0])]),
+            self.result('kiwi', [('doc1', 1, [1])])])
+
+        (res, stale) = self.aggregator.reconcile(
+            ['apple', 'kiwi'], merged, {'doc1': self.document(2)})
+
+        self.assertEqual(stale, set(['kiwi']))
+        self.assertEqual(self.occurrences(res)['apple'], [('doc1', [0])])
+
+    def test_reconcile_confirmed_stale(self):
+        merged = self.aggregator.merge_results([
+            self.result('apple', [('doc1', 1, [0]), ('doc2', 1, [3])])])
+
+        (res, stale) = self.aggregator.reconcile(
+            ['apple'], merged, {'doc1': self.document(2),
+                                'doc2': self.document(1)}, False)
+
+        self.assertEqual(self.occurrences(res), {'apple': [('doc2', [3])]},
+                         "Failed to drop a confirmed stale version")
+        self.assertEqual(stale, set())
+
+    def test_reconcile_deleted_and_unknown(self):
+        merged = self.aggregator.merge_results([
+            self.result('apple', [('doc1', 1, [0]), ('doc2', 1, [3])])])
+
+        (res, stale) = self.aggregator.reconcile(
+            ['apple', 'missing'], merged,
+            {'doc1': self.document(1, delete=True)})
+
+        self.assertEqual(self.occurrences(res), {'apple': []})
+        self.assertEqual(stale, set())
+
+    def test_format_documents(self):
+        document = DocumentModel().set_doc_info({
+            'internal': {'lockNo': 1},
+            'external': {'wordCount': 10, 'lastIndexed': 'time',
+                         'tokenRanges': []}})
+        token_results = [{'token': 'apple', 'ngramSize': 1,
+                          'documentOccurrences': [{'documentID': 'doc1',
+                                                   'locations': [0]}]}]
+
+        res = self.aggregator.format_documents(token_results,
+                                               {'doc1': document})
+
+        self.assertEqual(res, [{'documentID': 'doc1', 'wordCount': 10,
+                                'pageLastIndexed': 'time',
+                                'importantTokenRanges': []}])
@@ -0,0 +1,104 @@
+import unittest
+import mock
+
+import search_master_node
+from document_model import DocumentModel
+
+
+class SearchMasterNodeTest(unittest.TestCase):
+
+    # mock dependencies of the search master & save references to class
+    def setUp(self):
+        patchers = {
+            'index': mock.patch('search_master_node.INDEX_METADATA'),
+            'storage': mock.patch('search_master_node.INDEX_STORAGE'),
+            'documents': mock.patch('search_master_node.DOCUMENTS'),
+            'config': mock.patch('search_master_node.Config'),
+            'router': mock.patch('search_master_node.PartitionRouter')
+        }
+        mocks = dict((name, patcher.start())
+                     for (name, patcher) in patchers.items())
+        for patcher in patchers.values():
+            self.addCleanup(patcher.stop)
+        self.mock_storage = mocks['storage']
+        self.mock_documents = mocks['documents']
+        self.mock_router = mocks['router'].return_value
+        mocks['config'].SEARCH_MAX_RETRIES = 1
+        mocks['config'].SEARCH_DISPATCH = 'local'
+        mocks['config'].SEARCH_WORKER_THREADS = 2
+        self.partitions = {'apple': [('p1', 'k1')],
+                           'kiwi': [('p1', 'k1'), ('p2', 'k2')],
+                           'new': [('p3', None)]}
+        self.mock_router.get_partitions_for_token.side_effect = \
+            lambda token: self.partitions.get(token, [])
+
+    def posting(self, doc_id, lock_no):
+        return {'ngram_size': 1, 'documentOccurrences': [{
+            'documentID': doc_id,
+            'versions': [{'lockNo': lock_no, 'locations': [lock_no]}]}]}
+
+    def document(self, lock_no):
+        return DocumentModel().set_doc_info({
+            'internal': {'lockNo': lock_no},
+            'external': {'wordCount': 3, 'lastIndexed': 'time',
+                         'tokenRanges': []}})
+
+    def test_create_search_tasks(self):
+        tasks = search_master_node.create_search_tasks(
+            ['apple', 'kiwi', 'new', 'missing'], self.mock_router, 'query')
+
+        self.assertEqual([(t.get_partitions()[0]['partitionURI'],
+                           t.get_search_tokens()) for t in tasks],
+                         [('k1', ['apple', 'kiwi']), ('k2', ['kiwi'])],
+                         "Failed to create one task per partition")
+        for task in tasks:
+            self.assertEqual(task.get_query_id(), 'query')
+            self.assertTrue(task.verify())
+
+    def test_search(self):
+        self.mock_storage.lookup_tokens.side_effect = \
+            lambda uri, tokens: {'apple': self.posting('doc1', 1)} \
+            if uri == 'k1' else {}
+        self.mock_documents.get_document_models.return_value = {
+            'doc1': self.document(1)}
+
+        res = search_master_node.search(['apple'])
+
+        self.assertEqual(res['returnCode'], search_master_node.SUCCESS)
+        self.assertEqual(res['tokens'], [{
+            'token': 'apple', 'ngramSize': 1,
+            'documentOccurrences': [{'documentID': 'doc1',
+                                     'locations': [1]}]}])
+        self.assertEqual([d['documentID'] for d in res['documents']],
+                         ['doc1'])
+        self.assertEqual(self.mock_storage.lookup_tokens.call_count, 1)
+        self.assertEqual(set(res['timings'].keys()), set([
+            'resolvePartitions', 'searchPartitions', 'aggregateResults',
+            'hydrateDocuments', 'total']))
+
+    def test_search_again_for_missing_version(self):
+        self.mock_storage.lookup_tokens.side_effect = [
+            {'apple': self.posting('doc1', 1)},
+            {'apple': self.posting('doc1', 2)}]
+        self.mock_documents.get_document_models.return_value = {
+            'doc1': self.document(2)}
+
+        res = search_master_node.search(['apple'])
+
+        self.assertEqual(self.mock_storage.lookup_tokens.call_count, 2,
+                         "Failed to search the token again")
+        self.assertEqual(res['tokens'][0]['documentOccurrences'],
+                         [{'documentID': 'doc1', 'locations': [2]}])
+
+    def test_search_drops_confirmed_stale(self):
+        self.mock_storage.lookup_tokens.return_value = {
+            'apple': self.posting('doc1', 1)}
+        self.mock_documents.get_document_models.return_value = {
+            'doc1': self.document(2)}
+
+        res = search_master_node.search(['apple'])
+
+        self.assertEqual(self.mock_storage.lookup_tokens.call_count, 2)
+        self.assertEqual(res['tokens'][0]['documentOccurrences'], [],
+                         "Returned a stale version")
+        self.assertEqual(res['documents'], [])
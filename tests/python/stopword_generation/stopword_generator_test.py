@@ -0,0 +1,261 @@
+import unittest
+import mock
+from botocore.exceptions import ClientError
+
+from index_partition import IndexPartition
+from stopword_generator import StopWordGenerator
+
+
+class StopWordGeneratorTest(unittest.TestCase):
+
+    # mock dependencies of StopWordGenerator & save references to class
+    @mock.patch('stopword_generator.StopWordCountStorage')
+    @mock.patch('stopword_generator.StopWordController')
+    @mock.patch('stopword_generator.IndexController')
+    @mock.patch('stopword_generator.IndexStorage')
+    def setUp(self, mock_storage_class, mock_index_class,
+              mock_stopword_class, mock_counts_class):
+        patcher = mock.patch('stopword_generator.Config')
+        self.mock_config = patcher.start()
+        self.addCleanup(patcher.stop)
+        self.mock_config.STOPWORD_COUNT = 2
+        self.mock_config.STOPWORD_WORKER_THREADS = 1
+        self.mock_storage = mock_storage_class.return_value
+        self.mock_index = mock_index_class.return_value
+        self.mock_stopword = mock_stopword_class.return_value
+        self.mock_counts = mock_counts_class.return_value
+        # partition storage & stored counts, by storage key
+        self.partitions = {}
+        self.stored = {}
+        self.mock_storage.load_partition.side_effect = \
+            lambda key: self.partitions[key]
+        self.mock_counts.get_counts.side_effect = self.stored.get
+        self.mock_counts.put_counts.side_effect = self.stored.__setitem__
+        self.mock_counts.get_totals.return_value = ({}, {})
+        self.generator = StopWordGenerator()
+
+    # a partition with count occurrences of every token
+    def partition(self, counts, ngram_size=1):
+        partition = IndexPartition()
+        partition.add_tokens([(token, 'doc1', 1, ngram_size, range(count))
+                              for (token, count) in counts.items()])
+        return partition
+
+    # lists the partitions & stores them under their storage keys
+    def index(self, partitions):
+        self.mock_index.scan_partitions.return_value = [
+            {'pKey': pkey, 's3Key': key}
+            for (pkey, key, counts) in partitions]
+        for (pkey, key, counts) in partitions:
+            self.partitions[key] = self.partition(counts)
+
+    # totals written by the last put_totals call
+    def totals(self):
+        return self.mock_counts.put_totals.call_args[0]
+
+    def test_generate_stopwords(self):
+        self.index([('p1', 'k1', {'the': 5, 'apple': 1}),
+                    ('p2', 'k2', {'the': 2, 'and': 4})])
+
+        self.generator.generate_stopwords()
+
+        self.assertEqual(self.generator.get_stop_words(),
+                         {'the': 7, 'and': 4})
+        self.assertEqual(self.totals(),
+                         ({'p1': 'k1', 'p2': 'k2'},
+                          {'the': 7, 'apple': 1, 'and': 4}))
+        self.assertEqual(self.stored, {'k1': {'the': 5, 'apple': 1},
+                                       'k2': {'the': 2, 'and': 4}},
+                         "Failed to store the counts of each partition")
+        stats = self.generator.get_stats()
+        self.assertEqual((stats['partitions'], stats['unchanged'],
+                          stats['tokens'], stats['occurrences'],
+                          stats['stopWords']), (2, 0, 3, 12, 2))
+
+    def test_top_n_selection(self):
+        self.mock_config.STOPWORD_COUNT = 3
+        self.index([('p1', 'k1', dict(('t{0}'.format(n), n)
+                                      for n in range(1, 10)))])
+
+        self.generator.generate_stopwords()
+
+        self.assertEqual(self.generator.get_stop_words(),
+                         {'t9': 9, 't8': 8, 't7': 7})
+
+    def test_fewer_tokens_than_stop_words(self):
+        self.mock_config.STOPWORD_COUNT = 5
+        self.index([('p1', 'k1', {'the': 2, 'and': 1})])
+
+        self.generator.generate_stopwords()
+
+        self.assertEqual(self.generator.get_stop_words(),
+                         {'the': 2, 'and': 1})
+
+    def test_ngrams_not_counted(self):
+        partition = self.partition({'the': 1})
+        partition.add_tokens([('of the', 'doc1', 1, 2, [0, 1, 2])])
+        self.partitions['k1'] = partition
+
+        self.assertEqual(self.generator.count_partition('k1'), {'the': 1})
+
+    def test_count_changes(self):
+        self.index([('p1', 'k1', {'the': 1}), ('p2', 'k2', {'and': 2})])
+        changes = [('p1', None, 'k1'), ('p2', None, 'k2')]
+
+        res = self.generator.count_changes(iter(changes))
+
+        self.assertEqual(res, [('p1', None, 'k1', {}, {'the': 1}),
+                               ('p2', None, 'k2', {}, {'and': 2})])
+
+    def test_count_changes_threads(self):
+        self.mock_config.STOPWORD_WORKER_THREADS = 4
+        partitions = [('p{0}'.format(n), 'k{0}'.format(n), {'the': n})
+                      for n in range(1, 20)]
+        self.index(partitions)
+
+        res = self.generator.count_changes(
+            (pkey, None, key) for (pkey, key, counts) in partitions)
+
+        self.assertEqual(sorted(res), sorted(
+            (pkey, None, key, {}, counts)
+            for (pkey, key, counts) in partitions),
+            "Failed to count every change in the thread pool")
+
+    def test_add_stopwords_table(self):
+        self.index([('p1', 'k1', {'the': 5, 'and': 4, 'apple': 1})])
+        self.generator.generate_stopwords()
+
+        self.generator.add_stopwords_table()
+
+        models = self.mock_stopword.add_words.call_args[0][0]
+        self.assertEqual(sorted((m.get_payload()['pKey'],
+                                 m.get_payload()['sortKey']) for m in models),
+                         [('and', 4), ('the', 5)])
+
+    # totals of a last run over the listed partitions
+    def last_run(self, partitions):
+        tokens = {}
+        for (pkey, key, counts) in partitions:
+            self.stored[key] = counts
+            for (token, count) in counts.items():
+                tokens[token] = tokens.get(token, 0) + count
+        self.mock_counts.get_totals.return_value = (
+            dict((pkey, key) for (pkey, key, counts) in partitions), tokens)
+
+    def test_list_changes(self):
+        self.index([('p1', 'k1', {}), ('p2', 'k2-new', {}),
+                    ('p4', 'k4', {})])
+        current = {}
+
+        changes = list(self.generator.list_changes(
+            {'p1': 'k1', 'p2': 'k2', 'p3': 'k3'}, current))
+
+        self.assertEqual(changes, [('p2', 'k2', 'k2-new'),
+                                   ('p4', None, 'k4'),
+                                   ('p3', 'k3', None)])
+        self.assertEqual(current, {'p1': 'k1', 'p2': 'k2-new', 'p4': 'k4'})
+
+    def test_count_change(self):
+        self.stored['k1'] = {'the': 1}
+        self.partitions['k2'] = self.partition({'the': 3})
+
+        res = self.generator.count_change(('p1', 'k1', 'k2'))
+
+        self.assertEqual(res, ('p1', 'k1', 'k2', {'the': 1}, {'the': 3}))
+        self.assertEqual(self.stored['k2'], {'the': 3})
+
+    def test_count_change_removed(self):
+        self.stored['k1'] = {'the': 1}
+
+        res = self.generator.count_change(('p1', 'k1', None))
+
+        self.assertEqual(res, ('p1', 'k1', None, {'the': 1}, {}))
+        self.assertFalse(self.mock_storage.load_partition.called)
+
+    def test_count_change_replaced(self):
+        self.mock_storage.load_partition.side_effect = ClientError(
+            {'Error': {'Code': 'NoSuchKey', 'Message': 'missing'}},
+            'GetObject')
+
+        res = self.generator.count_change(('p1', None, 'k1'))
+
+        self.assertEqual(res, ('p1', None, None, {}, {}))
+        self.assertFalse(self.mock_counts.put_counts.called)
+
+    def test_apply_counts(self):
+        self.generator._tokens = {'the': 5, 'apple': 1, 'and': 2}
+
+        self.generator.apply_counts({'the': 2, 'apple': 1},
+                                    {'the': 1, 'kiwi': 3})
+
+        self.assertEqual(self.generator._tokens,
+                         {'the': 4, 'and': 2, 'kiwi': 3},
+                         "Failed to replace the old counts")
+
+    def test_incremental_run(self):
+        self.last_run([('p1', 'k1', {'the': 5, 'apple': 1}),
+                       ('p2', 'k2', {'the': 2, 'and': 4}),
+                       ('p3', 'k3', {'kiwi': 9})])
+        self.index([('p1', 'k1', {'the': 5, 'apple': 1}),
+                    ('p2', 'k2-new', {'the': 3, 'and': 2})])
+
+        self.generator.generate_stopwords()
+
+        self.assertEqual([c[0][0] for c in self.mock_storage.load_partition
+                          .call_args_list], ['k2-new'],
+                         "Counted an unchanged partition")
+        self.assertEqual(self.totals(),
+                         ({'p1': 'k1', 'p2': 'k2-new'},
+                          {'the': 8, 'apple': 1, 'and': 2}))
+        self.assertEqual(sorted(c[0][0] for c in self.mock_counts
+                                .delete_counts.call_args_list),
+                         ['k2', 'k3'])
+        self.assertEqual(self.generator.get_stop_words(),
+                         {'the': 8, 'and': 2})
+        stats = self.generator.get_stats()
+        self.assertEqual((stats['partitions'], stats['unchanged'],
+                          stats['removed'], stats['skipped']), (1, 1, 1, 0))
+
+    def test_unchanged_run(self):
+        self.last_run([('p1', 'k1', {'the': 5})])
+        self.index([('p1', 'k1', {'the': 5})])
+
+        self.generator.generate_stopwords()
+
+        self.assertFalse(self.mock_storage.load_partition.called)
+        self.assertFalse(self.mock_counts.delete_counts.called)
+        self.assertEqual(self.generator.get_stop_words(), {'the': 5})
+        self.assertEqual(self.generator.get_stats()['unchanged'], 1)
+
+    def test_replaced_partition_skipped(self):
+        self.last_run([('p1', 'k1', {'the': 5})])
+        self.index([('p1', 'k1-new', {'the': 7})])
+        del self.partitions['k1-new']
+        self.mock_storage.load_partition.side_effect = ClientError(
+            {'Error': {'Code': 'NoSuchKey', 'Message': 'missing'}},
+            'GetObject')
+
+        self.generator.generate_stopwords()
+
+        self.assertEqual(self.totals(), ({'p1': 'k1'}, {'the': 5}),
+                         "Dropped the counts of a replaced partition")
+        self.assertFalse(self.mock_counts.delete_counts.called)
+        self.assertEqual(self.generator.get_stats()['skipped'], 1)
+
+    def test_missing_counts_full_run(self):
+        self.last_run([('p1', 'k1', {'the': 5}), ('p2', 'k2', {'and': 4})])
+        del self.stored['k2']
+        self.index([('p1', 'k1', {'the': 5}), ('p2', 'k2-new', {'and': 1})])
+
+        self.generator.generate_stopwords()
+
+        # the changed partition is counted before the stored counts of its
+        # old storage key are found missing
+        self.assertEqual([c[0][0] for c in self.mock_storage
+                          .load_partition.call_args_list],
+                         ['k2-new', 'k1', 'k2-new'],
+                         "Failed to count every partition again")
+        self.assertEqual(self.totals(),
+                         ({'p1': 'k1', 'p2': 'k2-new'},
+                          {'the': 5, 'and': 1}))
+        self.assertEqual(self.generator.get_stats()['partitions'], 2)
@@ -0,0 +1,66 @@
+import unittest
+import mock
+
+from aws_clients import AwsClients, LazyReference
+
+
+class AwsClientsTest(unittest.TestCase):
+
+    # mock the boto3 session & start every test with an empty registry
+    def setUp(self):
+        AwsClients.reset()
+        patcher = mock.patch('aws_clients.boto3')
+        self.mock_boto = patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(AwsClients.reset)
+        self.mock_session = self.mock_boto.session.Session.return_value
+
+    def test_client_is_lazy(self):
+        client = AwsClients.client('s3')
+
+        self.assertFalse(self.mock_boto.session.Session.called,
+                         "Session created before the client was used")
+        client.get_object(Bucket='bucket', Key='key')
+        self.mock_session.client.return_value.get_object \
+            .assert_called_once_with(Bucket='bucket', Key='key')
+
+    def test_client_is_shared(self):
+        AwsClients.client('s3').get_object()
+        AwsClients.client('s3').put_object()
+        AwsClients.client('sqs').send_message()
+
+        self.assertEqual(self.mock_boto.session.Session.call_count, 1)
+        self.assertEqual([c[0][0] for c in
+                          self.mock_session.client.call_args_list],
+                         ['s3', 'sqs'], "Failed to share clients")
+
+    def test_table_shares_resource(self):
+        AwsClients.table('DOCUMENTS').query()
+        AwsClients.table('STOP_WORD').query()
+
+        self.assertEqual(self.mock_session.resource.call_count, 1)
+        self.assertEqual([c[0][0] for c in self.mock_session.resource
+                          .return_value.Table.call_args_list],
+                         ['DOCUMENTS', 'STOP_WORD'])
+
+    @mock.patch('aws_clients.Config')
+    def test_get_config(self, mock_config):
+        mock_config.AWS_MAX_POOL_CONNECTIONS = 7
+        mock_config.AWS_RETRY_MODE = 'standard'
+        mock_config.AWS_MAX_ATTEMPTS = 4
+
+        config = AwsClients.get_config()
+
+        self.assertEqual(config.max_pool_connections, 7)
+        self.assertEqual(config.retries, {'mode': 'standard',
+                                          'max_attempts': 4})
+
+    def test_reference_created_once(self):
+        factory = mock.Mock()
+        reference = LazyReference(factory)
+
+        reference.query()
+        reference.scan()
+
+        self.assertEqual(factory.call_count, 1)
+        self.assertEqual(reference.get_target(), factory.return_value)
@@ -0,0 +1,67 @@
+import unittest
+import mock
+
+from backoff import Backoff
+
+
+class BackoffTest(unittest.TestCase):
+
+    def setUp(self):
+        self.client = mock.Mock()
+        self.unprocessed = {'TABLE': [{'PutRequest': {'Item': {
+            'pKey': {'S': 'b'}}}}]}
+
+    @mock.patch('backoff.time')
+    def test_sleep_capped(self, mock_time):
+        for attempt in range(10):
+            Backoff.sleep(attempt, 0.05, 1.0)
+
+        for call in mock_time.sleep.call_args_list:
+            self.assertTrue(0 <= call[0][0] <= 1.0, "Backoff exceeds cap")
+
+    @mock.patch('backoff.random')
+    @mock.patch('backoff.time')
+    def test_sleep_grows(self, mock_time, mock_random):
+        Backoff.sleep(0, 0.05, 1.0)
+        Backoff.sleep(3, 0.05, 1.0)
+
+        self.assertEqual([c[0] for c in mock_random.uniform.call_args_list],
+                         [(0, 0.05), (0, 0.4)])
+
+    def test_batch_write(self):
+        self.client.batch_write_item.return_value = {'UnprocessedItems': {}}
+        Backoff.batch_write(self.client, {'TABLE': []}, 2, 0.05, 1.0)
+
+        self.client.batch_write_item.assert_called_once_with(
+            RequestItems={'TABLE': []})
+
+    @mock.patch('backoff.time')
+    def test_batch_write_unprocessed_items(self, mock_time):
+        self.client.batch_write_item.side_effect = [
+            {'UnprocessedItems': self.unprocessed}, {'UnprocessedItems': {}}
+        ]
+        Backoff.batch_write(self.client, {'TABLE': []}, 2, 0.05, 1.0)
+
+        self.assertEqual(self.client.batch_write_item.call_args[1]
+                         ['RequestItems'], self.unprocessed,
+                         "Failed to write unprocessed items")
+        self.assertEqual(mock_time.sleep.call_count, 1)
+
+    @mock.patch('backoff.time')
+    def test_batch_write_retries_exhausted(self, mock_time):
+        self.client.batch_write_item.return_value = {
+            'UnprocessedItems': self.unprocessed}
+
+        with self.assertRaises(Exception) as context:
+            Backoff.batch_write(self.client, {'TABLE': []}, 2, 0.05, 1.0)
+
+        self.assertTrue('TABLE' in str(context.exception))
+        self.assertEqual(self.client.batch_write_item.call_count, 3)
+
+    def test_batch_write_exception(self):
+        self.client.batch_write_item.side_effect = Exception("ERROR")
+
+        with self.assertRaises(Exception) as context:
+            Backoff.batch_write(self.client, {'TABLE': []}, 2, 0.05, 1.0)
+
+        self.assertTrue('ERROR' in str(context.exception))
@@ -7,12 +7,10 @@ from document_controller import DocumentController
 class DocumentControllerTest(unittest.TestCase):
 
     # mock dependencies of DocumentController & save references to class
-    @mock.patch('document_controller.boto3')
-    def setUp(self, mock_boto):
+    @mock.patch('document_controller.AwsClients')
+    def setUp(self, mock_aws):
         self.mock_table = mock.Mock()
-        self.mock_resource = mock.Mock()
-        self.mock_resource.Table.return_value = self.mock_table
-        mock_boto.resource.return_value = self.mock_resource
+        mock_aws.table.return_value = self.mock_table
         self.doc_ctrl = DocumentController()
 
     def test_get_document(self):
@@ -53,6 +51,38 @@ class DocumentControllerTest(unittest.TestCase):
 
         self.assertTrue('ERROR' in context.exception)
 
+    def test_acquire_lock(self):
+        self.mock_table.update_item.return_value = {'Attributes': {
+            'pKey': 'id', 'internal': {'lockNo': 2, 'updating': False}
+        }}
+        res = self.doc_ctrl.acquire_lock('id', 60)
+
+        self.assertEqual(res.get_lock_no(), 2,
+                         "Failed to return document before lock")
+        kwargs = self.mock_table.update_item.call_args[1]
+        self.assertEqual(kwargs['ReturnValues'], 'ALL_OLD')
+        self.assertTrue('add internal.lockNo :one' in
+                        kwargs['UpdateExpression'],
+                        "Failed to increment lockNo")
+        self.assertTrue('ConditionExpression' in kwargs,
+                        "Locked document without condition")
+
+    def test_acquire_lock_locked(self):
+        ex = Exception("ERROR")
+        ex.response = {'Error': {'Code': 'ConditionalCheckFailedException'}}
+        self.mock_table.update_item.side_effect = ex
+        res = self.doc_ctrl.acquire_lock('id', 60)
+
+        self.assertEqual(res, None, "Acquired lock of locked document")
+
+    def test_acquire_lock_exception(self):
+        self.mock_table.update_item.side_effect = Exception("ERROR")
+
+        with self.assertRaises(Exception) as context:
+            self.doc_ctrl.acquire_lock('id', 60)
+
+        self.assertTrue('ERROR' in str(context.exception))
+
     def test_unlock_document(self):
         res = self.doc_ctrl.unlock_document("id")
         self.assertTrue(res, "Failed to unlock document")
@@ -72,6 +102,19 @@ class DocumentControllerTest(unittest.TestCase):
 
         self.assertTrue(res, "Failed to create new document")
 
+    def test_create_new_document_if_absent_exists(self):
+        mock_model = mock.Mock()
+        mock_model.verify.return_value = True
+        ex = Exception("ERROR")
+        ex.response = {'Error': {'Code': 'ConditionalCheckFailedException'}}
+        self.mock_table.put_item.side_effect = ex
+        res = self.doc_ctrl.create_new_document(mock_model, True)
+
+        self.assertFalse(res, "Created document that exists")
+        self.assertTrue('ConditionExpression' in
+                        self.mock_table.put_item.call_args[1],
+                        "Created document without condition")
+
     def test_create_new_document_invalid_model(self):
         mock_model = mock.Mock()
         mock_model.verify.return_value = False
@@ -88,3 +131,158 @@ class DocumentControllerTest(unittest.TestCase):
             self.doc_ctrl.create_new_document(mock_model)
 
         self.assertTrue('ERROR' in context.exception)
+
+    def test_get_documents(self):
+        self.mock_table.meta.client.batch_get_item.return_value = {
+            'Responses': {'DOCUMENTS': [
+                {'pKey': {'S': 'id'}, 'internal': {'M': {
+                    'delete': {'BOOL': True}}}}
+            ]},
+            'UnprocessedKeys': {}
+        }
+        res = self.doc_ctrl.get_documents(['id', 'id', 'missing'],
+                                          ['internal'])
+
+        self.assertEqual(res, {'id': {'pKey': 'id',
+                                      'internal': {'delete': True}}},
+                         "Failed to retrieve documents")
+        request = self.mock_table.meta.client.batch_get_item.call_args[1][
+            'RequestItems']['DOCUMENTS']
+        self.assertEqual(len(request['Keys']), 2, "Requested duplicate keys")
+        self.assertEqual(sorted(request['ExpressionAttributeNames'].values()),
+                         ['internal', 'pKey'], "Incorrect projection")
+
+    @mock.patch('document_controller.Config')
+    def test_get_documents_batches(self, mock_config):
+        mock_config.DOCUMENT_BATCH_SIZE = 2
+        self.mock_table.meta.client.batch_get_item.return_value = {
+            'Responses': {'DOCUMENTS': []}
+        }
+        self.doc_ctrl.get_documents(['a', 'b', 'c'])
+
+        self.assertEqual(self.mock_table.meta.client.batch_get_item
+                         .call_count, 2, "Failed to batch reads")
+
+    @mock.patch('backoff.time')
+    def test_get_documents_unprocessed_keys(self, mock_time):
+        unprocessed = {'DOCUMENTS': {'Keys': [{'pKey': {'S': 'b'}}]}}
+        self.mock_table.meta.client.batch_get_item.side_effect = [{
+            'Responses': {'DOCUMENTS': [{'pKey': {'S': 'a'}}]},
+            'UnprocessedKeys': unprocessed
+        }, {
+            'Responses': {'DOCUMENTS': [{'pKey': {'S': 'b'}}]},
+            'UnprocessedKeys': {}
+        }]
+        res = self.doc_ctrl.get_documents(['a', 'b'])
+
+        self.assertEqual(sorted(res.keys()), ['a', 'b'],
+                         "Failed to read unprocessed keys")
+        self.assertEqual(self.mock_table.meta.client.batch_get_item
+                         .call_args[1]['RequestItems'], unprocessed,
+                         "Failed to request unprocessed keys")
+        self.assertTrue(mock_time.sleep.called, "Failed to back off")
+
+    def test_get_documents_nested_projection(self):
+        self.mock_table.meta.client.batch_get_item.return_value = {
+            'Responses': {'DOCUMENTS': []}
+        }
+        self.doc_ctrl.get_documents(['id'], ['internal.lockNo',
+                                             'internal.delete'])
+
+        request = self.mock_table.meta.client.batch_get_item.call_args[1][
+            'RequestItems']['DOCUMENTS']
+        names = request['ExpressionAttributeNames']
+        paths = [path.strip() for path in
+                 request['ProjectionExpression'].split(',')]
+        self.assertEqual(sorted('.'.join(names[n] for n in path.split('.'))
+                                for path in paths),
+                         ['internal.delete', 'internal.lockNo', 'pKey'],
+                         "Incorrect nested projection")
+
+    def test_get_document_models(self):
+        self.mock_table.meta.client.batch_get_item.return_value = {
+            'Responses': {'DOCUMENTS': [
+                {'pKey': {'S': 'id'}, 'internal': {'M': {
+                    'lockNo': {'N': '4'}, 'delete': {'BOOL': True}}}}
+            ]}
+        }
+        res = self.doc_ctrl.get_document_models(['id'])
+
+        self.assertEqual(res['id'].get_lock_no(), 4,
+                         "Failed to read document model")
+        self.assertTrue(res['id'].is_deleted())
+
+    @mock.patch('document_controller.Config')
+    def test_create_new_documents(self, mock_config):
+        mock_config.DOCUMENT_WRITE_BATCH_SIZE = 2
+        self.mock_table.meta.client.batch_write_item.return_value = {
+            'UnprocessedItems': {}
+        }
+        models = []
+        for valid in [True, True, False, True]:
+            model = mock.Mock()
+            model.verify.return_value = valid
+            model.get_payload.return_value = {'pKey': 'id'}
+            models.append(model)
+        res = self.doc_ctrl.create_new_documents(models)
+
+        self.assertEqual(res, 3, "Wrote invalid document")
+        self.assertEqual(self.mock_table.meta.client.batch_write_item
+                         .call_count, 2, "Failed to batch writes")
+
+    @mock.patch('backoff.time')
+    def test_create_new_documents_unprocessed_items(self, mock_time):
+        unprocessed = {'DOCUMENTS': [
+            {'PutRequest': {'Item': {'pKey': {'S': 'b'}}}}
+        ]}
+        self.mock_table.meta.client.batch_write_item.side_effect = [
+            {'UnprocessedItems': unprocessed}, {'UnprocessedItems': {}}
+        ]
+        model = mock.Mock()
+        model.verify.return_value = True
+        model.get_payload.return_value = {'pKey': 'b'}
+        self.doc_ctrl.create_new_documents([model])
+
+        self.assertEqual(self.mock_table.meta.client.batch_write_item
+                         .call_args[1]['RequestItems'], unprocessed,
+                         "Failed to write unprocessed items")
+        self.assertTrue(mock_time.sleep.called, "Failed to back off")
+
+    def test_get_documents_exception(self):
+        self.mock_table.meta.client.batch_get_item.side_effect = \
+            Exception("ERROR")
+
+        with self.assertRaises(Exception) as context:
+            self.doc_ctrl.get_documents(['id'])
+
+        self.assertTrue('ERROR' in str(context.exception))
+
+    def test_remove_token_occurrences(self):
+        self.mock_table.update_item.return_value = {
+            'Attributes': {'internal': {'tokenCount': 3}}
+        }
+        res = self.doc_ctrl.remove_token_occurrences('id', 2)
+
+        self.assertEqual(res, 3, "Incorrect remaining token count")
+        self.assertEqual(self.mock_table.update_item.call_args[1][
+            'ExpressionAttributeValues'], {':count': -2},
+            "Failed to decrement token count")
+        self.assertFalse(self.mock_table.delete_item.called,
+                         "Removed document with tokens left")
+
+    def test_remove_token_occurrences_last_token(self):
+        self.mock_table.update_item.return_value = {
+            'Attributes': {'internal': {'tokenCount': 0}}
+        }
+        self.doc_ctrl.remove_token_occurrences('id', 1)
+
+        self.assertTrue(self.mock_table.delete_item.called,
+                        "Failed to remove document without tokens")
+
+    def test_remove_token_occurrences_missing_document(self):
+        ex = Exception("ERROR")
+        ex.response = {'Error': {'Code': 'ConditionalCheckFailedException'}}
+        self.mock_table.update_item.side_effect = ex
+
+        self.assertEqual(self.doc_ctrl.remove_token_occurrences('id', 1), 0,
+                         "Failed to skip missing document")
@@ -45,3 +45,38 @@ class DocumentModelTest(unittest.TestCase):
         fixture.load_from_write_input(mock_input)
 
         self.assertTrue(fixture.verify(), "Failed to load from write input")
+
+    def test_document_state(self):
+        fixture = (DocumentModel().with_pkey('pkey')
+                                  .set_updating(True)
+                                  .set_delete(False))
+        self.assertTrue(fixture.is_updating(), "Failed to get updating")
+        self.assertFalse(fixture.is_deleted(), "Failed to get delete")
+
+    def test_get_token_count(self):
+        fixture = DocumentModel().with_token_count(4)
+        self.assertEqual(fixture.get_token_count(), 4,
+                         "Failed to get token count")
+        self.assertEqual(DocumentModel().get_token_count(), 0,
+                         "Failed to default token count")
+
+    def test_external_getters(self):
+        fixture = (DocumentModel().with_word_count(7)
+                                  .with_index_time('now')
+                                  .with_token_range('title', 0, 2))
+        self.assertEqual(fixture.get_word_count(), 7)
+        self.assertEqual(fixture.get_last_indexed(), 'now')
+        self.assertEqual(fixture.get_token_ranges(), [{
+            DocumentModel.RANGE_NAME: 'title',
+            DocumentModel.RANGE_START: 0,
+            DocumentModel.RANGE_END: 2
+        }])
+
+    def test_projected_state(self):
+        fixture = DocumentModel().set_doc_info({
+            'pKey': 'pkey', 'internal': {'lockNo': 3, 'delete': True}
+        })
+        self.assertEqual(fixture.get_lock_no(), 3)
+        self.assertTrue(fixture.is_deleted())
+        self.assertFalse(fixture.is_updating(),
+                         "Failed to default missing internal field")
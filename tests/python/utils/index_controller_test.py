@@ -2,25 +2,30 @@ import unittest
 import mock
 
 from index_controller import IndexController
+from index_model import IndexModel
+from partition_router import PartitionRouter
 
 
 class IndexControllerTest(unittest.TestCase):
 
     # mock dependencies of IndexController & save references to class
-    @mock.patch('index_controller.boto3')
-    def setUp(self, mock_boto):
+    @mock.patch('index_controller.AwsClients')
+    def setUp(self, mock_aws):
         self.mock_table = mock.Mock()
-        self.mock_resource = mock.Mock()
-        self.mock_resource.Table.return_value = self.mock_table
-        mock_boto.resource.return_value = self.mock_resource
+        mock_aws.table.return_value = self.mock_table
         self.index_control = IndexController()
 
     def test_create_new_index(self):
         mock_model = mock.Mock()
         mock_model.verify.return_value = True
+        mock_model.get_payload.return_value = {'pKey': 'id'}
+        mock_model.get_token_bucket.return_value = 'a'
         res = self.index_control.create_new_index(mock_model)
 
         self.assertTrue(res, "Failed to create new index metadata")
+        self.assertEqual(self.mock_table.put_item.call_args[1]['Item'],
+                         {'pKey': 'id', 'tokenBucket': 'a'},
+                         "Failed to write token bucket")
 
     def test_create_new_index_invalid_model(self):
         mock_model = mock.Mock()
@@ -32,6 +37,8 @@ class IndexControllerTest(unittest.TestCase):
     def test_create_new_index_exception(self):
         mock_model = mock.Mock()
         mock_model.verify.return_value = True
+        mock_model.get_payload.return_value = {'pKey': 'id'}
+        mock_model.get_token_bucket.return_value = 'a'
         self.mock_table.put_item.side_effect = Exception("ERROR")
 
         with self.assertRaises(Exception) as context:
@@ -58,3 +65,308 @@ class IndexControllerTest(unittest.TestCase):
             res = self.index_control.get_partition_ids()
 
         self.assertTrue('ERROR' in context.exception)
+
+    def test_get_partition_ranges(self):
+        self.mock_table.scan.return_value = {
+            'Items': [
+                {
+                    'pKey': 'id',
+                    'startingToken': 'a',
+                    'endingToken': 'b',
+                    'size': 1
+                }
+            ]
+        }
+
+        res = self.index_control.get_partition_ranges()
+        self.assertEqual(res[0]['pKey'], 'id', "Failed to retrieve ranges")
+
+    def test_get_partition_ranges_exception(self):
+        self.mock_table.scan.side_effect = Exception("ERROR")
+
+        with self.assertRaises(Exception) as context:
+            self.index_control.get_partition_ranges()
+
+        self.assertTrue('ERROR' in context.exception)
+
+    def test_scan_partitions_pages(self):
+        self.mock_table.scan.side_effect = [
+            {'Items': [{'pKey': 'a'}], 'LastEvaluatedKey': {'pKey': 'a'}},
+            {'Items': [{'pKey': 'b'}]}
+        ]
+        res = list(self.index_control.scan_partitions(['pKey']))
+
+        self.assertEqual(res, [{'pKey': 'a'}, {'pKey': 'b'}],
+                         "Failed to read every page")
+        self.assertEqual(self.mock_table.scan.call_args[1], {
+            'AttributesToGet': ['pKey'],
+            'ExclusiveStartKey': {'pKey': 'a'}
+        }, "Failed to continue from the last evaluated key")
+
+    def test_scan_partitions_segments(self):
+        def scan(**kwargs):
+            if 'ExclusiveStartKey' in kwargs:
+                return {'Items': [{'pKey': 'last'}]}
+            return {'Items': [{'pKey': kwargs['Segment']}],
+                    'LastEvaluatedKey': {'pKey': kwargs['Segment']}}
+        self.mock_table.scan.side_effect = scan
+        res = list(self.index_control.scan_partitions(segments=3))
+
+        self.assertEqual(sorted(item['pKey'] for item in res),
+                         [0, 1, 2, 'last', 'last', 'last'],
+                         "Failed to read every segment")
+        self.assertEqual(set(c[1]['TotalSegments'] for c in
+                             self.mock_table.scan.call_args_list), set([3]),
+                         "Failed to scan in segments")
+
+    # answers queries of the token bucket index from the items, by bucket
+    # in starting token order
+    def query_index(self, items):
+        def query(**kwargs):
+            bucket = kwargs['KeyConditionExpression'].get_expression()[
+                'values'][1]
+            res = sorted((item for item in items
+                          if IndexModel.bucket_for_range(
+                              item['startingToken'],
+                              item['endingToken']) == bucket),
+                         key=lambda item: item['startingToken'],
+                         reverse=not kwargs.get('ScanIndexForward', True))
+            return {'Items': res[:kwargs.get('Limit', len(res))]}
+        self.mock_table.query.side_effect = query
+
+    def range_item(self, pkey, start, end):
+        return {'pKey': pkey, 'startingToken': start, 'endingToken': end,
+                'size': 10}
+
+    @mock.patch('index_controller.Config.METADATA_QUERY_ROUTING', True)
+    def test_get_partition_ranges_for_tokens(self):
+        self.query_index([self.range_item('a', 'apple', 'azure'),
+                          self.range_item('*', 'berry', 'kale'),
+                          self.range_item('k', 'kiwi', 'kumquat'),
+                          self.range_item('m', 'mango', 'melon')])
+        res = self.index_control.get_partition_ranges_for_tokens(
+            ['apple', 'avocado', 'kiwi'])
+
+        self.assertEqual(sorted(item['pKey'] for item in res),
+                         ['*', 'a', 'k'], "Failed to query token buckets")
+        self.assertEqual(set(c[1]['IndexName'] for c in
+                             self.mock_table.query.call_args_list),
+                         set(['TOKEN_BUCKET_INDEX']),
+                         "Failed to query the token bucket index")
+
+    @mock.patch('index_controller.Config.METADATA_QUERY_ROUTING', True)
+    def test_get_partition_ranges_for_tokens_preceding(self):
+        self.query_index([self.range_item('A', 'apple', 'azure'),
+                          self.range_item('B', 'banana', 'bzz'),
+                          self.range_item('K', 'kale', 'kiwi')])
+        router = PartitionRouter(self.index_control)
+
+        for tokens in [['mango'], ['mango', 'apple'], ['mango', 'banana'],
+                       ['mango', 'kale']]:
+            router.refresh(tokens)
+            self.assertEqual(router.get_partition_for_token('mango'), 'K',
+                             "Routing depends on the tokens loaded")
+        last = [c for c in self.mock_table.query.call_args_list
+                if 'Limit' in c[1]]
+        self.assertTrue(last, "Failed to query the preceding buckets")
+        for call in last:
+            self.assertEqual((call[1]['Limit'],
+                              call[1]['ScanIndexForward']), (1, False))
+
+    @mock.patch('index_controller.Config')
+    def test_get_partition_ranges_for_tokens_first(self, mock_config):
+        mock_config.METADATA_QUERY_ROUTING = True
+        mock_config.METADATA_READ_THREADS = 1
+        mock_config.METADATA_SCAN_SEGMENTS = 1
+        mock_config.METADATA_PRECEDING_BUCKETS = 2
+        self.query_index([self.range_item('K', 'kale', 'kiwi')])
+        self.mock_table.scan.return_value = {
+            'Items': [self.range_item('K', 'kale', 'kiwi')]}
+        res = self.index_control.get_partition_ranges_for_tokens(['apple'])
+
+        self.assertEqual([item['pKey'] for item in res], ['K'])
+        self.assertTrue(self.mock_table.scan.called,
+                        "Failed to scan for a token before every partition")
+        self.assertEqual(len([c for c in self.mock_table.query.call_args_list
+                              if 'Limit' in c[1]]), 2,
+                         "Failed to limit the preceding bucket queries")
+
+    @mock.patch('index_controller.Config')
+    def test_get_partition_ranges_for_tokens_scan(self, mock_config):
+        mock_config.METADATA_QUERY_ROUTING = False
+        mock_config.METADATA_SCAN_SEGMENTS = 1
+        self.mock_table.scan.return_value = {'Items': [{'pKey': 'id'}]}
+        res = self.index_control.get_partition_ranges_for_tokens(['apple'])
+
+        self.assertEqual(res, [{'pKey': 'id'}],
+                         "Failed to scan without query routing")
+        self.assertFalse(self.mock_table.query.called,
+                         "Queried with query routing off")
+
+    @mock.patch('index_controller.Config.METADATA_QUERY_ROUTING', True)
+    def test_get_partition_for_token(self):
+        self.mock_table.query.side_effect = [
+            {'Items': [{'pKey': 'small', 'size': 5}]},
+            {'Items': [{'pKey': 'large', 'size': 50}]}
+        ]
+        res = self.index_control.get_partition_for_token('apple')
+
+        self.assertEqual(res, 'small', "Failed to route to smallest")
+        self.assertEqual(self.mock_table.query.call_count, 2,
+                         "Failed to query token & spanning buckets")
+        self.assertTrue('FilterExpression' in
+                        self.mock_table.query.call_args[1],
+                        "Queried partitions not containing the token")
+
+    def test_create_bucket_index(self):
+        client = self.mock_table.meta.client
+        client.describe_table.return_value = {'Table': {
+            'ProvisionedThroughput': {'ReadCapacityUnits': 5,
+                                      'WriteCapacityUnits': 2}
+        }}
+        res = self.index_control.create_bucket_index()
+
+        self.assertTrue(res, "Failed to create token bucket index")
+        index = client.update_table.call_args[1][
+            'GlobalSecondaryIndexUpdates'][0]['Create']
+        self.assertEqual(index['IndexName'], 'TOKEN_BUCKET_INDEX')
+        self.assertEqual(index['ProvisionedThroughput'],
+                         {'ReadCapacityUnits': 5, 'WriteCapacityUnits': 2},
+                         "Failed to provision the index like the table")
+
+    def test_create_bucket_index_exists(self):
+        client = self.mock_table.meta.client
+        client.describe_table.return_value = {'Table': {
+            'BillingModeSummary': {'BillingMode': 'PAY_PER_REQUEST'},
+            'GlobalSecondaryIndexes': [{'IndexName': 'TOKEN_BUCKET_INDEX'}]
+        }}
+        res = self.index_control.create_bucket_index()
+
+        self.assertFalse(res, "Created existing token bucket index")
+        self.assertFalse(client.update_table.called)
+
+    def test_update_metadata_token_bucket(self):
+        model = (IndexModel().with_pkey('id').with_storage_key('key')
+                             .with_start_token('apple')
+                             .with_end_token('avocado')
+                             .with_size(3).with_version(1))
+        self.index_control.update_metadata(model, False)
+
+        kwargs = self.mock_table.update_item.call_args[1]
+        self.assertTrue('tokenBucket = :bucket' in kwargs['UpdateExpression'],
+                        "Failed to set token bucket")
+        self.assertEqual(kwargs['ExpressionAttributeValues'][':bucket'], 'a')
+        self.assertEqual(kwargs['ExpressionAttributeValues'][':lockNo'], 2,
+                         "Failed to bump version")
+
+    def test_update_metadata_without_range(self):
+        model = (IndexModel().with_pkey('id').with_storage_key('key')
+                             .with_start_token(None)
+                             .with_end_token(None))
+        self.index_control.update_metadata(model, True)
+
+        kwargs = self.mock_table.update_item.call_args[1]
+        self.assertTrue(kwargs['UpdateExpression'].endswith(
+            ' remove tokenBucket'), "Failed to remove token bucket")
+
+    def test_set_token_bucket(self):
+        res = self.index_control.set_token_bucket('id', 3, 'a')
+
+        self.assertTrue(res, "Failed to set token bucket")
+        kwargs = self.mock_table.update_item.call_args[1]
+        self.assertEqual(kwargs['ExpressionAttributeValues'],
+                         {':bucket': 'a'}, "Bumped version with bucket")
+        self.assertTrue('ConditionExpression' in kwargs,
+                        "Set bucket without version condition")
+
+    def test_scan_partitions_segment_exception(self):
+        self.mock_table.scan.side_effect = Exception("ERROR")
+
+        with self.assertRaises(Exception) as context:
+            list(self.index_control.scan_partitions(segments=2))
+
+        self.assertTrue('ERROR' in str(context.exception))
+
+    def test_is_version_conflict(self):
+        ex = Exception("ERROR")
+        ex.response = {'Error': {'Code': 'ConditionalCheckFailedException'}}
+        self.assertTrue(IndexController.is_version_conflict(ex),
+                        "Failed to detect version conflict")
+
+    def test_is_version_conflict_other_error(self):
+        ex = Exception("ERROR")
+        self.assertFalse(IndexController.is_version_conflict(ex),
+                         "Detected version conflict for other error")
+
+    def test_get_version_info(self):
+        self.mock_table.query.return_value = {
+            'Items': [{'versionNo': 3, 's3Key': 'key'}]
+        }
+        res = self.index_control.get_version_info('id')
+        self.assertEqual(res, (3, 'key'), "Failed to get version info")
+
+    def test_get_version_info_missing(self):
+        self.mock_table.query.return_value = {'Items': []}
+        res = self.index_control.get_version_info('id')
+        self.assertEqual(res, (None, None),
+                         "Returned version info for missing partition")
+
+    def test_delete_metadata(self):
+        res = self.index_control.delete_metadata('id', 3)
+
+        self.assertTrue(res, "Failed to delete metadata")
+        kwargs = self.mock_table.delete_item.call_args[1]
+        self.assertEqual(kwargs['Key'], {'pKey': 'id'},
+                         "Deleted incorrect partition")
+        self.assertTrue('ConditionExpression' in kwargs,
+                        "Deleted metadata without version condition")
+
+    def test_delete_metadata_exception(self):
+        self.mock_table.delete_item.side_effect = Exception("ERROR")
+
+        with self.assertRaises(Exception) as context:
+            self.index_control.delete_metadata('id', 3)
+
+        self.assertTrue('ERROR' in str(context.exception))
+
+    def test_is_version_conflict_transaction(self):
+        ex = Exception("ERROR")
+        ex.response = {'Error': {'Code': 'TransactionCanceledException'}}
+        self.assertTrue(IndexController.is_version_conflict(ex),
+                        "Failed to detect cancelled transaction")
+
+    def test_replace_partitions(self):
+        mock_model = mock.Mock()
+        mock_model.verify.return_value = True
+        mock_model.get_id.return_value = 'id'
+        mock_model.get_version.return_value = 2
+        mock_model.get_size.return_value = 10
+        mock_model.get_start_token.return_value = 'a'
+        mock_model.get_end_token.return_value = 'b'
+        mock_model.get_storage_key.return_value = 'key'
+        mock_model.get_token_bucket.return_value = 'a'
+        res = self.index_control.replace_partitions(mock_model,
+                                                    [('old', 1)])
+
+        self.assertTrue(res, "Failed to replace partitions")
+        items = self.mock_table.meta.client.transact_write_items \
+            .call_args[1]['TransactItems']
+        self.assertEqual(items[0]['Update']['Key'], {'pKey': {'S': 'id'}},
+                         "Updated incorrect partition")
+        self.assertEqual(items[0]['Update']['ExpressionAttributeValues']
+                         [':lockNo'], {'N': '3'}, "Failed to bump version")
+        self.assertEqual(items[0]['Update']['ExpressionAttributeValues']
+                         [':bucket'], {'S': 'a'},
+                         "Failed to write token bucket")
+        self.assertEqual(items[1]['Delete']['Key'], {'pKey': {'S': 'old'}},
+                         "Deleted incorrect partition")
+        self.assertEqual(items[1]['Delete']['ExpressionAttributeValues'],
+                         {':version': {'N': '1'}},
+                         "Deleted without version condition")
+
+    def test_replace_partitions_invalid_model(self):
+        mock_model = mock.Mock()
+        mock_model.verify.return_value = False
+
+        with self.assertRaises(Exception):
+            self.index_control.replace_partitions(mock_model, [])
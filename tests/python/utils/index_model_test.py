@@ -26,3 +26,21 @@ class IndexModelTest(unittest.TestCase):
                                .with_end_token('end'))
         fixture._info['randofield'] = 'randoval'
         self.assertFalse(fixture.verify(), "Failed to reject invalid model")
+
+    def test_bucket_for_token(self):
+        self.assertEqual(IndexModel.bucket_for_token('apple'), 'a')
+        self.assertEqual(IndexModel.bucket_for_token(''), '*',
+                         "Failed to look up empty token in spanning bucket")
+
+    def test_bucket_for_range(self):
+        self.assertEqual(IndexModel.bucket_for_range('apple', 'azure'), 'a')
+        self.assertEqual(IndexModel.bucket_for_range('apple', 'kiwi'), '*',
+                         "Failed to bucket range spanning buckets")
+        self.assertEqual(IndexModel.bucket_for_range('', 'apple'), '*')
+        self.assertEqual(IndexModel.bucket_for_range(None, None), None)
+
+    def test_get_token_bucket(self):
+        fixture = (IndexModel().with_start_token('kale')
+                               .with_end_token('kiwi'))
+        self.assertEqual(fixture.get_token_bucket(), 'k',
+                         "Failed to bucket partition")
@@ -1,3 +1,6 @@
+import cPickle as pickle
+import os
+import tempfile
 import unittest
 import mock
 
@@ -35,3 +38,255 @@ class IndexPartitionTest(unittest.TestCase):
         self.partition.add_token('token', 'doc_id', 1, 1, [1])
         res = self.partition.get_token_count('token')
         self.assertEqual(res, 1, "Returned incorrect token count")
+
+    def test_serialize_round_trip(self):
+        self.partition.add_token('token', 'doc_id', 1, 1, [1, 2])
+        self.partition.add_token('alpha', 'doc_id', 1, 1, [0])
+        out_file = tempfile.mktemp()
+        try:
+            self.partition.serialize(out_file)
+            res = IndexPartition()
+            res.deserialize(out_file)
+        finally:
+            os.remove(out_file)
+
+        self.assertFalse(res.is_legacy_format(), "Read as legacy partition")
+        self.assertEqual(res.size(), 2, "Incorrect partition size")
+        self.assertEqual(res.starting_token(), 'alpha',
+                         "Incorrect starting token")
+        self.assertEqual(res.ending_token(), 'token', "Incorrect ending token")
+        self.assertEqual(res.get_token_count('token'), 2,
+                         "Incorrect token count")
+
+    def test_deserialize_legacy_pickle(self):
+        self.partition.add_token('token', 'doc_id', 1, 1, [1, 2])
+        in_file = tempfile.mktemp()
+        try:
+            with open(in_file, 'wb') as payload:
+                pickle.dump(self.partition._partition, payload,
+                            pickle.HIGHEST_PROTOCOL)
+            res = IndexPartition()
+            res.deserialize(in_file)
+        finally:
+            os.remove(in_file)
+
+        self.assertTrue(res.is_legacy_format(), "Failed to detect pickle")
+        self.assertEqual(res.get_token_count('token'), 2,
+                         "Incorrect token count")
+
+    def test_update_after_deserialize(self):
+        self.partition.add_token('token', 'doc_id', 1, 1, [1, 2])
+        self.partition.add_token('other', 'doc_id', 1, 1, [3])
+        out_file = tempfile.mktemp()
+        try:
+            self.partition.serialize(out_file)
+            res = IndexPartition()
+            res.deserialize(out_file)
+            res.add_token('token', 'doc_id', 2, 1, [4])
+            res.serialize(out_file)
+            res = IndexPartition()
+            res.deserialize(out_file)
+        finally:
+            os.remove(out_file)
+
+        self.assertEqual(res.size(), 2, "Incorrect partition size")
+        self.assertEqual(res.get_token_count('token'), 1,
+                         "Failed to update token")
+        self.assertEqual(res.get_token_count('other'), 1,
+                         "Failed to keep untouched token")
+
+    def test_lookup(self):
+        self.partition.add_token('token', 'doc_id', 1, 1, [1, 2])
+        self.partition.add_token('other', 'doc_id', 1, 1, [3])
+        in_file = tempfile.mktemp()
+        try:
+            self.partition.serialize(in_file)
+            res = IndexPartition().lookup(in_file, ['token', 'missing'])
+        finally:
+            os.remove(in_file)
+
+        self.assertEqual(res.keys(), ['token'], "Returned incorrect tokens")
+        self.assertEqual(res['token']['documentOccurrences'][0]['versions'],
+                         [{'lockNo': 1, 'locations': [1, 2]}],
+                         "Returned incorrect postings")
+
+    def test_add_token_keeps_two_versions(self):
+        self.partition.add_token('token', 'doc_a', 1, 1, [1])
+        self.partition.add_token('token', 'doc_b', 1, 1, [2])
+        self.partition.add_token('token', 'doc_a', 2, 1, [3])
+        self.partition.add_token('token', 'doc_a', 3, 1, [4])
+
+        occurrences = self.partition._partition.get_token_info(
+            'token')['documentOccurrences']
+        self.assertEqual([doc['documentID'] for doc in occurrences],
+                         ['doc_a', 'doc_b'], "Incorrect document order")
+        self.assertEqual(occurrences[0]['versions'],
+                         [{'lockNo': 3, 'locations': [4]},
+                          {'lockNo': 2, 'locations': [3]}],
+                         "Failed to replace oldest version")
+
+    def test_add_token_to_legacy_partition(self):
+        self.partition.add_token('token', 'doc_id', 1, 1, [1])
+        state = self.partition._partition.__dict__.copy()
+        del state['_documents']
+        del state['_encoded']
+        legacy = self.partition._partition.__class__.__new__(
+            self.partition._partition.__class__)
+        legacy.__setstate__(state)
+
+        legacy.add_token('token', 'doc_id', 2, 1, [2])
+        legacy.add_token('token', 'other_doc', 1, 1, [3])
+
+        occurrences = legacy.get_token_info('token')['documentOccurrences']
+        self.assertEqual(len(occurrences), 2, "Duplicated document")
+        self.assertEqual(occurrences[0]['versions'][0]['lockNo'], 2,
+                         "Failed to update document")
+
+    def test_add_tokens(self):
+        self.partition.add_token('beta', 'doc_a', 1, 1, [0])
+        res = self.partition.add_tokens([
+            ('gamma', 'doc_a', 2, 1, [1]),
+            ('beta', 'doc_b', 2, 1, [2]),
+            ('alpha', 'doc_a', 2, 2, [3]),
+            ('gamma', 'doc_b', 2, 1, [4])
+        ])
+
+        self.assertEqual(res.items(), [
+            ('alpha', IndexPartition.TOKEN_ADDED),
+            ('beta', IndexPartition.DOCUMENT_ADDED),
+            ('gamma', IndexPartition.TOKEN_ADDED)
+        ], "Returned incorrect outcomes")
+        self.assertEqual(self.partition.size(), 3, "Incorrect partition size")
+        self.assertEqual(self.partition.starting_token(), 'alpha',
+                         "Incorrect starting token")
+        self.assertEqual(self.partition.ending_token(), 'gamma',
+                         "Incorrect ending token")
+        self.assertEqual(self.partition.get_token_count('gamma'), 2,
+                         "Failed to add every posting")
+
+    def test_add_tokens_new_version(self):
+        self.partition.add_token('token', 'doc_id', 1, 1, [1])
+        res = self.partition.add_tokens([('token', 'doc_id', 2, 1, [2])])
+
+        self.assertEqual(res['token'], IndexPartition.VERSION_ADDED,
+                         "Returned incorrect outcome")
+        versions = self.partition._partition.get_token_info(
+            'token')['documentOccurrences'][0]['versions']
+        self.assertEqual([v['lockNo'] for v in versions], [2, 1],
+                         "Failed to keep previous version")
+
+    def test_add_tokens_empty(self):
+        res = self.partition.add_tokens([])
+        self.assertEqual(len(res), 0, "Returned outcomes for no postings")
+        self.assertEqual(self.partition.starting_token(), None,
+                         "Changed range without postings")
+
+    def test_dumps_loads(self):
+        self.partition.add_token('token', 'doc_id', 1, 1, [1, 2])
+        res = IndexPartition()
+        res.loads(self.partition.dumps())
+
+        self.assertFalse(res.is_legacy_format(), "Read as legacy partition")
+        self.assertEqual(res.get_token_count('token'), 2,
+                         "Incorrect token count")
+
+    def test_merge_tokens(self):
+        self.partition.add_token('alpha', 'doc_a', 1, 1, [1])
+        other = IndexPartition()
+        other.add_token('beta', 'doc_b', 1, 1, [2])
+        other.add_token('gamma', 'doc_b', 1, 1, [3])
+        self.partition.merge_tokens(other, ['beta'])
+
+        self.assertEqual(sorted(self.partition.get_token_list()),
+                         ['alpha', 'beta'], "Failed to copy tokens")
+        self.assertEqual(self.partition.size(), 2, "Incorrect size")
+        self.assertEqual(self.partition.ending_token(), 'beta',
+                         "Incorrect ending token")
+
+    def test_merge_tokens_encoded(self):
+        other = IndexPartition()
+        other.add_token('token', 'doc_id', 1, 1, [1, 2])
+        encoded = IndexPartition()
+        encoded.loads(other.dumps())
+        self.partition.merge_tokens(encoded)
+
+        self.assertEqual(self.partition.get_token_count('token'), 2,
+                         "Failed to copy encoded postings")
+
+    def test_merge_tokens_shared_token(self):
+        self.partition.add_token('token', 'doc_a', 1, 1, [1])
+        self.partition.add_token('token', 'doc_b', 3, 1, [1])
+        other = IndexPartition()
+        other.add_token('token', 'doc_b', 2, 1, [2])
+        other.add_token('token', 'doc_b', 4, 1, [2])
+        other.add_token('token', 'doc_c', 1, 1, [3])
+        self.partition.merge_tokens(other)
+
+        occurrences = self.partition._partition.get_token_info(
+            'token')['documentOccurrences']
+        versions = dict((info['documentID'],
+                         [v['lockNo'] for v in info['versions']])
+                        for info in occurrences)
+        self.assertEqual(versions, {'doc_a': [1], 'doc_b': [4, 3],
+                                    'doc_c': [1]},
+                         "Failed to merge documents")
+        self.assertEqual(self.partition.size(), 1, "Counted token twice")
+
+    def test_get_document_ids(self):
+        self.partition.add_token('alpha', 'doc_a', 1, 1, [1])
+        other = IndexPartition()
+        other.add_token('beta', 'doc_b', 1, 1, [2])
+        encoded = IndexPartition()
+        encoded.loads(other.dumps())
+        self.partition.merge_tokens(encoded)
+
+        self.assertEqual(self.partition.get_document_ids(),
+                         set(['doc_a', 'doc_b']),
+                         "Failed to get document ids")
+
+    def test_get_token_counts(self):
+        self.partition.add_token('alpha', 'doc_a', 1, 1, [1, 2])
+        self.partition.add_token('alpha', 'doc_b', 1, 1, [3])
+        self.partition.add_token('alpha beta', 'doc_a', 1, 2, [1])
+        self.partition.add_token('beta', 'doc_a', 1, 1, [4])
+        res = IndexPartition()
+        res.loads(self.partition.dumps())
+        res.add_token('beta', 'doc_a', 2, 1, [4, 5, 6])
+
+        self.assertEqual(res.get_token_counts(), {'alpha': 3, 'beta': 3},
+                         "Incorrect token counts")
+        self.assertIn('alpha', res._partition._encoded,
+                      "Counting decoded the stored postings")
+
+    def test_filter_postings(self):
+        self.partition.add_token('alpha', 'doc_a', 1, 1, [1])
+        self.partition.add_token('alpha', 'doc_a', 2, 1, [1])
+        self.partition.add_token('alpha', 'doc_b', 1, 1, [2])
+        self.partition.add_token('beta', 'doc_b', 1, 1, [3])
+        self.partition.add_token('gamma', 'doc_a', 2, 1, [4])
+
+        def keep(doc_id, versions):
+            if doc_id == 'doc_b':
+                return []
+            return [v for v in versions if v['lockNo'] >= 2]
+        res = self.partition.filter_postings(keep)
+
+        self.assertEqual(sorted(res), [('alpha', 'doc_a', 1, False),
+                                       ('alpha', 'doc_b', 1, True),
+                                       ('beta', 'doc_b', 1, True)],
+                         "Incorrect removed postings")
+        self.assertEqual(sorted(self.partition.get_token_list()),
+                         ['alpha', 'gamma'], "Failed to remove empty token")
+        self.assertEqual(self.partition.size(), 2, "Incorrect size")
+        self.assertEqual(self.partition.starting_token(), 'alpha')
+        self.assertEqual(self.partition.ending_token(), 'gamma')
+
+    def test_filter_postings_unchanged(self):
+        self.partition.add_token('token', 'doc_id', 1, 1, [1])
+        encoded = IndexPartition()
+        encoded.loads(self.partition.dumps())
+        res = encoded.filter_postings(lambda doc_id, versions: versions)
+
+        self.assertEqual(res, [], "Removed postings")
+        self.assertTrue('token' in encoded._partition._encoded,
+                        "Decoded unchanged token")
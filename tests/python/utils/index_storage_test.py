@@ -1,16 +1,24 @@
 import unittest
 import mock
+from StringIO import StringIO
 
 from index_storage import IndexStorage
+from partition_codec import PartitionCodec
 
 
 class IndexStorageTest(unittest.TestCase):
 
     # mock dependencies of IndexStorage & save references to class
-    @mock.patch('index_storage.boto3')
-    def setUp(self, mock_boto):
+    @mock.patch('index_storage.PartitionCache')
+    @mock.patch('index_storage.AwsClients')
+    def setUp(self, mock_aws, mock_cache_class):
         self.mock_client = mock.Mock()
-        mock_boto.client.return_value = self.mock_client
+        mock_aws.client.return_value = self.mock_client
+        self.mock_cache = mock.Mock()
+        self.mock_cache.get_file.return_value = None
+        self.mock_cache.get_partition.return_value = None
+        self.mock_cache.get_path.side_effect = lambda key: key
+        mock_cache_class.return_value = self.mock_cache
         self.index_storage = IndexStorage()
 
     def test_get_partition(self):
@@ -28,6 +36,7 @@ class IndexStorageTest(unittest.TestCase):
     @mock.patch('index_storage.open')
     def test_write_partition(self, mock_open):
         mock_part = mock.Mock()
+        mock_part.dumps.return_value = 'data'
         res = self.index_storage.write_partition('uri', mock_part)
 
         self.assertTrue(res, "Failed to write partition to storage")
@@ -35,6 +44,7 @@ class IndexStorageTest(unittest.TestCase):
     @mock.patch('index_storage.open')
     def test_write_partition_exception(self, mock_open):
         mock_part = mock.Mock()
+        mock_part.dumps.return_value = 'data'
         self.mock_client.put_object.side_effect = Exception("ERROR")
 
         with self.assertRaises(Exception) as context:
@@ -53,3 +63,185 @@ class IndexStorageTest(unittest.TestCase):
             self.index_storage.delete_partition('key')
 
         self.assertTrue('ERROR' in context.exception)
+
+    def ranged_get(self, data):
+        def get_object(Bucket, Key, Range):
+            (start, end) = Range[len('bytes='):].split('-')
+            return {'Body': StringIO(data[int(start):int(end) + 1])}
+        return get_object
+
+    def test_lookup_tokens(self):
+        data = PartitionCodec.encode({
+            'token': {
+                'ngram_size': 1,
+                'documentOccurrences': [{
+                    'documentID': 'doc_id',
+                    'versions': [{'lockNo': 1, 'locations': [1]}]
+                }]
+            }
+        })
+        self.mock_client.get_object.side_effect = self.ranged_get(data)
+
+        res = self.index_storage.lookup_tokens('uri', ['token', 'missing'])
+        self.assertEqual(res.keys(), ['token'], "Returned incorrect tokens")
+
+    @mock.patch('index_storage.Config')
+    def test_lookup_tokens_ranged_reads(self, mock_config):
+        mock_config.PARTITION_HEADER_READ_SIZE = 16
+        mock_config.PARTITION_RANGE_GAP = 0
+        tokens = {}
+        for token in ['a', 'b', 'c']:
+            tokens[token] = {
+                'ngram_size': 1,
+                'documentOccurrences': [{
+                    'documentID': 'doc_id',
+                    'versions': [{'lockNo': 1, 'locations': [1]}]
+                }]
+            }
+        data = PartitionCodec.encode(tokens)
+        self.mock_client.get_object.side_effect = self.ranged_get(data)
+
+        res = self.index_storage.lookup_tokens('uri', ['a', 'c'])
+        self.assertEqual(sorted(res.keys()), ['a', 'c'],
+                         "Returned incorrect tokens")
+        # preamble, directory, then one read for each postings block
+        self.assertEqual(self.mock_client.get_object.call_count, 4,
+                         "Incorrect number of ranged reads")
+
+    def test_lookup_tokens_exception(self):
+        self.mock_client.get_object.side_effect = Exception("ERROR")
+
+        with self.assertRaises(Exception) as context:
+            self.index_storage.lookup_tokens('uri', ['token'])
+
+        self.assertTrue('ERROR' in context.exception)
+
+    def test_get_partition_cached(self):
+        self.mock_cache.get_file.return_value = 'cached_path'
+        res = self.index_storage.get_partition('part_id')
+
+        self.assertEqual(res, 'cached_path', "Failed to use cached file")
+        self.assertFalse(self.mock_client.download_file.called,
+                         "Downloaded cached partition")
+
+    def test_load_partition_cached(self):
+        mock_part = mock.Mock()
+        self.mock_cache.get_partition.return_value = mock_part
+        res = self.index_storage.load_partition('part_id')
+
+        self.assertEqual(res, mock_part, "Failed to use cached partition")
+        self.assertFalse(self.mock_client.download_file.called,
+                         "Downloaded cached partition")
+
+    @mock.patch('index_storage.IndexPartition')
+    def test_load_partition(self, mock_part_class):
+        self.mock_client.get_object.return_value = {
+            'Body': StringIO('data'), 'ContentLength': 4}
+        res = self.index_storage.load_partition('part_id')
+
+        self.assertEqual(res, mock_part_class.return_value,
+                         "Failed to load partition")
+        self.mock_cache.add_partition.assert_called_with('part_id', res)
+
+    @mock.patch('index_storage.IndexPartition')
+    def test_load_partition_for_update(self, mock_part_class):
+        self.mock_client.get_object.return_value = {
+            'Body': StringIO('data'), 'ContentLength': 4}
+        self.index_storage.load_partition('part_id', for_update=True)
+
+        self.assertFalse(self.mock_cache.add_partition.called,
+                         "Cached partition loaded for update")
+
+    def test_lookup_tokens_cached(self):
+        mock_part = mock.Mock()
+        mock_part.get_token_infos.return_value = {'token': {}}
+        self.mock_cache.get_partition.return_value = mock_part
+        res = self.index_storage.lookup_tokens('uri', ['token'])
+
+        self.assertEqual(res, {'token': {}}, "Failed to use cached partition")
+        self.assertFalse(self.mock_client.get_object.called,
+                         "Read cached partition from storage")
+
+    @mock.patch('index_storage.open')
+    def test_write_partition_in_memory(self, mock_open):
+        mock_part = mock.Mock()
+        mock_part.dumps.return_value = 'data'
+        self.index_storage.write_partition('uri', mock_part)
+
+        self.mock_client.put_object.assert_called_with(
+            Bucket=IndexStorage.INDEX_STORAGE, Key='uri.pkl', Body='data')
+        self.assertFalse(mock_open.called, "Wrote partition to a file")
+        self.assertFalse(self.mock_cache.add_file.called,
+                         "Cached a file that was not written")
+
+    @mock.patch('index_storage.Config')
+    @mock.patch('index_storage.open')
+    def test_write_partition_spill(self, mock_open, mock_config):
+        mock_config.PARTITION_SPILL_BYTES = 2
+        mock_part = mock.Mock()
+        mock_part.dumps.return_value = 'data'
+        self.index_storage.write_partition('uri', mock_part)
+
+        mock_open.assert_any_call('uri', 'wb')
+        mock_open.assert_any_call('uri', 'rb')
+        self.mock_cache.add_file.assert_called_with('uri')
+
+    @mock.patch('index_storage.open')
+    def test_load_partition_in_memory(self, mock_open):
+        data = PartitionCodec.encode({
+            'token': {
+                'ngram_size': 1,
+                'documentOccurrences': [{
+                    'documentID': 'doc_id',
+                    'versions': [{'lockNo': 1, 'locations': [1, 2]}]
+                }]
+            }
+        })
+        self.mock_client.get_object.return_value = {
+            'Body': StringIO(data), 'ContentLength': len(data)}
+        res = self.index_storage.load_partition('uri')
+
+        self.assertEqual(res.get_token_count('token'), 2,
+                         "Failed to load partition from stream")
+        self.assertFalse(mock_open.called, "Wrote partition to a file")
+        self.assertFalse(self.mock_client.download_file.called,
+                         "Downloaded partition to a file")
+
+    @mock.patch('index_storage.IndexPartition')
+    @mock.patch('index_storage.Config')
+    @mock.patch('index_storage.open')
+    def test_load_partition_spill(self, mock_open, mock_config,
+                                  mock_part_class):
+        mock_config.PARTITION_SPILL_BYTES = 2
+        mock_config.PARTITION_STREAM_CHUNK_SIZE = 2
+        out_file = StringIO()
+        mock_open.return_value.__enter__.return_value = out_file
+        self.mock_client.get_object.return_value = {
+            'Body': StringIO('data'), 'ContentLength': 4}
+        res = self.index_storage.load_partition('uri')
+
+        self.assertEqual(out_file.getvalue(), 'data',
+                         "Failed to spill partition")
+        self.mock_cache.add_file.assert_called_with('uri')
+        res.deserialize.assert_called_with('uri')
+
+    @mock.patch('index_storage.IndexPartition')
+    def test_load_partition_cached_file(self, mock_part_class):
+        self.mock_cache.get_file.return_value = 'cached_path'
+        res = self.index_storage.load_partition('uri')
+
+        res.deserialize.assert_called_with('cached_path')
+        self.assertFalse(self.mock_client.get_object.called,
+                         "Downloaded cached partition")
+
+    def test_is_missing_partition(self):
+        ex = Exception("ERROR")
+        ex.response = {'Error': {'Code': 'NoSuchKey'}}
+        self.assertTrue(IndexStorage.is_missing_partition(ex),
+                        "Failed to detect missing partition")
+
+    def test_is_missing_partition_other_error(self):
+        ex = Exception("ERROR")
+        ex.response = {'Error': {'Code': 'AccessDenied'}}
+        self.assertFalse(IndexStorage.is_missing_partition(ex),
+                         "Detected missing partition for other error")
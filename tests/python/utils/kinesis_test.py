@@ -0,0 +1,158 @@
+import unittest
+import mock
+import base64
+import json
+
+from kinesis import Kinesis
+
+
+class KinesisTest(unittest.TestCase):
+
+    # mock dependencies of Kinesis & save references to class
+    def setUp(self):
+        self.mock_client = mock.Mock()
+        self.mock_client.put_records.side_effect = self.put_records
+        self.kinesis = self.new_kinesis(100)
+        self.requests = []
+        self.failures = []
+
+    def new_kinesis(self, aggregate_bytes):
+        with mock.patch('kinesis.AwsClients') as mock_aws:
+            mock_aws.client.return_value = self.mock_client
+            return Kinesis('stream', aggregate_bytes=aggregate_bytes)
+
+    # records every request, failing the records of the first entry of
+    # self.failures for each call
+    def put_records(self, Records, StreamName):
+        self.requests.append(list(Records))
+        failed = self.failures.pop(0) if self.failures else []
+        entries = []
+        for (idx, record) in enumerate(Records):
+            if idx in failed:
+                entries.append({'ErrorCode': 'ProvisionedThroughput'
+                                             'ExceededException'})
+            else:
+                entries.append({'SequenceNumber': str(idx)})
+        return {'FailedRecordCount': len(failed), 'Records': entries}
+
+    def task(self, payload):
+        task = mock.Mock()
+        task.get_payload.return_value = payload
+        return task
+
+    def kinesis_records(self, records):
+        return [{'kinesis': {'data': base64.b64encode(r['Data'])}}
+                for r in records]
+
+    def test_dispatch_tasks(self):
+        res = self.kinesis.dispatch_tasks([self.task({'id': 1})])
+
+        self.assertTrue(res, "Failed to dispatch tasks")
+        self.assertEqual(len(self.requests), 1)
+        self.assertEqual(json.loads(self.requests[0][0]['Data']), {'id': 1})
+
+    def test_dispatch_tasks_exception(self):
+        self.mock_client.put_records.side_effect = Exception("ERROR")
+
+        with self.assertRaises(Exception) as context:
+            self.kinesis.dispatch_tasks([self.task({'id': 1})])
+
+        self.assertTrue('ERROR' in context.exception)
+
+    def test_aggregate_round_trip(self):
+        tasks = [self.task({'id': i}) for i in range(20)]
+        self.kinesis.dispatch_tasks(tasks)
+        records = self.requests[0]
+
+        self.assertTrue(1 < len(records) < 20, "Failed to aggregate tasks")
+        for record in records:
+            self.assertTrue(len(record['Data']) <= 100,
+                            "Record exceeds aggregation budget")
+        res = self.kinesis.parse_tasks_from_records(
+            self.kinesis_records(records))
+        self.assertEqual(res, [{'id': i} for i in range(20)],
+                         "Failed to de-aggregate tasks")
+
+    def test_dispatch_grouped_tasks(self):
+        kinesis = self.new_kinesis(1000)
+        tasks = [self.task({'id': i, 'partition': ['a', 'b', ''][i % 3]})
+                 for i in range(9)]
+        kinesis.dispatch_tasks(tasks, lambda task:
+                               task.get_payload()['partition'])
+        records = self.requests[0]
+
+        self.assertEqual(len(records), 3, "Failed to group tasks")
+        self.assertEqual([r['PartitionKey'] for r in records[:2]],
+                         ['a', 'b'])
+        self.assertTrue(len(records[2]['PartitionKey']) > 0,
+                        "Empty group key used as partition key")
+        for record in records:
+            res = kinesis.parse_tasks_from_records(
+                self.kinesis_records([record]))
+            self.assertEqual(len(set(t['partition'] for t in res)), 1,
+                             "Record mixes groups")
+
+    def test_parse_single_task_record(self):
+        records = [{'Data': json.dumps({'id': 1})}]
+        res = self.kinesis.parse_tasks_from_records(
+            self.kinesis_records(records))
+        self.assertEqual(res, [{'id': 1}])
+
+    def test_request_record_limit(self):
+        kinesis = self.new_kinesis(0)
+        kinesis.dispatch_tasks([self.task({'id': i}) for i in range(1201)])
+
+        self.assertEqual([len(r) for r in self.requests], [500, 500, 201],
+                         "Failed to respect the request record limit")
+
+    @mock.patch('kinesis.Kinesis.MAX_REQUEST_BYTES', 200)
+    def test_request_byte_limit(self):
+        kinesis = self.new_kinesis(0)
+        kinesis.dispatch_tasks([self.task({'id': 'x' * 50})
+                                for i in range(6)])
+
+        for request in self.requests:
+            size = sum(len(r['Data']) + len(r['PartitionKey'])
+                       for r in request)
+            self.assertTrue(size <= 200, "Request exceeds byte limit")
+        self.assertEqual(sum(len(r) for r in self.requests), 6)
+
+    @mock.patch('kinesis.Kinesis.MAX_RECORD_BYTES', 20)
+    def test_task_too_large(self):
+        with self.assertRaises(Exception) as context:
+            self.kinesis.dispatch_tasks([self.task({'id': 'x' * 50})])
+
+        self.assertTrue('too large' in str(context.exception))
+
+    @mock.patch('backoff.time.sleep')
+    def test_retry_failed_records(self, mock_sleep):
+        kinesis = self.new_kinesis(0)
+        self.failures = [[1, 3], [0]]
+        kinesis.dispatch_tasks([self.task({'id': i}) for i in range(4)])
+
+        self.assertEqual(len(self.requests), 3)
+        retried = [json.loads(r['Data'])['id'] for r in self.requests[1]]
+        self.assertEqual(retried, [1, 3], "Retried incorrect records")
+        self.assertEqual(json.loads(self.requests[2][0]['Data'])['id'], 1)
+        self.assertEqual(mock_sleep.call_count, 2)
+        stats = kinesis.get_stats()
+        self.assertEqual(stats['retries'], 3)
+        self.assertEqual(stats['requests'], 3)
+        self.assertEqual(stats['tasks'], 4)
+        self.assertEqual(stats['records'], 4)
+
+    @mock.patch('kinesis.Config')
+    @mock.patch('backoff.time.sleep')
+    def test_retry_exhausted(self, mock_sleep, mock_config):
+        mock_config.KINESIS_MAX_RETRIES = 2
+        mock_config.KINESIS_BACKOFF_BASE = 0.1
+        mock_config.KINESIS_BACKOFF_MAX = 1.0
+        self.failures = [[0]] * 3
+
+        with self.assertRaises(Exception) as context:
+            self.kinesis.dispatch_tasks([self.task({'id': 1})])
+
+        self.assertTrue('after retries' in str(context.exception))
+        self.assertEqual(len(self.requests), 3)
+        for call in mock_sleep.call_args_list:
+            self.assertTrue(0 <= call[0][0] <= 1.0, "Backoff exceeds cap")
@@ -0,0 +1,36 @@
+import struct
+
+from partition_codec import PartitionCodec
+
+
+# encodes a postings block in format version 1, no longer written but
+# still read: the document ids followed by fixed width integer arrays.
+# Shared by the codec tests & the compression benchmark
+def encode_v1_postings(occurrences):
+    doc_ids = []
+    version_counts = []
+    lock_nos = []
+    location_counts = []
+    locations = []
+    for doc_info in occurrences:
+        doc_ids.append(doc_info['documentID'].encode('utf-8'))
+        versions = doc_info['versions']
+        version_counts.append(len(versions))
+        for version in versions:
+            lock_nos.append(version['lockNo'])
+            location_counts.append(len(version['locations']))
+            locations.extend(version['locations'])
+
+    return ''.join([
+        PartitionCodec.DOC_COUNT.pack(len(doc_ids)),
+        pack('H', [len(d) for d in doc_ids]),
+        ''.join(doc_ids),
+        pack('B', version_counts),
+        pack('I', lock_nos),
+        pack('I', location_counts),
+        pack('I', locations)
+    ])
+
+
+def pack(type_code, values):
+    return struct.pack('<{0}{1}'.format(len(values), type_code), *values)
@@ -0,0 +1,90 @@
+import os
+import shutil
+import tempfile
+import unittest
+import mock
+
+from partition_cache import PartitionCache
+
+
+class PartitionCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.cache = PartitionCache(self.directory, 10, 2)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def write_file(self, key, size):
+        with open(self.cache.get_path(key), 'wb') as out_file:
+            out_file.write('x' * size)
+        self.cache.add_file(key)
+
+    def test_get_file(self):
+        self.write_file('key', 4)
+        res = self.cache.get_file('key')
+        self.assertEqual(res, os.path.join(self.directory, 'key'),
+                         "Failed to return cached file")
+        self.assertEqual(self.cache.get_stats()['diskHits'], 1,
+                         "Failed to count disk hit")
+
+    def test_get_file_missing(self):
+        self.assertEqual(self.cache.get_file('key'), None,
+                         "Returned file that is not cached")
+
+    def test_evict_files(self):
+        self.write_file('a', 4)
+        self.write_file('b', 4)
+        self.cache.get_file('a')
+        self.write_file('c', 4)
+
+        self.assertEqual(self.cache.get_file('b'), None,
+                         "Failed to evict least recently used file")
+        self.assertFalse(os.path.exists(self.cache.get_path('b')),
+                         "Failed to remove evicted file")
+        self.assertNotEqual(self.cache.get_file('a'), None,
+                            "Evicted recently used file")
+
+    def test_load_directory(self):
+        self.write_file('a', 4)
+        res = PartitionCache(self.directory, 10, 2)
+        self.assertNotEqual(res.get_file('a'), None,
+                            "Failed to reuse existing cache files")
+
+    def test_get_partition(self):
+        partition = mock.Mock()
+        self.cache.add_partition('key', partition)
+        self.assertEqual(self.cache.get_partition('key'), partition,
+                         "Failed to return cached partition")
+        self.assertEqual(self.cache.get_partition('key'), partition,
+                         "Failed to keep shared partition cached")
+
+    def test_get_partition_for_update(self):
+        self.cache.add_partition('key', mock.Mock())
+        self.cache.get_partition('key', for_update=True)
+        self.assertEqual(self.cache.get_partition('key'), None,
+                         "Failed to hand over partition for update")
+
+    def test_evict_partitions(self):
+        self.cache.add_partition('a', mock.Mock())
+        self.cache.add_partition('b', mock.Mock())
+        self.cache.get_partition('a')
+        self.cache.add_partition('c', mock.Mock())
+
+        self.assertEqual(self.cache.get_partition('b'), None,
+                         "Failed to evict least recently used partition")
+        self.assertEqual(self.cache.get_stats()['evictions'], 1,
+                         "Failed to count eviction")
+
+    def test_remove(self):
+        self.write_file('key', 4)
+        self.cache.add_partition('key', mock.Mock())
+        self.cache.remove('key')
+
+        self.assertEqual(self.cache.get_file('key'), None,
+                         "Failed to remove cached file")
+        self.assertEqual(self.cache.get_partition('key'), None,
+                         "Failed to remove cached partition")
+        self.assertEqual(self.cache.get_stats()['diskBytes'], 0,
+                         "Failed to release cached bytes")
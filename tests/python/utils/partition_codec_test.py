@@ -0,0 +1,190 @@
+import unittest
+import mock
+
+import partition_codec
+from legacy_postings import encode_v1_postings
+from partition_codec import PartitionCodec
+
+
+class PartitionCodecTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tokens = {
+            'token': {
+                'ngram_size': 1,
+                'documentOccurrences': [{
+                    'documentID': 'doc1',
+                    'versions': [{'lockNo': 2, 'locations': [1, 5, 9]},
+                                 {'lockNo': 1, 'locations': [1]}]
+                }, {
+                    'documentID': 'doc2',
+                    'versions': [{'lockNo': 7, 'locations': []}]
+                }]
+            },
+            u'caf\xe9 au lait': {
+                'ngram_size': 3,
+                'documentOccurrences': [{
+                    'documentID': 'doc1',
+                    'versions': [{'lockNo': 0, 'locations': [4]}]
+                }]
+            }
+        }
+
+    def test_round_trip(self):
+        data = PartitionCodec.encode(self.tokens)
+        res = PartitionCodec.decode(data)
+        self.assertEqual(res, self.tokens, "Failed to round trip partition")
+
+    def test_round_trip_empty(self):
+        data = PartitionCodec.encode({})
+        self.assertEqual(PartitionCodec.decode(data), {},
+                         "Failed to round trip empty partition")
+
+    def test_is_encoded(self):
+        data = PartitionCodec.encode(self.tokens)
+        self.assertTrue(PartitionCodec.is_encoded(data),
+                        "Failed to detect encoded partition")
+        self.assertFalse(PartitionCodec.is_encoded('\x80\x02}q\x01.'),
+                         "Detected pickle as encoded partition")
+
+    def test_directory_sorted(self):
+        data = PartitionCodec.encode(self.tokens)
+        (directory, start) = PartitionCodec.decode_directory(data)
+        tokens = [entry[0] for entry in directory]
+        self.assertEqual(tokens, sorted(self.tokens.keys()),
+                         "Token directory is not sorted")
+
+    def test_decode_invalid(self):
+        with self.assertRaises(Exception) as context:
+            PartitionCodec.decode('\x80\x02' + '\x00' * 20)
+
+        self.assertTrue('not an encoded partition' in str(context.exception))
+
+    def test_lookup(self):
+        data = PartitionCodec.encode(self.tokens)
+        res = PartitionCodec.lookup(data, ['token', 'missing'])
+        self.assertEqual(res, {'token': self.tokens['token']},
+                         "Failed to look up token")
+
+    def test_header_length(self):
+        data = PartitionCodec.encode(self.tokens)
+        (directory, start) = PartitionCodec.decode_directory(data)
+        self.assertEqual(PartitionCodec.header_length(data[:16]), start,
+                         "Incorrect header length")
+
+    def encode_v1(self, tokens):
+        entries = sorted((partition_codec._to_bytes(token),
+                          info['ngram_size'],
+                          encode_v1_postings(
+                              info['documentOccurrences']))
+                         for (token, info) in tokens.iteritems())
+        directory = ''
+        offset = 0
+        for (token, ngram_size, block) in entries:
+            directory += PartitionCodec.TOKEN_LENGTH.pack(len(token)) + token
+            directory += PartitionCodec.TOKEN_ENTRY.pack(ngram_size, offset,
+                                                         len(block))
+            offset += len(block)
+        preamble = PartitionCodec.PREAMBLE.pack(PartitionCodec.MAGIC, 1, 0,
+                                                len(directory), len(entries))
+        return preamble + directory + ''.join(e[2] for e in entries)
+
+    def test_round_trip_compressed(self):
+        data = PartitionCodec.encode(self.tokens, compression_level=9)
+        res = PartitionCodec.decode(data)
+        self.assertEqual(res, self.tokens, "Failed to round trip partition")
+
+    def test_compressed_block(self):
+        occurrences = [{
+            'documentID': 'document-{0}'.format(i),
+            'versions': [{'lockNo': 1, 'locations': range(i, i + 10)}]
+        } for i in range(100)]
+        raw = PartitionCodec.encode_postings(occurrences, 0)
+        compressed = PartitionCodec.encode_postings(occurrences, 6)
+
+        self.assertEqual(raw[:1], PartitionCodec.RAW_BLOCK)
+        self.assertEqual(compressed[:1], PartitionCodec.ZLIB_BLOCK)
+        self.assertTrue(len(compressed) < len(raw), "Failed to compress")
+        self.assertEqual(PartitionCodec.decode_block(compressed), occurrences,
+                         "Failed to decode compressed block")
+
+    def test_small_block_not_compressed(self):
+        block = PartitionCodec.encode_postings(
+            self.tokens['token']['documentOccurrences'], 9)
+        self.assertEqual(block[:1], PartitionCodec.RAW_BLOCK,
+                         "Compressed block that grew")
+
+    @mock.patch('partition_codec.Config')
+    def test_default_compression_level(self, mock_config):
+        mock_config.PARTITION_COMPRESSION_LEVEL = 6
+        occurrences = [{
+            'documentID': 'document',
+            'versions': [{'lockNo': 1, 'locations': [1] * 100}]
+        }]
+        block = PartitionCodec.encode_postings(occurrences)
+        self.assertEqual(block[:1], PartitionCodec.ZLIB_BLOCK,
+                         "Ignored configured compression level")
+
+    def test_delta_round_trip(self):
+        occurrences = [{
+            'documentID': 'doc',
+            'versions': [{'lockNo': 2 ** 40, 'locations': [9, 3, 2 ** 31]},
+                         {'lockNo': 3, 'locations': [0, 0, 1]}]
+        }]
+        block = PartitionCodec.encode_postings(occurrences, 0)
+        self.assertEqual(PartitionCodec.decode_block(block), occurrences,
+                         "Failed to round trip unsorted values")
+
+    def test_smaller_than_v1(self):
+        occurrences = self.tokens['token']['documentOccurrences']
+        self.assertTrue(len(PartitionCodec.encode_postings(occurrences, 0)) <
+                        len(encode_v1_postings(occurrences)),
+                        "Block is not smaller than format version 1")
+
+    def test_decode_v1(self):
+        data = self.encode_v1(self.tokens)
+        self.assertEqual(PartitionCodec.format_version(data), 1)
+        self.assertEqual(PartitionCodec.decode(data), self.tokens,
+                         "Failed to decode format version 1")
+        self.assertEqual(PartitionCodec.lookup(data, ['token']),
+                         {'token': self.tokens['token']},
+                         "Failed to look up format version 1")
+
+    def test_decode_blocks_converts_v1(self):
+        data = self.encode_v1(self.tokens)
+        blocks = PartitionCodec.decode_blocks(data)
+        encoded = dict((token, (ngram_size, block))
+                       for (token, ngram_size, block) in blocks)
+        res = PartitionCodec.decode(PartitionCodec.encode({}, encoded))
+        self.assertEqual(res, self.tokens, "Failed to convert version 1")
+
+    def test_copy_compressed_blocks(self):
+        data = PartitionCodec.encode(self.tokens, compression_level=9)
+        encoded = dict((token, (ngram_size, block)) for
+                       (token, ngram_size, block) in
+                       PartitionCodec.decode_blocks(data))
+        res = PartitionCodec.encode({}, encoded, compression_level=0)
+        self.assertEqual(PartitionCodec.decode(res), self.tokens,
+                         "Failed to copy compressed blocks")
+
+    def test_unsupported_version(self):
+        data = PartitionCodec.PREAMBLE.pack(PartitionCodec.MAGIC, 99, 0, 0, 0)
+        with self.assertRaises(Exception) as context:
+            PartitionCodec.decode(data)
+
+        self.assertTrue('Unsupported' in str(context.exception))
+
+    def test_decode_document_ids(self):
+        occurrences = self.tokens['token']['documentOccurrences']
+        for level in [0, 9]:
+            block = PartitionCodec.encode_postings(occurrences, level)
+            self.assertEqual(PartitionCodec.decode_document_ids(block),
+                             ['doc1', 'doc2'],
+                             "Failed to decode document ids")
+
+    def test_decode_document_ids_v1(self):
+        occurrences = self.tokens['token']['documentOccurrences']
+        block = encode_v1_postings(occurrences)
+        self.assertEqual(PartitionCodec.decode_document_ids(block, 1),
+                         ['doc1', 'doc2'],
+                         "Failed to decode version 1 document ids")
@@ -0,0 +1,110 @@
+import unittest
+import mock
+
+from partition_router import PartitionRouter
+
+
+class PartitionRouterTest(unittest.TestCase):
+
+    def setUp(self):
+        self.mock_index = mock.Mock()
+        self.mock_index.get_partition_ranges.return_value = [
+            self.item('p1', 'a', 'f', 10),
+            self.item('p2', 'd', 'k', 5),
+            self.item('p3', 'm', 'z', 1000),
+            self.item('p4', 'l', 'p', 20)
+        ]
+        self.router = PartitionRouter(self.mock_index)
+
+    def item(self, pkey, start, end, size):
+        return {'pKey': pkey, 'startingToken': start,
+                'endingToken': end, 'size': size}
+
+    def test_load_scans_once(self):
+        self.router.load()
+        self.router.load()
+        self.router.get_partition_for_token('b')
+        self.assertEqual(self.mock_index.get_partition_ranges.call_count, 1,
+                         "Scanned metadata more than once")
+
+    def test_refresh_tokens(self):
+        self.mock_index.get_partition_ranges_for_tokens.return_value = [
+            self.item('p2', 'd', 'k', 5)
+        ]
+        self.router.refresh(['e'])
+
+        self.mock_index.get_partition_ranges_for_tokens.assert_called_with(
+            ['e'])
+        self.assertFalse(self.mock_index.get_partition_ranges.called,
+                         "Scanned metadata for token buckets")
+        self.assertEqual(self.router.get_partition_for_token('e'), 'p2')
+
+    def test_single_candidate(self):
+        res = self.router.get_partition_for_token('b')
+        self.assertEqual(res, 'p1', "Routed to incorrect partition")
+
+    def test_smallest_candidate(self):
+        res = self.router.get_partition_for_token('e')
+        self.assertEqual(res, 'p2', "Failed to route to smallest partition")
+
+    def test_range_boundaries(self):
+        self.assertEqual(self.router.get_partition_for_token('a'), 'p1')
+        self.assertEqual(self.router.get_partition_for_token('k'), 'p2')
+
+    def test_full_partition_skipped(self):
+        res = self.router.get_partition_for_token('n')
+        self.assertEqual(res, 'p4', "Routed to partition at max size")
+
+    def test_full_partition_only_candidate(self):
+        res = self.router.get_partition_for_token('q')
+        self.assertEqual(res, 'p3', "Failed to route to full partition")
+
+    def test_no_candidate(self):
+        res = self.router.get_partition_for_token('kz')
+        self.assertEqual(res, 'p2',
+                         "Failed to route to the partition before the token")
+
+    def test_no_candidate_before_first(self):
+        res = self.router.get_partition_for_token('0')
+        self.assertEqual(res, 'p1', "Failed to route to the first partition")
+
+    def test_no_partitions(self):
+        self.mock_index.get_partition_ranges.return_value = []
+        res = self.router.get_partition_for_token('a')
+        self.assertEqual(res, '', "Routed token without partitions")
+
+    def test_equal_size_uses_pkey_order(self):
+        items = [self.item('p2', 'c', 'z', 5), self.item('p1', 'a', 'z', 5)]
+        for ranges in [items, list(reversed(items))]:
+            self.mock_index.get_partition_ranges.return_value = ranges
+            res = self.router.refresh().get_partition_for_token('d')
+            self.assertEqual(res, 'p1', "Failed to break tie on pkey")
+
+    def test_route_tokens(self):
+        res = self.router.route_tokens(['b', 'e', 'q'])
+        self.assertEqual(res, {'b': 'p1', 'e': 'p2', 'q': 'p3'},
+                         "Failed to route tokens")
+
+    def test_refresh(self):
+        self.router.load()
+        self.mock_index.get_partition_ranges.return_value = []
+        self.router.refresh()
+        self.assertEqual(self.router.partition_count(), 0,
+                         "Failed to refresh partition ranges")
+
+    def test_get_partitions_for_token(self):
+        self.mock_index.get_partition_ranges.return_value = [
+            self.item('p1', 'a', 'f', 10),
+            self.item('p2', 'd', 'k', 5),
+            self.item('p3', 'm', 'z', 1000)
+        ]
+        self.mock_index.get_partition_ranges.return_value[0]['s3Key'] = 's1'
+        self.mock_index.get_partition_ranges.return_value[1]['s3Key'] = 's2'
+        self.mock_index.get_partition_ranges.return_value[2]['s3Key'] = 's3'
+
+        self.assertEqual(self.router.get_partitions_for_token('e'),
+                         [('p1', 's1'), ('p2', 's2')],
+                         "Failed to return every candidate partition")
+        self.assertEqual(self.router.get_partitions_for_token('q'),
+                         [('p3', 's3')],
+                         "Failed to return full partition")
@@ -0,0 +1,79 @@
+import unittest
+import mock
+import json
+
+from result_queue import ResultQueue
+
+
+class ResultQueueTest(unittest.TestCase):
+
+    # mock dependencies of ResultQueue & save references to class
+    @mock.patch('result_queue.AwsClients')
+    def setUp(self, mock_aws):
+        self.mock_client = mock.Mock()
+        self.mock_client.get_queue_url.return_value = {'QueueUrl': 'url'}
+        mock_aws.client.return_value = self.mock_client
+        self.queue = ResultQueue('queue')
+
+    def message(self, group_id, body, handle='handle'):
+        return {
+            'Body': json.dumps(body),
+            'ReceiptHandle': handle,
+            'Attributes': {'MessageGroupId': group_id}
+        }
+
+    def test_send_result(self):
+        res = self.queue.send_result('query', {'tokens': []})
+
+        self.assertTrue(res, "Failed to send result")
+        kwargs = self.mock_client.send_message.call_args[1]
+        self.assertEqual(kwargs['QueueUrl'], 'url')
+        self.assertEqual(kwargs['MessageGroupId'], 'query')
+        self.assertEqual(json.loads(kwargs['MessageBody']), {'tokens': []})
+
+    def test_send_result_exception(self):
+        self.mock_client.send_message.side_effect = Exception("ERROR")
+
+        with self.assertRaises(Exception) as context:
+            self.queue.send_result('query', {})
+
+        self.assertTrue('ERROR' in context.exception)
+
+    def test_queue_url_cached(self):
+        self.queue.send_result('query', {})
+        self.queue.send_result('query', {})
+        self.assertEqual(self.mock_client.get_queue_url.call_count, 1)
+
+    def test_receive_results(self):
+        self.mock_client.receive_message.return_value = {
+            'Messages': [self.message('query', {'a': 1}, 'h1'),
+                         self.message('other', {'b': 2}, 'h2'),
+                         self.message('query', {'c': 3}, 'h3')]
+        }
+
+        res = self.queue.receive_results('query', 2, 5)
+
+        self.assertEqual(res, [{'a': 1}, {'c': 3}])
+        handles = [c[1]['ReceiptHandle'] for c in
+                   self.mock_client.delete_message.call_args_list]
+        self.assertEqual(handles, ['h1', 'h3'])
+        self.mock_client.change_message_visibility.assert_called_once_with(
+            QueueUrl='url', ReceiptHandle='h2', VisibilityTimeout=0)
+
+    @mock.patch('result_queue.time')
+    def test_receive_results_timeout(self, mock_time):
+        mock_time.time.side_effect = [0, 0, 10]
+        self.mock_client.receive_message.return_value = {}
+
+        res = self.queue.receive_results('query', 1, 5)
+
+        self.assertEqual(res, [], "Failed to stop at timeout")
+        self.assertEqual(self.mock_client.receive_message.call_count, 1)
+
+    def test_receive_results_exception(self):
+        self.mock_client.receive_message.side_effect = Exception("ERROR")
+
+        with self.assertRaises(Exception) as context:
+            self.queue.receive_results('query', 1, 5)
+
+        self.assertTrue('ERROR' in context.exception)
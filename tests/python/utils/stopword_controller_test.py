@@ -0,0 +1,77 @@
+import unittest
+import mock
+
+from stopword_controller import StopWordController
+from stopword_model import StopWordModel
+
+
+class StopWordControllerTest(unittest.TestCase):
+
+    # mock dependencies of StopWordController & save references to class
+    @mock.patch('stopword_controller.AwsClients')
+    def setUp(self, mock_aws):
+        self.mock_table = mock.Mock()
+        mock_aws.table.return_value = self.mock_table
+        self.sw_ctrl = StopWordController()
+
+    def test_get_word(self):
+        self.mock_table.query.return_value = {
+            'Count': 1,
+            'Items': [{'pKey': 'the', 'sortKey': 10}]
+        }
+
+        res = self.sw_ctrl.get_word('the')
+        self.assertEqual(res.get_sortkey(), 10, "Failed to retrieve word")
+
+    def test_add_word(self):
+        res = self.sw_ctrl.add_word(StopWordModel().set_data('the', 10))
+
+        self.assertTrue(res, "Failed to add word")
+        self.assertEqual(self.mock_table.put_item.call_args[1]['Item'],
+                         {'pKey': 'the', 'sortKey': 10},
+                         "Incorrect item written")
+
+    @mock.patch('stopword_controller.Config')
+    def test_add_words_batches(self, mock_config):
+        mock_config.STOPWORD_BATCH_SIZE = 2
+        self.mock_table.meta.client.batch_write_item.return_value = {
+            'UnprocessedItems': {}
+        }
+        res = self.sw_ctrl.add_words([StopWordModel().set_data(word, 1)
+                                      for word in ['a', 'b', 'c']])
+
+        self.assertEqual(res, 3, "Incorrect number of words written")
+        calls = self.mock_table.meta.client.batch_write_item.call_args_list
+        self.assertEqual([len(c[1]['RequestItems']['STOP_WORD'])
+                          for c in calls], [2, 1],
+                         "Failed to batch writes")
+        self.assertEqual(calls[0][1]['RequestItems']['STOP_WORD'][0], {
+            'PutRequest': {'Item': {'pKey': {'S': 'a'},
+                                    'sortKey': {'N': '1'}}}
+        }, "Incorrect put request")
+
+    @mock.patch('backoff.time')
+    def test_add_words_unprocessed_items(self, mock_time):
+        unprocessed = {'STOP_WORD': [{'PutRequest': {'Item': {
+            'pKey': {'S': 'b'}, 'sortKey': {'N': '1'}}}}]}
+        self.mock_table.meta.client.batch_write_item.side_effect = [{
+            'UnprocessedItems': unprocessed
+        }, {
+            'UnprocessedItems': {}
+        }]
+        self.sw_ctrl.add_words([StopWordModel().set_data(word, 1)
+                                for word in ['a', 'b']])
+
+        self.assertEqual(self.mock_table.meta.client.batch_write_item
+                         .call_args[1]['RequestItems'], unprocessed,
+                         "Failed to write unprocessed items")
+        self.assertTrue(mock_time.sleep.called, "Failed to back off")
+
+    def test_add_words_exception(self):
+        self.mock_table.meta.client.batch_write_item.side_effect = \
+            Exception("ERROR")
+
+        with self.assertRaises(Exception) as context:
+            self.sw_ctrl.add_words([StopWordModel().set_data('the', 1)])
+
+        self.assertTrue('ERROR' in str(context.exception))
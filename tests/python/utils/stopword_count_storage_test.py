@@ -0,0 +1,69 @@
+import json
+import unittest
+import zlib
+import mock
+from StringIO import StringIO
+
+from botocore.exceptions import ClientError
+
+from stopword_count_storage import StopWordCountStorage
+
+
+class StopWordCountStorageTest(unittest.TestCase):
+
+    # mock dependencies of StopWordCountStorage & save references to class
+    @mock.patch('stopword_count_storage.AwsClients')
+    def setUp(self, mock_aws):
+        self.mock_client = mock.Mock()
+        mock_aws.client.return_value = self.mock_client
+        self.count_storage = StopWordCountStorage()
+
+    def test_counts_round_trip(self):
+        self.count_storage.put_counts('key', {'the': 3})
+        body = self.mock_client.put_object.call_args[1]['Body']
+        self.mock_client.get_object.return_value = {'Body': StringIO(body)}
+        res = self.count_storage.get_counts('key')
+
+        self.assertEqual(self.mock_client.put_object.call_args[1]['Key'],
+                         'stopword_counts/key', "Incorrect storage key")
+        self.assertEqual(res, {'the': 3}, "Failed to read counts")
+
+    def test_get_counts_missing(self):
+        self.mock_client.get_object.side_effect = ClientError(
+            {'Error': {'Code': 'NoSuchKey'}}, 'GetObject')
+        res = self.count_storage.get_counts('key')
+
+        self.assertEqual(res, None, "Failed to detect missing counts")
+
+    def test_get_counts_exception(self):
+        self.mock_client.get_object.side_effect = Exception("ERROR")
+
+        with self.assertRaises(Exception) as context:
+            self.count_storage.get_counts('key')
+
+        self.assertTrue('ERROR' in str(context.exception))
+
+    def test_get_totals(self):
+        self.mock_client.get_object.return_value = {'Body': StringIO(
+            zlib.compress(json.dumps({'partitions': {'p': 'key'},
+                                      'tokens': {'the': 3}})))}
+        res = self.count_storage.get_totals()
+
+        self.assertEqual(res, ({'p': 'key'}, {'the': 3}),
+                         "Failed to read totals")
+        self.assertEqual(self.mock_client.get_object.call_args[1]['Key'],
+                         'stopword_counts/totals', "Incorrect totals key")
+
+    def test_get_totals_first_run(self):
+        self.mock_client.get_object.side_effect = ClientError(
+            {'Error': {'Code': 'NoSuchKey'}}, 'GetObject')
+        res = self.count_storage.get_totals()
+
+        self.assertEqual(res, ({}, {}), "Failed to start from empty totals")
+
+    def test_delete_counts(self):
+        res = self.count_storage.delete_counts('key')
+
+        self.assertTrue(res, "Failed to delete counts")
+        self.assertEqual(self.mock_client.delete_object.call_args[1]['Key'],
+                         'stopword_counts/key', "Deleted incorrect key")
@@ -0,0 +1,237 @@
+import base64
+import unittest
+import mock
+
+import write_worker_node
+from document_model import DocumentModel
+from document_writer import DocumentWriter
+from input_models import WriteInputModel
+from kinesis import Kinesis
+from write_task_model import WriteTaskModel
+
+
+class DocumentWriterTest(unittest.TestCase):
+
+    # mock dependencies of DocumentWriter & save references to class
+    @mock.patch('document_writer.Kinesis')
+    @mock.patch('document_writer.IndexController')
+    @mock.patch('document_writer.DocumentController')
+    def setUp(self, mock_documents_class, mock_index_class,
+              mock_kinesis_class):
+        patcher = mock.patch('document_writer.Config')
+        self.mock_config = patcher.start()
+        self.addCleanup(patcher.stop)
+        self.mock_config.WRITE_MASTER_THREADS = 1
+        self.mock_config.INDEX_MAX_SIZE = 3
+        self.mock_documents = mock_documents_class.return_value
+        self.mock_index = mock_index_class.return_value
+        self.mock_kinesis = mock_kinesis_class.return_value
+        self.mock_documents.acquire_lock.side_effect = self.acquire_lock
+        self.mock_index.get_partition_ranges_for_tokens.return_value = [
+            self.partition('p1', 'a', 'c'), self.partition('p2', 'd', 'f')]
+        self.writer = DocumentWriter()
+
+    def partition(self, pkey, start, end, size=1):
+        return {'pKey': pkey, 'startingToken': start, 'endingToken': end,
+                'size': size, 's3Key': pkey + '-key'}
+
+    def request(self, doc_id, tokens):
+        return {
+            'documentID': doc_id,
+            'tokenCount': len(tokens),
+            'importantTokenRanges': [],
+            'tokens': [{'token': token, 'ngramSize': 1, 'locations': [idx]}
+                       for (idx, token) in enumerate(tokens)]
+        }
+
+    def write_input(self, doc_id, tokens):
+        write_input = WriteInputModel()
+        write_input.parse_from_request(self.request(doc_id, tokens))
+        return write_input
+
+    # existing documents at lockNo 1
+    def acquire_lock(self, doc_id, expiration):
+        return DocumentModel().set_doc_info({'pKey': doc_id, 'internal': {
+            'lockNo': 1, 'updating': True, 'delete': False}})
+
+    def dispatched(self):
+        return self.mock_kinesis.dispatch_tasks.call_args[0][0]
+
+    def test_write_documents(self):
+        res = self.writer.write_documents([
+            self.request('doc1', ['apple', 'egg']),
+            self.request('doc2', ['banana'])])
+
+        self.assertEqual(res, [
+            {'documentID': 'doc1', 'status': 'dispatched', 'lockNo': 2,
+             'tasks': 2},
+            {'documentID': 'doc2', 'status': 'dispatched', 'lockNo': 2,
+             'tasks': 1}])
+        self.assertEqual([(t.get_doc_id(), t.get_lock_no_next(),
+                           DocumentWriter.task_partition(t))
+                          for t in self.dispatched()],
+                         [('doc1', 2, 'p1'), ('doc1', 2, 'p2'),
+                          ('doc2', 2, 'p1')])
+        self.assertEqual([c[0][0] for c in self.mock_documents
+                          .unlock_document.call_args_list], ['doc1', 'doc2'])
+        self.assertEqual(self.mock_index.get_partition_ranges_for_tokens
+                         .call_count, 1, "Routed without a single snapshot")
+
+    def test_write_documents_invalid(self):
+        res = self.writer.write_documents([
+            'not a request', {'documentID': 'doc1'},
+            self.request('doc2', ['apple'])])
+
+        self.assertEqual([(r['documentID'], r['status'], r['lockNo'],
+                           r['tasks']) for r in res],
+                         [(None, 'invalid', None, 0),
+                          ('doc1', 'invalid', None, 0),
+                          ('doc2', 'dispatched', 2, 1)])
+        self.assertEqual([c[0][0] for c in self.mock_documents
+                          .acquire_lock.call_args_list], ['doc2'])
+
+    def test_write_documents_locked(self):
+        self.mock_documents.acquire_lock.side_effect = None
+        self.mock_documents.acquire_lock.return_value = None
+        self.mock_documents.create_new_document.return_value = False
+
+        res = self.writer.write_documents([self.request('doc1', ['apple'])])
+
+        self.assertEqual(res, [{'documentID': 'doc1', 'status': 'locked',
+                                'lockNo': None, 'tasks': 0}])
+        self.assertFalse(self.mock_kinesis.dispatch_tasks.called)
+        self.assertFalse(self.mock_documents.unlock_document.called,
+                         "Unlocked a document held by another writer")
+
+    def test_write_documents_dispatch_fails(self):
+        self.mock_kinesis.dispatch_tasks.side_effect = Exception("ERROR")
+
+        with self.assertRaises(Exception) as context:
+            self.writer.write_documents([self.request('doc1', ['apple'])])
+
+        self.assertTrue('ERROR' in context.exception)
+        self.assertFalse(self.mock_documents.unlock_document.called,
+                         "Unlocked a document whose tasks weren't sent")
+
+    def test_lock_document(self):
+        write_input = self.write_input('doc1', ['apple'])
+
+        self.assertEqual(self.writer.lock_document(write_input), 2)
+        self.assertFalse(self.mock_documents.create_new_document.called)
+
+    def test_lock_document_new(self):
+        self.mock_documents.acquire_lock.side_effect = None
+        self.mock_documents.acquire_lock.return_value = None
+        self.mock_documents.create_new_document.return_value = True
+        write_input = self.write_input('doc1', ['apple'])
+
+        res = self.writer.lock_document(write_input)
+
+        self.assertEqual(res, 1)
+        (doc, if_absent) = \
+            self.mock_documents.create_new_document.call_args[0]
+        self.assertEqual((doc.get_pkey(), doc.get_lock_no(),
+                          doc.is_updating()), ('doc1', 1, True))
+        self.assertTrue(if_absent, "Overwrote a document created meanwhile")
+
+    def test_lock_document_locked(self):
+        self.mock_documents.acquire_lock.side_effect = None
+        self.mock_documents.acquire_lock.return_value = None
+        self.mock_documents.create_new_document.return_value = False
+        write_input = self.write_input('doc1', ['apple'])
+
+        self.assertIsNone(self.writer.lock_document(write_input))
+
+    def router(self, partitions):
+        router = mock.Mock()
+        router.get_partition_for_token.side_effect = partitions.get
+        return router
+
+    def test_create_write_tasks(self):
+        router = self.router({'apple': 'p1', 'egg': 'p2', 'banana': 'p1'})
+
+        tasks = self.writer.create_write_tasks(
+            self.write_input('doc1', ['Apple', 'egg', 'banana']), 2, router)
+
+        self.assertEqual([[(op['token'], op['partitionID'], op['locations'])
+                           for op in task.get_operations()]
+                          for task in tasks],
+                         [[('apple', 'p1', [0]), ('banana', 'p1', [2])],
+                          [('egg', 'p2', [1])]],
+                         "Failed to create one task per partition")
+        self.assertEqual(len(set(t.get_write_id() for t in tasks)), 1)
+        for task in tasks:
+            self.assertTrue(task.verify())
+            self.assertEqual((task.get_doc_id(), task.get_lock_no_next()),
+                             ('doc1', 2))
+
+    def test_create_write_tasks_new_partitions(self):
+        tokens = ['t{0}'.format(idx) for idx in range(7)]
+        router = self.router(dict((token, '') for token in tokens))
+
+        tasks = self.writer.create_write_tasks(
+            self.write_input('doc1', tokens), 2, router)
+
+        self.assertEqual([[op['token'] for op in task.get_operations()]
+                          for task in tasks],
+                         [tokens[0:3], tokens[3:6], tokens[6:]],
+                         "Failed to cap new partitions at INDEX_MAX_SIZE")
+        for task in tasks:
+            self.assertEqual(DocumentWriter.task_partition(task), '')
+
+    def test_create_write_tasks_existing_before_new(self):
+        router = self.router({'apple': '', 'kiwi': 'p1'})
+
+        tasks = self.writer.create_write_tasks(
+            self.write_input('doc1', ['apple', 'kiwi']), 2, router)
+
+        self.assertEqual([DocumentWriter.task_partition(t) for t in tasks],
+                         ['p1', ''])
+
+    # tasks of different documents for one partition are sent in one
+    # record keyed by the partition & written to it at once by a worker
+    def test_partition_tasks_coalesced(self):
+        client = mock.Mock()
+        client.put_records.side_effect = lambda Records, StreamName: {
+            'FailedRecordCount': 0,
+            'Records': [{'SequenceNumber': str(idx)}
+                        for idx in range(len(Records))]}
+        with mock.patch('kinesis.AwsClients') as mock_aws:
+            mock_aws.client.return_value = client
+            self.writer._kinesis = Kinesis('stream', 25 * 1024)
+
+        self.writer.write_documents([self.request('doc1', ['apple', 'egg']),
+                                     self.request('doc2', ['banana'])])
+
+        records = client.put_records.call_args[1]['Records']
+        self.assertEqual([r['PartitionKey'] for r in records], ['p1', 'p2'],
+                         "Failed to group tasks by partition")
+        # records as delivered to a worker invocation
+        payloads = self.writer._kinesis.parse_tasks_from_records(
+            [{'kinesis': {'data': base64.b64encode(record['Data'])}}
+             for record in records])
+        self.assertEqual([(p['documentID'], p['tokenOperations'][0]
+                           ['partitionID']) for p in payloads],
+                         [('doc1', 'p1'), ('doc2', 'p1'), ('doc1', 'p2')])
+
+        tasks = []
+        for payload in payloads:
+            task = WriteTaskModel()
+            task.load(payload)
+            tasks.append(task)
+        with mock.patch('write_worker_node.write_partition') as mock_write, \
+                mock.patch('write_worker_node.Config') as mock_config:
+            mock_config.WRITE_WORKER_THREADS = 1
+            mock_write.side_effect = lambda partition_id, postings, stats: \
+                dict((p[0], True) for p in postings)
+            results = write_worker_node.execute_tasks(tasks)
+
+        self.assertEqual(sorted((c[0][0], sorted(p[:3] for p in c[0][1]))
+                                for c in mock_write.call_args_list),
+                         [('p1', [('apple', 'doc1', 2),
+                                  ('banana', 'doc2', 2)]),
+                          ('p2', [('egg', 'doc1', 2)])],
+                         "Failed to write a partition once for both "
+                         "documents")
+        self.assertEqual(sorted(r['tokens'].keys() for r in results),
+                         [['apple'], ['banana'], ['egg']])
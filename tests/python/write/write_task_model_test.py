@@ -0,0 +1,49 @@
+import unittest
+
+from write_task_model import WriteTaskModel
+
+
+class WriteTaskModelTest(unittest.TestCase):
+
+    def task(self):
+        return (WriteTaskModel().with_write_id('w1').with_document_id('doc1')
+                .with_lock_no_next(2)
+                .with_token_operation('apple', 1, [0], 'p1'))
+
+    def test_verify(self):
+        self.assertTrue(self.task().verify())
+
+    def test_verify_missing_field(self):
+        task = WriteTaskModel().with_write_id('w1').with_document_id('doc1')
+        self.assertFalse(task.verify())
+
+    def test_verify_unknown_field(self):
+        task = self.task()
+        task.get_payload()['other'] = 1
+        self.assertFalse(task.verify())
+
+    def test_attempt(self):
+        task = self.task()
+        self.assertEqual(task.get_attempt(), 0)
+
+        task.with_attempt(3)
+
+        self.assertTrue(task.verify(), "Rejected a re-queued task")
+        self.assertEqual(task.get_attempt(), 3)
+        loaded = WriteTaskModel()
+        loaded.load(task.get_payload())
+        self.assertEqual(loaded.get_attempt(), 3)
+
+    def test_get_operations_by_partition(self):
+        task = (self.task().with_token_operation('kiwi', 1, [1], 'p2')
+                .with_token_operation('banana', 2, [2], 'p1')
+                .with_token_operation('new', 1, [3], '')
+                .with_token_operation('other', 1, [4], ''))
+
+        groups = task.get_operations_by_partition()
+
+        self.assertEqual([(partition, [op['token'] for op in ops])
+                          for (partition, ops) in groups],
+                         [('p1', ['apple', 'banana']), ('p2', ['kiwi']),
+                          ('', ['new', 'other'])],
+                         "Failed to group operations in first seen order")
@@ -0,0 +1,272 @@
+import unittest
+import mock
+from botocore.exceptions import ClientError
+
+import write_worker_node
+from write_task_model import WriteTaskModel
+
+
+class WriteWorkerNodeTest(unittest.TestCase):
+
+    # mock dependencies of the worker & save references to class
+    def setUp(self):
+        patchers = {
+            'kinesis': mock.patch('write_worker_node.KINESIS'),
+            'dead_letters': mock.patch('write_worker_node.DEAD_LETTERS'),
+            'write': mock.patch('write_worker_node.write_partition'),
+            'config': mock.patch('write_worker_node.Config'),
+            'os': mock.patch('write_worker_node.os')
+        }
+        mocks = dict((name, patcher.start())
+                     for (name, patcher) in patchers.items())
+        for patcher in patchers.values():
+            self.addCleanup(patcher.stop)
+        self.mock_kinesis = mocks['kinesis']
+        self.mock_write = mocks['write']
+        self.mock_dead_letters = mocks['dead_letters']
+        mocks['config'].WRITE_WORKER_THREADS = 1
+        mocks['config'].WRITE_MAX_ATTEMPTS = 2
+
+    def task(self, doc_id, partitions):
+        task = (WriteTaskModel().with_write_id('w-' + doc_id)
+                .with_document_id(doc_id).with_lock_no_next(2))
+        for (token, partition_id) in partitions:
+            task.with_token_operation(token, 1, [0], partition_id)
+        return task
+
+    def handle(self, tasks):
+        self.mock_kinesis.parse_tasks_from_records.return_value = \
+            [task.get_payload() for task in tasks]
+        return write_worker_node.lambda_handler({'Records': []}, None)
+
+    def write_partition(self, partition_id, postings, stats):
+        if partition_id == 'b':
+            raise Exception("ERROR")
+        return dict((p[0], True) for p in postings)
+
+    def test_lambda_handler(self):
+        self.mock_write.side_effect = self.write_partition
+        res = self.handle([self.task('doc1', [('apple', 'a')])])
+
+        self.assertEqual(res[0]['tokens'], {'apple': True})
+        self.assertFalse(self.mock_kinesis.dispatch_tasks.called,
+                         "Re-queued a successful write")
+
+    def test_failed_write_requeued(self):
+        self.mock_write.side_effect = self.write_partition
+        res = self.handle([self.task('doc1', [('apple', 'a'),
+                                              ('banana', 'b')]),
+                           self.task('doc2', [('berry', 'b')])])
+
+        self.assertEqual(res[0]['tokens'], {'apple': True})
+        self.assertEqual(len(res[0]['errors']), 1)
+        retry_tasks = self.mock_kinesis.dispatch_tasks.call_args[0][0]
+        self.assertEqual([(t.get_doc_id(), t.get_lock_no_next(),
+                           [op['token'] for op in t.get_operations()])
+                          for t in retry_tasks],
+                         [('doc1', 2, ['banana']), ('doc2', 2, ['berry'])],
+                         "Failed to re-queue only the failed writes")
+        for task in retry_tasks:
+            self.assertTrue(task.verify(), "Re-queued an invalid task")
+            self.assertEqual(task.get_operations()[0]['partitionID'], 'b')
+            self.assertEqual(task.get_attempt(), 1)
+        self.assertFalse(self.mock_dead_letters.send_result.called)
+
+    def test_retry_increments_attempt(self):
+        self.mock_write.side_effect = self.write_partition
+        self.handle([self.task('doc1', [('banana', 'b')]).with_attempt(1)])
+
+        retry_tasks = self.mock_kinesis.dispatch_tasks.call_args[0][0]
+        self.assertEqual([t.get_attempt() for t in retry_tasks], [2])
+
+    def test_attempts_exhausted_dead_lettered(self):
+        self.mock_write.side_effect = self.write_partition
+        self.handle([self.task('doc1', [('banana', 'b')]).with_attempt(2),
+                     self.task('doc2', [('berry', 'b')]).with_attempt(1)])
+
+        retry_tasks = self.mock_kinesis.dispatch_tasks.call_args[0][0]
+        self.assertEqual([t.get_doc_id() for t in retry_tasks], ['doc2'])
+        (group_id, payload) = self.mock_dead_letters.send_result.call_args[0]
+        self.assertEqual(self.mock_dead_letters.send_result.call_count, 1)
+        self.assertEqual((group_id, payload['documentID'], payload['attempt'],
+                          [op['token'] for op in
+                           payload['tokenOperations']]),
+                         ('w-doc1', 'doc1', 3, ['banana']),
+                         "Failed to dead letter the exhausted write")
+
+    def test_only_dead_letters_not_requeued(self):
+        self.mock_write.side_effect = self.write_partition
+        self.handle([self.task('doc1', [('banana', 'b')]).with_attempt(2)])
+
+        self.assertFalse(self.mock_kinesis.dispatch_tasks.called)
+        self.assertTrue(self.mock_dead_letters.send_result.called)
+
+    def test_failed_requeue_fails_batch(self):
+        self.mock_write.side_effect = self.write_partition
+        self.mock_kinesis.dispatch_tasks.side_effect = Exception("ERROR")
+
+        with self.assertRaises(Exception) as context:
+            self.handle([self.task('doc1', [('banana', 'b')])])
+
+        self.assertTrue('ERROR' in context.exception)
+
+
+class WritePartitionTest(unittest.TestCase):
+
+    # mock the metadata table & partition storage of the worker
+    def setUp(self):
+        patchers = {
+            'index': mock.patch('write_worker_node.INDEX_METADATA'),
+            'storage': mock.patch('write_worker_node.INDEX_STORAGE'),
+            'config': mock.patch('write_worker_node.Config'),
+            'time': mock.patch('backoff.time')
+        }
+        mocks = dict((name, patcher.start())
+                     for (name, patcher) in patchers.items())
+        for patcher in patchers.values():
+            self.addCleanup(patcher.stop)
+        self.mock_index = mocks['index']
+        self.mock_storage = mocks['storage']
+        self.mock_time = mocks['time']
+        mocks['config'].WRITE_MAX_RETRIES = 2
+        mocks['config'].WRITE_BACKOFF_BASE = 0.05
+        mocks['config'].WRITE_BACKOFF_MAX = 1.0
+        self.postings = [('apple', 'doc1', 2, 1, [0])]
+
+    def client_error(self, code):
+        return ClientError({'Error': {'Code': code, 'Message': code}},
+                           'Operation')
+
+    def partition(self):
+        partition = mock.Mock()
+        partition.add_tokens.return_value = {'apple': True}
+        partition.starting_token.return_value = 'apple'
+        partition.ending_token.return_value = 'apple'
+        partition.size.return_value = 1
+        return partition
+
+    # storage keys the partition was uploaded under, in order
+    def uploaded(self):
+        return [c[0][0] for c in
+                self.mock_storage.write_partition.call_args_list]
+
+    def test_write_partition(self):
+        partition = self.partition()
+        self.mock_index.get_version_info.return_value = (3, 'old')
+        self.mock_storage.load_partition.return_value = partition
+
+        res = write_worker_node.write_partition('p1', self.postings)
+
+        self.assertEqual(res, {'apple': True})
+        partition.add_tokens.assert_called_once_with(self.postings)
+        self.mock_storage.load_partition.assert_called_once_with(
+            'old', for_update=True)
+        (index_model, is_new) = self.mock_index.update_metadata.call_args[0]
+        self.assertEqual(index_model.get_payload()['versionNo'], 3)
+        self.assertEqual(index_model.get_payload()['pKey'], 'p1')
+        self.assertFalse(is_new)
+        self.mock_storage.delete_partition.assert_called_once_with('old')
+
+    def test_write_new_partition(self):
+        with mock.patch('write_worker_node.IndexPartition') as mock_class:
+            mock_class.return_value = self.partition()
+            write_worker_node.write_partition('', self.postings)
+
+        self.assertFalse(self.mock_index.get_version_info.called,
+                         "Read the version of a new partition")
+        (index_model, is_new) = self.mock_index.update_metadata.call_args[0]
+        self.assertTrue(is_new)
+        self.assertTrue(index_model.get_payload()['pKey'],
+                        "Failed to create a partition id")
+        self.assertFalse(self.mock_storage.delete_partition.called)
+
+    def test_resized_partition(self):
+        self.mock_index.get_version_info.return_value = (None, None)
+        with mock.patch('write_worker_node.IndexPartition') as mock_class:
+            mock_class.return_value = self.partition()
+            write_worker_node.write_partition('p1', self.postings)
+
+        (index_model, is_new) = self.mock_index.update_metadata.call_args[0]
+        self.assertTrue(is_new, "Failed to write a retired partition's "
+                                "tokens to a new partition")
+        self.assertNotEqual(index_model.get_payload()['pKey'], 'p1')
+        self.assertFalse(self.mock_storage.load_partition.called)
+
+    def test_version_conflict_reapplied(self):
+        (first, second) = (self.partition(), self.partition())
+        self.mock_index.get_version_info.side_effect = [(3, 'old'),
+                                                        (4, 'newer')]
+        self.mock_storage.load_partition.side_effect = [first, second]
+        self.mock_index.update_metadata.side_effect = [
+            self.client_error('ConditionalCheckFailedException'), None]
+        stats = {'conflicts': 0, 'retries': 0}
+
+        res = write_worker_node.write_partition('p1', self.postings, stats)
+
+        self.assertEqual(res, {'apple': True})
+        first.add_tokens.assert_called_once_with(self.postings)
+        second.add_tokens.assert_called_once_with(self.postings)
+        self.assertEqual(self.mock_index.update_metadata.call_args[0][0]
+                         .get_payload()['versionNo'], 4,
+                         "Failed to write to the re-read version")
+        self.assertEqual(stats, {'conflicts': 1, 'retries': 1})
+        self.assertEqual(self.mock_time.sleep.call_count, 1)
+
+    def test_version_conflict_deletes_upload(self):
+        self.mock_index.get_version_info.return_value = (3, 'old')
+        self.mock_storage.load_partition.return_value = self.partition()
+        self.mock_index.update_metadata.side_effect = [
+            self.client_error('ConditionalCheckFailedException'), None]
+
+        write_worker_node.write_partition('p1', self.postings)
+
+        deleted = [c[0][0] for c in
+                   self.mock_storage.delete_partition.call_args_list]
+        self.assertEqual(deleted, [self.uploaded()[0], 'old'],
+                         "Failed to delete the orphaned upload")
+
+    def test_missing_partition_retried(self):
+        partition = self.partition()
+        self.mock_index.get_version_info.side_effect = [(3, 'old'),
+                                                        (4, 'newer')]
+        self.mock_storage.load_partition.side_effect = [
+            self.client_error('NoSuchKey'), partition]
+        stats = {'conflicts': 0, 'retries': 0}
+
+        res = write_worker_node.write_partition('p1', self.postings, stats)
+
+        self.assertEqual(res, {'apple': True})
+        self.assertEqual([c[0][0] for c in
+                          self.mock_storage.load_partition.call_args_list],
+                         ['old', 'newer'])
+        self.assertEqual(len(self.uploaded()), 1)
+        self.assertEqual(stats, {'conflicts': 1, 'retries': 1})
+
+    def test_retries_exhausted(self):
+        self.mock_index.get_version_info.return_value = (3, 'old')
+        self.mock_storage.load_partition.side_effect = \
+            lambda key, for_update: self.partition()
+        self.mock_index.update_metadata.side_effect = self.client_error(
+            'ConditionalCheckFailedException')
+        stats = {'conflicts': 0, 'retries': 0}
+
+        with self.assertRaises(ClientError):
+            write_worker_node.write_partition('p1', self.postings, stats)
+
+        self.assertEqual(self.mock_index.update_metadata.call_count, 3)
+        self.assertEqual(stats, {'conflicts': 3, 'retries': 2})
+        for call in self.mock_time.sleep.call_args_list:
+            self.assertTrue(0 <= call[0][0] <= 1.0, "Backoff exceeds cap")
+
+    def test_other_error_not_retried(self):
+        self.mock_index.get_version_info.return_value = (3, 'old')
+        self.mock_storage.load_partition.return_value = self.partition()
+        self.mock_index.update_metadata.side_effect = Exception("ERROR")
+
+        with self.assertRaises(Exception) as context:
+            write_worker_node.write_partition('p1', self.postings)
+
+        self.assertTrue('ERROR' in context.exception)
+        self.assertEqual(self.mock_index.update_metadata.call_count, 1)
+        self.assertFalse(self.mock_storage.delete_partition.called,
+                         "Deleted an upload the metadata may point to")